@@ -1,6 +1,12 @@
+import os
+"""Imports the os module to read the template cache setting and create its directory."""
+
 from flask import Flask, render_template
 """Imports Flask core class for creating the app and render_template for HTML rendering."""
 
+from jinja2 import FileSystemBytecodeCache
+"""Imports Jinja's on-disk bytecode cache so restarted workers skip compiling templates."""
+
 from routes.auth_routes import auth_bp
 """Imports the authentication Blueprint to handle login-related routes."""
 
@@ -10,36 +16,160 @@ from routes.api_routes import api_bp
 from routes.event_routes import event_bp
 """Imports the event Blueprint to handle campus event routes."""
 
-app = Flask(__name__)
-"""Initializes the Flask application instance."""
+from routes.cache_routes import cache_bp
+"""Imports the cache Blueprint that reports page cache statistics."""
 
-app.template_folder = "templates"
-"""Specifies the folder where HTML templates are stored."""
+from routes.feed_routes import feed_bp
+"""Imports the feed Blueprint that streams events and alerts as JSON."""
 
-app.static_folder = "static"
-"""Specifies the folder where static files (CSS, JS, images) are stored."""
+from routes.search_routes import search_bp
+"""Imports the search Blueprint that serves full-text search."""
 
-# Define what they user should see when they visit the root URL
-@app.route("/")
+from routes.recommendation_routes import recommendation_bp
+"""Imports the recommendation Blueprint that serves personalized event feeds."""
+
+from routes.metrics_routes import metrics_bp
+"""Imports the metrics Blueprint that serves Prometheus metrics."""
+
+from routes.timeline_routes import timeline_bp
+"""Imports the Blueprint for the merged events and alerts timeline."""
+
+from routes.calendar_routes import calendar_bp
+"""Imports the Blueprint that serves iCalendar subscription feeds."""
+
+from utils import db, metrics
+"""Imports the database module that provides pooled, per-request connections, and the metrics layer."""
+
+from utils.migrations import migrate
+"""Imports the migration runner that creates or upgrades the database schema."""
+
+from utils.refresher import refresher
+"""Imports the background refresher that scrapes events and fetches alerts off the request path."""
+
+TEMPLATE_CACHE = os.environ.get(
+    "CAMPUSCONNECT_TEMPLATE_CACHE",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), 'cache', 'jinja'))
+)
+"""Defines the directory where compiled templates are kept between restarts (an empty value turns it off)."""
 
+DEFAULT_CONFIG = {
+    "REFRESH": os.environ.get("CAMPUSCONNECT_REFRESH", "1") != "0",
+    "TEMPLATE_CACHE": TEMPLATE_CACHE,
+    "PRECOMPILE_TEMPLATES": True,
+}
+"""Defines the app's own settings: whether this process refreshes data sources (turn it off in web workers when
+python -m utils.refresher runs separately), the template bytecode cache directory, and whether every template is
+compiled at startup."""
+
+BLUEPRINTS = [
+    auth_bp, api_bp, event_bp, cache_bp, feed_bp, search_bp, recommendation_bp, metrics_bp, timeline_bp, calendar_bp,
+]
+"""Lists the Blueprints registered with the app, in registration order."""
+
+# Define what they user should see when they visit the root URL
 def index():
     """Function that renders the homepage template."""
 
     return render_template("index.html")
     """Renders the index.html template when the root URL is accessed."""
 
-# Register blueprints
-app.register_blueprint(auth_bp)
-"""Registers the authentication Blueprint with the app."""
+def create_app(config=None):
+    """
+    Build the Flask app. Everything expensive happens here, once per process that
+    calls it: the schema is brought up to date and every template is compiled (read
+    from the bytecode cache when possible). Under gunicorn --preload the master does
+    this before forking, so workers share the result copy-on-write, and each worker
+    starts its own refresher on its first request. The scraper and HTTP client are
+    only imported when a refresh runs. config overrides DEFAULT_CONFIG or any Flask setting.
+    """
+
+    app = Flask(__name__)
+    """Initializes the Flask application instance."""
+
+    app.config.update(DEFAULT_CONFIG)
+    """Applies the default settings."""
+
+    app.config.update(config or {})
+    """Applies the caller's settings."""
+
+    app.template_folder = "templates"
+    """Specifies the folder where HTML templates are stored."""
+
+    app.static_folder = "static"
+    """Specifies the folder where static files (CSS, JS, images) are stored."""
+
+    if app.config["TEMPLATE_CACHE"]:
+        """Checks whether compiled templates should be kept on disk."""
+
+        os.makedirs(app.config["TEMPLATE_CACHE"], exist_ok=True)
+        """Creates the cache directory if it doesn't exist yet."""
+
+        app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(app.config["TEMPLATE_CACHE"])}
+        """Loads compiled templates from the cache instead of compiling them again."""
+
+    app.add_url_rule("/", "index", index)
+    """Serves the homepage at the root URL."""
+
+    # Return each request's database connection to the pool when the request ends
+    db.init_app(app)
+    """Registers the teardown that releases per-request database connections."""
+
+    # Time every request and template render (and profile requests that ask for it when profiling is enabled)
+    metrics.init_app(app)
+    """Registers the hooks that feed the /metrics histograms."""
+
+    # Create the database or upgrade it to the current schema version (no-op once it is up to date)
+    with db.connection() as conn:
+        migrate(conn)
+        """Applies any pending migrations once at startup, instead of on each request or client."""
+
+    for blueprint in BLUEPRINTS:
+        """Iterates through each Blueprint."""
+
+        app.register_blueprint(blueprint)
+        """Registers the Blueprint with the app."""
+
+    if app.config["PRECOMPILE_TEMPLATES"]:
+        """Checks whether templates should be compiled now rather than on their first request."""
+
+        for name in app.jinja_env.list_templates():
+            """Iterates through each template."""
+
+            app.jinja_env.get_template(name)
+            """Compiles the template (or loads its bytecode) into the environment's cache."""
+
+    refresher.enabled = app.config["REFRESH"]
+    """Turns background refreshes on or off for this process."""
+
+    if app.config["REFRESH"]:
+        """Checks whether this process refreshes data sources."""
+
+        app.before_request(refresher.start)
+        """Starts the scheduler on the first request of each worker (threads don't survive a fork)."""
+
+    return app
+    """Returns the app."""
+
+def __getattr__(name):
+    """
+    Build the module-level app on first access, so `gunicorn app:app` and `from app import app`
+    keep working while importing this module stays cheap.
+    """
+
+    if name != "app":
+        """Checks whether something other than the app was asked for."""
+
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+        """Reports the missing attribute."""
 
-app.register_blueprint(api_bp)
-"""Registers the API Blueprint with the app."""
+    globals()["app"] = create_app()
+    """Builds the app and stores it so later accesses skip this function."""
 
-app.register_blueprint(event_bp)
-"""Registers the event Blueprint with the app."""
+    return globals()["app"]
+    """Returns the app."""
 
 if __name__ == "__main__":
     """Ensures the app runs only when executed directly, not when imported."""
 
-    app.run(debug=True)
-    """Runs the Flask app in debug mode, enabling live reload and error details."""
\ No newline at end of file
+    create_app().run(debug=True)
+    """Runs the Flask app in debug mode, enabling live reload and error details."""
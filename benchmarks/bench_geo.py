@@ -0,0 +1,237 @@
+"""
+Benchmark of campus alert matching (utils.geo) against scanning every alert polygon.
+
+Builds a throwaway migrated database with hundreds of campus locations spread over the
+continental United States, then ingests thousands of random alert polygons (a tenth
+issued by zone only) and times matching them at ingest, adding a campus afterwards,
+and reading one campus's alerts from the precomputed matches versus testing every
+stored polygon. Run from the project root:
+
+    python -m benchmarks.bench_geo --alerts 10000 --campuses 500
+"""
+
+import argparse
+"""Imports argparse to read benchmark options from the command line."""
+
+import json
+"""Imports the json module to store and read alert geometries."""
+
+import math
+"""Imports math to place polygon vertices around a center."""
+
+import os
+"""Imports the os module to build the database path."""
+
+import random
+"""Imports random to build reproducible campuses and polygons."""
+
+import tempfile
+"""Imports tempfile to keep the benchmark database out of the project."""
+
+import time
+"""Imports the time module to measure ingest and lookup time."""
+
+from utils import db, geo, migrations, queries
+"""Imports the connection settings, the schema migrations, the campus matcher, and the alert query."""
+
+REGION = (-125.0, -67.0, 25.0, 49.0)
+"""Defines the bounding box (min and max longitude, min and max latitude) campuses and alerts are spread over."""
+
+ZONES = [f"Z{i:03}" for i in range(200)]
+"""Defines the synthetic zone codes."""
+
+def polygon(rng):
+    """
+    Build a random star-shaped GeoJSON polygon of 8 to 24 vertices, 0.2 to 2 degrees
+    across, somewhere in the region (about the size of a county to a forecast area).
+    """
+
+    lon = rng.uniform(REGION[0], REGION[1])
+    """Picks the center longitude."""
+
+    lat = rng.uniform(REGION[2], REGION[3])
+    """Picks the center latitude."""
+
+    radius = rng.uniform(0.1, 1.0)
+    """Picks the polygon's size."""
+
+    count = rng.randint(8, 24)
+    """Picks the number of vertices."""
+
+    ring = [
+        [round(lon + radius * rng.uniform(0.5, 1) * math.cos(2 * math.pi * i / count), 4),
+         round(lat + radius * rng.uniform(0.5, 1) * math.sin(2 * math.pi * i / count), 4)]
+        for i in range(count)
+    ]
+    """Places the vertices around the center at random distances."""
+
+    return {"type": "Polygon", "coordinates": [ring + ring[:1]]}
+    """Returns the polygon with its ring closed."""
+
+def build(path, campuses, seed=42):
+    """
+    Create the database and add the campuses. Returns the open connection and the
+    seeded random generator (to build alerts from).
+    """
+
+    rng = random.Random(seed)
+    """Creates a seeded random generator so runs are comparable."""
+
+    conn = db.connect(path)
+    """Opens the benchmark database."""
+
+    migrations.migrate(conn)
+    """Creates the tables and the R*Tree indexes."""
+
+    for i in range(campuses):
+        """Iterates through each campus."""
+
+        geo.set_campus(conn, f"Campus {i}", rng.uniform(REGION[2], REGION[3]), rng.uniform(REGION[0], REGION[1]), [rng.choice(ZONES)])
+        """Adds the campus at a random point in one random zone."""
+
+    return conn, rng
+    """Returns the connection and the generator."""
+
+def ingest(conn, rng, alerts):
+    """
+    Insert alerts the way the alert client does (stamped with a new generation) and
+    match them to campuses in the same transaction. Returns the seconds spent
+    inserting and the seconds spent matching.
+    """
+
+    start = time.perf_counter()
+    """Records the start time of the insert."""
+
+    with conn:
+        """Ingests every alert in one transaction."""
+
+        generation = db.bump_generation(conn, "alerts")
+        """Bumps the alerts generation."""
+
+        conn.executemany(
+            "INSERT INTO api_data (id, headline, geometry, zones, changed_gen) VALUES (?, ?, ?, ?, ?)",
+            (
+                (f"urn:alert:{i}", f"Alert {i}",
+                 None if i % 10 == 0 else json.dumps(polygon(rng), separators=(",", ":")),
+                 " ".join(rng.sample(ZONES, 3)), generation)
+                for i in range(alerts)
+            )
+        )
+        """Inserts the alerts, every tenth one without a polygon."""
+
+        inserted = time.perf_counter()
+        """Records the end of the insert."""
+
+        geo.match_generation(conn, generation)
+        """Matches the alerts to the campuses."""
+
+    return inserted - start, time.perf_counter() - inserted
+    """Returns the insert and match times."""
+
+def scan(conn, campus):
+    """
+    The lookup the precomputed matches replace: test every stored polygon against the campus.
+    """
+
+    return [
+        row["id"] for row in conn.execute("SELECT id, geometry FROM api_data WHERE geometry IS NOT NULL")
+        if geo.contains(json.loads(row["geometry"]), campus["longitude"], campus["latitude"])
+    ]
+    """Returns the ids of the alerts whose polygon contains the campus."""
+
+def percentiles(func, arguments):
+    """
+    Call a function once per argument and return the p50 and p95 latency in milliseconds.
+    """
+
+    samples = []
+    """Initializes the list of latencies."""
+
+    for argument in arguments:
+        """Iterates through each argument."""
+
+        start = time.perf_counter()
+        """Records the start time."""
+
+        func(argument)
+        """Runs the lookup."""
+
+        samples.append((time.perf_counter() - start) * 1000)
+        """Records the latency."""
+
+    samples.sort()
+    """Sorts the latencies."""
+
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, len(samples) * 95 // 100)]
+    """Returns the median and the 95th percentile."""
+
+def main():
+    """Builds the campuses and alerts and prints matching and lookup times."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    """Creates the command-line parser."""
+
+    parser.add_argument("--alerts", type=int, default=5000, help="alert polygons to ingest")
+    """Adds the option for the number of alerts."""
+
+    parser.add_argument("--campuses", type=int, default=300, help="campus locations")
+    """Adds the option for the number of campuses."""
+
+    parser.add_argument("--lookups", type=int, default=20, help="campuses looked up by polygon scan (the slow baseline)")
+    """Adds the option for the number of baseline lookups."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        """Creates a directory for the benchmark database."""
+
+        conn, rng = build(os.path.join(directory, "bench_geo.db"), args.campuses)
+        """Adds the campuses."""
+
+        insert_seconds, match_seconds = ingest(conn, rng, args.alerts)
+        """Ingests and matches the alerts."""
+
+        matches = conn.execute("SELECT COUNT(*) FROM campus_alerts").fetchone()[0]
+        """Counts the stored matches."""
+
+        print(f"inserted {args.alerts} alerts in {insert_seconds:.2f}s, matched {args.campuses} campuses "
+              f"({matches} matches) in {match_seconds:.2f}s ({match_seconds / args.alerts * 1e6:.0f}us per alert)")
+        """Prints the ingest and match times."""
+
+        start = time.perf_counter()
+        """Records the start time of adding a campus."""
+
+        geo.set_campus(conn, "New Campus", 34.3318, -82.3868, [ZONES[0]])
+        """Adds one more campus, matching it against every stored alert."""
+
+        print(f"add a campus against {args.alerts} alerts: {(time.perf_counter() - start) * 1000:.1f}ms")
+        """Prints the time taken."""
+
+        campuses = geo.campuses(conn)
+        """Reads every campus."""
+
+        variants = [
+            ("indexed first page", campuses, lambda campus: queries.alerts(conn, True, campus=campus["id"])),
+            ("indexed all matches", campuses, lambda campus: conn.execute(
+                "SELECT alert_rowid FROM campus_alerts WHERE campus_id = ?", (campus["id"],)
+            ).fetchall()),
+            ("polygon scan", campuses[:args.lookups], lambda campus: scan(conn, campus)),
+        ]
+        """Defines the lookups to time."""
+
+        print(f"{'lookup':<22} {'p50 ms':>10} {'p95 ms':>10}")
+        """Prints the table header."""
+
+        for name, arguments, func in variants:
+            """Iterates through each lookup."""
+
+            print(f"{name:<22} {' '.join(f'{value:>10.3f}' for value in percentiles(func, arguments))}")
+            """Prints the latencies."""
+
+        conn.close()
+        """Closes the benchmark database."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the benchmark when executed directly."""
@@ -0,0 +1,171 @@
+"""
+Benchmark for CampusEventScraper.parse_events.
+
+Compares the original implementation (html.parser, full tree, two find() calls per field)
+with the current parse_html backends on synthetic Tribe Events pages, reporting throughput
+and peak Python heap (tracemalloc does not see libxml2's C allocations, so the lxml-native
+figure only covers Python objects). Run from the project root:
+
+    python -m benchmarks.bench_parse --sizes 1000 10000 50000
+"""
+
+import argparse
+"""Imports argparse to read benchmark options from the command line."""
+
+import re
+"""Imports the regex module used by the original implementation."""
+
+import time
+"""Imports the time module to measure parse duration."""
+
+import tracemalloc
+"""Imports tracemalloc to measure peak memory while parsing."""
+
+from bs4 import BeautifulSoup
+"""Imports BeautifulSoup for the original implementation."""
+
+from utils.event_scraper import parse_html, PARSER
+"""Imports the current parser and the backend it selects by default."""
+
+def make_page(count):
+    """
+    Build a synthetic Tribe Events list page with `count` events and some page chrome.
+    """
+
+    event = (
+        '<div class="tribe-common-g-row tribe-events-calendar-list__event">'
+        '<div class="tribe-events-calendar-list__event-date-tag"><time datetime="2025-04-{day:02d}">Apr {day}</time></div>'
+        '<div class="tribe-events-calendar-list__event-details">'
+        '<h3 class="tribe-events-calendar-list__event-title"><a href="/event/{i}">Event  number {i}</a></h3>'
+        '<address><span class="tribe-events-venue-details">Hall {hall}, Due West, SC</span></address>'
+        '<div class="tribe-events-calendar-list__event-description"><p>Join us for event {i}.\n  '
+        'There will be food, music, and   friends.</p></div>'
+        '</div></div>'
+    )
+    """Defines the markup of one event, modeled on Erskine's calendar page."""
+
+    chrome = '<nav>' + '<a href="/x">link</a>' * 200 + '</nav>'
+    """Defines navigation markup that a strainer can skip."""
+
+    body = "".join(event.format(i=i, day=i % 28 + 1, hall=i % 12) for i in range(count))
+    """Builds the markup for all of the events."""
+
+    return f'<html><head><title>Events</title></head><body>{chrome}<main>{body}</main>{chrome}</body></html>'
+    """Returns the full page."""
+
+def legacy_parse(html):
+    """
+    The original parse_events implementation, kept here as the baseline.
+    """
+
+    soup = BeautifulSoup(html, "html.parser")
+    """Parses the whole page with the built-in parser."""
+
+    events = []
+    """Initializes the list of extracted events."""
+
+    for div in soup.find_all("div", class_="tribe-events-calendar-list__event"):
+        """Iterates through each event container."""
+
+        title = div.find("h3").get_text(strip=True) if div.find("h3") else "Untitled Event"
+        """Extracts the title with two searches."""
+
+        date = div.find("time").get("datetime") if div.find("time") else None
+        """Extracts the date with two searches."""
+
+        location = div.find("span", class_="tribe-events-venue-details").get_text(strip=True) if div.find("span", class_="tribe-events-venue-details") else "Unknown Location"
+        """Extracts the location with two searches."""
+
+        description = div.find("div", class_="tribe-events-calendar-list__event-description").get_text(strip=True) if div.find("div", class_="tribe-events-calendar-list__event-description") else ""
+        """Extracts the description with two searches."""
+
+        events.append({
+            "title": re.sub(r"\s+", " ", title),
+            "date": date,
+            "location": location,
+            "description": re.sub(r"\s+", " ", description),
+        })
+        """Appends the cleaned event."""
+
+    return events
+    """Returns the extracted events."""
+
+def measure(func, html):
+    """
+    Run a parser and return (events parsed, seconds, peak MiB).
+    Time and memory are measured in separate runs because tracemalloc slows parsing down.
+    """
+
+    start = time.perf_counter()
+    """Records the start time."""
+
+    events = func(html)
+    """Runs the parser for timing."""
+
+    elapsed = time.perf_counter() - start
+    """Calculates how long the parse took."""
+
+    tracemalloc.start()
+    """Starts tracking memory allocations."""
+
+    func(html)
+    """Runs the parser again for the memory measurement."""
+
+    peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    """Reads the peak traced memory in MiB."""
+
+    tracemalloc.stop()
+    """Stops tracking memory allocations."""
+
+    return len(events), elapsed, peak
+    """Returns the measurements."""
+
+def main():
+    """Runs every parser variant on each page size and prints a comparison table."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    """Creates the command-line parser."""
+
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="events per page")
+    """Adds the option for the page sizes to benchmark."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    variants = [
+        ("legacy html.parser", legacy_parse),
+        ("html.parser strained", lambda html: parse_html(html, parser="html.parser")),
+    ]
+    """Defines the implementations that are always available."""
+
+    if PARSER == "lxml-native":
+        """Checks whether lxml is installed."""
+
+        variants += [
+            ("bs4+lxml full tree", lambda html: parse_html(html, parser="lxml", strain=False)),
+            ("bs4+lxml strained", lambda html: parse_html(html, parser="lxml")),
+            ("lxml-native", lambda html: parse_html(html, parser="lxml-native")),
+        ]
+        """Adds the lxml-backed variants."""
+
+    print(f"{'events':>7} {'variant':<24} {'seconds':>9} {'events/s':>10} {'heap MiB':>9}")
+    """Prints the table header."""
+
+    for size in args.sizes:
+        """Iterates through each page size."""
+
+        html = make_page(size)
+        """Builds the synthetic page."""
+
+        for name, func in variants:
+            """Iterates through each parser variant."""
+
+            count, elapsed, peak = measure(func, html)
+            """Runs and measures the variant."""
+
+            print(f"{size:>7} {name:<24} {elapsed:>9.3f} {count / elapsed:>10.0f} {peak:>9.1f}")
+            """Prints the variant's results."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the benchmark when executed directly."""
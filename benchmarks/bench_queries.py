@@ -0,0 +1,221 @@
+"""
+Benchmark of the /events and /api queries as the tables grow, comparing the original
+unbounded SELECTs with the indexed, keyset-paginated queries in utils.queries.
+
+Builds a throwaway database per size and times the first page, a deep page (reached
+through its cursor), and a filtered page, plus the merged /timeline against sorting a
+UNION ALL of the three tables. Run from the project root:
+
+    python -m benchmarks.bench_queries --sizes 1000 10000 100000 1000000
+"""
+
+import argparse
+"""Imports argparse to read benchmark options from the command line."""
+
+import datetime
+"""Imports datetime to generate event dates and alert timestamps."""
+
+import os
+"""Imports the os module to manage the temporary database directory."""
+
+import random
+"""Imports random to build reproducible synthetic rows."""
+
+import tempfile
+"""Imports tempfile to keep benchmark databases out of the project."""
+
+import time
+"""Imports the time module to measure query latency."""
+
+from utils import db, migrations, queries, timestamps
+"""Imports the connection settings, the schema migrations, the paginated queries, and the date normalizer."""
+
+LOCATIONS = ["Library", "Student Center", "Gallery", "Main Auditorium", "Campus Lawn", "Gym"]
+"""Defines the locations assigned to synthetic events."""
+
+def build(path, rows, seed=42):
+    """
+    Create a migrated database holding the given number of events, scraped events, and alerts.
+    """
+
+    rng = random.Random(seed)
+    """Creates a seeded random generator so runs are comparable."""
+
+    base = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    """Defines the earliest generated timestamp."""
+
+    conn = db.connect(path)
+    """Opens the benchmark database."""
+
+    migrations.migrate(conn)
+    """Creates the tables and indexes."""
+
+    def stamp():
+        """Returns an ISO timestamp spread over roughly ten years."""
+
+        return (base + datetime.timedelta(minutes=rng.randrange(5_256_000))).isoformat()
+        """Returns a random minute after the base time."""
+
+    with conn:
+        """Loads all rows in one transaction."""
+
+        conn.executemany(
+            "INSERT INTO events (title, location, date) VALUES (?, ?, ?)",
+            ((f"Event {i}", rng.choice(LOCATIONS), stamp()[:10]) for i in range(rows))
+        )
+        """Inserts the internal events."""
+
+        conn.executemany(
+            "INSERT INTO external_events (title, date, location, description, event_key) VALUES (?, ?, ?, ?, ?)",
+            ((f"Scraped {i}", stamp(), rng.choice(LOCATIONS), "Description " * 10, str(i)) for i in range(rows))
+        )
+        """Inserts the scraped events."""
+
+        conn.executemany(
+            "INSERT INTO api_data (id, event, headline, effective, expires) VALUES (?, ?, ?, ?, ?)",
+            ((f"urn:alert:{i}", "Flood Warning", "Flood Warning issued", stamp(), stamp()) for i in range(rows))
+        )
+        """Inserts the alerts."""
+
+        for table in timestamps.COLUMNS:
+            """Iterates through each table with dates."""
+
+            timestamps.normalize_rows(conn, table)
+            """Stores the dates as epoch seconds, as ingest does."""
+
+    conn.execute("ANALYZE")
+    """Collects statistics so the planner picks the same plans it would in production."""
+
+    return conn
+    """Returns the open connection."""
+
+def timed(func, repeat):
+    """
+    Run a query function several times and return the median latency in milliseconds.
+    """
+
+    samples = []
+    """Initializes the list of latencies."""
+
+    for _ in range(repeat):
+        """Repeats the query to smooth out noise."""
+
+        start = time.perf_counter()
+        """Records the start time."""
+
+        func()
+        """Runs the query."""
+
+        samples.append((time.perf_counter() - start) * 1000)
+        """Records the latency."""
+
+    return sorted(samples)[len(samples) // 2]
+    """Returns the median latency."""
+
+def deep_cursor(fetch, pages):
+    """
+    Follow next-page cursors a number of pages in and return the cursor found there.
+    """
+
+    cursor = None
+    """Starts from the first page."""
+
+    for _ in range(pages):
+        """Walks one page further."""
+
+        _, cursor = fetch(cursor)
+        """Reads the cursor of the next page."""
+
+        if cursor is None:
+            """Checks whether the last page was reached."""
+
+            break
+            """Stops at the last page."""
+
+    return cursor
+    """Returns the cursor of the deepest page reached."""
+
+def main():
+    """Builds a database per size and prints legacy and paginated query latencies."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    """Creates the command-line parser."""
+
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="rows per table")
+    """Adds the option for the table sizes to test."""
+
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query (median is reported)")
+    """Adds the option for the number of runs per query."""
+
+    parser.add_argument("--legacy", action="store_true", help="also time the original unbounded queries")
+    """Adds the option to include the original queries (slow on large tables)."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    print(f"{'rows':>9} {'query':<32} {'ms':>9}")
+    """Prints the table header."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        """Creates a directory for the benchmark databases."""
+
+        for size in args.sizes:
+            """Iterates through each table size."""
+
+            conn = build(os.path.join(directory, f"bench_{size}.db"), size)
+            """Builds the database for this size."""
+
+            deep_events = deep_cursor(lambda after: queries.external_events(conn, after=after), 20)
+            """Finds the cursor 20 pages into the scraped events."""
+
+            deep_alerts = deep_cursor(lambda after: queries.alerts(conn, include_expired=True, after=after), 20)
+            """Finds the cursor 20 pages into the alerts."""
+
+            week = timestamps.to_epoch("2024-06-01"), timestamps.to_epoch("2024-06-08")
+            """Defines the week the timeline queries cover."""
+
+            deep_timeline = deep_cursor(lambda after: queries.timeline(conn, *week, after=after), 20)
+            """Finds the cursor 20 pages into the timeline."""
+
+            variants = [
+                ("events page 1", lambda: queries.internal_events(conn)),
+                ("external page 1", lambda: queries.external_events(conn)),
+                ("external page 21 (cursor)", lambda: queries.external_events(conn, after=deep_events)),
+                ("external date+location", lambda: queries.external_events(conn, "2024-06-01", "2024-06-30", "Library")),
+                ("alerts page 1 (active)", lambda: queries.alerts(conn)),
+                ("alerts page 21 (cursor)", lambda: queries.alerts(conn, include_expired=True, after=deep_alerts)),
+                ("timeline week page 1", lambda: queries.timeline(conn, *week)),
+                ("timeline week page 21 (cursor)", lambda: queries.timeline(conn, *week, after=deep_timeline)),
+                ("timeline union sort", lambda: conn.execute("""
+                    SELECT * FROM (
+                        SELECT 'event' AS kind, id, title, starts_at AS at FROM events WHERE starts_at >= ?1 AND starts_at < ?2
+                        UNION ALL
+                        SELECT 'external', id, title, starts_at FROM external_events WHERE starts_at >= ?1 AND starts_at < ?2
+                        UNION ALL
+                        SELECT 'alert', id, headline, effective_at FROM api_data WHERE effective_at >= ?1 AND effective_at < ?2
+                    ) ORDER BY at LIMIT 51
+                """, week).fetchall()),
+            ]
+            """Defines the paginated queries to time."""
+
+            if args.legacy:
+                """Checks whether the original queries should be timed too."""
+
+                variants += [
+                    ("legacy external full scan", lambda: conn.execute("SELECT title, date, location, description FROM external_events").fetchall()),
+                    ("legacy alerts sort", lambda: conn.execute("SELECT * FROM api_data ORDER BY effective DESC").fetchall()),
+                ]
+                """Adds the original unbounded queries."""
+
+            for name, func in variants:
+                """Iterates through each query."""
+
+                print(f"{size:>9} {name:<32} {timed(func, args.repeat):>9.3f}")
+                """Prints the median latency."""
+
+            conn.close()
+            """Closes the benchmark database."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the benchmark when executed directly."""
@@ -0,0 +1,173 @@
+"""
+Benchmark of precomputed recommendations (utils.recommendations) at campus scale.
+
+Builds a throwaway migrated database with synthetic users and events, then times
+a full rebuild, the incremental match of a scrape's worth of new events, a preference
+change, and a user's feed lookup. Run from the project root:
+
+    python -m benchmarks.bench_recommendations --users 50000 --events 5000
+"""
+
+import argparse
+"""Imports argparse to read benchmark options from the command line."""
+
+import os
+"""Imports the os module to build the database path."""
+
+import random
+"""Imports random to build reproducible synthetic users and events."""
+
+import tempfile
+"""Imports tempfile to keep the benchmark database out of the project."""
+
+import time
+"""Imports the time module to measure durations."""
+
+from utils import db, migrations, recommendations
+"""Imports the connection settings, the schema migrations, and the recommendations module."""
+
+INTERESTS = (
+    "art music jazz choir theatre film poetry football soccer basketball tennis running yoga "
+    "chemistry biology physics history philosophy economics coding robotics ai career volunteering "
+    "chapel worship debate chess gaming photography dance cooking hiking climbing"
+).split() + [f"topic{i}" for i in range(260)]
+"""Defines the interests users list and events mention (named ones plus generic clubs and courses)."""
+
+PLACES = ["Library", "Student Center", "Gallery", "Main Auditorium", "Campus Lawn", "Gym", "Chapel"]
+"""Defines the event locations."""
+
+def event_row(rng, i):
+    """
+    Build one synthetic scraped event.
+    """
+
+    topic = rng.sample(INTERESTS, 2)
+    """Picks the event's topics."""
+
+    return (
+        f"{topic[0].title()} and {topic[1]} night {i}",
+        f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        rng.choice(PLACES),
+        f"Join us for {' '.join(rng.sample(INTERESTS, 4))} with friends.",
+        f"bench-{i}",
+    )
+    """Returns the row values."""
+
+def timed(func):
+    """
+    Run a function once and return its result and the seconds taken.
+    """
+
+    start = time.perf_counter()
+    """Records the start time."""
+
+    result = func()
+    """Runs the function."""
+
+    return result, time.perf_counter() - start
+    """Returns the result and the elapsed time."""
+
+def main():
+    """Builds the database and prints rebuild, incremental, and lookup timings."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    """Creates the command-line parser."""
+
+    parser.add_argument("--users", type=int, default=50000, help="number of users")
+    """Adds the option for the number of users."""
+
+    parser.add_argument("--events", type=int, default=5000, help="number of scraped events")
+    """Adds the option for the number of events."""
+
+    parser.add_argument("--new-events", type=int, default=100, help="events added by one incremental scrape")
+    """Adds the option for the size of an incremental scrape."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    rng = random.Random(42)
+    """Creates a seeded random generator so runs are comparable."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        """Creates a directory for the benchmark database."""
+
+        conn = db.connect(os.path.join(directory, "bench_recommendations.db"))
+        """Opens the benchmark database."""
+
+        migrations.migrate(conn)
+        """Creates the tables."""
+
+        with conn:
+            """Loads the users and events in one transaction."""
+
+            conn.executemany(
+                "INSERT INTO users (name, preferences) VALUES (?, ?)",
+                ((f"Student {i}", ", ".join(rng.sample(INTERESTS, rng.randint(1, 5)))) for i in range(args.users))
+            )
+            """Inserts the users with a few interests each."""
+
+            conn.executemany(
+                "INSERT INTO external_events (title, date, location, description, event_key) VALUES (?, ?, ?, ?, ?)",
+                (event_row(rng, i) for i in range(args.events))
+            )
+            """Inserts the events."""
+
+        matches, seconds = timed(lambda: recommendations.rebuild(conn))
+        """Computes every match from scratch."""
+
+        print(f"full rebuild: {matches} matches for {args.users} users x {args.events} events in {seconds:.2f}s")
+        """Prints the rebuild time."""
+
+        def scrape():
+            """Inserts a batch of new events and matches them, as the scraper's save does."""
+
+            with conn:
+                generation = db.bump_generation(conn, "events")
+                """Starts the ingest generation."""
+
+                conn.executemany(
+                    "INSERT INTO external_events (title, date, location, description, event_key, changed_gen) VALUES (?, ?, ?, ?, ?, ?)",
+                    (event_row(rng, args.events + i) + (generation,) for i in range(args.new_events))
+                )
+                """Inserts the new events."""
+
+            with conn:
+                return recommendations.match_generation(conn, generation)
+                """Matches only the new events, in a transaction after the write."""
+
+        matches, seconds = timed(scrape)
+        """Runs the incremental scrape."""
+
+        print(f"incremental match: {matches} matches for {args.new_events} new events in {seconds * 1000:.1f} ms")
+        """Prints the incremental match time."""
+
+        _, seconds = timed(lambda: recommendations.set_preferences(conn, 1, "jazz, robotics, hiking"))
+        """Changes one user's preferences."""
+
+        print(f"preference change: {seconds * 1000:.1f} ms")
+        """Prints the preference change time."""
+
+        samples = []
+        """Initializes the list of feed lookup latencies."""
+
+        for _ in range(200):
+            """Looks up the feeds of random users."""
+
+            _, seconds = timed(lambda: recommendations.recommended_events(conn, rng.randint(1, args.users)))
+            """Looks up one page of a user's feed."""
+
+            samples.append(seconds * 1000)
+            """Records the latency."""
+
+        samples.sort()
+        """Sorts the latencies to read percentiles."""
+
+        print(f"feed lookup: p50 {samples[len(samples) // 2]:.3f} ms, p95 {samples[int(len(samples) * 0.95)]:.3f} ms")
+        """Prints the feed lookup latency."""
+
+        conn.close()
+        """Closes the benchmark database."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the benchmark when executed directly."""
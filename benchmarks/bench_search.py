@@ -0,0 +1,213 @@
+"""
+Benchmark of full-text search (utils.search) against LIKE '%term%' scans.
+
+Builds a throwaway migrated database with a synthetic corpus of scraped events
+and alerts (indexed by the search triggers as they are inserted), then times ranked
+first-page searches for common, rare, prefix, and multi-word queries. Run from the
+project root:
+
+    python -m benchmarks.bench_search --docs 1000000
+"""
+
+import argparse
+"""Imports argparse to read benchmark options from the command line."""
+
+import itertools
+"""Imports itertools to build cumulative word weights."""
+
+import os
+"""Imports the os module to build the database path."""
+
+import random
+"""Imports random to build a reproducible synthetic corpus."""
+
+import tempfile
+"""Imports tempfile to keep the benchmark database out of the project."""
+
+import time
+"""Imports the time module to measure build and query time."""
+
+from utils import db, migrations, search
+"""Imports the connection settings, the schema migrations, and the search module."""
+
+WORDS = (
+    "spring festival music night lecture education library gallery concert football soccer "
+    "basketball career fair workshop seminar club meeting volunteer service chapel choir theatre "
+    "flood warning watch advisory heavy rain thunderstorm wind tornado county river evening"
+).split()
+"""Defines the most frequent words of the synthetic corpus."""
+
+RARE_WORD = "quasquicentennial"
+"""Defines a word that appears in only a handful of documents."""
+
+def vocabulary(rng, size=20000):
+    """
+    Build the corpus vocabulary (the common words followed by random filler words) and
+    cumulative Zipf weights, so a few words appear in most documents and most words are rare.
+    """
+
+    words = WORDS + ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10))) for _ in range(size)]
+    """Builds the vocabulary."""
+
+    return words, list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    """Returns the words and their cumulative weights."""
+
+def sentence(rng, vocab, length):
+    """
+    Build a random sentence from the vocabulary.
+    """
+
+    words, weights = vocab
+    """Unpacks the words and their cumulative weights."""
+
+    return " ".join(rng.choices(words, cum_weights=weights, k=length))
+    """Returns the sentence."""
+
+def build(path, docs, seed=42):
+    """
+    Create the database and insert docs documents, half scraped events and half alerts.
+    Returns the open connection and the seconds spent inserting (including indexing).
+    """
+
+    rng = random.Random(seed)
+    """Creates a seeded random generator so runs are comparable."""
+
+    vocab = vocabulary(rng)
+    """Builds the vocabulary."""
+
+    conn = db.connect(path)
+    """Opens the benchmark database."""
+
+    migrations.migrate(conn)
+    """Creates the tables, the search index, and its triggers."""
+
+    start = time.perf_counter()
+    """Records the start time of the load."""
+
+    with conn:
+        """Loads all rows in one transaction."""
+
+        conn.executemany(
+            "INSERT INTO external_events (title, description, event_key) VALUES (?, ?, ?)",
+            (
+                (sentence(rng, vocab, 4), sentence(rng, vocab, 30) + (f" {RARE_WORD}" if i % 100_000 == 0 else ""), str(i))
+                for i in range(docs // 2)
+            )
+        )
+        """Inserts the scraped events (each one is indexed by its trigger)."""
+
+        conn.executemany(
+            "INSERT INTO api_data (id, headline, description) VALUES (?, ?, ?)",
+            ((f"urn:alert:{i}", sentence(rng, vocab, 6), sentence(rng, vocab, 40)) for i in range(docs - docs // 2))
+        )
+        """Inserts the alerts (each one is indexed by its trigger)."""
+
+    conn.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    """Merges the index segments, as a reindex would."""
+
+    conn.commit()
+    """Commits the merged index."""
+
+    return conn, time.perf_counter() - start
+    """Returns the connection and the load time."""
+
+def timed(func, repeat):
+    """
+    Run a function several times and return the median latency in milliseconds.
+    """
+
+    samples = []
+    """Initializes the list of latencies."""
+
+    for _ in range(repeat):
+        """Repeats the query to smooth out noise."""
+
+        start = time.perf_counter()
+        """Records the start time."""
+
+        func()
+        """Runs the query."""
+
+        samples.append((time.perf_counter() - start) * 1000)
+        """Records the latency."""
+
+    return sorted(samples)[len(samples) // 2]
+    """Returns the median latency."""
+
+def like_scan(conn, term):
+    """
+    The LIKE-based search this subsystem replaces, limited to one page of results.
+    """
+
+    pattern = f"%{term}%"
+    """Builds the substring pattern."""
+
+    return conn.execute("""
+        SELECT id, title FROM external_events WHERE title LIKE ? OR description LIKE ?
+        UNION ALL
+        SELECT rowid, headline FROM api_data WHERE headline LIKE ? OR description LIKE ?
+        LIMIT 20
+    """, (pattern, pattern, pattern, pattern)).fetchall()
+    """Returns the first page of substring matches."""
+
+def main():
+    """Builds the corpus and prints search latencies."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    """Creates the command-line parser."""
+
+    parser.add_argument("--docs", type=int, default=200_000, help="documents in the corpus")
+    """Adds the option for the corpus size."""
+
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query (median is reported)")
+    """Adds the option for the number of runs per query."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        """Creates a directory for the benchmark database."""
+
+        conn, load_seconds = build(os.path.join(directory, "bench_search.db"), args.docs)
+        """Builds the corpus."""
+
+        print(f"loaded and indexed {args.docs} documents in {load_seconds:.1f}s")
+        """Prints the load time."""
+
+        start = time.perf_counter()
+        """Records the start time of the rebuild."""
+
+        search.reindex(conn)
+        """Rebuilds the index from scratch."""
+
+        print(f"bulk reindex: {time.perf_counter() - start:.1f}s")
+        """Prints the rebuild time."""
+
+        variants = [
+            ("fts most common word", lambda: search.search(conn, "spring")),
+            ("fts common word", lambda: search.search(conn, "festival")),
+            ("fts two common words", lambda: search.search(conn, "flood county")),
+            ("fts rare word", lambda: search.search(conn, RARE_WORD)),
+            ("fts prefix", lambda: search.search(conn, "thunder*")),
+            ("fts page 10", lambda: search.search(conn, "festival", page=10)),
+            ("fts alerts only", lambda: search.search(conn, "tornado", ["alert"])),
+            ("like common word", lambda: like_scan(conn, "festival")),
+            ("like rare word", lambda: like_scan(conn, RARE_WORD)),
+        ]
+        """Defines the queries to time."""
+
+        print(f"{'query':<24} {'ms':>10}")
+        """Prints the table header."""
+
+        for name, func in variants:
+            """Iterates through each query."""
+
+            print(f"{name:<24} {timed(func, args.repeat):>10.2f}")
+            """Prints the median latency."""
+
+        conn.close()
+        """Closes the benchmark database."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the benchmark when executed directly."""
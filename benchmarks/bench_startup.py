@@ -0,0 +1,296 @@
+"""
+Benchmark of app startup time and per-worker memory (app.create_app).
+
+Seeds a throwaway small database, then times fresh interpreters importing the app
+module, building the app, and serving the first page: with an empty template bytecode
+cache, with a warm one, and with the HTTP client imported eagerly the way the routes
+used to. It then forks gunicorn-style workers that each serve every page, once with
+the app built in the parent before forking (--preload) and once with each worker
+building its own, and reports each worker's RSS and private memory (Linux only).
+Run from the project root:
+
+    python -m benchmarks.bench_startup --runs 5 --workers 4
+"""
+
+import argparse
+"""Imports argparse to read benchmark options from the command line."""
+
+import json
+"""Imports the json module to pass measurements back from child processes."""
+
+import os
+"""Imports the os module to fork workers and point the app at the benchmark database."""
+
+import shutil
+"""Imports shutil to empty the template cache between cold runs."""
+
+import statistics
+"""Imports statistics to summarize the startup times."""
+
+import subprocess
+"""Imports subprocess to start each measurement in a fresh interpreter."""
+
+import sys
+"""Imports sys to run children with the same interpreter and count loaded modules."""
+
+import tempfile
+"""Imports tempfile to keep the benchmark database and caches out of the project."""
+
+import time
+"""Imports the time module to measure startup stages."""
+
+PATHS = ["/", "/events", "/api", "/timeline", "/search?q=art", "/calendar.ics"]
+"""Defines the pages every worker serves before its memory is measured."""
+
+def startup_child(eager):
+    """
+    Measure one startup in this (fresh) interpreter and print the stage times as JSON.
+    With eager set, the HTTP client is imported first, as the alerts routes used to.
+    """
+
+    start = time.perf_counter()
+    """Records when the measurement started."""
+
+    import app
+    """Imports the app module."""
+
+    if eager:
+        """Checks whether the old eager import should be reproduced."""
+
+        import utils.api_client
+        """Imports the alerts client and with it requests and the HTTP stack."""
+
+    imported = time.perf_counter()
+    """Records when the imports finished."""
+
+    flask_app = app.create_app()
+    """Builds the app."""
+
+    created = time.perf_counter()
+    """Records when the app was ready."""
+
+    flask_app.test_client().get("/events")
+    """Serves the first page."""
+
+    print(json.dumps({
+        "import": imported - start,
+        "create": created - imported,
+        "first": time.perf_counter() - created,
+        "modules": len(sys.modules),
+        "requests": "requests" in sys.modules,
+    }))
+    """Prints the measurements."""
+
+def usage():
+    """
+    Return this process's resident and private memory in MB, read from /proc.
+    """
+
+    values = {}
+    """Stores the fields of the memory summary."""
+
+    with open("/proc/self/smaps_rollup") as rollup:
+        """Opens the kernel's memory summary for this process."""
+
+        for line in rollup:
+            """Iterates through each field."""
+
+            parts = line.split()
+            """Splits the name, value, and unit."""
+
+            if len(parts) == 3 and parts[2] == "kB":
+                """Checks whether the line is a size."""
+
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+                """Stores the size in MB."""
+
+    return {"rss": values["Rss"], "private": values["Private_Clean"] + values["Private_Dirty"]}
+    """Returns the resident size and the memory not shared with any other process."""
+
+def memory_child(preload, workers):
+    """
+    Fork workers that each serve every page, and print each worker's memory as JSON
+    once all of them are running. With preload set the app is built before forking.
+    """
+
+    if preload:
+        """Checks whether the app should be built in the parent."""
+
+        import app
+        """Imports the app module in the parent."""
+
+        flask_app = app.create_app()
+        """Builds the app once for every worker to share."""
+
+    report, write = os.pipe()
+    """Creates the pipe the workers report their memory on."""
+
+    release, hold = os.pipe()
+    """Creates the pipe the workers wait on, so every worker is alive while memory is measured."""
+
+    for _ in range(workers):
+        """Starts each worker."""
+
+        if os.fork() == 0:
+            """Runs the worker in the child process."""
+
+            os.close(hold)
+            """Closes the release pipe's write end, so it reads end-of-file once the parent closes its own."""
+
+            os.close(report)
+            """Closes the report pipe's read end, which only the parent uses."""
+
+            if not preload:
+                """Checks whether the worker builds its own app."""
+
+                import app
+                """Imports the app module in the worker."""
+
+                flask_app = app.create_app()
+                """Builds the worker's app."""
+
+            client = flask_app.test_client()
+            """Creates a client that calls the app in process."""
+
+            for path in PATHS:
+                """Iterates through each page."""
+
+                client.get(path).get_data()
+                """Serves the page."""
+
+            os.write(write, (json.dumps(usage()) + "\n").encode("utf-8"))
+            """Reports the worker's memory."""
+
+            os.read(release, 1)
+            """Waits until every worker has reported."""
+
+            os._exit(0)
+            """Exits the worker without running the parent's cleanup."""
+
+    os.close(write)
+    """Keeps only the workers' ends of the report pipe open."""
+
+    with os.fdopen(report) as lines:
+        """Reads the workers' reports."""
+
+        print(json.dumps([json.loads(lines.readline()) for _ in range(workers)]))
+        """Prints every worker's memory."""
+
+    os.close(hold)
+    """Releases the workers."""
+
+    for _ in range(workers):
+        """Waits for each worker."""
+
+        os.wait()
+        """Reaps the worker."""
+
+def run_child(code, env):
+    """
+    Run a line of Python in a fresh interpreter and return the JSON it printed.
+    """
+
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+    """Runs the child and reads its output."""
+
+    return json.loads(output.strip().splitlines()[-1])
+    """Returns the last line, parsed."""
+
+def main():
+    """Seeds the benchmark database and prints startup times and per-worker memory."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    """Creates the command-line parser."""
+
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters timed per variant")
+    """Adds the option for the number of startups timed."""
+
+    parser.add_argument("--workers", type=int, default=4, help="workers forked per memory variant")
+    """Adds the option for the number of workers."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        """Creates a directory for the benchmark database and caches."""
+
+        env = dict(
+            os.environ,
+            CAMPUSCONNECT_DB=os.path.join(directory, "bench_startup.db"),
+            CAMPUSCONNECT_REFRESH="0",
+            CAMPUSCONNECT_LOG_FILE=os.path.join(directory, "logs", "system.log"),
+            CAMPUSCONNECT_TEMPLATE_CACHE=os.path.join(directory, "jinja"),
+        )
+        """Builds the children's environment: the benchmark database, no background refreshes (which would
+        fetch from the network), and private logs and template cache."""
+
+        subprocess.run([sys.executable, "-m", "db.seed_data", "--db", env["CAMPUSCONNECT_DB"], "--scale", "small"],
+                       env=env, capture_output=True, check=True)
+        """Seeds the database."""
+
+        variants = [
+            ("cold template cache", False, True),
+            ("warm template cache", False, False),
+            ("eager HTTP imports", True, False),
+        ]
+        """Defines the startups to time: whether the HTTP client is imported eagerly, and whether the template
+        cache is emptied before each run."""
+
+        print(f"{'startup':<22} {'import ms':>10} {'create ms':>10} {'first ms':>10} {'modules':>8} {'requests':>9}")
+        """Prints the table header."""
+
+        for name, eager, cold in variants:
+            """Iterates through each startup variant."""
+
+            runs = []
+            """Stores the measurements of each run."""
+
+            for _ in range(args.runs):
+                """Times each run in a fresh interpreter."""
+
+                if cold:
+                    """Checks whether the template cache should be empty."""
+
+                    shutil.rmtree(env["CAMPUSCONNECT_TEMPLATE_CACHE"], ignore_errors=True)
+                    """Empties the template cache."""
+
+                runs.append(run_child(f"from benchmarks.bench_startup import startup_child; startup_child({eager})", env))
+                """Measures one startup."""
+
+            medians = [statistics.median(run[stage] for run in runs) * 1000 for stage in ("import", "create", "first")]
+            """Takes the median time of each stage."""
+
+            print(f"{name:<22} {' '.join(f'{value:>10.1f}' for value in medians)} {runs[-1]['modules']:>8} "
+                  f"{'yes' if runs[-1]['requests'] else 'no':>9}")
+            """Prints the median times and what was loaded."""
+
+        if not os.path.exists("/proc/self/smaps_rollup"):
+            """Checks whether per-process memory can be read on this system."""
+
+            print("per-worker memory needs Linux (/proc/self/smaps_rollup)")
+            """Explains why the memory table is skipped."""
+
+            return
+            """Exits after the startup times."""
+
+        print(f"\n{'workers':<22} {'RSS MB':>10} {'private MB':>10} {'total private MB':>17}")
+        """Prints the memory table header."""
+
+        for name, preload in (("preload", True), ("build per worker", False)):
+            """Iterates through each memory variant."""
+
+            workers = run_child(f"from benchmarks.bench_startup import memory_child; memory_child({preload}, {args.workers})", env)
+            """Forks the workers and reads their memory."""
+
+            rss = statistics.mean(worker["rss"] for worker in workers)
+            """Averages the resident size."""
+
+            private = [worker["private"] for worker in workers]
+            """Lists each worker's private memory."""
+
+            print(f"{name:<22} {rss:>10.1f} {statistics.mean(private):>10.1f} {sum(private):>17.1f}")
+            """Prints the averages and the private memory of all workers together."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the benchmark when executed directly."""
@@ -0,0 +1,140 @@
+"""
+Microbenchmarks for utils.text against the original per-call re.sub cleaning.
+
+Simulates several weather.gov polls where most alert text repeats between polls,
+plus already-clean short fields (severity-style values). Run from the project root:
+
+    python -m benchmarks.bench_text --alerts 5000 --polls 5
+"""
+
+import argparse
+"""Imports argparse to read benchmark options from the command line."""
+
+import random
+"""Imports random to build a reproducible synthetic corpus."""
+
+import re
+"""Imports the regex module used by the original implementation."""
+
+import time
+"""Imports the time module to measure cleaning duration."""
+
+from utils import text
+"""Imports the shared text-normalization module."""
+
+def legacy_clean(value):
+    """
+    The original APIClient.clean_text implementation, kept here as the baseline.
+    """
+
+    if not value:
+        """Checks if the input text is empty or None."""
+
+        return None
+        """Returns None if no text is provided."""
+
+    value = re.sub(r"<.*?>", "", value)
+    """Removes HTML tags with an uncompiled pattern."""
+
+    return re.sub(r"\s+", " ", value).strip()
+    """Collapses whitespace with an uncompiled pattern."""
+
+def make_corpus(alerts, seed=42):
+    """
+    Build a list of alert field values resembling weather.gov descriptions and headlines.
+    """
+
+    rng = random.Random(seed)
+    """Creates a seeded random generator so runs are comparable."""
+
+    words = "flood warning issued for river county until evening heavy rain expected minor flooding roads".split()
+    """Defines the vocabulary used for synthetic sentences."""
+
+    values = []
+    """Initializes the corpus."""
+
+    for i in range(alerts):
+        """Builds the fields for one alert."""
+
+        sentence = " ".join(rng.choice(words) for _ in range(60))
+        """Builds a long description sentence."""
+
+        values.append(f"* WHAT...{sentence}\n\n* WHERE...Abbeville County &amp; surrounding areas.\n\n<p>{sentence}</p>")
+        """Adds a description with newlines, an entity, and a tag."""
+
+        values.append(f"Flood Warning issued April {i % 30 + 1} by NWS Greenville-Spartanburg SC")
+        """Adds an already-clean headline."""
+
+        values.append(rng.choice(["Severe", "Moderate", "Minor", "Extreme"]))
+        """Adds an already-clean short field."""
+
+    return values
+    """Returns the corpus."""
+
+def timed(func, polls, values):
+    """
+    Run a cleaning function over the corpus once per poll and return the seconds taken.
+    Each poll gets fresh string objects, like a newly decoded feed would.
+    """
+
+    batches = [[(value + " ")[:-1] for value in values] for _ in range(polls)]
+    """Copies the corpus once per poll so cached string hashes don't flatter the memo cache."""
+
+    start = time.perf_counter()
+    """Records the start time."""
+
+    for batch in batches:
+        """Simulates repeated polls of the same feed."""
+
+        func(batch)
+        """Cleans the whole corpus."""
+
+    return time.perf_counter() - start
+    """Returns the elapsed time."""
+
+def main():
+    """Runs each cleaning approach over the corpus and prints a comparison table."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    """Creates the command-line parser."""
+
+    parser.add_argument("--alerts", type=int, default=5000, help="alerts per poll")
+    """Adds the option for the number of alerts per poll."""
+
+    parser.add_argument("--polls", type=int, default=5, help="number of polls of the same feed")
+    """Adds the option for the number of polls."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    values = make_corpus(args.alerts)
+    """Builds the corpus."""
+
+    variants = [
+        ("legacy re.sub per call", lambda column: [legacy_clean(v) for v in column]),
+        ("clean_text per call", lambda column: [text.clean_text(v) for v in column]),
+        ("clean_column batch", text.clean_column),
+    ]
+    """Defines the approaches to compare."""
+
+    print(f"{'variant':<24} {'seconds':>9} {'values/s':>12}")
+    """Prints the table header."""
+
+    for name, func in variants:
+        """Iterates through each approach."""
+
+        text._clean.cache_clear()
+        """Starts each approach with a cold memo cache."""
+
+        elapsed = timed(func, args.polls, values)
+        """Runs and times the approach."""
+
+        print(f"{name:<24} {elapsed:>9.3f} {len(values) * args.polls / elapsed:>12.0f}")
+        """Prints the approach's results."""
+
+    print(f"memo cache: {text.cache_info()}")
+    """Prints the memo cache statistics from the last run."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the benchmark when executed directly."""
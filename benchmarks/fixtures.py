@@ -0,0 +1,245 @@
+"""
+Local fixture servers that stand in for weather.gov and the Erskine events page, so load
+tests and ingest benchmarks never touch the real sites.
+
+The events page is a synthetic Tribe Events list and the alerts feed a GeoJSON
+FeatureCollection. Both send an ETag and answer a matching If-None-Match with 304, like
+the real servers. Run standalone (to point a development server at them) with:
+
+    python -m benchmarks.fixtures --events 200 --alerts 100
+"""
+
+import argparse
+"""Imports argparse to read fixture sizes from the command line."""
+
+import datetime
+"""Imports datetime to give fixture alerts current effective and expiry times."""
+
+import hashlib
+"""Imports hashlib to derive the ETags of the fixture bodies."""
+
+import json
+"""Imports the json module to build the alerts feed."""
+
+import threading
+"""Imports threading to serve the fixtures in the background."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+"""Imports the standard library HTTP server the fixtures run on."""
+
+from benchmarks.bench_parse import make_page
+"""Imports the synthetic Tribe Events page builder shared with the parser benchmark."""
+
+def alerts_feed(count, now=None):
+    """
+    Build a weather.gov-style GeoJSON FeatureCollection with `count` active alerts.
+    """
+
+    now = now or datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    """Anchors the alert times at the current time so the alerts are active."""
+
+    polygon = {"type": "Polygon", "coordinates": [[[-82.75, 34.0], [-82.2, 34.0], [-82.2, 34.5], [-82.75, 34.5], [-82.75, 34.0]]]}
+    """Defines a box around Abbeville County, sent with half the alerts (the rest are issued by zone only)."""
+
+    features = [
+        {
+            "id": f"https://api.weather.gov/alerts/urn:oid:2.49.0.1.840.0.fixture.{i}",
+            "type": "Feature",
+            "geometry": None if i % 2 else polygon,
+            "properties": {
+                "id": f"urn:oid:2.49.0.1.840.0.fixture.{i}",
+                "areaDesc": "Abbeville, SC",
+                "geocode": {"SAME": ["045001"], "UGC": ["SCC001"]},
+                "event": "Flood Watch" if i % 2 else "Heat Advisory",
+                "headline": f"Fixture alert {i} issued for Abbeville County",
+                "description": "A synthetic alert served by the benchmark fixture server.",
+                "severity": "Moderate",
+                "urgency": "Expected",
+                "certainty": "Likely",
+                "effective": (now - datetime.timedelta(minutes=i)).isoformat(),
+                "expires": (now + datetime.timedelta(hours=6)).isoformat(),
+                "senderName": "NWS Greenville-Spartanburg SC",
+            },
+        }
+        for i in range(count)
+    ]
+    """Builds the alert features."""
+
+    return json.dumps({"type": "FeatureCollection", "features": features, "title": "Fixture alerts"}).encode("utf-8")
+    """Returns the feed as JSON bytes."""
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves the fixture bodies and counts the requests made for them."""
+
+    def do_GET(self):
+        """Returns the events page or the alerts feed, or a 304 if the client's ETag matches."""
+
+        body, content_type = self.server.bodies.get(self.path.split("?")[0], (None, None))
+        """Looks up the body for the path (query parameters such as alert filters are ignored)."""
+
+        with self.server.lock:
+            """Guards the request counters."""
+
+            self.server.hits[self.path.split("?")[0]] = self.server.hits.get(self.path.split("?")[0], 0) + 1
+            """Counts the request."""
+
+        if body is None:
+            """Checks whether the path is unknown."""
+
+            self.send_error(404)
+            """Returns a 404."""
+
+            return
+            """Exits because there is nothing to send."""
+
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        """Derives the ETag from the body."""
+
+        if self.headers.get("If-None-Match") == etag:
+            """Checks whether the client already has this version."""
+
+            self.send_response(304)
+            """Answers with Not Modified, as the real servers do."""
+
+            self.end_headers()
+            """Ends the headers."""
+
+            return
+            """Exits without a body."""
+
+        self.send_response(200)
+        """Starts a successful response."""
+
+        self.send_header("Content-Type", content_type)
+        """Sends the content type."""
+
+        self.send_header("Content-Length", str(len(body)))
+        """Sends the body length."""
+
+        self.send_header("ETag", etag)
+        """Sends the ETag so the next fetch can be conditional."""
+
+        self.end_headers()
+        """Ends the headers."""
+
+        self.wfile.write(body)
+        """Sends the body."""
+
+    def log_message(self, format, *args):
+        """Silences the per-request access log."""
+
+class FixtureServers:
+    """Runs the fixture endpoints on a local port in a background thread."""
+
+    def __init__(self, events=200, alerts=100, host="127.0.0.1", port=0):
+        """
+        Initialize with the number of events on the page, the number of alerts in the feed,
+        and the address to listen on (port 0 picks a free port).
+        """
+
+        self.server = ThreadingHTTPServer((host, port), FixtureHandler)
+        """Creates the HTTP server."""
+
+        self.server.daemon_threads = True
+        """Keeps request threads from blocking shutdown."""
+
+        self.server.bodies = {
+            "/events/": (make_page(events).encode("utf-8"), "text/html; charset=utf-8"),
+            "/alerts/active": (alerts_feed(alerts), "application/geo+json"),
+        }
+        """Builds the bodies once so serving them costs the fixture almost nothing."""
+
+        self.server.hits = {}
+        """Counts the requests made for each path."""
+
+        self.server.lock = threading.Lock()
+        """Creates the lock that guards the counters."""
+
+        self._thread = None
+        """Holds the serving thread once started."""
+
+    @property
+    def url(self):
+        """Returns the base URL of the fixture server."""
+
+        host, port = self.server.server_address[:2]
+        """Reads the address the server is listening on."""
+
+        return f"http://{host}:{port}"
+        """Returns the base URL."""
+
+    @property
+    def events_url(self):
+        """Returns the URL of the fixture events page."""
+
+        return self.url + "/events/"
+        """Returns the URL."""
+
+    @property
+    def alerts_url(self):
+        """Returns the URL of the fixture alerts feed."""
+
+        return self.url + "/alerts/active"
+        """Returns the URL."""
+
+    def start(self):
+        """Starts serving in a background thread and returns self."""
+
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fixture-server", daemon=True)
+        """Creates the serving thread."""
+
+        self._thread.start()
+        """Starts serving."""
+
+        return self
+        """Returns the running servers."""
+
+    def stop(self):
+        """Stops serving and closes the socket."""
+
+        self.server.shutdown()
+        """Stops the serving loop."""
+
+        self.server.server_close()
+        """Closes the listening socket."""
+
+def main():
+    """Runs the fixture servers in the foreground and prints the environment to point the app at them."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    """Creates the command-line parser."""
+
+    parser.add_argument("--events", type=int, default=200, help="events on the fixture page")
+    """Adds the option for the number of events."""
+
+    parser.add_argument("--alerts", type=int, default=100, help="alerts in the fixture feed")
+    """Adds the option for the number of alerts."""
+
+    parser.add_argument("--port", type=int, default=8001, help="port to listen on")
+    """Adds the option for the port."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    servers = FixtureServers(args.events, args.alerts, port=args.port).start()
+    """Starts the fixture servers."""
+
+    print(f"CAMPUSCONNECT_ALERTS_URL={servers.alerts_url}")
+    """Prints the setting that points the alert client at the fixture."""
+
+    print(f"events page: {servers.events_url} (list it in a CAMPUSCONNECT_SOURCES file)")
+    """Prints the URL to configure as a scrape source."""
+
+    try:
+        servers._thread.join()
+        """Serves until interrupted."""
+
+    except KeyboardInterrupt:
+        """Handles Ctrl+C."""
+
+        servers.stop()
+        """Stops the servers."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the fixture servers when executed directly."""
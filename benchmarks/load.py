@@ -0,0 +1,529 @@
+"""
+Reproducible end-to-end load test of the Flask app.
+
+Seeds a throwaway database at a named scale (db/seed_data.py) and starts local fixture
+servers for weather.gov and the Erskine events page (benchmarks.fixtures). It then serves
+the app in a child process (benchmarks.server) pointed at both, so the background
+refreshes ingest from the fixtures, and drives /, /events, and /api with concurrent
+clients. It reports throughput, p50/p95/p99 latency, and the server's RSS, and compares
+them with the stored baseline, exiting with status 1 on a regression. Run from the
+project root:
+
+    python -m benchmarks.load --scale small --duration 15 --concurrency 8
+    python -m benchmarks.load --scale small --save-baseline   # after an intended change
+
+Paths may contain {n}, replaced by a request counter, to get past the page cache
+(e.g. "/events?v={n}" renders the page on every request).
+"""
+
+import argparse
+"""Imports argparse to read load test options from the command line."""
+
+import http.client
+"""Imports http.client for low-overhead HTTP requests from the load generator."""
+
+import json
+"""Imports the json module to store and read the baseline."""
+
+import os
+"""Imports the os module to build paths and the server's environment."""
+
+import platform
+"""Imports platform to record the machine a baseline was measured on."""
+
+import socket
+"""Imports socket to find a free port for the app server."""
+
+import statistics
+"""Imports statistics to compute latency percentiles."""
+
+import subprocess
+"""Imports subprocess to run the app server in its own process."""
+
+import sys
+"""Imports sys to start the server with the same interpreter and set the exit status."""
+
+import tempfile
+"""Imports tempfile to keep the database, logs, and caches out of the project."""
+
+import threading
+"""Imports threading to run the concurrent clients."""
+
+import time
+"""Imports the time module to measure latency and the test duration."""
+
+from benchmarks.fixtures import FixtureServers
+"""Imports the local stand-ins for weather.gov and the Erskine events page."""
+
+from db.seed_data import SCALES, seed_database
+"""Imports the seeder that fills the database at a named scale."""
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+"""Defines the project root the server is started from."""
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+"""Defines the stored baseline results, keyed by scale."""
+
+DEFAULT_PATHS = ["/", "/events", "/api"]
+"""Defines the pages driven by default."""
+
+def free_port():
+    """
+    Return a TCP port that is free on localhost.
+    """
+
+    with socket.socket() as probe:
+        """Opens a throwaway socket."""
+
+        probe.bind(("127.0.0.1", 0))
+        """Lets the OS pick a free port."""
+
+        return probe.getsockname()[1]
+        """Returns the port."""
+
+def memory(pid):
+    """
+    Return the current and peak resident set size of a process in MB (None where /proc isn't available).
+    """
+
+    sizes = {"VmRSS": None, "VmHWM": None}
+    """Initializes the current (VmRSS) and peak (VmHWM) sizes."""
+
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            """Opens the process status file (Linux)."""
+
+            for line in status:
+                """Iterates through each status line."""
+
+                name, _, value = line.partition(":")
+                """Splits the field name from its value."""
+
+                if name in sizes:
+                    """Checks whether this is one of the memory fields."""
+
+                    sizes[name] = round(int(value.split()[0]) / 1024, 1)
+                    """Converts the size from kB to MB."""
+
+    except OSError:
+        """Handles platforms without /proc."""
+
+        pass
+        """Leaves the sizes unknown."""
+
+    return sizes["VmRSS"], sizes["VmHWM"]
+    """Returns the current and peak RSS."""
+
+def request(port, path, timeout=30):
+    """
+    Send one GET request and return its status and latency in milliseconds (status 0 on a connection error).
+    """
+
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    """Opens a connection (the threaded WSGI server closes it after each response)."""
+
+    start = time.perf_counter()
+    """Records the start time."""
+
+    try:
+        connection.request("GET", path)
+        """Sends the request."""
+
+        response = connection.getresponse()
+        """Waits for the response headers."""
+
+        response.read()
+        """Reads the whole body, as a browser would."""
+
+        status = response.status
+        """Keeps the status code."""
+
+    except (OSError, http.client.HTTPException):
+        """Handles refused, reset, or timed-out connections."""
+
+        status = 0
+        """Marks the request as failed."""
+
+    finally:
+        connection.close()
+        """Closes the connection."""
+
+    return status, (time.perf_counter() - start) * 1000
+    """Returns the status and latency."""
+
+def start_server(env, port, log_path, timeout):
+    """
+    Start the app server in a child process and wait until it answers. Returns the process.
+    """
+
+    log_file = open(log_path, "w")
+    """Opens the file that collects the server's console output."""
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.server", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT
+    )
+    """Starts the server with the benchmark environment."""
+
+    deadline = time.monotonic() + timeout
+    """Defines how long startup (including building indexes at large scales) may take."""
+
+    while time.monotonic() < deadline:
+        """Polls until the server answers or the deadline passes."""
+
+        if process.poll() is not None:
+            """Checks whether the server exited during startup."""
+
+            raise RuntimeError(f"server exited with status {process.returncode}; see {log_path}")
+            """Reports the failed startup."""
+
+        if request(port, "/", timeout=2)[0] == 200:
+            """Checks whether the server is answering."""
+
+            return process
+            """Returns the running server."""
+
+        time.sleep(0.2)
+        """Waits before polling again."""
+
+    process.terminate()
+    """Stops the server that never became ready."""
+
+    raise RuntimeError(f"server did not answer within {timeout}s; see {log_path}")
+    """Reports the timeout."""
+
+def drive(port, paths, concurrency, duration):
+    """
+    Request the paths round-robin from `concurrency` threads for `duration` seconds.
+    Returns a dictionary of (status, latency) samples per path and the elapsed time.
+    """
+
+    samples = {path: [] for path in paths}
+    """Initializes the samples per path."""
+
+    counter = iter(range(sys.maxsize))
+    """Creates a shared request counter (next() on it is atomic under the GIL)."""
+
+    deadline = time.perf_counter() + duration
+    """Defines when the clients stop sending new requests."""
+
+    def client(offset):
+        """Sends requests until the deadline, starting at a different path than its neighbours."""
+
+        index = offset
+        """Starts at this client's offset into the paths."""
+
+        while time.perf_counter() < deadline:
+            """Keeps sending until time is up."""
+
+            path = paths[index % len(paths)]
+            """Picks the next path."""
+
+            samples[path].append(request(port, path.replace("{n}", str(next(counter)))))
+            """Sends the request and records the result (list.append is thread-safe)."""
+
+            index += 1
+            """Moves to the next path."""
+
+    start = time.perf_counter()
+    """Records the start time."""
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)]
+    """Creates the client threads."""
+
+    for thread in threads:
+        """Iterates through each client."""
+
+        thread.start()
+        """Starts the client."""
+
+    for thread in threads:
+        """Iterates through each client."""
+
+        thread.join()
+        """Waits for the client to finish its last request."""
+
+    return samples, time.perf_counter() - start
+    """Returns the samples and the elapsed time."""
+
+def summarize(samples, elapsed):
+    """
+    Turn (status, latency) samples into requests, errors, throughput, and p50/p95/p99 latency.
+    """
+
+    latencies = sorted(latency for status, latency in samples if status == 200)
+    """Keeps the latencies of successful requests."""
+
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    """Computes the percentile cut points."""
+
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for status, _ in samples if status != 200),
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(cuts[49], 2) if cuts else None,
+        "p95_ms": round(cuts[94], 2) if cuts else None,
+        "p99_ms": round(cuts[98], 2) if cuts else None,
+    }
+    """Returns the summary."""
+
+def compare(results, baseline, tolerance):
+    """
+    Return a list of regressions: paths whose throughput fell, or whose p95 latency or peak
+    RSS grew, by more than `tolerance` (a fraction) compared with the baseline.
+    """
+
+    regressions = []
+    """Initializes the list of regressions."""
+
+    for path, current in results["paths"].items():
+        """Iterates through each measured path."""
+
+        before = baseline["paths"].get(path)
+        """Looks up the path's baseline."""
+
+        if not before:
+            """Checks whether the path was measured in the baseline."""
+
+            continue
+            """Skips new paths."""
+
+        if current["rps"] < before["rps"] * (1 - tolerance):
+            """Checks whether throughput fell too far."""
+
+            regressions.append(f"{path}: throughput {before['rps']} -> {current['rps']} req/s")
+            """Records the regression."""
+
+        if before["p95_ms"] and current["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            """Checks whether tail latency grew too far."""
+
+            regressions.append(f"{path}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+            """Records the regression."""
+
+        if current["errors"] > before["errors"]:
+            """Checks whether the path started failing."""
+
+            regressions.append(f"{path}: errors {before['errors']} -> {current['errors']}")
+            """Records the regression."""
+
+    if baseline.get("rss_peak_mb") and results.get("rss_peak_mb") and results["rss_peak_mb"] > baseline["rss_peak_mb"] * (1 + tolerance):
+        """Checks whether the server's peak memory grew too far."""
+
+        regressions.append(f"peak RSS {baseline['rss_peak_mb']} -> {results['rss_peak_mb']} MB")
+        """Records the regression."""
+
+    return regressions
+    """Returns the regressions."""
+
+def main():
+    """Seeds, serves, drives, reports, and compares with the baseline."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    """Creates the command-line parser."""
+
+    parser.add_argument("--scale", choices=SCALES, default="small", help="seeded database size")
+    """Adds the option for the database scale."""
+
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    """Adds the option for the number of clients."""
+
+    parser.add_argument("--duration", type=float, default=15, help="seconds of measured load")
+    """Adds the option for the test duration."""
+
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unmeasured load first")
+    """Adds the option for the warm-up duration."""
+
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS, help="paths to request round-robin")
+    """Adds the option for the paths to drive."""
+
+    parser.add_argument("--fixture-events", type=int, default=200, help="events on the fixture calendar page")
+    """Adds the option for the size of the fixture events page."""
+
+    parser.add_argument("--fixture-alerts", type=int, default=100, help="alerts in the fixture weather.gov feed")
+    """Adds the option for the size of the fixture alerts feed."""
+
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file to compare with and save to")
+    """Adds the option for the baseline file."""
+
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    """Adds the option to save the results as the baseline."""
+
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed fractional slowdown before failing")
+    """Adds the option for the regression tolerance."""
+
+    parser.add_argument("--startup-timeout", type=float, default=300, help="seconds to wait for the server")
+    """Adds the option for the server startup timeout."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        """Creates a directory for the database, logs, and caches."""
+
+        db_path = os.path.join(directory, "campusconnect.db")
+        """Defines the benchmark database path."""
+
+        start = time.perf_counter()
+        """Records the start of seeding."""
+
+        seed_database(db_path, args.scale)
+        """Seeds the database at the requested scale."""
+
+        print(f"seeded {args.scale} database ({SCALES[args.scale]}) in {time.perf_counter() - start:.1f}s")
+        """Prints the seed time."""
+
+        fixtures = FixtureServers(args.fixture_events, args.fixture_alerts).start()
+        """Starts the fixture servers."""
+
+        sources = os.path.join(directory, "sources.json")
+        """Defines the scrape source config that points at the fixture calendar."""
+
+        with open(sources, "w") as config:
+            """Opens the source config for writing."""
+
+            json.dump([{"name": "fixture", "url": fixtures.events_url}], config)
+            """Writes the single fixture source."""
+
+        env = dict(
+            os.environ,
+            CAMPUSCONNECT_DB=db_path,
+            CAMPUSCONNECT_SOURCES=sources,
+            CAMPUSCONNECT_ALERTS_URL=fixtures.alerts_url,
+            CAMPUSCONNECT_LOG_FILE=os.path.join(directory, "logs", "system.log"),
+            CAMPUSCONNECT_RETENTION_INTERVAL="0",
+        )
+        """Builds the server environment: the seeded database, the fixtures, private caches and logs, and no
+        retention runs (which would delete the seeded rows from past dates mid-test)."""
+
+        env.pop("CAMPUSCONNECT_PAGE_CACHE", None)
+        """Keeps the page cache in memory only, as in a default deployment."""
+
+        port = free_port()
+        """Picks the server port."""
+
+        start = time.perf_counter()
+        """Records the start of server startup."""
+
+        server = start_server(env, port, os.path.join(directory, "server.log"), args.startup_timeout)
+        """Starts the app server."""
+
+        try:
+            print(f"server ready in {time.perf_counter() - start:.1f}s, RSS {memory(server.pid)[0]} MB")
+            """Prints the startup time and memory."""
+
+            drive(port, args.paths, args.concurrency, args.warmup)
+            """Warms up caches and lets the startup refreshes ingest from the fixtures."""
+
+            samples, elapsed = drive(port, args.paths, args.concurrency, args.duration)
+            """Runs the measured load."""
+
+            rss, peak = memory(server.pid)
+            """Reads the server's memory after the load."""
+
+            print(f"fixture requests: {fixtures.server.hits}")
+            """Prints how often the background refreshes fetched the fixtures."""
+
+        finally:
+            server.terminate()
+            """Stops the app server."""
+
+            server.wait()
+            """Waits for it to exit."""
+
+            fixtures.stop()
+            """Stops the fixture servers."""
+
+    everything = [sample for path_samples in samples.values() for sample in path_samples]
+    """Combines the samples of every path."""
+
+    results = {
+        "paths": {path: summarize(path_samples, elapsed) for path, path_samples in samples.items()},
+        "total": summarize(everything, elapsed),
+        "rss_mb": rss,
+        "rss_peak_mb": peak,
+        "config": {"concurrency": args.concurrency, "duration": args.duration, "paths": args.paths},
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+    }
+    """Builds the results."""
+
+    print(f"\n{'path':<32} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    """Prints the table header."""
+
+    for path, row in [*results["paths"].items(), ("total", results["total"])]:
+        """Iterates through each path and the total."""
+
+        print(f"{path:<32} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9} {row['p50_ms']!s:>9} {row['p95_ms']!s:>9} {row['p99_ms']!s:>9}")
+        """Prints the path's results."""
+
+    print(f"\nserver RSS {rss} MB (peak {peak} MB)")
+    """Prints the server's memory use."""
+
+    baselines = {}
+    """Initializes the stored baselines."""
+
+    if os.path.exists(args.baseline):
+        """Checks whether a baseline file exists."""
+
+        with open(args.baseline) as baseline_file:
+            """Opens the baseline file."""
+
+            baselines = json.load(baseline_file)
+            """Reads the baselines of every scale."""
+
+    if args.save_baseline:
+        """Checks whether these results should become the baseline."""
+
+        baselines[args.scale] = results
+        """Replaces this scale's baseline."""
+
+        with open(args.baseline, "w") as baseline_file:
+            """Opens the baseline file for writing."""
+
+            json.dump(baselines, baseline_file, indent=2)
+            """Writes the baselines."""
+
+        print(f"saved {args.scale} baseline to {args.baseline}")
+        """Prints where the baseline was saved."""
+
+        return
+        """Exits without comparing the results with themselves."""
+
+    baseline = baselines.get(args.scale)
+    """Looks up the baseline for this scale."""
+
+    if baseline is None:
+        """Checks whether there is anything to compare with."""
+
+        print(f"no {args.scale} baseline in {args.baseline}; run with --save-baseline to store one")
+        """Explains how to create a baseline."""
+
+        return
+        """Exits without comparing."""
+
+    if baseline["config"] != results["config"] or baseline["machine"] != results["machine"]:
+        """Checks whether the baseline was measured under different conditions."""
+
+        print(f"note: baseline was measured with {baseline['config']} on {baseline['machine']}")
+        """Warns that the comparison may not be like for like."""
+
+    regressions = compare(results, baseline, args.tolerance)
+    """Compares the results with the baseline."""
+
+    for regression in regressions:
+        """Iterates through each regression."""
+
+        print(f"REGRESSION {regression}")
+        """Prints the regression."""
+
+    if regressions:
+        """Checks whether anything regressed."""
+
+        sys.exit(1)
+        """Fails so CI or a pre-merge check notices."""
+
+    print(f"no regressions beyond {args.tolerance:.0%} of the {args.scale} baseline")
+    """Reports that the results are within tolerance."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the load test when executed directly."""
@@ -0,0 +1,44 @@
+"""
+Serve the app with a threaded WSGI server for load tests. benchmarks.load starts this in a
+child process (so its RSS can be measured on its own) with the database, fixture URLs,
+and log paths set in the environment:
+
+    python -m benchmarks.server --port 5001
+"""
+
+import argparse
+"""Imports argparse to read the listening port from the command line."""
+
+import logging
+"""Imports logging to silence the per-request access log."""
+
+from werkzeug.serving import make_server
+"""Imports Werkzeug's WSGI server, which can serve each request on its own thread."""
+
+def main():
+    """Imports the app and serves it until the process is terminated."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    """Creates the command-line parser."""
+
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    """Adds the option for the address."""
+
+    parser.add_argument("--port", type=int, default=5001, help="port to listen on")
+    """Adds the option for the port."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    """Turns off the access log, which would otherwise cost every request a console write."""
+
+    from app import create_app
+    """Imports the app factory only after the environment is set, since settings are read at import time."""
+
+    make_server(args.host, args.port, create_app(), threaded=True).serve_forever()
+    """Serves the app with one thread per request, without the reloader or debugger."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the server when executed directly."""
@@ -1,81 +1,271 @@
-import sqlite3
-"""Imports SQLite3 to enable database connections and queries."""
-
 import os
 """Imports the os module to handle file operations like checking and removing files."""
 
-DB_PATH = "db/campusconnect.db"
-"""Defines the path to the SQLite database file campusconnect.db."""
-
-# Remove existing DB for a clean seed (optional in dev environment)
-if os.path.exists(DB_PATH):
-    """Checks if the database file already exists."""
-
-    os.remove(DB_PATH)
-    """Removes the existing database file to start fresh (useful in development)."""
-
-conn = sqlite3.connect(DB_PATH)
-"""Opens a connection to the SQLite database at the specified path."""
-
-c = conn.cursor()
-"""Creates a cursor object to execute SQL commands."""
-
-# Create tables manually or run schema.sql separately if preferred
-c.execute('''CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY,
-    name TEXT NOT NULL,
-    preferences TEXT
-)''')
-"""Creates the users table with id, name, and preferences fields if it does not exist."""
-
-c.execute('''CREATE TABLE IF NOT EXISTS events (
-    id INTEGER PRIMARY KEY,
-    title TEXT NOT NULL,
-    location TEXT,
-    date TEXT
-)''')
-"""Creates the events table with id, title, location, and date fields if it does not exist."""
-
-c.execute('''CREATE TABLE IF NOT EXISTS external_events (
-    id INTEGER PRIMARY KEY,
-    title TEXT NOT NULL,
-    date TEXT,
-    location TEXT,
-    description TEXT
-)''')
-"""Creates the external_events table with id, title, date, location, and description fields."""
-
-# Create Users Seed Data
-c.execute("INSERT INTO users (name, preferences) VALUES (?, ?)", ("Alice", "Aly"))
-"""Inserts a seed user Alice with preferences 'Aly' into the users table."""
-
-c.execute("INSERT INTO users (name, preferences) VALUES (?, ?)", ("Bob", "art, Bobby"))
-"""Inserts a seed user Bob with preferences 'art, Bobby' into the users table."""
-
-c.execute("INSERT INTO users (name, preferences) VALUES (?, ?)", ("Charlie", "Chaz"))
-"""Inserts a seed user Charlie with preferences 'Chaz' into the users table."""
-
-# Internal Events Seed Data
-c.execute("INSERT INTO events (title, location, date) VALUES (?, ?, ?)", ("Music Night", "Student Center", "2025-04-05"))
-"""Inserts a seed internal event 'Music Night' into the events table."""
-
-c.execute("INSERT INTO events (title, location, date) VALUES (?, ?, ?)", ("Hackathon", "Library", "2025-04-01"))
-"""Inserts a seed internal event 'Hackathon' into the events table."""
-
-c.execute("INSERT INTO events (title, location, date) VALUES (?, ?, ?)", ("Art Exhibition", "Gallery", "2025-04-10"))
-"""Inserts a seed internal event 'Art Exhibition' into the events table."""
-
-# External Events Seed Data (sample scraped-like data)
-c.execute("INSERT INTO external_events (title, date, location, description) VALUES (?, ?, ?, ?)",
-          ("Guest Lecture: AI in Education", "2025-04-15", "Main Auditorium", "A talk on the role of AI in modern education."))
-"""Inserts a sample external event 'Guest Lecture: AI in Education' into the external_events table."""
-
-c.execute("INSERT INTO external_events (title, date, location, description) VALUES (?, ?, ?, ?)",
-          ("Spring Festival", "2025-04-20", "Campus Lawn", "Annual spring celebration with food, music, and games."))
-"""Inserts a sample external event 'Spring Festival' into the external_events table."""
-
-conn.commit()
-"""Commits all changes to the database to ensure data is saved."""
-
-conn.close()
-"""Closes the database connection to free resources."""
\ No newline at end of file
+import argparse
+"""Imports argparse to read the seed scale from the command line."""
+
+import datetime
+"""Imports datetime to spread synthetic event dates and alert times over the year."""
+
+import random
+"""Imports random to generate reproducible synthetic rows."""
+
+from utils import db, geo, ics, recommendations, search, timestamps
+"""Imports the connection settings and the modules whose derived tables are built after seeding."""
+
+from utils.bulk_load import LOAD_PRAGMAS, load
+"""Imports the bulk loader the synthetic rows are inserted with."""
+
+from utils.migrations import migrate
+"""Imports the migration runner that creates the schema."""
+
+SCALES = {
+    "demo": {"users": 0, "events": 0, "external_events": 0, "alerts": 0},
+    "small": {"users": 1000, "events": 1000, "external_events": 5000, "alerts": 500},
+    "medium": {"users": 10000, "events": 10000, "external_events": 50000, "alerts": 5000},
+    "large": {"users": 100000, "events": 100000, "external_events": 500000, "alerts": 50000},
+}
+"""Defines how many synthetic rows each named scale adds on top of the demo rows."""
+
+INTERESTS = (
+    "art music jazz choir theatre film poetry football soccer basketball tennis running yoga chemistry "
+    "biology physics history philosophy economics coding robotics career volunteering chapel worship "
+    "debate chess gaming photography dance cooking hiking climbing"
+).split()
+"""Defines the interests synthetic users list and synthetic events are about."""
+
+EVENT_KINDS = ["Night", "Workshop", "Lecture", "Meetup", "Showcase", "Tournament", "Club Meeting", "Festival"]
+"""Defines the kinds of synthetic events."""
+
+LOCATIONS = ["Student Center", "Library", "Gallery", "Main Auditorium", "Campus Lawn", "Gym", "Chapel", "Science Hall"]
+"""Defines the locations of synthetic events."""
+
+ALERT_EVENTS = [
+    ("Flood Watch", "Moderate"), ("Flood Warning", "Severe"), ("Severe Thunderstorm Warning", "Severe"),
+    ("Tornado Watch", "Severe"), ("Tornado Warning", "Extreme"), ("Heat Advisory", "Moderate"),
+    ("Winter Storm Warning", "Severe"), ("Wind Advisory", "Minor"), ("Dense Fog Advisory", "Minor"),
+]
+"""Defines the weather.gov alert types (and their severities) used for synthetic alerts."""
+
+COUNTIES = {
+    "Abbeville": "SCC001", "Anderson": "SCC007", "Greenwood": "SCC047", "Laurens": "SCC059",
+    "McCormick": "SCC065", "Newberry": "SCC071", "Oconee": "SCC073", "Pickens": "SCC077",
+}
+"""Defines the South Carolina counties synthetic alerts cover, with their NWS county codes (UGC)."""
+
+CAMPUSES = [("Erskine College", 34.3318, -82.3868, ["SCC001"])]
+"""Defines the demo campus locations (name, latitude, longitude, and county codes) alerts are matched to."""
+
+def seed_demo(c):
+    """
+    Insert the small hand-written demo data set.
+    """
+
+    # Create Users Seed Data
+    c.execute("INSERT INTO users (name, preferences) VALUES (?, ?)", ("Alice", "Aly"))
+    """Inserts a seed user Alice with preferences 'Aly' into the users table."""
+
+    c.execute("INSERT INTO users (name, preferences) VALUES (?, ?)", ("Bob", "art, Bobby"))
+    """Inserts a seed user Bob with preferences 'art, Bobby' into the users table."""
+
+    c.execute("INSERT INTO users (name, preferences) VALUES (?, ?)", ("Charlie", "Chaz"))
+    """Inserts a seed user Charlie with preferences 'Chaz' into the users table."""
+
+    # Internal Events Seed Data
+    c.execute("INSERT INTO events (title, location, date) VALUES (?, ?, ?)", ("Music Night", "Student Center", "2025-04-05"))
+    """Inserts a seed internal event 'Music Night' into the events table."""
+
+    c.execute("INSERT INTO events (title, location, date) VALUES (?, ?, ?)", ("Hackathon", "Library", "2025-04-01"))
+    """Inserts a seed internal event 'Hackathon' into the events table."""
+
+    c.execute("INSERT INTO events (title, location, date) VALUES (?, ?, ?)", ("Art Exhibition", "Gallery", "2025-04-10"))
+    """Inserts a seed internal event 'Art Exhibition' into the events table."""
+
+    # External Events Seed Data (sample scraped-like data)
+    c.execute("INSERT INTO external_events (title, date, location, description) VALUES (?, ?, ?, ?)",
+              ("Guest Lecture: AI in Education", "2025-04-15", "Main Auditorium", "A talk on the role of AI in modern education."))
+    """Inserts a sample external event 'Guest Lecture: AI in Education' into the external_events table."""
+
+    c.execute("INSERT INTO external_events (title, date, location, description) VALUES (?, ?, ?, ?)",
+              ("Spring Festival", "2025-04-20", "Campus Lawn", "Annual spring celebration with food, music, and games."))
+    """Inserts a sample external event 'Spring Festival' into the external_events table."""
+
+    for table in ("events", "external_events"):
+        """Iterates through each table the demo events were inserted into."""
+
+        timestamps.normalize_rows(c, table)
+        """Stores the demo dates as epoch seconds."""
+
+def seed_bulk(conn, users=0, events=0, external_events=0, alerts=0, seed=42, year=2025):
+    """
+    Insert synthetic users, events, scraped events, and alerts with the bulk loader,
+    leaving the search index and recommendations to be rebuilt afterwards. Rows are
+    drawn from a seeded generator, so the same arguments always produce the same database.
+    """
+
+    rng = random.Random(seed)
+    """Creates a seeded random generator so seeded databases are comparable between runs."""
+
+    start = datetime.datetime(year, 1, 1, tzinfo=datetime.timezone.utc)
+    """Defines the start of the year the events and alerts are spread over."""
+
+    def day():
+        """Returns a random date in the year as YYYY-MM-DD."""
+
+        return (start + datetime.timedelta(days=rng.randrange(365))).strftime("%Y-%m-%d")
+        """Returns the date."""
+
+    def title():
+        """Returns a random event title such as 'Jazz Night'."""
+
+        return f"{rng.choice(INTERESTS).title()} {rng.choice(EVENT_KINDS)}"
+        """Returns the title."""
+
+    load(conn, "users", ["name", "preferences"],
+         ((f"Student {i}", ", ".join(rng.sample(INTERESTS, rng.randint(1, 4)))) for i in range(users)), index=False, match=False)
+    """Inserts the users with one to four interests each."""
+
+    load(conn, "events", ["title", "location", "date"],
+         ((title(), rng.choice(LOCATIONS), day()) for _ in range(events)), index=False, match=False)
+    """Inserts the internal events."""
+
+    load(
+        conn, "external_events", ["title", "date", "location", "description", "event_key", "source"],
+        (
+            (title(), day(), rng.choice(LOCATIONS),
+             f"Join us for {' and '.join(rng.sample(INTERESTS, 2))}. Everyone is welcome.", f"seed-{i}", "seed")
+            for i in range(external_events)
+        ),
+        index=False, match=False
+    )
+    """Inserts the scraped events with unique keys so later scrapes upsert rather than collide."""
+
+    def alert(i):
+        """Returns one synthetic weather.gov alert row."""
+
+        event, severity = rng.choice(ALERT_EVENTS)
+        """Picks the alert type."""
+
+        county = rng.choice(list(COUNTIES))
+        """Picks the county."""
+
+        effective = start + datetime.timedelta(minutes=rng.randrange(365 * 24 * 60))
+        """Picks when the alert took effect."""
+
+        return (
+            f"urn:oid:2.49.0.1.840.0.seed.{i}", event,
+            f"{event} issued for {county} County", f"The National Weather Service has issued a {event} for {county} County, SC.",
+            severity, "Expected", "Likely", effective.isoformat(), (effective + datetime.timedelta(hours=rng.choice((3, 6, 12, 24)))).isoformat(),
+            f"{county}, SC", "seed", COUNTIES[county],
+        )
+        """Returns the row values."""
+
+    load(
+        conn, "api_data",
+        ["id", "event", "headline", "description", "severity", "urgency", "certainty", "effective", "expires", "area", "source", "zones"],
+        (alert(i) for i in range(alerts)), index=False, match=False
+    )
+    """Inserts the alerts."""
+
+def seed_database(path=db.DB_PATH, scale="demo", seed=42, recommend=False, **counts):
+    """
+    Recreate the database at path with the demo rows plus the named scale's synthetic rows
+    (individual counts override the scale's), then build the search index and the
+    calendar feeds, add the demo campuses, and, if
+    recommend is True, every user's recommendations (minutes from the medium scale up).
+    """
+
+    # Remove existing DB for a clean seed (optional in dev environment)
+    for name in (path, path + "-wal", path + "-shm"):
+        """Iterates through the database file and its WAL files."""
+
+        if os.path.exists(name):
+            """Checks if the file already exists."""
+
+            os.remove(name)
+            """Removes it to start fresh (a leftover WAL would otherwise be replayed into the new file)."""
+
+    conn = db.connect(path)
+    """Opens a connection to the SQLite database at the specified path."""
+
+    migrate(conn)
+    """Creates the tables, indexes, and triggers."""
+
+    conn.execute("PRAGMA journal_mode=OFF")
+    """Turns off the rollback journal for the load (a crash mid-seed just means seeding again)."""
+
+    for pragma in LOAD_PRAGMAS:
+        """Iterates through each bulk load setting."""
+
+        conn.execute(pragma)
+        """Applies the setting."""
+
+    with conn:
+        """Inserts every row in one transaction."""
+
+        seed_demo(conn)
+        """Inserts the demo rows."""
+
+        seed_bulk(conn, seed=seed, **{**SCALES[scale], **{name: value for name, value in counts.items() if value is not None}})
+        """Inserts the synthetic rows for the scale."""
+
+    search.reindex(conn)
+    """Indexes every row for search in one pass."""
+
+    with conn:
+        ics.render_all(conn)
+        """Serializes every event for the calendar feeds in one pass."""
+
+    for campus in CAMPUSES:
+        """Iterates through each demo campus."""
+
+        geo.set_campus(conn, *campus)
+        """Adds the campus and matches it to the alerts issued for its county."""
+
+    if recommend:
+        """Checks whether recommendations should be computed now."""
+
+        recommendations.rebuild(conn)
+        """Matches every user against every event."""
+
+    conn.execute("PRAGMA journal_mode=WAL")
+    """Uses the same journal mode as the app so the seeded file can be served as is."""
+
+    conn.close()
+    """Closes the database connection to free resources."""
+
+def main():
+    """Seeds the database at the scale given on the command line."""
+
+    parser = argparse.ArgumentParser(description="Seed the CampusConnect database with demo and synthetic data.")
+    """Creates the command-line parser."""
+
+    parser.add_argument("--db", default=db.DB_PATH, help="database file to (re)create")
+    """Adds the option for the database path."""
+
+    parser.add_argument("--scale", choices=SCALES, default="demo", help="how much synthetic data to add")
+    """Adds the option for the named scale."""
+
+    parser.add_argument("--seed", type=int, default=42, help="random seed for the synthetic rows")
+    """Adds the option for the random seed."""
+
+    for name in ("users", "events", "external_events", "alerts"):
+        """Iterates through each table's row count."""
+
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help=f"synthetic {name.replace('_', ' ')} (overrides the scale)")
+        """Adds the option that overrides the scale for that table."""
+
+    parser.add_argument("--recommendations", action="store_true",
+                        help="also compute recommendations for synthetic users (always done for the demo scale)")
+    """Adds the option that computes recommendations at larger scales."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    seed_database(args.db, args.scale, args.seed, args.recommendations or args.scale == "demo", users=args.users, events=args.events,
+                  external_events=args.external_events, alerts=args.alerts)
+    """Seeds the database."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the seeder when executed directly."""
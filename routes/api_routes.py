@@ -1,52 +1,105 @@
-from flask import Blueprint, render_template
-"""Imports Flask components for routing and rendering HTML templates."""
+from flask import Blueprint, Response, abort, render_template, request
+"""Imports Flask components for routing, rendering HTML templates, streaming responses, and reading query parameters."""
 
-import sqlite3
-"""Imports SQLite3 to enable database connections and queries."""
+from utils.db import get_db, get_generation
+"""Imports the helper that returns this request's pooled database connection, and the data generation lookup."""
 
-from utils.api_client import APIClient
-"""Imports a custom APIClient class used to fetch weather alerts."""
+from utils.refresher import refresher
+"""Imports the shared background refresher that keeps weather alerts up to date."""
+
+from utils.page_cache import cached_page
+"""Imports the page cache decorator that skips re-rendering until new alerts are ingested."""
+
+from utils import geo, queries
+"""Imports the campus list and the paginated alert query."""
+
+from utils.alert_stream import broadcaster
+"""Imports the shared broadcaster that pushes newly ingested alerts to connected streams."""
 
 api_bp = Blueprint('api', __name__)
 """Creates a Flask Blueprint named 'api' to modularize routes."""
 
+@api_bp.before_request
+
+def refresh_alerts_if_stale():
+    """Refreshes alerts in the background if they are stale (never blocks the request, even on cache hits)."""
+
+    refresher.trigger("alerts")
+    """Starts a background weather.gov refresh if the stored alerts are older than their interval."""
+
+def next_expiry():
+    """Returns when the next alert expires, so a cached page is rebuilt once an alert it lists has expired."""
+
+    return queries.next_expiry(get_db())
+    """Reads the next expiry with the request's connection."""
+
 @api_bp.route("/api")
+@cached_page("alerts", vary=next_expiry)
 
 def api():
     """Main function handling API data retrieval and rendering."""
 
-    # Step 1: Create an instance of APIClient and fetch alerts
-    client = APIClient()
-    """Initializes the APIClient to interact with weather.gov."""
+    # Step 1: Query the api_data table
+    conn = get_db()
+    """Borrows the request's pooled connection (rows allow dict-like access)."""
+
+    generation = get_generation(conn, "alerts")
+    """Reads the alerts generation before the page (the live stream resends anything ingested after it)."""
+
+    include_expired = request.args.get("expired") == "1"
+    """Reads whether expired alerts should be shown too (hidden by default)."""
+
+    campus = request.args.get("campus", type=int)
+    """Reads the campus whose alerts should be shown (every alert when missing or not a number)."""
+
+    if not queries.cursor_value(campus, (int, type(None))):
+        """Checks whether the campus id is too large to be stored in SQLite."""
+
+        campus = None
+        """Shows every alert, as for a campus that isn't a number."""
+
+    api_data, next_after = queries.alerts(
+        conn, include_expired, request.args.get("after"), queries.page_size(request.args.get("limit")), campus
+    )
+    """Fetches one page of alerts, newest first, and the cursor for the next page."""
+
+    # Step 2: Pass results into template
+    return render_template(
+        "api.html", api_data=api_data, next_after=next_after, include_expired=include_expired,
+        campuses=geo.campuses(conn), campus=campus, generation=generation
+    )
+    """Renders the api.html template, passing in the page of alerts, the campuses, the link to the next page, and the
+    alerts generation the live stream resumes from."""
+
+@api_bp.route("/api/stream")
 
-    client.run()  # fetches data from weather.gov and saves into api_data table
-    """Runs the client to fetch alerts and store them in the database."""
+def stream():
+    """
+    Push weather alerts to dashboards as Server-Sent Events as soon as they are ingested.
+    Browsers resume with the Last-Event-ID header after a dropped connection (other
+    clients can pass since=<generation>), and campus=<id> only sends that campus's alerts.
+    """
 
-    # Step 2: Query the api_data table
-    conn = sqlite3.connect("campusconnect.db")
-    """Opens a connection to the campusconnect.db SQLite database."""
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+    """Reads the generation the client last received, if any."""
 
-    conn.row_factory = sqlite3.Row  # allows dict-like access
-    """Configures rows to be accessed like dictionaries for readability."""
+    if since is not None and not (since.isdecimal() and int(since) <= queries.SQLITE_INT[1]):
+        """Checks whether the generation isn't a number SQLite can compare with."""
 
-    cursor = conn.cursor()
-    """Creates a cursor object to execute SQL queries."""
+        abort(400, "Last-Event-ID and since must be an integer generation")
+        """Rejects the malformed value."""
 
-    cursor.execute("""
-        SELECT id, event, headline, description,
-               severity, urgency, certainty,
-               effective, expires, area, source
-        FROM api_data
-        ORDER BY effective DESC
-    """)
-    """Executes SQL query to retrieve alert data ordered by effective date."""
+    response = Response(
+        broadcaster.stream(int(since) if since else None, request.args.get("campus", type=int)),
+        mimetype="text/event-stream"
+    )
+    """Builds a streaming response that holds no database connection while it waits for alerts."""
 
-    api_data = cursor.fetchall()
-    """Fetches all rows returned by the query into a list."""
+    response.headers["Cache-Control"] = "no-cache"
+    """Keeps browsers and proxies from caching the stream."""
 
-    conn.close()
-    """Closes the database connection to free resources."""
+    response.headers["X-Accel-Buffering"] = "no"
+    """Tells nginx to pass each message through instead of buffering the stream."""
 
-    # Step 3: Pass results into template
-    return render_template("api.html", api_data=api_data)
-    """Renders the api.html template, passing in the retrieved alert data."""
\ No newline at end of file
+    return response
+    """Returns the stream."""
@@ -0,0 +1,16 @@
+from flask import Blueprint, jsonify
+"""Imports Flask components for modular routing and JSON responses."""
+
+from utils.page_cache import page_cache
+"""Imports the shared page cache whose statistics are reported."""
+
+cache_bp = Blueprint('cache', __name__)
+"""Creates a Blueprint named 'cache' for page cache diagnostics."""
+
+@cache_bp.route("/cache/stats")
+
+def cache_stats():
+    """Function that reports page cache hits, misses, 304s, and the hit rate."""
+
+    return jsonify(page_cache.summary())
+    """Returns the page cache statistics as JSON."""
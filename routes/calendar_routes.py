@@ -0,0 +1,139 @@
+from flask import Blueprint, Response, abort, request, stream_with_context
+"""Imports Flask components for routing and streaming responses."""
+
+from utils.db import get_db, get_generation
+"""Imports the helper that returns this request's pooled database connection, and the data generation lookup."""
+
+from utils.refresher import refresher
+"""Imports the shared background refresher that keeps external events up to date."""
+
+from utils import feeds, ics, queries
+"""Imports the compression helpers, the pre-serialized calendar entries, and the snapshot helper."""
+
+calendar_bp = Blueprint('calendar', __name__)
+"""Creates a Flask Blueprint named 'calendar' for the iCalendar subscription feeds."""
+
+MAX_AGE = 300
+"""Defines how long (in seconds) calendar clients and proxies may reuse a feed before revalidating."""
+
+def calendar_response(etag, name, open_cursor):
+    """
+    Answer a calendar poll: a 304 when the client's ETag is current, otherwise the feed
+    streamed from its stored VEVENT blocks. The ETag is built from data generations read
+    in the same snapshot as the blocks, so a poll that changes nothing costs no row reads,
+    and ends with the negotiated content encoding, since a strong ETag names one exact
+    body and the gzip and identity bodies differ.
+    """
+
+    encoding = feeds.choose_encoding(request.accept_encodings)
+    """Negotiates the content encoding with the client."""
+
+    if encoding:
+        """Checks whether the feed will be compressed."""
+
+        etag = f"{etag}-{encoding}"
+        """Gives the compressed body its own ETag."""
+
+    if request.if_none_match.contains(etag):
+        """Checks whether the client already has this version of the feed."""
+
+        response = Response(status=304)
+        """Builds an empty 304 Not Modified response."""
+
+    else:
+        """Handles clients that need the feed body."""
+
+        response = Response(
+            stream_with_context(feeds.compress(ics.calendar_chunks(open_cursor(), name), encoding)),
+            mimetype="text/calendar"
+        )
+        """Builds a streaming response that concatenates the stored blocks."""
+
+        if encoding:
+            """Checks whether the feed is compressed."""
+
+            response.headers["Content-Encoding"] = encoding
+            """Tells the client how the body is compressed."""
+
+    response.headers["Vary"] = "Accept-Encoding"
+    """Tells caches that the body and its ETag depend on the accepted encodings."""
+
+    response.set_etag(etag)
+    """Sets the strong ETag so calendar clients can poll with If-None-Match."""
+
+    response.headers["Cache-Control"] = f"public, max-age={MAX_AGE}"
+    """Lets clients and proxies reuse the feed briefly, then revalidate."""
+
+    return response
+    """Returns the 304 or the streaming feed."""
+
+@calendar_bp.route("/calendar.ics")
+
+def all_events():
+    """Function that serves every dated campus event (or those about ?interests=a,b) as an iCalendar feed."""
+
+    refresher.trigger("events")
+    """Starts a background scrape if the stored events are stale (the feed never waits for it)."""
+
+    conn = get_db()
+    """Borrows the request's pooled connection, held until the feed has been streamed."""
+
+    generation = queries.begin_snapshot(conn, "events")
+    """Starts the read snapshot and reads the events generation it reflects."""
+
+    return calendar_response(f"events-{generation}", "Campus Events", lambda: ics.feed_events(conn, None, request.args.get("interests")))
+    """Returns the feed."""
+
+@calendar_bp.route("/calendar/<source>.ics")
+
+def source_events(source):
+    """Function that serves the events scraped from one campus calendar (or those about ?interests=a,b) as an iCalendar feed."""
+
+    refresher.trigger("events")
+    """Starts a background scrape if the stored events are stale (the feed never waits for it)."""
+
+    conn = get_db()
+    """Borrows the request's pooled connection, held until the feed has been streamed."""
+
+    generation = queries.begin_snapshot(conn, "events")
+    """Starts the read snapshot and reads the events generation it reflects."""
+
+    if conn.execute("SELECT 1 FROM ics_events WHERE source = ? LIMIT 1", (source,)).fetchone() is None:
+        """Checks whether any events were scraped from the calendar."""
+
+        abort(404)
+        """Returns a 404 for unknown calendars."""
+
+    return calendar_response(
+        f"events-{generation}-{source}", f"{source.title()} Events", lambda: ics.feed_events(conn, source, request.args.get("interests"))
+    )
+    """Returns the feed."""
+
+@calendar_bp.route("/users/<int:user_id>/calendar.ics")
+
+def user_events(user_id):
+    """Function that serves the events matched to a user's interests as an iCalendar feed."""
+
+    refresher.trigger("events")
+    """Starts a background scrape if the stored events are stale (the feed never waits for it)."""
+
+    conn = get_db()
+    """Borrows the request's pooled connection, held until the feed has been streamed."""
+
+    generation = queries.begin_snapshot(conn, "events")
+    """Starts the read snapshot and reads the events generation it reflects."""
+
+    user = conn.execute("SELECT name FROM users WHERE id = ?", (user_id,)).fetchone() if queries.cursor_value(user_id, (int,)) else None
+    """Looks up the user (ids too large to be stored in SQLite belong to no one)."""
+
+    if user is None:
+        """Checks whether the user exists."""
+
+        abort(404)
+        """Returns a 404 for unknown users."""
+
+    return calendar_response(
+        f"events-{generation}-preferences-{get_generation(conn, 'preferences')}-user-{user_id}",
+        f"Events for {user['name']}", lambda: ics.user_events(conn, user_id)
+    )
+    """Returns the feed, which also changes whenever any user's preferences do."""
@@ -1,70 +1,87 @@
-import os
-"""Imports the os module to handle file paths and directory operations."""
+import logging
+"""Imports logging for its level constants."""
 
-from flask import Blueprint, render_template
-"""Imports Flask components for modular routing and rendering HTML templates."""
+from flask import Blueprint, render_template, request
+"""Imports Flask components for modular routing, rendering HTML templates, and reading query parameters."""
 
-import sqlite3
-"""Imports SQLite3 to enable database connections and queries."""
+from utils.db import get_db
+"""Imports the helper that returns this request's pooled database connection."""
 
-# Import your CampusEventScraper class
-from utils.event_scraper import CampusEventScraper
-"""Imports the custom CampusEventScraper class used to fetch external events."""
+from utils.refresher import refresher
+"""Imports the shared background refresher that keeps external events up to date."""
+
+from utils.page_cache import cached_page
+"""Imports the page cache decorator that skips re-rendering until new events are ingested."""
+
+from utils import queries
+"""Imports the paginated, filtered event queries."""
+
+from utils.logger import get_logger
+"""Imports the structured, non-blocking logger."""
+
+log = get_logger(__name__)
+"""Creates the logger for the events page."""
 
 event_bp = Blueprint('event', __name__)
 """Creates a Flask Blueprint named 'event' to group event-related routes."""
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'db', 'campusconnect.db')
-"""Constructs the relative path to the campusconnect.db database file."""
+@event_bp.before_request
 
-DB_PATH = os.path.abspath(DB_PATH)  # Ensures full absolute path
-"""Converts the relative path into an absolute path for reliability."""
+def refresh_events_if_stale():
+    """Refreshes external events in the background if they are stale (never blocks the request, even on cache hits)."""
+
+    refresher.trigger("events")
+    """Starts a background scrape if the stored external events are older than their interval."""
 
 @event_bp.route("/events")
+@cached_page("events")
 
 def events():
-    """Main function handling event scraping, database queries, and template rendering."""
-
-    # Step 1: Run the scraper to fetch and store external events
-    scraper = CampusEventScraper("https://www.erskine.edu/events/", db_path=DB_PATH)
-    """Initializes the scraper with the Erskine events URL and database path."""
+    """Main function handling event database queries and template rendering."""
 
-    scraper.run()
-    """Runs the scraper to fetch external events and store them in the database."""
+    conn = get_db()
+    """Borrows the request's pooled connection to the SQLite database."""
 
-    conn = sqlite3.connect(DB_PATH)
-    """Opens a connection to the SQLite database using the absolute path."""
+    start = request.args.get("start")
+    """Reads the optional earliest date (e.g. 2025-04-01)."""
 
-    cursor = conn.cursor()
-    """Creates a cursor object to execute SQL queries."""
+    end = request.args.get("end")
+    """Reads the optional latest date."""
 
-    # Step 2: Fetch internal events
-    cursor.execute("SELECT title, location, date FROM events")
-    """Executes SQL query to retrieve internal events from the events table."""
+    location = request.args.get("location")
+    """Reads the optional location filter."""
 
-    internal_events = cursor.fetchall()
-    """Fetches all internal event rows returned by the query."""
+    limit = queries.page_size(request.args.get("limit"))
+    """Reads the page size, falling back to the default."""
 
-    print("Internal Events:", internal_events)  # Debugging
-    """Prints internal events to console for debugging purposes."""
+    # Step 1: Fetch one page of internal events
+    internal_events, internal_next = queries.internal_events(
+        conn, start, end, location, request.args.get("internal_after"), limit
+    )
+    """Fetches the requested page of internal events and the cursor for the next one."""
 
-    # Step 3: Fetch external events from DB
-    cursor.execute("SELECT title, date, location, description FROM external_events")
-    """Executes SQL query to retrieve external events from the external_events table."""
+    # Step 2: Fetch one page of external events from DB
+    external_events, external_next = queries.external_events(
+        conn, start, end, location, request.args.get("external_after"), limit
+    )
+    """Fetches the requested page of scraped events and the cursor for the next one."""
 
-    external_events = cursor.fetchall()
-    """Fetches all external event rows returned by the query."""
+    if log.isEnabledFor(logging.DEBUG):
+        """Checks whether debug records are logged before converting the rows."""
 
-    print("External Events:", external_events)  # Debugging
-    """Prints external events to console for debugging purposes."""
+        log.debug("Internal events: %s", [dict(row) for row in internal_events])
+        """Logs the page of internal events (sampled by CAMPUSCONNECT_LOG_SAMPLE)."""
 
-    conn.close()
-    """Closes the database connection to free resources."""
+        log.debug("External events: %s", [dict(row) for row in external_events])
+        """Logs the page of scraped events."""
 
-    # Step 4: Pass both sets of events into template
+    # Step 3: Pass both sets of events into template
     return render_template(
         "events.html",
         internal_events=internal_events,
-        external_events=external_events
+        external_events=external_events,
+        internal_next=internal_next,
+        external_next=external_next,
+        filters={name: request.args[name] for name in ("start", "end", "location", "limit") if request.args.get(name)}
     )
-    """Renders the events.html template, passing both internal and external events."""
\ No newline at end of file
+    """Renders the events.html template, passing both pages of events and the links to the next pages."""
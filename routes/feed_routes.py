@@ -0,0 +1,107 @@
+from flask import Blueprint, Response, abort, request, stream_with_context
+"""Imports Flask components for routing and streaming responses."""
+
+from utils.db import get_db
+"""Imports the helper that returns this request's pooled database connection."""
+
+from utils.refresher import refresher
+"""Imports the shared background refresher that keeps events and alerts up to date."""
+
+from utils import feeds, queries
+"""Imports the feed serialization helpers and the feed queries."""
+
+feed_bp = Blueprint('feed', __name__)
+"""Creates a Flask Blueprint named 'feed' for the machine-readable JSON feeds."""
+
+MIMETYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+"""Defines the content type of each feed format."""
+
+@feed_bp.route("/feeds/<source>.<fmt>")
+
+def feed(source, fmt):
+    """
+    Stream events or alerts as JSON or NDJSON straight from a SQLite cursor.
+    Accepts since=<generation> to send only rows changed after a previous sync, followed
+    by tombstones of the rows retention deleted (the X-Generation header and the JSON
+    "generation" field give the value to use next), and expired=1 to include expired
+    alerts. A since older than the retained tombstones gets every row instead, marked
+    as a full sync.
+    """
+
+    if source not in ("events", "alerts") or fmt not in MIMETYPES:
+        """Checks whether the requested feed exists."""
+
+        abort(404)
+        """Returns a 404 for unknown feeds."""
+
+    since = request.args.get("since", type=int)
+    """Reads the generation the client last synced to, if any."""
+
+    if (since is None and request.args.get("since")) or not queries.cursor_value(since, (int, type(None))):
+        """Checks whether since was given but isn't a number SQLite can compare with."""
+
+        abort(400, "since must be an integer generation")
+        """Rejects the malformed parameter."""
+
+    refresher.trigger(source)
+    """Starts a background refresh if the source is stale (the feed never waits for it)."""
+
+    conn = get_db()
+    """Borrows the request's pooled connection, held until the response has been streamed."""
+
+    generation = queries.begin_snapshot(conn, source)
+    """Starts the read snapshot and reads the generation it reflects."""
+
+    if since is not None and since < queries.sync_floor(conn, source):
+        """Checks whether deletions the client hasn't seen may have been pruned."""
+
+        since = None
+        """Sends every row, so the client replaces its copy."""
+
+    if source == "events":
+        """Checks whether the events feed was requested."""
+
+        cursors = queries.events_since(conn, since)
+        """Opens cursors over the changed internal and scraped events."""
+
+    else:
+        """Handles the alerts feed."""
+
+        cursors = (queries.alerts_since(conn, since, request.args.get("expired") == "1"),)
+        """Opens a cursor over the changed alerts."""
+
+    if since is not None:
+        """Checks whether this is an incremental sync."""
+
+        cursors = (*cursors, queries.deleted_since(conn, source, since))
+        """Sends the tombstones of rows deleted since the client's last sync after the changed rows."""
+
+    batches = feeds.iter_rows(cursors)
+    """Reads the rows lazily in batches."""
+
+    chunks = feeds.ndjson_chunks(batches) if fmt == "ndjson" else feeds.json_chunks(batches, generation, since is None)
+    """Serializes the batches in the requested format."""
+
+    encoding = feeds.choose_encoding(request.accept_encodings)
+    """Negotiates the content encoding with the client."""
+
+    response = Response(stream_with_context(feeds.compress(chunks, encoding)), mimetype=MIMETYPES[fmt])
+    """Builds a streaming response that keeps the request (and its connection) open until done."""
+
+    if encoding:
+        """Checks whether the feed is compressed."""
+
+        response.headers["Content-Encoding"] = encoding
+        """Tells the client how the body is compressed."""
+
+    response.headers["Vary"] = "Accept-Encoding"
+    """Tells caches that the body depends on the accepted encodings."""
+
+    response.headers["X-Generation"] = str(generation)
+    """Tells the client which since value to send on its next sync."""
+
+    response.headers["X-Full-Sync"] = "1" if since is None else "0"
+    """Tells the client whether the rows replace its copy or update it."""
+
+    return response
+    """Returns the streaming response."""
@@ -0,0 +1,33 @@
+from flask import Blueprint, Response
+"""Imports Flask components for modular routing and plain-text responses."""
+
+from utils import metrics
+"""Imports the metrics layer whose histograms and counters are exported."""
+
+from utils.page_cache import page_cache
+"""Imports the shared page cache whose statistics are exported alongside the timings."""
+
+from utils.alert_stream import broadcaster
+"""Imports the alert stream broadcaster whose connection counters are exported alongside the timings."""
+
+metrics_bp = Blueprint('metrics', __name__)
+"""Creates a Blueprint named 'metrics' for the Prometheus scrape endpoint."""
+
+@metrics_bp.route("/metrics")
+
+def prometheus_metrics():
+    """Function that reports request, template, query, and pipeline timings in the Prometheus text format."""
+
+    cache = metrics.counter_from(
+        "campusconnect_page_cache_lookups_total", "Page cache lookups by result.", "result", page_cache.stats
+    )
+    """Exports the page cache hit, miss, and 304 counters."""
+
+    stream = metrics.counter_from(
+        "campusconnect_alert_stream_events_total", "Alert stream connections, overflow drops, and alerts pushed.", "event",
+        broadcaster.stats
+    )
+    """Exports the alert stream counters."""
+
+    return Response(metrics.render([cache, stream]), mimetype="text/plain; version=0.0.4")
+    """Returns every metric as Prometheus exposition text."""
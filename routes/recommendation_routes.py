@@ -0,0 +1,50 @@
+from flask import Blueprint, abort, render_template, request
+"""Imports Flask components for routing, rendering HTML templates, and reading query parameters."""
+
+from utils.db import get_db
+"""Imports the helper that returns this request's pooled database connection."""
+
+from utils.page_cache import cached_page
+"""Imports the page cache decorator that skips re-rendering until events or preferences change."""
+
+from utils.recommendations import MAX_MATCHES, PAGE_SIZE, recommended_events
+"""Imports the per-user match limit, the page size, and the lookup of a user's precomputed event matches."""
+
+from utils import queries
+"""Imports the check that an id fits in a SQLite integer."""
+
+recommendation_bp = Blueprint('recommendation', __name__)
+"""Creates a Flask Blueprint named 'recommendation' for personalized event feeds."""
+
+@recommendation_bp.route("/users/<int:user_id>/recommendations")
+@cached_page("events", "preferences")
+
+def recommendations(user_id):
+    """Function that renders a user's events ranked against their preferences."""
+
+    conn = get_db()
+    """Borrows the request's pooled connection to the SQLite database."""
+
+    if not queries.cursor_value(user_id, (int,)):
+        """Checks whether the id is too large to be stored in SQLite."""
+
+        abort(404)
+        """Returns a 404, since no user can have it."""
+
+    user = conn.execute("SELECT id, name, preferences FROM users WHERE id = ?", (user_id,)).fetchone()
+    """Looks up the user."""
+
+    if user is None:
+        """Checks whether the user exists."""
+
+        abort(404)
+        """Returns a 404 for unknown users."""
+
+    page = max(1, min(request.args.get("page", 1, type=int), -(-MAX_MATCHES // PAGE_SIZE)))
+    """Reads the page number, starting at 1 and ending at the last page a user's stored matches can fill."""
+
+    events, has_next = recommended_events(conn, user_id, request.args.get("from"), page)
+    """Reads one page of the user's precomputed matches, optionally only from a date on."""
+
+    return render_template("recommendations.html", user=user, events=events, page=page, has_next=has_next)
+    """Renders the recommendations.html template with the ranked events and paging links."""
@@ -0,0 +1,49 @@
+from flask import Blueprint, render_template, request
+"""Imports Flask components for routing, rendering HTML templates, and reading query parameters."""
+
+from utils.db import get_db
+"""Imports the helper that returns this request's pooled database connection."""
+
+from utils.page_cache import cached_page
+"""Imports the page cache decorator that skips re-running searches until new data is ingested."""
+
+from utils import queries, search as search_index
+"""Imports the page size helper and the full-text search module."""
+
+search_bp = Blueprint('search', __name__)
+"""Creates a Flask Blueprint named 'search' for full-text search."""
+
+KIND_LABELS = {"event": "Campus event", "external": "Scraped event", "alert": "Weather alert"}
+"""Defines the label shown for each kind of result."""
+
+@search_bp.route("/search")
+@cached_page("events", "alerts")
+
+def search():
+    """Function that runs a ranked full-text search and renders one page of highlighted results."""
+
+    q = request.args.get("q", "").strip()
+    """Reads the search text."""
+
+    kind = request.args.get("kind", "")
+    """Reads the optional kind filter (event, external, or alert)."""
+
+    limit = queries.page_size(request.args.get("limit", 20))
+    """Reads the number of results per page."""
+
+    page = max(1, min(request.args.get("page", 1, type=int), -(-search_index.MAX_CANDIDATES // limit)))
+    """Reads the page number, starting at 1 and ending at the last page the ranked candidates can fill."""
+
+    results, has_next = search_index.search(get_db(), q, [kind] if kind else None, page, limit)
+    """Runs the search for the requested page."""
+
+    return render_template(
+        "search.html",
+        q=q,
+        kind=kind,
+        kinds=KIND_LABELS,
+        results=results,
+        page=page,
+        has_next=has_next
+    )
+    """Renders the search.html template with the results and paging links."""
@@ -0,0 +1,82 @@
+import datetime
+"""Imports datetime to read the first day of the timeline from the query string."""
+
+from flask import Blueprint, render_template, request
+"""Imports Flask components for routing, rendering HTML templates, and reading query parameters."""
+
+from utils.db import get_db
+"""Imports the helper that returns this request's pooled database connection."""
+
+from utils.page_cache import cached_page
+"""Imports the page cache decorator that skips re-rendering until new events or alerts are ingested."""
+
+from utils import queries, timestamps
+"""Imports the merged timeline query and the campus time zone helpers."""
+
+timeline_bp = Blueprint('timeline', __name__)
+"""Creates a Flask Blueprint named 'timeline' for the merged events and alerts view."""
+
+KIND_LABELS = {"event": "Campus event", "external": "Scraped event", "alert": "Weather alert"}
+"""Defines the label shown for each kind of entry."""
+
+MAX_DAYS = 90
+"""Defines the longest range, in days, one timeline may cover."""
+
+@timeline_bp.app_template_filter("localtime")
+
+def localtime(epoch, format="%a %b %d, %I:%M %p"):
+    """Template filter that formats epoch seconds as a time in the campus time zone."""
+
+    moment = timestamps.from_epoch(epoch)
+    """Converts the time to the campus time zone."""
+
+    return moment.strftime(format) if moment else ""
+    """Returns the formatted time, or nothing for a missing one."""
+
+@timeline_bp.route("/timeline")
+@cached_page("events", "alerts", vary=timestamps.today)
+
+def timeline():
+    """Function that renders one page of events and alerts in start time order over a range of days."""
+
+    try:
+        start = datetime.date.fromisoformat(request.args.get("start", ""))
+        """Reads the first day of the range (e.g. 2025-04-01)."""
+
+    except ValueError:
+        """Handles a missing or malformed date."""
+
+        start = datetime.date.fromisoformat(timestamps.today())
+        """Starts the range today, on the campus calendar."""
+
+    days = max(1, min(request.args.get("days", 7, type=int), MAX_DAYS))
+    """Reads how many days the range covers, clamped to the allowed range."""
+
+    try:
+        end = timestamps.to_epoch((start + datetime.timedelta(days=days)).isoformat())
+        """Converts the day after the range to epoch seconds."""
+
+    except OverflowError:
+        """Handles a range that runs past the last representable day (9999-12-31)."""
+
+        end = None
+        """Leaves the range open-ended."""
+
+    entries, next_after = queries.timeline(
+        get_db(),
+        timestamps.to_epoch(start.isoformat()),
+        end,
+        request.args.get("after"),
+        queries.page_size(request.args.get("limit"))
+    )
+    """Fetches one page of the merged timeline and the cursor for the next page."""
+
+    return render_template(
+        "timeline.html",
+        entries=entries,
+        next_after=next_after,
+        kinds=KIND_LABELS,
+        start=start.isoformat(),
+        days=days
+    )
+    """Renders the timeline.html template with the page of entries and the link to the next page."""
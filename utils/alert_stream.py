@@ -0,0 +1,381 @@
+import os
+"""Imports the os module to read stream settings from environment variables and detect forked workers."""
+
+import queue
+"""Imports queue for the bounded per-client message queues."""
+
+import threading
+"""Imports threading to run the change log poller and guard the subscriber set."""
+
+import time
+"""Imports the time module to hide expired alerts and sleep between polls."""
+
+from utils.db import DB_PATH, connection, get_generation
+"""Imports the database path, the pooled connection helper, and the data generation lookup."""
+
+from utils.feeds import dumps
+"""Imports the JSON serializer shared with the feeds (orjson when it is installed)."""
+
+from utils.logger import get_logger
+"""Imports the structured, non-blocking logger."""
+
+from utils import queries
+"""Imports the snapshot helper."""
+
+log = get_logger(__name__)
+"""Creates the logger for the alert stream."""
+
+POLL_INTERVAL = float(os.environ.get("CAMPUSCONNECT_STREAM_POLL", 1.0))
+"""Defines how often (in seconds) each worker checks the alerts generation while clients are connected."""
+
+HEARTBEAT = float(os.environ.get("CAMPUSCONNECT_STREAM_HEARTBEAT", 15))
+"""Defines how many idle seconds pass before a heartbeat comment is sent (keeps proxies from closing the stream)."""
+
+QUEUE_SIZE = int(os.environ.get("CAMPUSCONNECT_STREAM_QUEUE", 64))
+"""Defines how many unsent ingest batches a client may fall behind by before it is disconnected."""
+
+RETRY_MS = 3000
+"""Defines how long (in milliseconds) browsers wait before reconnecting a dropped stream."""
+
+CHANGES_QUERY = """
+    SELECT a.id, a.event, a.headline, a.description,
+           a.severity, a.urgency, a.certainty,
+           a.effective, a.expires, a.area, a.source,
+           a.effective_at, a.expires_at, a.changed_gen,
+           (SELECT group_concat(campus_id) FROM campus_alerts WHERE alert_rowid = a.rowid) AS campuses
+    FROM api_data a
+    WHERE a.changed_gen > ? AND a.changed_gen <= ? AND (a.expires_at IS NULL OR a.expires_at > ?)
+    ORDER BY a.changed_gen, a.id
+"""
+"""Defines the query that reads the alerts inserted or updated between two generations (the change log), with the
+campuses each one was matched to."""
+
+def message(alert):
+    """
+    Encode one alert as a Server-Sent Events message. Returns the campus ids the
+    alert was matched to (for per-campus streams) and the message bytes.
+    """
+
+    alert = dict(alert)
+    """Copies the row into a dictionary."""
+
+    campuses = alert.pop("campuses")
+    """Takes out the matched campuses."""
+
+    alert["campuses"] = [int(campus) for campus in campuses.split(",")] if campuses else []
+    """Lists the matched campus ids."""
+
+    return frozenset(alert["campuses"]), b"event: alert\ndata: " + dumps(alert) + b"\n\n"
+    """Returns the campuses and the encoded message."""
+
+def changes(conn, since):
+    """
+    Read the unexpired alerts changed after a generation in one snapshot. Returns the
+    current generation and the encoded messages (nothing to send when since is None).
+    """
+
+    generation = queries.begin_snapshot(conn, "alerts")
+    """Starts the read snapshot and reads the alerts generation it reflects."""
+
+    try:
+        if since is None or since >= generation:
+            """Checks whether there is nothing to read."""
+
+            return generation, []
+            """Returns the generation with no messages."""
+
+        return generation, [message(alert) for alert in conn.execute(CHANGES_QUERY, (since, generation, int(time.time())))]
+        """Returns the generation and the changed alerts."""
+
+    finally:
+        conn.rollback()
+        """Ends the read snapshot."""
+
+class Subscriber:
+    """One connected stream: its bounded queue of ingest batches and whether it fell too far behind."""
+
+    def __init__(self, size=QUEUE_SIZE):
+        """
+        Initialize with the number of batches the client may fall behind by.
+        """
+
+        self.queue = queue.Queue(maxsize=size)
+        """Holds (generation, messages) batches waiting to be sent."""
+
+        self.dropped = False
+        """Stores whether the queue overflowed (the client then reconnects and resumes from the database)."""
+
+class AlertBroadcaster:
+    """
+    Fans ingested alerts out to every stream connected to this worker. One thread per
+    process polls the alerts generation (the change log shared by every worker through
+    SQLite) and reads each ingest batch once, however many clients are connected.
+    """
+
+    def __init__(self, db_path=DB_PATH, poll_interval=POLL_INTERVAL, queue_size=QUEUE_SIZE):
+        """
+        Initialize with the database path, the poll interval, and the per-client queue size.
+        """
+
+        self.db_path = db_path
+        """Stores the path of the database whose alerts are streamed."""
+
+        self.poll_interval = poll_interval
+        """Stores how often the poller checks the alerts generation."""
+
+        self.queue_size = queue_size
+        """Stores the per-client queue size."""
+
+        self.generation = None
+        """Stores the last generation published (None while nobody is connected)."""
+
+        self._subscribers = set()
+        """Stores the connected streams."""
+
+        self._lock = threading.Lock()
+        """Creates a lock that guards the subscribers and the published generation."""
+
+        self._thread = None
+        """Holds the poller thread once it has been started."""
+
+        self._pid = None
+        """Stores the process that started the poller (a forked worker starts its own)."""
+
+        self.stats = {"connected": 0, "dropped": 0, "published": 0}
+        """Stores the connection, overflow, and published alert counters."""
+
+    def _start(self):
+        """
+        Start the poller thread in this process if it is not running (called with the lock held).
+        """
+
+        if self._pid == os.getpid() and self._thread.is_alive():
+            """Checks whether this process already runs the poller."""
+
+            return
+            """Exits early so only one poller runs per process."""
+
+        self._pid = os.getpid()
+        """Records the process that owns the poller."""
+
+        self._thread = threading.Thread(target=self._loop, name="campusconnect-alert-stream", daemon=True)
+        """Creates a daemon thread so it never blocks interpreter shutdown."""
+
+        self._thread.start()
+        """Starts the poller."""
+
+    def subscribe(self):
+        """
+        Register a new stream and return its Subscriber. The first stream of a quiet
+        worker pins the published generation before the caller reads its own snapshot,
+        so nothing ingested in between is missed.
+        """
+
+        subscriber = Subscriber(self.queue_size)
+        """Creates the stream's queue."""
+
+        with self._lock:
+            """Guards the subscribers while adding one."""
+
+            if self.generation is None:
+                """Checks whether the poller has been idle."""
+
+                with connection(self.db_path) as conn:
+                    """Borrows a pooled connection to read the generation."""
+
+                    self.generation = get_generation(conn, "alerts")
+                    """Publishes only the alerts ingested from now on."""
+
+            self._subscribers.add(subscriber)
+            """Adds the stream."""
+
+            self.stats["connected"] += 1
+            """Counts the connection."""
+
+            self._start()
+            """Makes sure the poller is running."""
+
+        return subscriber
+        """Returns the stream's subscriber."""
+
+    def unsubscribe(self, subscriber):
+        """
+        Remove a stream once its client has gone.
+        """
+
+        with self._lock:
+            """Guards the subscribers while removing one."""
+
+            self._subscribers.discard(subscriber)
+            """Removes the stream."""
+
+            if not self._subscribers:
+                """Checks whether anyone is still connected."""
+
+                self.generation = None
+                """Stops polling until the next client connects."""
+
+    def publish(self, generation, messages):
+        """
+        Queue an ingest batch for every stream (called with the lock held). Streams whose
+        queue is full are dropped instead of blocking ingest fan-out for everyone else.
+        """
+
+        for subscriber in list(self._subscribers):
+            """Iterates through each connected stream."""
+
+            try:
+                subscriber.queue.put_nowait((generation, messages))
+                """Queues the batch."""
+
+            except queue.Full:
+                """Handles a client that stopped reading."""
+
+                subscriber.dropped = True
+                """Tells the stream to close so the client reconnects with its Last-Event-ID."""
+
+                self._subscribers.discard(subscriber)
+                """Stops queueing batches for it."""
+
+                self.stats["dropped"] += 1
+                """Counts the overflow."""
+
+        self.stats["published"] += len(messages)
+        """Counts the published alerts."""
+
+        if not self._subscribers:
+            """Checks whether every stream was dropped."""
+
+            self.generation = None
+            """Stops polling until the next client connects."""
+
+    def poll(self):
+        """
+        Read and publish the alerts ingested since the last published generation, if any.
+        """
+
+        with self._lock:
+            """Reads the published generation consistently with the subscribers."""
+
+            since = self.generation
+            """Stores the generation to read from."""
+
+        if since is None:
+            """Checks whether anyone is connected."""
+
+            return
+            """Exits early without touching the database."""
+
+        with connection(self.db_path) as conn:
+            """Borrows a pooled connection for the read."""
+
+            if get_generation(conn, "alerts") <= since:
+                """Checks whether any alerts were ingested (the common case costs one row read)."""
+
+                return
+                """Exits early because there is nothing new."""
+
+            generation, messages = changes(conn, since)
+            """Reads the changed alerts."""
+
+        with self._lock:
+            """Guards the subscribers while publishing."""
+
+            if self.generation != since:
+                """Checks whether every client left (and maybe a new one pinned another generation) meanwhile."""
+
+                return
+                """Drops the stale batch."""
+
+            self.generation = generation
+            """Records the published generation."""
+
+            self.publish(generation, messages)
+            """Queues the batch for every stream."""
+
+    def _loop(self):
+        """
+        Poller loop: check the alerts generation every poll interval.
+        """
+
+        while True:
+            """Keeps polling for the life of the process."""
+
+            try:
+                self.poll()
+                """Publishes any newly ingested alerts."""
+
+            except Exception as e:
+                """Handles database errors so the poller keeps running."""
+
+                log.exception("Alert stream poll failed: %s", e)
+                """Logs the error and its traceback."""
+
+            time.sleep(self.poll_interval)
+            """Sleeps until the next poll."""
+
+    def stream(self, since=None, campus=None, heartbeat=HEARTBEAT):
+        """
+        Yield a Server-Sent Events stream: first the alerts changed after since (a
+        Last-Event-ID the client resumes from), then every alert ingested while it stays
+        connected, with a heartbeat comment whenever it has been idle. Each batch ends
+        with the generation as the event id. Given a campus id, only alerts matched to
+        that campus are sent.
+        """
+
+        subscriber = self.subscribe()
+        """Registers the stream before reading the backlog so no batch falls in between."""
+
+        try:
+            with connection(self.db_path) as conn:
+                """Borrows a pooled connection only for the backlog (not for the life of the stream)."""
+
+                generation, messages = changes(conn, since)
+                """Reads the alerts the client missed."""
+
+            yield f"retry: {RETRY_MS}\n\n".encode("utf-8")
+            """Tells the browser how soon to reconnect if the stream drops."""
+
+            while True:
+                """Sends batches until the client disconnects or falls behind."""
+
+                yield b"".join(body for campuses, body in messages if campus is None or campus in campuses) + f"id: {generation}\n\n".encode("utf-8")
+                """Sends the batch and moves the client's Last-Event-ID to its generation."""
+
+                while True:
+                    """Waits for the next batch the client hasn't seen."""
+
+                    if subscriber.dropped:
+                        """Checks whether the client fell too far behind."""
+
+                        return
+                        """Ends the stream; the browser reconnects and catches up from the database."""
+
+                    try:
+                        batch, messages = subscriber.queue.get(timeout=heartbeat)
+                        """Waits for an ingest batch."""
+
+                    except queue.Empty:
+                        """Handles an idle stream."""
+
+                        yield b": heartbeat\n\n"
+                        """Sends a comment so proxies and clients know the stream is alive."""
+
+                        continue
+                        """Keeps waiting."""
+
+                    if batch > generation:
+                        """Checks whether the batch is newer than what the client already has."""
+
+                        generation = batch
+                        """Records the client's new position."""
+
+                        break
+                        """Sends the batch."""
+
+        finally:
+            self.unsubscribe(subscriber)
+            """Removes the stream once the client disconnects."""
+
+broadcaster = AlertBroadcaster()
+"""Creates the shared broadcaster used by the alert stream route."""
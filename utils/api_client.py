@@ -1,105 +1,275 @@
+import json
+"""Imports the json module to store alert geometries compactly."""
+
 import requests
 """Imports the requests library to handle HTTP requests to external APIs."""
 
-import sqlite3
-"""Imports SQLite3 to enable database connections and queries."""
+from utils.db import DB_PATH, connection, bump_generation, get_generation
+"""Imports the canonical database path, the pooled connection helper, and the generation counters."""
+
+from utils.text import clean_text
+"""Imports the shared, precompiled and memoized text cleaner."""
+
+import os
+"""Imports the os module to read alert filters from environment variables."""
+
+from utils.http_client import http_client
+"""Imports the shared pooled HTTP client with conditional request caching."""
+
+from utils.json_stream import StreamingArrayReader
+"""Imports the incremental JSON reader used to stream alert features."""
+
+from utils.logger import get_logger
+"""Imports the structured, non-blocking logger."""
+
+from utils.migrations import migrate
+"""Imports the migration runner that creates the api_data table."""
+
+from utils.timestamps import to_epoch
+"""Imports the timestamp parser that stores effective and expiry times as epoch seconds."""
+
+from utils import geo, metrics
+"""Imports the campus alert matcher and the metrics layer that records stage latencies, row counts, and payload sizes."""
+
+log = get_logger(__name__)
+"""Creates the logger for alert ingestion."""
+
+BATCH_SIZE = 500
+"""Defines how many alerts are written to the database per executemany batch."""
+
+RETRIES = 2
+"""Defines how many times a failed weather.gov request is retried (if the shared retry budget allows)."""
+
+ALERTS_URL = os.environ.get("CAMPUSCONNECT_ALERTS_URL", "https://api.weather.gov/alerts/active")
+"""Defines the alerts endpoint, overridable to point at a mirror or a local fixture server."""
 
-import re
-"""Imports the regex module for cleaning and formatting text."""
+ALERT_FILTERS = {
+    "area": os.environ.get("CAMPUSCONNECT_ALERT_AREA"),
+    "zone": os.environ.get("CAMPUSCONNECT_ALERT_ZONE"),
+    "severity": os.environ.get("CAMPUSCONNECT_ALERT_SEVERITY"),
+}
+"""Defines weather.gov filters (e.g. area=SC, severity=Severe,Extreme) so only alerts relevant to our campuses are ingested."""
+
+def alert_filters():
+    """
+    Return the configured weather.gov query parameters, leaving out unset filters.
+    """
+
+    return {name: value for name, value in ALERT_FILTERS.items() if value}
+    """Returns only the filters that have a value."""
 
 class APIClient:
     """Defines the APIClient class responsible for fetching and storing weather alerts."""
 
-    BASE_URL = "https://api.weather.gov/alerts/active"
+    BASE_URL = ALERTS_URL
     """Sets the base URL for the weather.gov alerts API."""
 
-    def __init__(self, db_path="campusconnect.db"):
+    _schema_ready = set()
+    """Stores the database paths already upgraded in this process, so clients created per refresh skip the check."""
+
+    def __init__(self, db_path=DB_PATH, http=http_client):
         """Initializes the APIClient with a database path and ensures the table exists."""
 
         self.db_path = db_path
         """Stores the database path for later use in queries."""
 
+        self.http = http
+        """Stores the HTTP client used to call weather.gov."""
+
+        self.last_fetch = None
+        """Holds the result of the last fetch so its validators can be saved after a successful ingest."""
+
+        self.last_error = None
+        """Holds the error of the last run, if it failed (the stored alerts are then left as they were)."""
+
         self.init_db()  # ensure table exists when client is created
         """Calls init_db to create the api_data table if it does not already exist."""
 
     def init_db(self):
-        """Creates the api_data table if it doesn't exist."""
-
-        conn = sqlite3.connect(self.db_path)
-        """Opens a connection to the SQLite database using the provided path."""
-
-        cursor = conn.cursor()
-        """Creates a cursor object to execute SQL commands."""
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS api_data (
-                id TEXT PRIMARY KEY,
-                event TEXT,
-                headline TEXT,
-                description TEXT,
-                severity TEXT,
-                urgency TEXT,
-                certainty TEXT,
-                effective TEXT,
-                expires TEXT,
-                area TEXT,
-                source TEXT
-            )
-        """)
-        """Executes SQL command to create the api_data table with necessary fields."""
-
-        conn.commit()
-        """Commits the transaction to save changes to the database."""
-
-        conn.close()
-        """Closes the database connection to free resources."""
+        """Creates or upgrades the database schema, including the api_data table (once per database and process)."""
+
+        if self.db_path in self._schema_ready:
+            """Checks whether this database was already upgraded in this process."""
+
+            return
+            """Exits early so the check runs once per process, not once per client."""
+
+        with connection(self.db_path) as conn:
+            """Borrows a pooled connection to the SQLite database."""
+
+            migrate(conn)
+            """Applies any pending migrations (a no-op once the database is up to date)."""
+
+        self._schema_ready.add(self.db_path)
+        """Records that the database is up to date."""
 
+    @metrics.timed("alerts.fetch")
     def fetch_alerts(self, params=None):
         """
         Sends GET request to weather.gov alerts API.
+        Returns None if the alerts haven't changed since the last fetch (HTTP 304).
         """
 
         try:
-            response = requests.get(self.BASE_URL, params=params, timeout=10)
-            """Sends an HTTP GET request to the API with optional parameters and timeout."""
+            result = self.http.get(self.BASE_URL, params=params, retries=RETRIES, db_path=self.db_path)
+            """Sends a conditional HTTP GET request to the API with optional parameters (timeouts, retries, and the
+            circuit breaker are handled by the shared HTTP client)."""
 
-            response.raise_for_status()
+            if result.not_modified:
+                """Checks whether weather.gov reported that the alerts haven't changed."""
+
+                log.info("Alerts not modified since last fetch.")
+                """Logs that parsing and saving will be skipped."""
+
+                return None
+                """Returns None so run() skips parsing and database writes."""
+
+            result.response.raise_for_status()
             """Raises an exception if the response contains an HTTP error."""
 
-            return response.json()
+            self.last_fetch = result
+            """Keeps the result so its validators can be saved once the alerts are stored."""
+
+            metrics.observe_bytes("alerts.fetch", len(result.response.content))
+            """Records the size of the downloaded feed."""
+
+            return result.response.json()
             """Returns the API response as a JSON object."""
 
         except requests.RequestException as e:
             """Handles any request-related exceptions."""
 
-            print(f"Error fetching alerts: {e}")
-            """Prints an error message if the request fails."""
+            log.error("Error fetching alerts: %s", e)
+            """Logs an error message if the request fails."""
+
+            self.last_error = e
+            """Keeps the error so the refresher records the run as failed."""
 
             return None
             """Returns None when an error occurs."""
 
     def clean_text(self, text):
         """
-        Cleans text using regex: remove HTML tags, normalize whitespace.
+        Cleans text: remove HTML tags, decode entities, normalize whitespace.
         """
 
-        if not text:
-            """Checks if the input text is empty or None."""
+        return clean_text(text)
+        """Returns the text cleaned by the shared text-normalization module."""
 
-            return None
-            """Returns None if no text is provided."""
+    def alert_row(self, feature):
+        """
+        Convert one GeoJSON feature into an api_data row with cleaned values.
+        """
+
+        props = feature.get("properties", {})
+        """Extracts the 'properties' dictionary from the feature."""
+
+        geometry = feature.get("geometry")
+        """Extracts the alert's polygon (None for alerts issued for whole zones)."""
+
+        return (
+            feature.get("id"),
+            self.clean_text(props.get("event")),
+            self.clean_text(props.get("headline")),
+            self.clean_text(props.get("description")),
+            props.get("severity"),
+            props.get("urgency"),
+            props.get("certainty"),
+            props.get("effective"),
+            props.get("expires"),
+            self.clean_text(props.get("areaDesc")),
+            props.get("senderName"),
+            json.dumps(geometry, separators=(",", ":")) if geometry else None,
+            " ".join((props.get("geocode") or {}).get("UGC") or ()) or None,
+            to_epoch(props.get("effective")),
+            to_epoch(props.get("expires"))
+        )
+        """Returns the row values in api_data column order, with the geometry as compact JSON, the zone codes space-separated, and the times as epoch seconds."""
+
+    def save_alert_rows(self, conn, rows, generation):
+        """
+        Upsert a batch of api_data rows with a single executemany call.
+        Alerts that are identical to the saved row are left untouched, so only new
+        or changed alerts are stamped with the generation (and sent to feed clients).
+        Returns the number of alerts inserted or changed.
+        """
+
+        return conn.executemany("""
+            INSERT INTO api_data (
+                id, event, headline, description,
+                severity, urgency, certainty,
+                effective, expires, area, source, geometry, zones,
+                effective_at, expires_at, changed_gen
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                event = excluded.event,
+                headline = excluded.headline,
+                description = excluded.description,
+                severity = excluded.severity,
+                urgency = excluded.urgency,
+                certainty = excluded.certainty,
+                effective = excluded.effective,
+                expires = excluded.expires,
+                area = excluded.area,
+                source = excluded.source,
+                geometry = excluded.geometry,
+                zones = excluded.zones,
+                effective_at = excluded.effective_at,
+                expires_at = excluded.expires_at,
+                changed_gen = excluded.changed_gen
+            WHERE (event, headline, description, severity, urgency, certainty, effective, expires, area, source, geometry, zones)
+                IS NOT (excluded.event, excluded.headline, excluded.description, excluded.severity, excluded.urgency,
+                        excluded.certainty, excluded.effective, excluded.expires, excluded.area, excluded.source,
+                        excluded.geometry, excluded.zones)
+        """, [row + (generation,) for row in rows]).rowcount
+        """Inserts new alerts, updates changed ones in the api_data table, and returns how many rows were written."""
+
+    def write_batch(self, rows):
+        """
+        Upsert a batch of alert rows in its own short write transaction, so other writers
+        are never blocked for longer than one batch. The alerts generation is bumped (and
+        the changed alerts matched to campuses) only if some alert was new or changed.
+        Returns the number of alerts written.
+        """
+
+        with connection(self.db_path) as conn:
+            """Borrows a pooled connection for the batch only, not for the whole download."""
+
+            conn.execute("BEGIN IMMEDIATE")
+            """Takes the write lock, so the generation read next is the one this batch will commit."""
+
+            try:
+                generation = get_generation(conn, "alerts") + 1
+                """Stores the generation the batch's rows are stamped with if any of them changed."""
+
+                changed = self.save_alert_rows(conn, rows, generation)
+                """Upserts the batch."""
+
+                if changed:
+                    """Checks whether any alert was new or changed."""
+
+                    bump_generation(conn, "alerts")
+                    """Invalidates cached alert pages and moves feed clients on in the same transaction."""
+
+                    geo.match_generation(conn, generation)
+                    """Matches the new and changed alerts to the campuses they affect."""
+
+                conn.commit()
+                """Commits the batch and releases the write lock."""
+
+            except BaseException:
+                """Handles a batch that failed partway through."""
 
-        # Remove HTML tags
-        text = re.sub(r"<.*?>", "", text)
-        """Removes any HTML tags from the text using regex."""
+                conn.rollback()
+                """Discards the batch and releases the write lock."""
 
-        # Collapse multiple spaces/newlines
-        text = re.sub(r"\s+", " ", text).strip()
-        """Normalizes whitespace by collapsing multiple spaces/newlines into single spaces."""
+                raise
+                """Re-raises the error for the caller."""
 
-        return text
-        """Returns the cleaned text."""
+        return changed
+        """Returns the number of alerts written."""
 
+    @metrics.timed("alerts.save")
     def save_alerts_to_db(self, data):
         """
         Parses JSON response and inserts into api_data table.
@@ -108,64 +278,163 @@ class APIClient:
         if not data or "features" not in data:
             """Checks if the data is valid and contains 'features'."""
 
-            print("No valid data to insert.")
-            """Prints a message if no valid data is available."""
+            log.warning("No valid data to insert.")
+            """Logs a warning if no valid data is available."""
 
             return
             """Exits the function early if data is invalid."""
 
-        conn = sqlite3.connect(self.db_path)
-        """Opens a connection to the SQLite database."""
-
-        cursor = conn.cursor()
-        """Creates a cursor object to execute SQL commands."""
-
-        for feature in data["features"]:
-            """Iterates through each feature in the API response."""
-
-            props = feature.get("properties", {})
-            """Extracts the 'properties' dictionary from each feature."""
-
-            cursor.execute("""
-                INSERT OR REPLACE INTO api_data (
-                    id, event, headline, description,
-                    severity, urgency, certainty,
-                    effective, expires, area, source
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                feature.get("id"),
-                self.clean_text(props.get("event")),
-                self.clean_text(props.get("headline")),
-                self.clean_text(props.get("description")),
-                props.get("severity"),
-                props.get("urgency"),
-                props.get("certainty"),
-                props.get("effective"),
-                props.get("expires"),
-                self.clean_text(props.get("areaDesc")),
-                props.get("senderName")
-            ))
-            """Inserts or replaces alert data into the api_data table with cleaned values."""
-
-        conn.commit()
-        """Commits the transaction to save all inserted alerts."""
-
-        conn.close()
-        """Closes the database connection to free resources."""
-
-        print("Alerts successfully saved to database.")
-        """Prints confirmation that alerts were saved."""
-
-    def run(self):
+        changed = self.write_batch([self.alert_row(feature) for feature in data["features"]])
+        """Cleans every feature and upserts them in one batch."""
+
+        log.info("Alerts successfully saved to database.", extra={"alerts": len(data["features"]), "changed": changed})
+        """Logs confirmation that alerts were saved."""
+
+    @metrics.timed("alerts.stream", rows=lambda saved: saved)
+    def stream_alerts(self, params=None, batch_size=BATCH_SIZE):
+        """
+        Streaming ingest: parse features incrementally from the response body, clean
+        each one as it arrives, and write fixed-size batches, following pagination
+        'next' links. Peak memory is bounded by the batch size, not the feed size. Each
+        batch is its own short transaction (and generation, if anything in it changed),
+        so other writers are never locked out for the length of the download.
+        Returns the number of alerts saved, or None if the feed was unchanged or failed.
+        """
+
+        url = self.BASE_URL
+        """Starts with the alerts endpoint."""
+
+        first = None
+        """Holds the first page's result so its validators can be saved at the end."""
+
+        saved = 0
+        """Counts how many alerts were read from the feed."""
+
+        changed = 0
+        """Counts how many of them were new or changed."""
+
+        try:
+            while url:
+                """Keeps fetching until there is no next page."""
+
+                result = self.http.get(url, params=params, stream=True, retries=RETRIES, db_path=self.db_path)
+                """Sends a conditional, streaming GET request for the page."""
+
+                with result.response:
+                    """Closes the streamed response (returning its connection to the pool) however the page ends."""
+
+                    if result.not_modified:
+                        """Checks whether weather.gov reported that the alerts haven't changed."""
+
+                        log.info("Alerts not modified since last fetch.")
+                        """Logs that parsing and saving will be skipped."""
+
+                        return None
+                        """Returns None because there is nothing new to save."""
+
+                    result.response.raise_for_status()
+                    """Raises an exception if the response contains an HTTP error."""
+
+                    first = first or result
+                    """Remembers the first page's result."""
+
+                    result.response.encoding = result.response.encoding or "utf-8"
+                    """Makes sure the body is decoded as text (weather.gov sends UTF-8 GeoJSON)."""
+
+                    reader = StreamingArrayReader(result.response.iter_content(chunk_size=65536, decode_unicode=True))
+                    """Creates a reader that yields features as their text arrives."""
+
+                    batch = []
+                    """Initializes the current batch of rows."""
+
+                    for feature in reader:
+                        """Iterates through each feature as it is parsed."""
+
+                        batch.append(self.alert_row(feature))
+                        """Cleans the feature and adds it to the batch."""
+
+                        if len(batch) >= batch_size:
+                            """Checks whether the batch is full."""
+
+                            changed += self.write_batch(batch)
+                            """Writes the full batch."""
+
+                            saved += len(batch)
+                            """Counts the batch's alerts."""
+
+                            batch = []
+                            """Starts a new batch."""
+
+                    if batch:
+                        """Checks whether any rows are left over."""
+
+                        changed += self.write_batch(batch)
+                        """Writes the final partial batch."""
+
+                        saved += len(batch)
+                        """Counts the batch's alerts."""
+
+                url = (reader.meta.get("pagination") or {}).get("next")
+                """Follows the next-page link, if the API returned one."""
+
+                params = None
+                """Drops the filters because the next link already includes them."""
+
+        except (requests.RequestException, ValueError) as e:
+            """Handles request failures and malformed JSON (batches already written are kept; the validators
+            aren't saved, so the next poll fetches the whole feed again)."""
+
+            log.error("Error streaming alerts: %s", e)
+            """Logs an error message if the request fails."""
+
+            self.last_error = e
+            """Keeps the error so the refresher records the run as failed."""
+
+            return None
+            """Returns None when an error occurs."""
+
+        self.http.remember(first)
+        """Saves the feed's ETag/Last-Modified so the next poll can be answered with a 304."""
+
+        log.info("Streamed %d alerts into the database (%d new or changed).", saved, changed,
+                 extra={"alerts": saved, "changed": changed})
+        """Logs how many alerts were saved."""
+
+        return saved
+        """Returns the number of alerts saved."""
+
+    @metrics.timed("alerts.run")
+    def run(self, params=None, stream=True):
         """
         Full pipeline: fetch, clean, and store alerts.
+        Uses the configured area/zone/severity filters unless params are given,
+        and streams the feed unless stream=False. If weather.gov can't be reached,
+        the stored alerts are kept and the error is left in last_error.
         """
 
-        data = self.fetch_alerts()
+        self.last_error = None
+        """Clears the error of any previous run."""
+
+        params = alert_filters() if params is None else params
+        """Uses the configured filters when no explicit parameters are given."""
+
+        if stream:
+            """Checks whether the streaming ingest should be used."""
+
+            self.stream_alerts(params or None)
+            """Streams the alerts into the database in batches."""
+
+            return
+            """Exits because the streaming ingest already saved everything."""
+
+        data = self.fetch_alerts(params or None)
         """Fetches alerts from the API."""
 
         if data:
             """Checks if valid data was returned."""
 
             self.save_alerts_to_db(data)
-            """Saves the fetched alerts into the database."""
\ No newline at end of file
+            """Saves the fetched alerts into the database."""
+
+            self.http.remember(self.last_fetch)
+            """Saves the feed's ETag/Last-Modified so the next poll can be answered with a 304."""
@@ -0,0 +1,438 @@
+import argparse
+"""Imports argparse to read the table, files, and options from the command line."""
+
+import csv
+"""Imports csv to read CSV exports."""
+
+import itertools
+"""Imports itertools to insert rows in fixed-size chunks."""
+
+import json
+"""Imports the json module to read JSON Lines exports."""
+
+import os
+"""Imports the os module to tell file formats apart by extension."""
+
+import time
+"""Imports the time module to report how long a load took."""
+
+from utils import db, geo, ics, recommendations, search, timestamps
+"""Imports the connection settings, and the modules whose derived tables are kept in sync with loaded rows."""
+
+from utils.event_scraper import event_key
+"""Imports the key the scraper upserts events by, so loaded events are updated by later scrapes instead of duplicated."""
+
+from utils.migrations import migrate
+"""Imports the migration runner, so loads always go into an up-to-date schema."""
+
+from utils.logger import get_logger
+"""Imports the structured, non-blocking logger."""
+
+log = get_logger(__name__)
+"""Creates the logger for bulk loads."""
+
+CHUNK_SIZE = 50000
+"""Defines how many rows are passed to each executemany call."""
+
+LOAD_PRAGMAS = (
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA temp_store=MEMORY",
+)
+"""Defines the settings used while loading: no fsyncs, a 256 MB page cache for rebuilding indexes, and in-memory sorts."""
+
+GENERATIONS = {"users": "preferences", "events": "events", "external_events": "events", "api_data": "alerts"}
+"""Maps each loadable table to the data generation bumped when rows are loaded into it."""
+
+SEARCH_KINDS = {table: kind for kind, (table, _, _) in search.SOURCES.items()}
+"""Maps each searchable table to its document kind."""
+
+def read_file(path):
+    """
+    Read a CSV file (with a header row) or a JSON Lines file (one object per line).
+    Returns the column names and an iterator over the rows as tuples in that order.
+    Empty CSV fields are read as NULL.
+    """
+
+    handle = open(path, newline="", encoding="utf-8")
+    """Opens the file; the returned iterator closes it once exhausted."""
+
+    if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson"):
+        """Checks whether the file is JSON Lines."""
+
+        lines = (line for line in handle if line.strip())
+        """Skips blank lines."""
+
+        first = next(lines, None)
+        """Reads the first object, whose keys name the columns."""
+
+        if first is None:
+            """Checks whether the file is empty."""
+
+            handle.close()
+            """Closes the file."""
+
+            return [], iter(())
+            """Returns no columns and no rows."""
+
+        columns = list(json.loads(first))
+        """Takes the column names from the first object."""
+
+        def rows():
+            """Yields each object's values in column order, closing the file at the end."""
+
+            with handle:
+                for line in itertools.chain([first], lines):
+                    """Iterates through each object, starting with the one already read."""
+
+                    record = json.loads(line)
+                    """Parses the object."""
+
+                    yield tuple(record.get(column) for column in columns)
+                    """Yields its values (missing keys become NULL)."""
+
+        return columns, rows()
+        """Returns the columns and the row iterator."""
+
+    reader = csv.reader(handle)
+    """Creates the CSV reader."""
+
+    columns = next(reader, [])
+    """Reads the header row."""
+
+    def rows():
+        """Yields each record with empty fields turned into NULL, closing the file at the end."""
+
+        with handle:
+            for record in reader:
+                """Iterates through each record."""
+
+                yield tuple(value if value != "" else None for value in record)
+                """Yields its values."""
+
+    return columns, rows()
+    """Returns the columns and the row iterator."""
+
+def load_rows(conn, table, columns, rows, chunk_size=CHUNK_SIZE):
+    """
+    Insert rows (tuples in `columns` order) into a table inside the caller's
+    transaction. The table's indexes and triggers are dropped first and recreated
+    after the last row, so each index is built once, in sorted order, instead of being
+    updated row by row. Returns the number of rows inserted.
+    """
+
+    known = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    """Reads the table's column names."""
+
+    if not known:
+        """Checks whether the table exists."""
+
+        raise ValueError(f"unknown table: {table}")
+        """Raises an error naming the table."""
+
+    unknown = [column for column in columns if column not in known]
+    """Finds any columns the table doesn't have."""
+
+    if unknown or not columns:
+        """Checks whether the columns can be inserted."""
+
+        raise ValueError(f"{table} has no columns named {', '.join(unknown) or '(none given)'}")
+        """Raises an error naming the bad columns."""
+
+    deferred = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)
+    ).fetchall()
+    """Saves the definitions of the table's explicit indexes and triggers (primary key indexes stay)."""
+
+    for kind, name, _ in deferred:
+        """Iterates through each index and trigger."""
+
+        conn.execute(f"DROP {kind.upper()} {name}")
+        """Drops it for the duration of the load."""
+
+    statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    """Builds the insert statement."""
+
+    count = 0
+    """Counts the inserted rows."""
+
+    rows = iter(rows)
+    """Makes sure the rows can be consumed chunk by chunk."""
+
+    while True:
+        """Keeps inserting until the rows run out."""
+
+        chunk = list(itertools.islice(rows, chunk_size))
+        """Reads the next chunk of rows."""
+
+        if not chunk:
+            """Checks whether every row was inserted."""
+
+            break
+            """Stops inserting."""
+
+        conn.executemany(statement, chunk)
+        """Inserts the chunk with one prepared statement."""
+
+        count += len(chunk)
+        """Counts the chunk."""
+
+    for _, _, sql in deferred:
+        """Iterates through each saved index and trigger."""
+
+        conn.execute(sql)
+        """Recreates it, building each index over all the rows at once."""
+
+    return count
+    """Returns the number of rows inserted."""
+
+def keyed_rows(conn, columns, rows):
+    """
+    Add the scraper's event_key to external_events rows (tuples in `columns` order),
+    leaving out rows whose key is already stored or appeared earlier in the load, the
+    same way a scrape upserts them. Returns the columns and the row iterator.
+    """
+
+    positions = [columns.index(name) if name in columns else None for name in ("title", "date", "location")]
+    """Finds the columns the key is built from (missing ones count as empty)."""
+
+    seen = {key for key, in conn.execute("SELECT event_key FROM external_events WHERE event_key IS NOT NULL")}
+    """Reads the stored keys before the load drops the table's indexes."""
+
+    def rows_with_keys():
+        """Yields each new row with its key appended."""
+
+        skipped = 0
+        """Counts the rows left out as duplicates."""
+
+        for row in rows:
+            """Iterates through each loaded row."""
+
+            key = event_key(*(row[position] if position is not None else None for position in positions))
+            """Builds the row's key from its title, date, and location."""
+
+            if key in seen:
+                """Checks whether the event is already stored or was loaded earlier in this file."""
+
+                skipped += 1
+                """Counts the duplicate."""
+
+                continue
+                """Leaves it out, since the unique key index can't hold it."""
+
+            seen.add(key)
+            """Remembers the key."""
+
+            yield row + (key,)
+            """Yields the row with its key."""
+
+        if skipped:
+            """Checks whether any duplicates were left out."""
+
+            log.info("skipped duplicate events", extra={"table": "external_events", "skipped": skipped})
+            """Logs how many."""
+
+    return [*columns, "event_key"], rows_with_keys()
+    """Returns the columns and the keyed rows."""
+
+def load(conn, table, columns, rows, index=True, match=True):
+    """
+    Load rows into a table inside the caller's transaction, stamping them with a new
+    data generation so cached pages and feed clients pick them up and converting their
+    dates to epoch seconds (scraped events also get the scraper's event_key unless one is
+    given, and duplicates are left out). With index=True the
+    loaded rows are added to the search index (and loaded events to the calendar
+    feeds), and with match=True loaded events are
+    matched against users' preferences (loading users recomputes every match) and loaded
+    alerts against campus locations. Matching costs far more than loading, so skip it
+    when the recommendations aren't needed.
+    Returns the number of rows loaded.
+    """
+
+    before = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+    """Reads the highest rowid before the load, so only new rows are indexed."""
+
+    generation = db.bump_generation(conn, GENERATIONS.get(table, table))
+    """Bumps the table's data generation."""
+
+    if "changed_gen" in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")} and "changed_gen" not in columns:
+        """Checks whether the rows should be stamped with the generation."""
+
+        columns = [*columns, "changed_gen"]
+        """Adds the generation column."""
+
+        rows = (row + (generation,) for row in rows)
+        """Appends the generation to each row."""
+
+    if table == "external_events" and "event_key" not in columns:
+        """Checks whether the loaded events need keys for later scrapes to update them."""
+
+        columns, rows = keyed_rows(conn, columns, rows)
+        """Appends each event's key and leaves out duplicates."""
+
+    dates = [(columns.index(text), epoch) for text, epoch in timestamps.COLUMNS.get(table, ()) if text in columns and epoch not in columns]
+    """Finds the loaded date columns whose epoch columns weren't given."""
+
+    if dates:
+        """Checks whether any dates should be converted."""
+
+        columns = [*columns, *(epoch for _, epoch in dates)]
+        """Adds the epoch columns."""
+
+        rows = (row + tuple(timestamps.to_epoch(row[position]) for position, _ in dates) for row in rows)
+        """Appends each row's dates as epoch seconds."""
+
+    count = load_rows(conn, table, columns, rows)
+    """Inserts the rows with the indexes and triggers deferred."""
+
+    if index and table in SEARCH_KINDS:
+        """Checks whether the loaded rows should be made searchable."""
+
+        search.index_rows(conn, SEARCH_KINDS[table], after=before)
+        """Indexes the loaded rows, which bypassed the search triggers."""
+
+    if index and table in SEARCH_KINDS and SEARCH_KINDS[table] in ics.SOURCES:
+        """Checks whether the loaded rows are events the calendar feeds list."""
+
+        ics.render_generation(conn, generation, SEARCH_KINDS[table])
+        """Serializes the loaded events."""
+
+    if not match:
+        """Checks whether recommendations should be left for a later rebuild."""
+
+        return count
+        """Returns the number of rows loaded."""
+
+    if table == "api_data":
+        """Checks whether alerts were loaded."""
+
+        geo.match_generation(conn, generation)
+        """Matches the loaded alerts to the campuses they affect."""
+
+    elif table == "users":
+        """Checks whether users (and so preferences) were loaded."""
+
+        recommendations.match_all(conn)
+        """Recomputes every match for the new set of users."""
+
+    elif table in SEARCH_KINDS and SEARCH_KINDS[table] in recommendations.SOURCES:
+        """Checks whether the loaded rows are events users can be matched to."""
+
+        recommendations.match_generation(conn, generation, SEARCH_KINDS[table])
+        """Matches the loaded events."""
+
+    return count
+    """Returns the number of rows loaded."""
+
+def load_files(path, table, files, journal=False, index=True, match=True):
+    """
+    Load CSV or JSON Lines files into a table in one transaction. Unless journal=True,
+    the rollback journal is turned off for the load, which is fastest but means a
+    failed or interrupted load can leave the database corrupt: only load without a
+    journal into a database that can be recreated, with the app stopped. See load for
+    index and match. Returns the number of rows loaded.
+    """
+
+    conn = db.connect(path)
+    """Opens a dedicated connection, since the load changes connection-wide settings."""
+
+    try:
+        migrate(conn)
+        """Creates or upgrades the schema before loading."""
+
+        if not journal:
+            """Checks whether the journal may be turned off."""
+
+            conn.execute("PRAGMA journal_mode=OFF")
+            """Turns off the rollback journal for the load."""
+
+        for pragma in LOAD_PRAGMAS:
+            """Iterates through each load setting."""
+
+            conn.execute(pragma)
+            """Applies the setting."""
+
+        count = 0
+        """Counts the loaded rows."""
+
+        with conn:
+            """Loads every file in one transaction."""
+
+            for name in files:
+                """Iterates through each file."""
+
+                columns, rows = read_file(name)
+                """Reads the file's columns and rows."""
+
+                loaded = load(conn, table, columns, rows, index, match)
+                """Loads the rows."""
+
+                log.info("loaded file", extra={"table": table, "file": name, "rows": loaded})
+                """Logs the load."""
+
+                count += loaded
+                """Counts the rows."""
+
+        if index and table in SEARCH_KINDS:
+            """Checks whether the search index was added to."""
+
+            search.optimize(conn)
+            """Merges the new index segments."""
+
+            conn.commit()
+            """Commits the merged index."""
+
+    finally:
+        conn.execute("PRAGMA journal_mode=WAL")
+        """Switches back to the journal mode the app uses."""
+
+        conn.close()
+        """Closes the connection."""
+
+    return count
+    """Returns the number of rows loaded."""
+
+def main():
+    """Loads the files named on the command line and prints how long it took."""
+
+    parser = argparse.ArgumentParser(
+        description="Bulk load CSV (with a header row) or JSON Lines files into a CampusConnect table."
+    )
+    """Creates the command-line parser."""
+
+    parser.add_argument("table", choices=sorted(GENERATIONS), help="table to load into")
+    """Adds the argument for the table."""
+
+    parser.add_argument("files", nargs="+", help=".csv, .jsonl, or .ndjson files")
+    """Adds the argument for the files."""
+
+    parser.add_argument("--db", default=db.DB_PATH, help="database file to load into")
+    """Adds the option for the database path."""
+
+    parser.add_argument("--journal", action="store_true", help="keep the rollback journal (slower, but a failed load rolls back)")
+    """Adds the option that keeps the journal."""
+
+    parser.add_argument("--skip-search", action="store_true",
+                        help="don't add the rows to the search index (run python -m utils.search reindex afterwards)")
+    """Adds the option that skips search indexing."""
+
+    parser.add_argument("--skip-recommendations", action="store_true",
+                        help="don't match loaded events to users (run python -m utils.recommendations rebuild afterwards)")
+    """Adds the option that skips recommendation matching."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    start = time.perf_counter()
+    """Records the start time."""
+
+    count = load_files(args.db, args.table, args.files, args.journal, not args.skip_search, not args.skip_recommendations)
+    """Loads the files."""
+
+    print(f"Loaded {count} rows into {args.table} in {time.perf_counter() - start:.2f}s.")
+    """Prints how many rows were loaded and how long it took."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the loader when executed directly."""
@@ -0,0 +1,276 @@
+import os
+"""Imports the os module to resolve the database path and detect forked worker processes."""
+
+import queue
+"""Imports queue to hold idle pooled connections in a thread-safe way."""
+
+import sqlite3
+"""Imports SQLite3 to enable database connections and queries."""
+
+import threading
+"""Imports threading to guard creation of connection pools."""
+
+from contextlib import contextmanager
+"""Imports contextmanager to lend out pooled connections with a with-statement."""
+
+from flask import g
+"""Imports Flask's application-context globals to hold the per-request connection."""
+
+DB_PATH = os.environ.get(
+    "CAMPUSCONNECT_DB",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'db', 'campusconnect.db'))
+)
+"""Defines the one canonical path to the campusconnect.db database, overridable with an environment variable."""
+
+POOL_SIZE = int(os.environ.get("CAMPUSCONNECT_DB_POOL", 8))
+"""Defines how many idle connections each pool keeps open."""
+
+PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+"""Defines the settings applied to every connection: incremental auto-vacuum (takes effect when a database
+is created or vacuumed, so retention can return freed pages to the OS in small steps), WAL so readers don't
+block on writers, NORMAL sync (safe with WAL), a 256 MB memory map, a 64 MB page cache, and a 5 s busy timeout."""
+
+def connect(path=DB_PATH):
+    """
+    Open a new, fully configured connection to a SQLite database.
+    """
+
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False, cached_statements=256)
+    """Opens the connection, allowing pooled reuse across threads and caching up to 256 prepared statements."""
+
+    conn.row_factory = sqlite3.Row
+    """Configures rows to be accessed like dictionaries (they still unpack like tuples)."""
+
+    for pragma in PRAGMAS:
+        """Iterates through each connection setting."""
+
+        conn.execute(pragma)
+        """Applies the setting."""
+
+    return conn
+    """Returns the configured connection."""
+
+class ConnectionPool:
+    """Thread-safe pool of configured SQLite connections to one database file."""
+
+    def __init__(self, path=DB_PATH, size=POOL_SIZE):
+        """
+        Initialize with the database path and the number of idle connections to keep.
+        """
+
+        self.path = path
+        """Stores the path of the database this pool connects to."""
+
+        self.size = size
+        """Stores the maximum number of idle connections kept open."""
+
+        self._idle = queue.LifoQueue(maxsize=size)
+        """Holds idle connections; LIFO keeps the most recently used (warmest) ones in play."""
+
+        self._pid = os.getpid()
+        """Stores the process that owns the pooled connections."""
+
+    def _check_fork(self):
+        """
+        Drop connections inherited from a parent process; SQLite handles can't be shared across fork.
+        """
+
+        if self._pid != os.getpid():
+            """Checks whether this pool was copied into a forked worker."""
+
+            self._idle = queue.LifoQueue(maxsize=self.size)
+            """Starts the worker with an empty pool without touching the parent's connections."""
+
+            self._pid = os.getpid()
+            """Records the worker as the new owner."""
+
+    def acquire(self):
+        """
+        Take an idle connection from the pool, or open a new one if none are idle.
+        """
+
+        self._check_fork()
+        """Makes sure the pool belongs to the current process."""
+
+        try:
+            return self._idle.get_nowait()
+            """Returns an idle connection if one is available."""
+
+        except queue.Empty:
+            """Handles an empty pool."""
+
+            return connect(self.path)
+            """Returns a newly opened connection."""
+
+    def release(self, conn):
+        """
+        Return a connection to the pool, rolling back any unfinished transaction.
+        Connections beyond the pool size are closed.
+        """
+
+        if conn.in_transaction:
+            """Checks whether the borrower left a transaction open."""
+
+            conn.rollback()
+            """Rolls back so the next borrower starts clean."""
+
+        try:
+            self._idle.put_nowait(conn)
+            """Keeps the connection for reuse."""
+
+        except queue.Full:
+            """Handles a pool that already has enough idle connections."""
+
+            conn.close()
+            """Closes the extra connection to free resources."""
+
+    @contextmanager
+    def connection(self):
+        """
+        Lend out a pooled connection for the duration of a with-block.
+        """
+
+        conn = self.acquire()
+        """Takes a connection from the pool."""
+
+        try:
+            yield conn
+            """Hands the connection to the caller."""
+
+        finally:
+            self.release(conn)
+            """Returns the connection to the pool."""
+
+_pools = {}
+"""Stores one pool per database path."""
+
+_pools_lock = threading.Lock()
+"""Creates a lock that guards creation of pools."""
+
+def get_pool(path=DB_PATH):
+    """
+    Return the shared connection pool for a database path.
+    """
+
+    path = os.path.abspath(path)
+    """Normalizes the path so the same file always maps to the same pool."""
+
+    with _pools_lock:
+        """Prevents two threads from creating separate pools for the same file."""
+
+        if path not in _pools:
+            """Checks whether a pool exists for this path."""
+
+            _pools[path] = ConnectionPool(path)
+            """Creates the pool for this path."""
+
+        return _pools[path]
+        """Returns the pool."""
+
+def connection(path=DB_PATH):
+    """
+    Borrow a pooled connection for a with-block (for code outside Flask requests).
+    """
+
+    return get_pool(path).connection()
+    """Returns the pool's context manager."""
+
+def get_db():
+    """
+    Return the connection for the current Flask app context, borrowing one from the pool on first use.
+    """
+
+    if "db" not in g:
+        """Checks whether this request already has a connection."""
+
+        g.db = get_pool().acquire()
+        """Borrows a connection for the rest of the request."""
+
+    return g.db
+    """Returns the request's connection."""
+
+def release_db(exception=None):
+    """
+    Return the app context's connection to the pool when the context ends.
+    """
+
+    conn = g.pop("db", None)
+    """Removes the connection from the app context, if one was borrowed."""
+
+    if conn is not None:
+        """Checks whether a connection was used during the request."""
+
+        get_pool().release(conn)
+        """Returns the connection to the pool."""
+
+def init_app(app):
+    """
+    Register the per-request connection teardown with a Flask app.
+    """
+
+    app.teardown_appcontext(release_db)
+    """Returns the request's connection to the pool after every request."""
+
+def bump_generation(conn, name):
+    """
+    Increment the data generation counter for a source inside the caller's transaction
+    and return the new value. Ingest code calls this whenever it commits new data, so
+    caches keyed on the generation (in any worker process) know their entries are out
+    of date, and stamps the rows it writes with the returned value so feeds can send
+    only rows changed since a client's last sync. Writers are serialized by SQLite,
+    so generations become visible in increasing order.
+    """
+
+    return conn.execute("""
+        INSERT INTO data_generation (name, generation) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET generation = generation + 1
+        RETURNING generation
+    """, (name,)).fetchone()[0]
+    """Increments the counter for the source (starting it at 1) and returns the new value."""
+
+def get_generation(conn, name):
+    """
+    Return the current data generation for a source (0 if it has never been bumped).
+    """
+
+    try:
+        row = conn.execute("SELECT generation FROM data_generation WHERE name = ?", (name,)).fetchone()
+        """Reads the counter for the source."""
+
+    except sqlite3.OperationalError:
+        """Handles a database that doesn't have the generation table yet."""
+
+        return 0
+        """Returns 0 because nothing has been ingested yet."""
+
+    return row[0] if row else 0
+    """Returns the counter, or 0 if the source has no row yet."""
+
+def add_column(conn, table, column, definition):
+    """
+    Add a column to an existing table if it doesn't have it yet (used by migrations to
+    upgrade databases created by older versions). Returns True if the column was added.
+    """
+
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    """Reads the current column names of the table."""
+
+    if not columns or column in columns:
+        """Checks whether the table is missing or already up to date."""
+
+        return False
+        """Returns False because nothing was changed."""
+
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    """Adds the column to the existing table."""
+
+    return True
+    """Returns True because the column was added."""
@@ -1,24 +1,320 @@
+import hashlib
+"""Imports hashlib to derive stable keys from event content."""
+
 import requests
 """Imports the requests library to send HTTP requests to external websites."""
 
-from bs4 import BeautifulSoup
-"""Imports BeautifulSoup for parsing and extracting data from HTML content."""
+from bs4 import BeautifulSoup, SoupStrainer
+"""Imports BeautifulSoup for parsing HTML and SoupStrainer for building only the parts we need."""
+
+from utils.text import collapse_whitespace
+"""Imports the shared whitespace normalizer used for scraped text."""
+
+from utils.http_client import http_client
+"""Imports the shared pooled HTTP client with conditional request caching."""
+
+from utils.db import DB_PATH, connection, bump_generation
+"""Imports the canonical database path, the pooled connection helper, and the generation counter."""
+
+from utils.recommendations import match_generation
+"""Imports the helper that keeps users' recommended events up to date as events are saved."""
+
+from utils import ics
+"""Imports the calendar module whose pre-serialized events are updated as events are saved."""
+
+from utils.migrations import migrate
+"""Imports the migration runner that creates or upgrades the events tables."""
+
+from utils.timestamps import to_epoch
+"""Imports the date parser that stores each event's start as epoch seconds."""
+
+from utils.logger import get_logger
+"""Imports the structured, non-blocking logger."""
+
+from utils import metrics
+"""Imports the metrics layer that records stage latencies, row counts, and payload sizes."""
+
+log = get_logger(__name__)
+"""Creates the logger for event scraping."""
+
+try:
+    from lxml import etree, html as lxml_html
+    """Imports lxml's C parser and tree API when it is installed."""
+
+    PARSER = "lxml-native"
+    """Uses lxml's own tree (without building a BeautifulSoup tree) when lxml is available."""
+
+except ImportError:
+    """Handles environments without lxml."""
+
+    PARSER = "html.parser"
+    """Falls back to BeautifulSoup with Python's built-in HTML parser."""
+
+LOOKUP_CHUNK = 500
+"""Defines how many event keys are looked up per query (kept below SQLite's variable limit)."""
+
+TRIBE_EVENTS_PROFILE = {
+    "container": {"name": "div", "class_": "tribe-events-calendar-list__event"},
+    "title": {"name": "h3"},
+    "date": {"name": "time", "attr": "datetime"},
+    "location": {"name": "span", "class_": "tribe-events-venue-details"},
+    "description": {"name": "div", "class_": "tribe-events-calendar-list__event-description"},
+}
+"""Defines the selectors for calendars built with The Events Calendar (Tribe Events), such as Erskine's."""
+
+FIELD_DEFAULTS = {
+    "title": "Untitled Event",
+    "date": None,
+    "location": "Unknown Location",
+    "description": "",
+}
+"""Defines the value used for each field when its element is missing from an event container."""
+
+def matches(tag, spec):
+    """
+    Check whether a tag matches a selector spec (same name and, if given, the CSS class).
+    """
+
+    if tag.name != spec["name"]:
+        """Checks the tag name first since it is the cheapest test."""
+
+        return False
+        """Returns False for tags with a different name."""
+
+    return spec.get("class_") is None or has_class(tag.get("class"), spec["class_"])
+    """Returns True if no class is required or the tag has the required class."""
+
+def extract_fields(container, profile):
+    """
+    Extract every field of one event in a single walk over the container's descendants,
+    instead of searching the subtree once per field. Missing fields get their defaults.
+    """
+
+    event = dict(FIELD_DEFAULTS)
+    """Starts with each field's default value."""
+
+    remaining = [(field, profile[field]) for field in FIELD_DEFAULTS]
+    """Stores the fields that haven't been found yet."""
+
+    for tag in container.descendants:
+        """Walks the container's elements in document order, like find() does."""
+
+        if tag.name is None:
+            """Checks whether the node is text rather than an element."""
+
+            continue
+            """Skips text nodes."""
+
+        still_missing = []
+        """Collects the fields this tag doesn't satisfy."""
+
+        for field, spec in remaining:
+            """Checks the tag against each field still being looked for."""
+
+            if not matches(tag, spec):
+                """Checks whether the tag is the first match for this field."""
+
+                still_missing.append((field, spec))
+                """Keeps looking for this field."""
+
+            elif spec.get("attr"):
+                """Checks whether the field is read from an attribute."""
+
+                event[field] = tag.get(spec["attr"])
+                """Stores the attribute value (e.g. the datetime of a <time> tag)."""
+
+            else:
+                """Handles fields read from the element's text."""
+
+                event[field] = tag.get_text(strip=True)
+                """Stores the element's text with surrounding whitespace removed."""
+
+        remaining = still_missing
+        """Drops the fields that were just found."""
+
+        if not remaining:
+            """Checks whether every field has been found."""
+
+            break
+            """Stops walking the rest of the container."""
+
+    return event
+    """Returns the extracted fields."""
+
+def has_class(value, wanted):
+    """
+    Check whether a class attribute value (string or list) contains a CSS class.
+    """
+
+    if value is None:
+        """Checks whether the element has no class attribute."""
+
+        return False
+        """Returns False because there is no class to match."""
+
+    return wanted in (value if isinstance(value, list) else value.split())
+    """Returns True if the wanted class is one of the element's classes."""
+
+def parse_lxml(html, profile):
+    """
+    Parse an events page with lxml's native tree, skipping BeautifulSoup entirely.
+    Produces the same fields as the BeautifulSoup backends.
+    """
+
+    tree = lxml_html.document_fromstring(html.encode("utf-8") if isinstance(html, str) else html)
+    """Parses the page with lxml's C parser (as bytes, so encoding declarations are allowed)."""
+
+    etree.strip_elements(tree, "script", "style", with_tail=False)
+    """Removes script and style contents, which BeautifulSoup's get_text() also ignores."""
+
+    container = profile["container"]
+    """Looks up the selector for the element that wraps each event."""
+
+    specs = [(field, profile[field]) for field in FIELD_DEFAULTS]
+    """Lists each field with its selector."""
+
+    events = []
+    """Initializes an empty list to store extracted events."""
+
+    for div in tree.iter(container["name"]):
+        """Iterates through elements with the container's tag name."""
+
+        if container.get("class_") and not has_class(div.get("class"), container["class_"]):
+            """Checks whether the element has the container's CSS class."""
+
+            continue
+            """Skips elements that aren't event containers."""
+
+        event = dict(FIELD_DEFAULTS)
+        """Starts with each field's default value."""
+
+        remaining = specs
+        """Stores the fields that haven't been found yet."""
+
+        for tag in div.iterdescendants():
+            """Walks the container's elements in document order, once."""
+
+            still_missing = []
+            """Collects the fields this tag doesn't satisfy."""
+
+            for field, spec in remaining:
+                """Checks the tag against each field still being looked for."""
+
+                if tag.tag != spec["name"] or (spec.get("class_") and not has_class(tag.get("class"), spec["class_"])):
+                    """Checks whether the tag is the first match for this field."""
+
+                    still_missing.append((field, spec))
+                    """Keeps looking for this field."""
+
+                elif spec.get("attr"):
+                    """Checks whether the field is read from an attribute."""
+
+                    event[field] = tag.get(spec["attr"])
+                    """Stores the attribute value (e.g. the datetime of a <time> tag)."""
+
+                else:
+                    """Handles fields read from the element's text."""
+
+                    event[field] = "".join(text.strip() for text in tag.itertext())
+                    """Stores the element's text, stripping each piece like get_text(strip=True)."""
+
+            remaining = still_missing
+            """Drops the fields that were just found."""
 
-import re
-"""Imports the regex module for cleaning and normalizing text."""
+            if not remaining:
+                """Checks whether every field has been found."""
 
-import sqlite3
-"""Imports SQLite3 to enable database connections and queries."""
+                break
+                """Stops walking the rest of the container."""
 
-DB_PATH = "db/campusconnect.db"
-"""Defines the default path to the campusconnect.db SQLite database."""
+        event["title"] = collapse_whitespace(event["title"])
+        """Cleans the title by collapsing multiple spaces into one."""
+
+        event["description"] = collapse_whitespace(event["description"])
+        """Cleans the description by collapsing multiple spaces into one."""
+
+        events.append(event)
+        """Appends the cleaned event details as a dictionary to the events list."""
+
+    return events
+    """Returns the list of parsed and cleaned events."""
+
+def parse_html(html, profile=TRIBE_EVENTS_PROFILE, parser=PARSER, strain=True):
+    """
+    Parse an events page into a list of event dicts using a selector profile.
+    `parser` is "lxml-native" (lxml tree, fastest) or a BeautifulSoup backend such
+    as "lxml" or "html.parser"; with `strain`, BeautifulSoup only builds the event
+    containers. Defined at module level so it can run in a worker process.
+    """
+
+    if not html:
+        """Checks if HTML content is empty."""
+
+        return []
+        """Returns an empty list if no HTML is provided."""
+
+    if parser == "lxml-native":
+        """Checks whether the native lxml backend was selected."""
+
+        return parse_lxml(html, profile)
+        """Returns the events parsed without building a BeautifulSoup tree."""
+
+    container = profile["container"]
+    """Looks up the selector for the element that wraps each event."""
+
+    wanted = container.get("class_")
+    """Looks up the CSS class that marks an event container, if any."""
+
+    only = SoupStrainer(
+        container["name"],
+        class_=(lambda value: has_class(value, wanted)) if wanted else None
+    ) if strain else None
+    """Builds a strainer so the parser skips everything outside the event containers (matching multi-class attributes too)."""
+
+    soup = BeautifulSoup(html, parser, parse_only=only)
+    """Parses the HTML content using BeautifulSoup with the fastest available backend."""
+
+    events = []
+    """Initializes an empty list to store extracted events."""
+
+    for div in soup.find_all(container["name"], class_=container.get("class_")):
+        """Iterates through each event container."""
+
+        event = extract_fields(div, profile)
+        """Extracts all of the event's fields in one pass."""
+
+        # Clean data (the parser has already decoded HTML entities)
+        event["title"] = collapse_whitespace(event["title"])
+        """Cleans the title by collapsing multiple spaces into one."""
+
+        event["description"] = collapse_whitespace(event["description"])
+        """Cleans the description by collapsing multiple spaces into one."""
+
+        events.append(event)
+        """Appends the cleaned event details as a dictionary to the events list."""
+
+    return events
+    """Returns the list of parsed and cleaned events."""
+
+def event_key(title, date, location):
+    """
+    Build a stable key for an event from its normalized title, date, and location,
+    so the same calendar entry always maps to the same external_events row.
+    """
+
+    parts = [collapse_whitespace(value or "").strip().lower() for value in (title, date, location)]
+    """Normalizes case and whitespace so cosmetic differences don't create new keys."""
+
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+    """Returns the SHA-1 hex digest of the joined fields."""
 
 class CampusEventScraper:
     """Defines the CampusEventScraper class for fetching, parsing, and storing event data."""
 
-    def __init__(self, url, db_path=DB_PATH):
+    def __init__(self, url, db_path=DB_PATH, http=http_client, profile=TRIBE_EVENTS_PROFILE, source=None):
         """
-        Initialize with the campus events URL and database path.
+        Initialize with the campus events URL, database path, and the selector
+        profile and source name used for this calendar.
         """
 
         self.url = url
@@ -27,10 +323,27 @@ class CampusEventScraper:
         self.db_path = db_path
         """Stores the database path for saving scraped events."""
 
+        self.http = http
+        """Stores the HTTP client used to fetch the events page."""
+
+        self.last_fetch = None
+        """Holds the result of the last fetch so its validators can be saved after a successful ingest."""
+
+        self.profile = profile
+        """Stores the selector profile used to find events on the page."""
+
+        self.source = source or url
+        """Stores the name recorded with each saved event (defaults to the page URL)."""
+
+    @metrics.timed("scraper.fetch_page")
     def fetch_page(self):
         """
         Send GET request to the events page and return HTML content.
-        Includes headers to mimic a real browser.
+        Includes headers to mimic a real browser. Returns None if the page
+        hasn't changed since the last successful scrape (HTTP 304). Requests
+        time out and are retried by the shared HTTP client; a page that still
+        can't be fetched (or whose host's circuit breaker is open) is logged and
+        returned as an empty string, leaving the stored events in place.
         """
 
         headers = {
@@ -44,106 +357,214 @@ class CampusEventScraper:
         """Defines HTTP headers to mimic a browser and avoid request blocking."""
 
         try:
-            response = requests.get(self.url, headers=headers)
-            """Sends an HTTP GET request to the events page using the defined headers."""
+            result = self.http.get(self.url, headers=headers, retries=2, db_path=self.db_path)
+            """Sends a conditional HTTP GET request to the events page using the defined headers."""
+
+            if result.not_modified:
+                """Checks whether the server reported that the page hasn't changed."""
+
+                log.info("Events page not modified since last scrape.")
+                """Logs that parsing and saving will be skipped."""
 
-            response.raise_for_status()
+                return None
+                """Returns None so run() skips parsing and database writes."""
+
+            result.response.raise_for_status()
             """Raises an exception if the response contains an HTTP error."""
 
-            return response.text
+            self.last_fetch = result
+            """Keeps the result so its validators can be saved once the events are stored."""
+
+            metrics.observe_bytes("scraper.fetch_page", len(result.response.content))
+            """Records the size of the downloaded page."""
+
+            return result.response.text
             """Returns the HTML content of the page as text."""
 
-        except requests.exceptions.HTTPError as e:
-            """Handles HTTP errors during the request."""
+        except requests.RequestException as e:
+            """Handles HTTP errors, timeouts, unreachable hosts, and open circuit breakers."""
 
-            print(f"Failed to fetch events: {e}")
-            """Prints an error message if the request fails."""
+            log.error("Failed to fetch events: %s", e, extra={"url": self.url})
+            """Logs an error message if the request fails."""
 
             return ""  # Return empty string so parse_events() won’t break
             """Returns an empty string to prevent parse_events() from breaking."""
 
+    @metrics.timed("scraper.parse_events", rows=len)
     def parse_events(self, html):
         """
         Parse HTML using BeautifulSoup to extract event details.
-        Adjust selectors based on the structure of your college's event page.
+        Adjust selectors by passing a different profile for your college's event page.
         """
 
-        if not html:
-            """Checks if HTML content is empty."""
+        return parse_html(html, self.profile)
+        """Returns the list of parsed and cleaned events using this scraper's selector profile."""
 
-            return []
-            """Returns an empty list if no HTML is provided."""
+    _schema_ready = set()
+    """Tracks which database paths have already been upgraded for keyed upserts in this process."""
 
-        soup = BeautifulSoup(html, "html.parser")
-        """Parses the HTML content using BeautifulSoup."""
+    def ensure_schema(self, conn):
+        """
+        Bring the database up to the current schema version, then backfill the event_key
+        of rows saved without one (seed data or rows from older versions) and remove
+        duplicate rows (from earlier plain INSERTs), keeping the oldest.
+        """
 
-        events = []
-        """Initializes an empty list to store extracted events."""
+        if self.db_path in self._schema_ready:
+            """Checks whether this database was already upgraded in this process."""
 
-        # Example: Erskine College events page structure
-        # Each event is inside a div with class 'tribe-events-calendar-list__event'
-        event_divs = soup.find_all("div", class_="tribe-events-calendar-list__event")
-        """Finds all event containers in the HTML based on their CSS class."""
+            return
+            """Exits early so the checks run once per process, not once per save."""
 
-        for div in event_divs:
-            """Iterates through each event container."""
+        migrate(conn)
+        """Applies any pending migrations, which add the event_key, source, and changed_gen columns."""
 
-            title = div.find("h3").get_text(strip=True) if div.find("h3") else "Untitled Event"
-            """Extracts the event title or assigns 'Untitled Event' if missing."""
+        missing = conn.execute("SELECT id, title, date, location FROM external_events WHERE event_key IS NULL").fetchall()
+        """Finds rows that don't have a key yet (e.g. seed data or rows from older versions)."""
 
-            date = div.find("time").get("datetime") if div.find("time") else None
-            """Extracts the event date from the <time> tag or sets None if missing."""
+        if missing:
+            """Checks whether any rows need to be backfilled."""
 
-            location = div.find("span", class_="tribe-events-venue-details").get_text(strip=True) if div.find("span", class_="tribe-events-venue-details") else "Unknown Location"
-            """Extracts the event location or assigns 'Unknown Location' if missing."""
+            conn.execute("DROP INDEX IF EXISTS idx_external_events_key")
+            """Drops the unique index while backfilling, since old rows may duplicate each other."""
 
-            description = div.find("div", class_="tribe-events-calendar-list__event-description").get_text(strip=True) if div.find("div", class_="tribe-events-calendar-list__event-description") else ""
-            """Extracts the event description or assigns an empty string if missing."""
+            conn.executemany(
+                "UPDATE external_events SET event_key = ? WHERE id = ?",
+                [(event_key(title, date, location), row_id) for row_id, title, date, location in missing]
+            )
+            """Backfills the keys for those rows in a single batch."""
 
-            # Clean data with regex (remove extra whitespace, HTML entities, etc.)
-            title = re.sub(r"\s+", " ", title)
-            """Cleans the title by collapsing multiple spaces into one."""
+            conn.execute("""
+                DELETE FROM external_events
+                WHERE id NOT IN (SELECT MIN(id) FROM external_events GROUP BY event_key)
+            """)
+            """Removes duplicate rows so the unique index can be created."""
 
-            description = re.sub(r"\s+", " ", description)
-            """Cleans the description by collapsing multiple spaces into one."""
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_external_events_key ON external_events(event_key)")
+        """Creates the unique index used as the upsert conflict target."""
 
-            events.append({
-                "title": title,
-                "date": date,
-                "location": location,
-                "description": description
-            })
-            """Appends the cleaned event details as a dictionary to the events list."""
+        conn.commit()
+        """Commits the backfill."""
 
-        return events
-        """Returns the list of parsed and cleaned events."""
+        self._schema_ready.add(self.db_path)
+        """Remembers that this database no longer needs upgrading."""
 
+    @metrics.timed("scraper.save_events", rows=lambda stats: stats["inserted"] + stats["updated"])
     def save_events(self, events):
         """
         Store cleaned events into external_events table.
+        Rows are upserted by event_key in one transaction, and only new or changed
+        rows are written. Returns counts of inserted, updated, and unchanged events.
         """
 
-        conn = sqlite3.connect(self.db_path)
-        """Opens a connection to the SQLite database."""
+        stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+        """Initializes the counters reported back to the caller."""
 
-        c = conn.cursor()
-        """Creates a cursor object to execute SQL commands."""
+        rows = {}
+        """Stores the rows to save keyed by event_key (later duplicates in the page win)."""
 
         for event in events:
             """Iterates through each event in the events list."""
 
-            c.execute("""
-                INSERT INTO external_events (title, date, location, description)
-                VALUES (?, ?, ?, ?)
-            """, (event["title"], event["date"], event["location"], event["description"]))
-            """Inserts event details into the external_events table."""
+            key = event_key(event["title"], event["date"], event["location"])
+            """Derives the stable key for the event."""
 
-        conn.commit()
-        """Commits the transaction to save all inserted events."""
+            rows[key] = (key, event["title"], event["date"], event["location"], event["description"], self.source, to_epoch(event["date"]))
+            """Stores the row values with the date as epoch seconds, collapsing duplicates within the same scrape."""
+
+        with connection(self.db_path) as conn:
+            """Borrows a pooled connection and returns it to the pool even if saving fails."""
+
+            self.ensure_schema(conn)
+            """Ensures the event_key column and unique index exist."""
+
+            keys = list(rows)
+            """Stores the list of keys so they can be looked up in chunks."""
+
+            existing = {}
+            """Stores the current title and description of rows that are already saved."""
+
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                """Iterates through the keys in chunks to stay under SQLite's variable limit."""
+
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                """Selects the current chunk of keys."""
+
+                placeholders = ",".join("?" * len(chunk))
+                """Builds the placeholder list for the IN clause."""
+
+                for key, title, description in conn.execute(
+                    f"SELECT event_key, title, description FROM external_events WHERE event_key IN ({placeholders})", chunk
+                ):
+                    """Iterates through the rows that already exist for this chunk."""
+
+                    existing[key] = (title, description)
+                    """Stores the saved values for comparison."""
+
+            changed = []
+            """Stores the rows that need to be written."""
+
+            for key, row in rows.items():
+                """Iterates through each scraped row."""
+
+                if key not in existing:
+                    """Checks whether the event is new."""
+
+                    stats["inserted"] += 1
+                    """Counts the event as inserted."""
 
-        conn.close()
-        """Closes the database connection to free resources."""
+                    changed.append(row)
+                    """Queues the new row for writing."""
 
+                elif existing[key] != (row[1], row[4]):
+                    """Checks whether the title or description changed since the last scrape."""
+
+                    stats["updated"] += 1
+                    """Counts the event as updated."""
+
+                    changed.append(row)
+                    """Queues the changed row for writing."""
+
+                else:
+                    """Handles events that are identical to the saved row."""
+
+                    stats["unchanged"] += 1
+                    """Counts the event as unchanged without writing it."""
+
+            if changed:
+                """Checks whether anything needs to be written."""
+
+                with conn:
+                    generation = bump_generation(conn, "events")
+                    """Invalidates cached event pages in the same transaction as the new data."""
+
+                    conn.executemany("""
+                        INSERT INTO external_events (event_key, title, date, location, description, source, starts_at, changed_gen)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(event_key) DO UPDATE SET
+                            title = excluded.title,
+                            description = excluded.description,
+                            source = excluded.source,
+                            starts_at = excluded.starts_at,
+                            changed_gen = excluded.changed_gen
+                    """, [row + (generation,) for row in changed])
+                    """Upserts all new and changed rows in a single transaction, stamped with the new generation."""
+
+                    ics.render_generation(conn, generation)
+                    """Re-serializes the calendar entries of the new and changed events in the same transaction."""
+
+                with conn:
+                    match_generation(conn, generation)
+                    """Matches the new and changed events against users' preferences in a transaction of its own,
+                    so the scrape's write doesn't hold the lock while every interested user is scored."""
+
+                    bump_generation(conn, "preferences")
+                    """Invalidates cached feed pages in the same transaction as the new matches."""
+
+        return stats
+        """Returns the inserted/updated/unchanged counts."""
+
+    @metrics.timed("scraper.run")
     def run(self):
         """
         Main entry point: fetch page, parse events, save to DB.
@@ -152,26 +573,39 @@ class CampusEventScraper:
         html = self.fetch_page()
         """Fetches the HTML content of the events page."""
 
+        if html is None:
+            """Checks whether the page was unchanged since the last scrape."""
+
+            return
+            """Exits early because there is nothing new to parse or save."""
+
         events = self.parse_events(html)
         """Parses the HTML content to extract event details."""
 
-        print(f"Extracted {len(events)} events.")
-        """Prints the number of events extracted for debugging."""
+        log.info("Extracted %d events.", len(events), extra={"url": self.url, "events": len(events)})
+        """Logs the number of events extracted."""
+
+        log.debug("Extracted events: %s", events)
+        """Logs the parsed events themselves (only rendered when debug records are kept)."""
 
         if events:
             """Checks if any events were successfully scraped."""
 
-            self.save_events(events)
-            """Saves the scraped events into the database."""
+            stats = self.save_events(events)
+            """Saves the scraped events into the database and keeps the change counts."""
 
-            print("Events saved to external_events table.")
-            """Prints confirmation that events were saved."""
+            log.info("Events saved to external_events table: %d inserted, %d updated, %d unchanged.",
+                     stats["inserted"], stats["updated"], stats["unchanged"], extra=stats)
+            """Logs how many events were inserted, updated, or left unchanged."""
 
         else:
             """Handles the case where no events were scraped."""
 
-            print("No events scraped.")
-            """Prints a message indicating no events were found."""
+            log.warning("No events scraped.", extra={"url": self.url})
+            """Logs a warning indicating no events were found."""
+
+        self.http.remember(self.last_fetch)
+        """Saves the page's ETag/Last-Modified so the next scrape can be answered with a 304."""
 
 if __name__ == "__main__":
     # Example usage with Erskine College events page
@@ -0,0 +1,170 @@
+import json
+"""Imports the json module as the fallback serializer."""
+
+import zlib
+"""Imports zlib to gzip feed responses as they are streamed."""
+
+try:
+    import orjson
+    """Imports orjson for fast serialization straight to bytes, if it is installed."""
+
+except ImportError:
+    """Handles environments without orjson."""
+
+    orjson = None
+    """Falls back to the standard json module."""
+
+try:
+    import brotli
+    """Imports brotli to compress feeds for clients that accept it, if it is installed."""
+
+except ImportError:
+    """Handles environments without brotli."""
+
+    brotli = None
+    """Falls back to gzip only."""
+
+BATCH_SIZE = 500
+"""Defines how many rows are fetched from SQLite and sent to the client per chunk."""
+
+def dumps(value):
+    """
+    Serialize a value to compact JSON bytes, using orjson when it is available.
+    """
+
+    if orjson is not None:
+        """Checks whether the fast serializer is installed."""
+
+        return orjson.dumps(value)
+        """Returns the JSON bytes from orjson."""
+
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    """Returns the JSON bytes from the standard library."""
+
+def iter_rows(cursors, batch_size=BATCH_SIZE):
+    """
+    Yield lists of row dictionaries from one or more cursors, batch_size rows at a time,
+    so no more than one batch is ever held in memory.
+    """
+
+    for cursor in cursors:
+        """Iterates through each cursor in order."""
+
+        while True:
+            """Keeps reading until the cursor is exhausted."""
+
+            rows = cursor.fetchmany(batch_size)
+            """Reads the next batch of rows."""
+
+            if not rows:
+                """Checks whether the cursor is exhausted."""
+
+                break
+                """Moves on to the next cursor."""
+
+            yield [dict(row) for row in rows]
+            """Yields the batch as plain dictionaries."""
+
+def ndjson_chunks(batches):
+    """
+    Yield newline-delimited JSON, one chunk per batch of rows.
+    """
+
+    for batch in batches:
+        """Iterates through each batch of rows."""
+
+        yield b"".join(dumps(row) + b"\n" for row in batch)
+        """Yields one JSON document per line."""
+
+def json_chunks(batches, generation, full=True):
+    """
+    Yield a single JSON document of the form {"generation": N, "full": bool, "items": [...]}
+    without building the list of items in memory. full tells the client the items are
+    every row, replacing what it stored, rather than the changes since its last sync.
+    """
+
+    yield b'{"generation":' + dumps(generation) + b',"full":' + dumps(full) + b',"items":['
+    """Yields the opening of the document."""
+
+    first = True
+    """Tracks whether a separator is needed before the next batch."""
+
+    for batch in batches:
+        """Iterates through each batch of rows."""
+
+        chunk = b",".join(dumps(row) for row in batch)
+        """Serializes the batch as comma-separated items."""
+
+        yield chunk if first else b"," + chunk
+        """Yields the batch, separated from the previous one."""
+
+        first = False
+        """Records that later batches need a separator."""
+
+    yield b"]}"
+    """Yields the closing of the document."""
+
+def choose_encoding(accept_encodings):
+    """
+    Pick the best content encoding the client accepts: brotli (when installed), gzip, or none.
+    """
+
+    if brotli is not None and accept_encodings["br"]:
+        """Checks whether the client accepts brotli and it is available."""
+
+        return "br"
+        """Returns brotli."""
+
+    if accept_encodings["gzip"]:
+        """Checks whether the client accepts gzip."""
+
+        return "gzip"
+        """Returns gzip."""
+
+    return None
+    """Returns None so the feed is sent uncompressed."""
+
+def compress(chunks, encoding):
+    """
+    Compress a stream of chunks incrementally with the given encoding, flushing after
+    each chunk so clients can start processing rows before the feed is complete.
+    """
+
+    if encoding is None:
+        """Checks whether compression was negotiated."""
+
+        yield from chunks
+        """Passes the chunks through unchanged."""
+
+        return
+        """Exits because there is nothing to compress."""
+
+    if encoding == "br":
+        """Checks whether brotli was negotiated."""
+
+        compressor = brotli.Compressor(quality=4)
+        """Creates a streaming brotli compressor tuned for speed."""
+
+        for chunk in chunks:
+            """Iterates through each chunk of the feed."""
+
+            yield compressor.process(chunk) + compressor.flush()
+            """Yields the compressed chunk."""
+
+        yield compressor.finish()
+        """Yields the end of the brotli stream."""
+
+        return
+        """Exits because the stream is complete."""
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    """Creates a streaming compressor that writes the gzip format."""
+
+    for chunk in chunks:
+        """Iterates through each chunk of the feed."""
+
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        """Yields the compressed chunk."""
+
+    yield compressor.flush()
+    """Yields the end of the gzip stream."""
@@ -0,0 +1,424 @@
+import argparse
+"""Imports argparse to read campus locations from the command line."""
+
+import json
+"""Imports the json module to read stored alert geometries."""
+
+from utils.db import DB_PATH, bump_generation, connection
+"""Imports the database path, the generation counter, and the pooled connection helper."""
+
+from utils.metrics import timed
+"""Imports the decorator that records each stage's latency and row count at /metrics."""
+
+BATCH_SIZE = 500
+"""Defines how many alerts are matched per batch."""
+
+def polygons(geometry):
+    """
+    Yield the polygons (lists of rings of [longitude, latitude] positions, outer ring
+    first) of a GeoJSON Polygon, MultiPolygon, or GeometryCollection.
+    """
+
+    if not geometry:
+        """Checks whether the alert has no geometry."""
+
+        return
+        """Yields nothing."""
+
+    if geometry["type"] == "Polygon":
+        """Checks whether the geometry is a single polygon."""
+
+        yield geometry["coordinates"]
+        """Yields it."""
+
+    elif geometry["type"] == "MultiPolygon":
+        """Checks whether the geometry is a set of polygons."""
+
+        yield from geometry["coordinates"]
+        """Yields each polygon."""
+
+    elif geometry["type"] == "GeometryCollection":
+        """Checks whether the geometry is a collection of geometries."""
+
+        for part in geometry["geometries"]:
+            """Iterates through each member geometry."""
+
+            yield from polygons(part)
+            """Yields its polygons."""
+
+def bounds(geometry):
+    """
+    Return the bounding box of a geometry's polygons as (min longitude, max longitude,
+    min latitude, max latitude), or None if it has no polygons.
+    """
+
+    points = [point for polygon in polygons(geometry) for point in polygon[0]]
+    """Collects the outer ring positions (holes lie inside them)."""
+
+    if not points:
+        """Checks whether there is anything to bound."""
+
+        return None
+        """Returns None."""
+
+    longitudes = [point[0] for point in points]
+    """Collects the longitudes."""
+
+    latitudes = [point[1] for point in points]
+    """Collects the latitudes."""
+
+    return min(longitudes), max(longitudes), min(latitudes), max(latitudes)
+    """Returns the bounding box."""
+
+def ring_contains(ring, longitude, latitude):
+    """
+    Return True if a point lies inside a closed ring, by counting how many ring edges a
+    ray from the point crosses (the even-odd rule).
+    """
+
+    inside = False
+    """Tracks whether an odd number of edges has been crossed."""
+
+    x2, y2 = ring[-1][:2]
+    """Starts with the edge that closes the ring."""
+
+    for position in ring:
+        """Iterates through each vertex."""
+
+        x1, y1 = x2, y2
+        """Moves the previous vertex to the edge's start."""
+
+        x2, y2 = position[:2]
+        """Takes this vertex as the edge's end."""
+
+        if (y1 > latitude) != (y2 > latitude) and longitude < x1 + (latitude - y1) * (x2 - x1) / (y2 - y1):
+            """Checks whether the edge straddles the point's latitude east of the point."""
+
+            inside = not inside
+            """Counts the crossing."""
+
+    return inside
+    """Returns whether the point is inside."""
+
+def contains(geometry, longitude, latitude):
+    """
+    Return True if a point lies inside any of a geometry's polygons (and not in one of its holes).
+    """
+
+    for outer, *holes in polygons(geometry):
+        """Iterates through each polygon's outer ring and holes."""
+
+        if ring_contains(outer, longitude, latitude) and not any(ring_contains(hole, longitude, latitude) for hole in holes):
+            """Checks whether the point is inside the outer ring and outside every hole."""
+
+            return True
+            """Returns True at the first polygon containing the point."""
+
+    return False
+    """Returns False because no polygon contains the point."""
+
+def zone_campuses(conn):
+    """
+    Return a dictionary of NWS zone or county code (UGC, e.g. SCC001) to the ids of the
+    campuses in it, for alerts that name zones instead of sending a polygon.
+    """
+
+    campuses = {}
+    """Stores the campuses of each zone."""
+
+    for campus_id, zones in conn.execute("SELECT id, zones FROM campus_locations WHERE zones IS NOT NULL"):
+        """Iterates through each campus that lists zones."""
+
+        for zone in zones.split():
+            """Iterates through each zone."""
+
+            campuses.setdefault(zone, []).append(campus_id)
+            """Adds the campus to the zone."""
+
+    return campuses
+    """Returns the zone index."""
+
+def index_alerts(conn, alerts, zones=None):
+    """
+    Store the bounding boxes of a batch of alerts (rows with rowid, geometry, and zones)
+    and recompute which campuses each one affects, inside the caller's transaction.
+    Candidate campuses come from an R*Tree lookup of the alert's bounding box and are
+    confirmed with a point-in-polygon test. Alerts without a polygon match the campuses
+    in the zones they list. Returns the number of campus matches stored.
+    """
+
+    zones = zone_campuses(conn) if zones is None else zones
+    """Loads the zone index unless the caller already has it."""
+
+    rowids = [(alert["rowid"],) for alert in alerts]
+    """Stores the rowids of the alerts."""
+
+    conn.executemany("DELETE FROM alert_bounds WHERE id = ?", rowids)
+    """Removes the alerts' old bounding boxes."""
+
+    conn.executemany("DELETE FROM campus_alerts WHERE alert_rowid = ?", rowids)
+    """Removes the alerts' old matches."""
+
+    boxes = []
+    """Stores the new bounding boxes."""
+
+    matches = set()
+    """Stores the new (campus, alert) matches."""
+
+    for alert in alerts:
+        """Iterates through each alert."""
+
+        geometry = json.loads(alert["geometry"]) if alert["geometry"] else None
+        """Parses the alert's GeoJSON geometry, if it has one."""
+
+        box = bounds(geometry)
+        """Computes its bounding box."""
+
+        if box:
+            """Checks whether the alert covers an area."""
+
+            boxes.append((alert["rowid"], *box))
+            """Queues the bounding box."""
+
+            for campus in conn.execute("""
+                SELECT c.id, c.longitude, c.latitude
+                FROM campus_points p JOIN campus_locations c ON c.id = p.id
+                WHERE p.min_lon >= ? AND p.max_lon <= ? AND p.min_lat >= ? AND p.max_lat <= ?
+            """, box):
+                """Iterates through each campus inside the bounding box."""
+
+                if contains(geometry, campus["longitude"], campus["latitude"]):
+                    """Checks whether the campus is inside the alert's polygon."""
+
+                    matches.add((campus["id"], alert["rowid"]))
+                    """Queues the match."""
+
+        else:
+            """Handles an alert issued for zones rather than a polygon."""
+
+            for zone in (alert["zones"] or "").split():
+                """Iterates through each zone the alert names."""
+
+                matches.update((campus_id, alert["rowid"]) for campus_id in zones.get(zone, ()))
+                """Queues the campuses in the zone."""
+
+    conn.executemany("INSERT INTO alert_bounds (id, min_lon, max_lon, min_lat, max_lat) VALUES (?, ?, ?, ?, ?)", boxes)
+    """Stores the bounding boxes."""
+
+    conn.executemany("INSERT INTO campus_alerts (campus_id, alert_rowid) VALUES (?, ?)", sorted(matches))
+    """Stores the matches."""
+
+    return len(matches)
+    """Returns the number of matches stored."""
+
+@timed("geo.match_generation", rows=lambda count: count)
+def match_generation(conn, generation):
+    """
+    Index and match the alerts written in one ingest generation (called by the alert
+    client in the same transaction as its upsert, so /api?campus= never lags behind
+    the alerts). Returns the number of campus matches stored.
+    """
+
+    zones = zone_campuses(conn)
+    """Loads the zone index once for every batch."""
+
+    cursor = conn.execute("SELECT rowid, geometry, zones FROM api_data WHERE changed_gen = ?", (generation,))
+    """Opens a cursor over the alerts stamped with the generation."""
+
+    count = 0
+    """Counts the stored matches."""
+
+    while True:
+        """Keeps reading until every alert is matched."""
+
+        alerts = cursor.fetchmany(BATCH_SIZE)
+        """Reads the next batch of alerts."""
+
+        if not alerts:
+            """Checks whether the cursor is exhausted."""
+
+            return count
+            """Returns the number of matches stored."""
+
+        count += index_alerts(conn, alerts, zones)
+        """Matches the batch."""
+
+def match_campus(conn, campus_id):
+    """
+    Recompute which stored alerts affect one campus, inside the caller's transaction.
+    Returns the number of matches stored.
+    """
+
+    campus = conn.execute("SELECT id, longitude, latitude, zones FROM campus_locations WHERE id = ?", (campus_id,)).fetchone()
+    """Reads the campus."""
+
+    conn.execute("DELETE FROM campus_alerts WHERE campus_id = ?", (campus_id,))
+    """Removes the campus's old matches."""
+
+    rowids = set()
+    """Stores the rowids of the alerts affecting the campus."""
+
+    for alert in conn.execute("""
+        SELECT a.rowid, a.geometry
+        FROM alert_bounds b JOIN api_data a ON a.rowid = b.id
+        WHERE b.min_lon <= ? AND b.max_lon >= ? AND b.min_lat <= ? AND b.max_lat >= ?
+    """, (campus["longitude"], campus["longitude"], campus["latitude"], campus["latitude"])):
+        """Iterates through each alert whose bounding box contains the campus."""
+
+        if contains(json.loads(alert["geometry"]), campus["longitude"], campus["latitude"]):
+            """Checks whether the campus is inside the alert's polygon."""
+
+            rowids.add(alert["rowid"])
+            """Adds the alert."""
+
+    for zone in (campus["zones"] or "").split():
+        """Iterates through each zone the campus is in."""
+
+        rowids.update(row[0] for row in conn.execute(
+            "SELECT rowid FROM api_data WHERE geometry IS NULL AND instr(' ' || zones || ' ', ?)", (f" {zone} ",)
+        ))
+        """Adds the alerts issued for the zone without a polygon."""
+
+    conn.executemany("INSERT INTO campus_alerts (campus_id, alert_rowid) VALUES (?, ?)", [(campus_id, rowid) for rowid in sorted(rowids)])
+    """Stores the matches."""
+
+    return len(rowids)
+    """Returns the number of matches stored."""
+
+def set_campus(conn, name, latitude, longitude, zones=()):
+    """
+    Add a campus (or move an existing one with the same name) and match it against the
+    stored alerts in one transaction. zones lists the NWS zone and county codes (UGC,
+    e.g. SCC001) the campus is in. Returns the campus id.
+    """
+
+    with conn:
+        campus_id = conn.execute("""
+            INSERT INTO campus_locations (name, latitude, longitude, zones) VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET latitude = excluded.latitude, longitude = excluded.longitude, zones = excluded.zones
+            RETURNING id
+        """, (name, latitude, longitude, " ".join(zones) or None)).fetchone()[0]
+        """Saves the campus and reads its id."""
+
+        conn.execute(
+            "INSERT OR REPLACE INTO campus_points (id, min_lon, max_lon, min_lat, max_lat) VALUES (?, ?, ?, ?, ?)",
+            (campus_id, longitude, longitude, latitude, latitude)
+        )
+        """Stores the campus point in the R*Tree."""
+
+        match_campus(conn, campus_id)
+        """Matches the campus against the stored alerts."""
+
+        bump_generation(conn, "alerts")
+        """Invalidates cached alert pages in the same transaction."""
+
+    return campus_id
+    """Returns the campus id."""
+
+def remove_campus(conn, name):
+    """
+    Remove a campus and its matches in one transaction. Returns True if it existed.
+    """
+
+    with conn:
+        row = conn.execute("DELETE FROM campus_locations WHERE name = ? RETURNING id", (name,)).fetchone()
+        """Deletes the campus and reads its id."""
+
+        if row is None:
+            """Checks whether the campus existed."""
+
+            return False
+            """Returns False because nothing was removed."""
+
+        conn.execute("DELETE FROM campus_points WHERE id = ?", (row[0],))
+        """Removes the campus point."""
+
+        conn.execute("DELETE FROM campus_alerts WHERE campus_id = ?", (row[0],))
+        """Removes the campus's matches."""
+
+        bump_generation(conn, "alerts")
+        """Invalidates cached alert pages in the same transaction."""
+
+    return True
+    """Returns True because the campus was removed."""
+
+def campuses(conn):
+    """
+    Return every campus with the number of stored alerts affecting it, by name.
+    """
+
+    return conn.execute("""
+        SELECT c.id, c.name, c.latitude, c.longitude, c.zones, COUNT(m.alert_rowid) AS alerts
+        FROM campus_locations c LEFT JOIN campus_alerts m ON m.campus_id = c.id
+        GROUP BY c.id
+        ORDER BY c.name
+    """).fetchall()
+    """Returns the campuses."""
+
+def main():
+    """Lists, adds, or removes campus locations from the command line."""
+
+    parser = argparse.ArgumentParser(description="Manage the campus locations weather alerts are matched against.")
+    """Creates the command-line parser."""
+
+    commands = parser.add_subparsers(dest="command", required=True)
+    """Creates the subcommands."""
+
+    commands.add_parser("list", help="list campuses and how many alerts affect each")
+    """Adds the list command."""
+
+    add = commands.add_parser("add", help="add or move a campus")
+    """Adds the add command."""
+
+    add.add_argument("name", help="campus name")
+    """Adds the argument for the name."""
+
+    add.add_argument("latitude", type=float, help="latitude in degrees")
+    """Adds the argument for the latitude."""
+
+    add.add_argument("longitude", type=float, help="longitude in degrees (negative in the Americas)")
+    """Adds the argument for the longitude."""
+
+    add.add_argument("--zone", action="append", default=[], help="NWS zone or county code (UGC) the campus is in, e.g. SCC001")
+    """Adds the option for the zones."""
+
+    remove = commands.add_parser("remove", help="remove a campus")
+    """Adds the remove command."""
+
+    remove.add_argument("name", help="campus name")
+    """Adds the argument for the name."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    from utils.migrations import migrate
+    """Imports the migration runner here, since the migrations import this module for the schema."""
+
+    with connection(DB_PATH) as conn:
+        """Borrows a pooled connection to the database."""
+
+        migrate(conn)
+        """Creates the campus tables if they are missing."""
+
+        if args.command == "add":
+            """Checks whether a campus should be added."""
+
+            set_campus(conn, args.name, args.latitude, args.longitude, args.zone)
+            """Saves and matches the campus."""
+
+        elif args.command == "remove" and not remove_campus(conn, args.name):
+            """Checks whether the campus to remove doesn't exist."""
+
+            parser.exit(1, f"no campus named {args.name}\n")
+            """Exits with an error."""
+
+        for campus in campuses(conn):
+            """Iterates through each campus."""
+
+            print(f"{campus['id']:>4}  {campus['name']:<32} {campus['latitude']:>9.4f} {campus['longitude']:>10.4f}  "
+                  f"{campus['zones'] or '-':<16} {campus['alerts']} alerts")
+            """Prints the campus."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the campus tool when executed directly."""
@@ -0,0 +1,515 @@
+import hashlib
+"""Imports hashlib to build cache file names from URLs and query parameters."""
+
+import os
+"""Imports the os module to read timeout and resilience settings from environment variables."""
+
+import random
+"""Imports the random module to add jitter to retry delays."""
+
+import threading
+"""Imports threading to give each thread its own pooled HTTP session."""
+
+import time
+"""Imports the time module to timestamp stored validators, time open breakers, and wait between retries."""
+
+from urllib.parse import urlencode, urlparse
+"""Imports urlencode to turn query parameters into a stable cache key, and urlparse to group requests by host."""
+
+import requests
+"""Imports the requests library to send HTTP requests to external websites."""
+
+from requests.adapters import HTTPAdapter
+"""Imports HTTPAdapter to configure connection pooling for the shared session."""
+
+from utils.db import DB_PATH, connection
+"""Imports the canonical database path and the pooled connection helper used to store validators."""
+
+from utils import metrics
+"""Imports the metrics layer that exports breaker states and outbound request outcomes."""
+
+from utils.logger import get_logger
+"""Imports the structured, non-blocking logger."""
+
+log = get_logger(__name__)
+"""Creates the logger for breaker transitions."""
+
+TIMEOUT = (
+    float(os.environ.get("CAMPUSCONNECT_HTTP_CONNECT_TIMEOUT", 3.05)),
+    float(os.environ.get("CAMPUSCONNECT_HTTP_READ_TIMEOUT", 10)),
+)
+"""Defines the default (connect, read) timeout in seconds, so a hung server never holds a worker indefinitely."""
+
+BREAKER_FAILURES = int(os.environ.get("CAMPUSCONNECT_BREAKER_FAILURES", 5))
+"""Defines how many consecutive failures to a host open its circuit breaker."""
+
+BREAKER_RESET = float(os.environ.get("CAMPUSCONNECT_BREAKER_RESET", 30))
+"""Defines how many seconds an open breaker refuses requests before letting a probe through."""
+
+RETRY_RATIO = float(os.environ.get("CAMPUSCONNECT_RETRY_RATIO", 0.2))
+"""Defines the retries earned per request sent, so retries stay a bounded share of outbound traffic."""
+
+RETRY_BURST = 10
+"""Defines the most retries that can be saved up for a burst of failures."""
+
+BACKOFF_CAP = 10
+"""Defines the longest delay in seconds between retries."""
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+"""Defines the HTTP statuses that mean the host is struggling (worth retrying and counted against its breaker)."""
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of sending a request to a host whose circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Tracks the health of one host. After enough consecutive failures the breaker opens
+    and requests fail immediately; once the reset time passes, one probe is let through
+    (half-open), and its outcome closes or re-opens the breaker.
+    """
+
+    STATES = {"closed": 0, "half-open": 1, "open": 2}
+    """Maps each state to the value reported at /metrics."""
+
+    def __init__(self, host, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        """
+        Initialize with the host, the failure threshold, and the reset time.
+        """
+
+        self.host = host
+        """Stores the host the breaker protects."""
+
+        self.failures = failures
+        """Stores how many consecutive failures open the breaker."""
+
+        self.reset = reset
+        """Stores how long the breaker stays open before a probe."""
+
+        self.state = "closed"
+        """Stores the current state."""
+
+        self.consecutive = 0
+        """Counts the failures since the last success."""
+
+        self.opened_at = 0
+        """Stores when the breaker last opened."""
+
+        self._lock = threading.Lock()
+        """Creates a lock so concurrent requests see consistent state changes."""
+
+        metrics.UPSTREAM_STATE.set(host, value=0)
+        """Reports the breaker as closed."""
+
+    def _move(self, state):
+        """
+        Change state, recording and logging the transition (called with the lock held).
+        """
+
+        self.state = state
+        """Stores the new state."""
+
+        metrics.UPSTREAM_STATE.set(self.host, value=self.STATES[state])
+        """Reports the new state."""
+
+        metrics.UPSTREAM_TRANSITIONS.inc(self.host, state)
+        """Counts the transition."""
+
+        log.warning("Circuit breaker for %s is now %s.", self.host, state, extra={"host": self.host, "state": state})
+        """Logs the transition."""
+
+    def allow(self):
+        """
+        Return True if a request to the host may be sent now.
+        """
+
+        with self._lock:
+            """Guards the state while checking it."""
+
+            if self.state == "closed":
+                """Checks whether the host is healthy."""
+
+                return True
+                """Lets the request through."""
+
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset:
+                """Checks whether the breaker has been open long enough to try the host again."""
+
+                self._move("half-open")
+                """Lets this request through as the probe."""
+
+                return True
+                """Sends the probe."""
+
+            return False
+            """Refuses the request while the breaker is open or a probe is in flight."""
+
+    def record_success(self):
+        """
+        Record a successful request, closing the breaker if it was probing.
+        """
+
+        with self._lock:
+            """Guards the state while updating it."""
+
+            self.consecutive = 0
+            """Resets the failure count."""
+
+            if self.state != "closed":
+                """Checks whether the probe succeeded."""
+
+                self._move("closed")
+                """Closes the breaker."""
+
+    def record_failure(self):
+        """
+        Record a failed request, opening the breaker after too many in a row (or at once if it was probing).
+        """
+
+        with self._lock:
+            """Guards the state while updating it."""
+
+            self.consecutive += 1
+            """Counts the failure."""
+
+            if self.state == "half-open" or (self.state == "closed" and self.consecutive >= self.failures):
+                """Checks whether the probe failed or the host kept failing."""
+
+                self.opened_at = time.monotonic()
+                """Records when the breaker opened."""
+
+                self._move("open")
+                """Opens the breaker."""
+
+class RetryBudget:
+    """
+    Process-wide token bucket limiting retries to a share of outbound requests, so an
+    outage can't multiply traffic to a struggling host (or the time workers spend on it).
+    """
+
+    def __init__(self, ratio=RETRY_RATIO, burst=RETRY_BURST):
+        """
+        Initialize with the retries earned per request and the most that can be saved up.
+        """
+
+        self.ratio = ratio
+        """Stores the retries earned per request."""
+
+        self.burst = burst
+        """Stores the bucket size."""
+
+        self.tokens = burst
+        """Stores the retries currently available."""
+
+        self._lock = threading.Lock()
+        """Creates a lock so concurrent requests don't overspend the budget."""
+
+    def deposit(self):
+        """
+        Earn a share of a retry for a request sent.
+        """
+
+        with self._lock:
+            """Guards the bucket while filling it."""
+
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+            """Adds the share without overflowing the bucket."""
+
+    def withdraw(self):
+        """
+        Spend one retry, returning False if the budget is used up.
+        """
+
+        with self._lock:
+            """Guards the bucket while spending from it."""
+
+            if self.tokens < 1:
+                """Checks whether a whole retry is available."""
+
+                return False
+                """Refuses the retry."""
+
+            self.tokens -= 1
+            """Spends the retry."""
+
+            return True
+            """Allows the retry."""
+
+class FetchResult:
+    """Wraps an HTTP response together with the cache information needed to remember it."""
+
+    def __init__(self, response, cache_key, validators, db_path=DB_PATH):
+        """
+        Initialize with the response, its cache key, the validators it was requested with,
+        and the database the validators are stored in.
+        """
+
+        self.response = response
+        """Stores the underlying requests.Response object."""
+
+        self.cache_key = cache_key
+        """Stores the cache key derived from the URL and parameters."""
+
+        self.validators = validators
+        """Stores the ETag/Last-Modified values that were sent with the request."""
+
+        self.db_path = db_path
+        """Stores the database whose data the response is ingested into."""
+
+        self.not_modified = response.status_code == 304
+        """Stores whether the server said the content hasn't changed since the last fetch."""
+
+class HTTPClient:
+    """
+    Shared HTTP layer with pooled keep-alive sessions, conditional requests whose
+    validators are stored in the database the responses are ingested into, and
+    per-host circuit breakers with a shared retry budget.
+    """
+
+    def __init__(self, pool_size=10, retry_budget=None):
+        """
+        Initialize with the number of pooled connections per host and the retry budget
+        (a new process-wide one by default).
+        """
+
+        self.pool_size = pool_size
+        """Stores how many keep-alive connections each session keeps per host."""
+
+        self._local = threading.local()
+        """Creates thread-local storage so each thread reuses its own session."""
+
+        self.retry_budget = retry_budget or RetryBudget()
+        """Stores the budget every retry is paid from."""
+
+        self.breakers = {}
+        """Stores one circuit breaker per host."""
+
+        self._breakers_lock = threading.Lock()
+        """Creates a lock that guards creation of the breakers."""
+
+    @property
+    def session(self):
+        """
+        Return this thread's pooled requests.Session, creating it on first use.
+        """
+
+        session = getattr(self._local, "session", None)
+        """Looks up the session already created for this thread."""
+
+        if session is None:
+            """Checks whether this thread needs a new session."""
+
+            session = requests.Session()
+            """Creates a session so connections are kept alive between requests."""
+
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            """Creates an adapter with a connection pool of the configured size."""
+
+            session.mount("http://", adapter)
+            """Uses the pooled adapter for plain HTTP URLs."""
+
+            session.mount("https://", adapter)
+            """Uses the pooled adapter for HTTPS URLs."""
+
+            self._local.session = session
+            """Stores the session for later requests on this thread."""
+
+        return session
+        """Returns the thread's session."""
+
+    def cache_key(self, url, params=None):
+        """
+        Build a stable cache key from a URL and its query parameters.
+        """
+
+        query = urlencode(sorted((params or {}).items()), doseq=True)
+        """Encodes the parameters in sorted order so the same request always gets the same key."""
+
+        return hashlib.sha256(f"{url}?{query}".encode("utf-8")).hexdigest()
+        """Returns the SHA-256 hex digest of the URL and query."""
+
+    def load_validators(self, key, db_path=DB_PATH):
+        """
+        Read the stored ETag/Last-Modified values for a cache key (empty if none).
+        They live in the database the response is ingested into, so a new, reseeded,
+        or purged database is always fetched in full.
+        """
+
+        with connection(db_path) as conn:
+            """Borrows a pooled connection for the lookup."""
+
+            row = conn.execute(
+                "SELECT etag, last_modified FROM http_validators WHERE cache_key = ?", (key,)
+            ).fetchone()
+            """Reads the validators saved for the key."""
+
+        return {"etag": row[0], "last_modified": row[1]} if row else {}
+        """Returns the validators, or an empty dict so the request is sent unconditionally."""
+
+    def breaker(self, url):
+        """
+        Return the circuit breaker for a URL's host.
+        """
+
+        host = urlparse(url).netloc
+        """Extracts the host from the URL."""
+
+        with self._breakers_lock:
+            """Prevents two threads from creating different breakers for the same host."""
+
+            if host not in self.breakers:
+                """Checks whether this host has been seen before."""
+
+                self.breakers[host] = CircuitBreaker(host)
+                """Creates the breaker for the host."""
+
+            return self.breakers[host]
+            """Returns the host's breaker."""
+
+    def get(self, url, params=None, headers=None, timeout=TIMEOUT, stream=False, retries=0, backoff=0.5, db_path=DB_PATH):
+        """
+        Send a GET request, adding If-None-Match/If-Modified-Since when validators are cached.
+        Connection errors, timeouts, and 429/5xx answers are retried up to `retries` times
+        with exponential backoff and jitter while the shared retry budget allows, and count
+        against the host's circuit breaker; while it is open, CircuitOpenError (a
+        RequestException) is raised without contacting the host. db_path is the database
+        the response will be ingested into, where its validators are kept.
+        Returns a FetchResult; check `not_modified` before parsing the body.
+        """
+
+        key = self.cache_key(url, params)
+        """Builds the cache key for this request."""
+
+        validators = self.load_validators(key, db_path)
+        """Loads any validators saved from the last successful fetch."""
+
+        request_headers = dict(headers or {})
+        """Copies the caller's headers so they can be extended safely."""
+
+        if validators.get("etag"):
+            """Checks whether an ETag was saved for this URL."""
+
+            request_headers["If-None-Match"] = validators["etag"]
+            """Asks the server to reply 304 if the ETag still matches."""
+
+        if validators.get("last_modified"):
+            """Checks whether a Last-Modified date was saved for this URL."""
+
+            request_headers["If-Modified-Since"] = validators["last_modified"]
+            """Asks the server to reply 304 if the content hasn't changed since that date."""
+
+        breaker = self.breaker(url)
+        """Looks up the host's circuit breaker."""
+
+        self.retry_budget.deposit()
+        """Earns a share of a retry for this request."""
+
+        attempt = 0
+        """Initializes the attempt counter."""
+
+        while True:
+            """Keeps trying until the request succeeds or may not be retried."""
+
+            if not breaker.allow():
+                """Checks whether the host's breaker is refusing requests."""
+
+                metrics.UPSTREAM_REQUESTS.inc(breaker.host, "refused")
+                """Counts the refused request."""
+
+                raise CircuitOpenError(f"circuit breaker for {breaker.host} is open")
+                """Fails fast so callers fall back to the stored data."""
+
+            try:
+                response = self.session.get(url, params=params, headers=request_headers, timeout=timeout, stream=stream)
+                """Sends the request over the pooled session."""
+
+                error = None
+                """Records that the host answered."""
+
+            except requests.RequestException as e:
+                """Handles connection errors and timeouts."""
+
+                response, error = None, e
+                """Records the error."""
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                """Checks whether the host answered normally (client errors are the caller's to handle)."""
+
+                breaker.record_success()
+                """Records the healthy answer."""
+
+                metrics.UPSTREAM_REQUESTS.inc(breaker.host, "ok")
+                """Counts the request."""
+
+                return FetchResult(response, key, validators, db_path)
+                """Returns the response wrapped with its cache information."""
+
+            breaker.record_failure()
+            """Counts the failure against the host's breaker."""
+
+            if attempt >= retries or not self.retry_budget.withdraw():
+                """Checks whether retries are used up (for this request or across the process)."""
+
+                metrics.UPSTREAM_REQUESTS.inc(breaker.host, "failed")
+                """Counts the failed request."""
+
+                if error is not None:
+                    """Checks whether the host never answered."""
+
+                    raise error
+                    """Re-raises the connection error or timeout."""
+
+                return FetchResult(response, key, validators, db_path)
+                """Returns the error response so the caller's raise_for_status reports it."""
+
+            if response is not None:
+                """Checks whether an error response is being discarded."""
+
+                response.close()
+                """Returns its connection to the pool."""
+
+            metrics.UPSTREAM_REQUESTS.inc(breaker.host, "retried")
+            """Counts the retry."""
+
+            time.sleep(random.uniform(0, min(BACKOFF_CAP, backoff * 2 ** attempt)))
+            """Waits a random share of the doubled delay, so workers retrying together don't stampede the host."""
+
+            attempt += 1
+            """Counts the attempt."""
+
+    def remember(self, result):
+        """
+        Save the validators from a successfully processed response.
+        Call this only after the response has been parsed and stored, so a failed
+        ingest is retried in full on the next fetch instead of getting a 304.
+        """
+
+        if result is None or result.not_modified:
+            """Checks whether there is anything new to remember."""
+
+            return
+            """Exits early because the stored validators are still current."""
+
+        etag = result.response.headers.get("ETag")
+        """Reads the ETag header from the response."""
+
+        last_modified = result.response.headers.get("Last-Modified")
+        """Reads the Last-Modified header from the response."""
+
+        if not etag and not last_modified:
+            """Checks whether the server supports conditional requests for this URL."""
+
+            return
+            """Exits early because there is nothing to send next time."""
+
+        with connection(result.db_path) as conn:
+            """Borrows a pooled connection for the write."""
+
+            with conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO http_validators (cache_key, url, etag, last_modified, stored_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (result.cache_key, result.response.url, etag, last_modified, time.time()))
+                """Stores the validators and some bookkeeping in their own short transaction."""
+
+http_client = HTTPClient()
+"""Creates the shared HTTP client used by the scraper and the API client."""
@@ -0,0 +1,331 @@
+import datetime
+"""Imports datetime to format event times and the feed's DTSTAMP."""
+
+import sys
+"""Imports sys to read the command-line arguments."""
+
+import time
+"""Imports the time module to report how long a rebuild took."""
+
+from utils.db import DB_PATH, connection
+"""Imports the database path and the pooled connection helper."""
+
+from utils.metrics import timed
+"""Imports the decorator that records each stage's latency and row count at /metrics."""
+
+from utils.migrations import migrate
+"""Imports the migration runner that creates the calendar table on older databases."""
+
+SOURCES = {
+    "event": "SELECT id, title, location, NULL AS description, date, starts_at, NULL AS source FROM events",
+    "external": "SELECT id, title, location, description, date, starts_at, source FROM external_events",
+}
+"""Defines the query that reads the calendar fields of each kind of event."""
+
+BATCH_SIZE = 500
+"""Defines how many events are serialized per batch."""
+
+PRODUCT_ID = "-//CampusConnect//Campus Events//EN"
+"""Defines the PRODID that identifies the generator of the feeds."""
+
+def escape(value):
+    """
+    Escape a value for an iCalendar TEXT property (RFC 5545 section 3.3.11).
+    """
+
+    return (value or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+    """Returns the escaped text."""
+
+def fold(line):
+    """
+    Fold a content line into 75-octet pieces joined by CRLF and a space, as RFC 5545
+    requires, without splitting a UTF-8 character.
+    """
+
+    if len(line.encode("utf-8")) <= 75:
+        """Checks whether the line is short enough already (the common case)."""
+
+        return line + "\r\n"
+        """Returns the line with its terminator."""
+
+    pieces = []
+    """Stores the folded pieces."""
+
+    piece = ""
+    """Holds the piece being filled."""
+
+    for char in line:
+        """Iterates through each character."""
+
+        if len((piece + char).encode("utf-8")) > (75 if not pieces else 74):
+            """Checks whether the character would overflow the piece (continuations lose one octet to the space)."""
+
+            pieces.append(piece)
+            """Closes the piece."""
+
+            piece = ""
+            """Starts a new piece."""
+
+        piece += char
+        """Adds the character."""
+
+    pieces.append(piece)
+    """Closes the last piece."""
+
+    return "\r\n ".join(pieces) + "\r\n"
+    """Returns the folded line with its terminator."""
+
+def start_property(date, starts_at):
+    """
+    Return the DTSTART property of an event: an all-day date for bare dates such as
+    2025-04-05, otherwise the start time in UTC.
+    """
+
+    if date and len(date.strip()) == 10:
+        """Checks whether the event was given as a whole day."""
+
+        return f"DTSTART;VALUE=DATE:{date.strip().replace('-', '')}"
+        """Returns the date without separators."""
+
+    return "DTSTART:" + datetime.datetime.fromtimestamp(starts_at, datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    """Returns the UTC start time."""
+
+def vevent(kind, event, stamp):
+    """
+    Serialize one event as a VEVENT block, with stamp (a UTC timestamp such as
+    20250405T140000Z) as its DTSTAMP.
+    """
+
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{kind}-{event['id']}@campusconnect",
+        f"DTSTAMP:{stamp}",
+        start_property(event["date"], event["starts_at"]),
+        f"SUMMARY:{escape(event['title'])}",
+    ]
+    """Builds the required properties."""
+
+    if event["location"]:
+        """Checks whether the event has a location."""
+
+        lines.append(f"LOCATION:{escape(event['location'])}")
+        """Adds the location."""
+
+    if event["description"]:
+        """Checks whether the event has a description."""
+
+        lines.append(f"DESCRIPTION:{escape(event['description'])}")
+        """Adds the description."""
+
+    lines.append("END:VEVENT")
+    """Closes the block."""
+
+    return "".join(fold(line) for line in lines)
+    """Returns the folded block."""
+
+def render_events(conn, kind, events):
+    """
+    Serialize a batch of events of one kind and store their VEVENT blocks inside the
+    caller's transaction. Events without a parseable date are dropped from the feeds.
+    Returns the number of blocks stored.
+    """
+
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    """Stamps the blocks with the time they were serialized."""
+
+    conn.executemany(
+        "DELETE FROM ics_events WHERE kind = ? AND event_id = ?",
+        [(kind, event["id"]) for event in events if event["starts_at"] is None]
+    )
+    """Removes the blocks of events whose date can no longer be read."""
+
+    rows = [
+        (kind, event["id"], event["source"], event["starts_at"], vevent(kind, event, stamp))
+        for event in events if event["starts_at"] is not None
+    ]
+    """Serializes the dated events."""
+
+    conn.executemany("INSERT OR REPLACE INTO ics_events (kind, event_id, source, starts_at, vevent) VALUES (?, ?, ?, ?, ?)", rows)
+    """Stores the blocks."""
+
+    return len(rows)
+    """Returns the number of blocks stored."""
+
+def render_query(conn, kind, where="", params=()):
+    """
+    Serialize the events of one kind selected by an optional WHERE clause, in batches.
+    Returns the number of blocks stored.
+    """
+
+    cursor = conn.execute(f"{SOURCES[kind]} {where}", params)
+    """Opens a cursor over the events."""
+
+    count = 0
+    """Counts the stored blocks."""
+
+    while True:
+        """Keeps reading until every event is serialized."""
+
+        events = cursor.fetchmany(BATCH_SIZE)
+        """Reads the next batch of events."""
+
+        if not events:
+            """Checks whether the cursor is exhausted."""
+
+            return count
+            """Returns the number of blocks stored."""
+
+        count += render_events(conn, kind, events)
+        """Serializes the batch."""
+
+@timed("ics.render_generation", rows=lambda count: count)
+def render_generation(conn, generation, kind="external"):
+    """
+    Serialize the events of one kind written in one ingest generation (called by the
+    scraper and bulk loads in the same transaction as their writes, so the feeds never
+    lag behind the events). Unchanged events keep their blocks.
+    """
+
+    return render_query(conn, kind, "WHERE changed_gen = ?", (generation,))
+    """Serializes the new and changed events."""
+
+def render_all(conn):
+    """
+    Serialize every event inside the caller's transaction. Returns the number of blocks stored.
+    """
+
+    conn.execute("DELETE FROM ics_events")
+    """Removes every block."""
+
+    return sum(render_query(conn, kind) for kind in SOURCES)
+    """Serializes each kind of event."""
+
+def calendar_chunks(cursor, name, batch_size=BATCH_SIZE):
+    """
+    Yield an iCalendar document as UTF-8 chunks: the calendar header, the stored VEVENT
+    blocks read from cursor (a query whose first column is the block) batch_size at a
+    time and concatenated as is, and the footer.
+    """
+
+    yield "".join(fold(line) for line in (
+        "BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODUCT_ID}", "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape(name)}",
+    )).encode("utf-8")
+    """Yields the calendar header."""
+
+    while True:
+        """Keeps reading until the cursor is exhausted."""
+
+        rows = cursor.fetchmany(batch_size)
+        """Reads the next batch of blocks."""
+
+        if not rows:
+            """Checks whether every block was sent."""
+
+            break
+            """Stops reading."""
+
+        yield "".join(row[0] for row in rows).encode("utf-8")
+        """Yields the batch of blocks."""
+
+    yield b"END:VCALENDAR\r\n"
+    """Yields the calendar footer."""
+
+def interest_query(interests):
+    """
+    Turn a comma-separated list of interests written like users' preferences (such as
+    'jazz, robotics club') into an FTS5 query matching events about any of them.
+    Returns None if there are no interests.
+    """
+
+    from utils.search import match_query
+    """Imports the search query builder here, since the search module imports the migrations this module uses."""
+
+    queries = [match_query(interest) for interest in (interests or "").split(",")]
+    """Builds a query per interest (every word of an interest must match)."""
+
+    return " OR ".join(f"({query})" for query in queries if query) or None
+    """Returns the interests joined as alternatives."""
+
+def feed_events(conn, source=None, interests=None):
+    """
+    Return a cursor over the VEVENT blocks of every event, soonest first, optionally
+    only those scraped from one campus calendar (source) and those about any of a
+    comma-separated list of interests (looked up in the full-text search index).
+    """
+
+    from utils.search import KIND_COUNT
+    """Imports the search index's rowid layout here, since the search module imports the migrations this module uses."""
+
+    clauses = []
+    """Stores the filters."""
+
+    params = []
+    """Stores the filter parameters."""
+
+    if source is not None:
+        """Checks whether only one calendar's events were asked for."""
+
+        clauses.append("c.source = ?")
+        """Adds the calendar filter."""
+
+        params.append(source)
+        """Adds the calendar name."""
+
+    match = interest_query(interests)
+    """Builds the interests query, if any were given."""
+
+    if match:
+        """Checks whether only some interests were asked for."""
+
+        clauses.append(f"""(c.kind, c.event_id) IN (
+            SELECT kind, rowid / {KIND_COUNT} FROM search_index WHERE search_index MATCH ?
+        )""")
+        """Keeps the events whose search documents match the interests."""
+
+        params.append(match)
+        """Adds the query."""
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    """Builds the WHERE clause."""
+
+    return conn.execute(f"SELECT c.vevent FROM ics_events c {where} ORDER BY c.starts_at", params)
+    """Returns the cursor."""
+
+def user_events(conn, user_id):
+    """
+    Return a cursor over the VEVENT blocks of the events matched to a user's preferences, soonest first.
+    """
+
+    return conn.execute("""
+        SELECT c.vevent
+        FROM user_event_matches m JOIN ics_events c ON c.kind = m.kind AND c.event_id = m.event_id
+        WHERE m.user_id = ?
+        ORDER BY c.starts_at
+    """, (user_id,))
+    """Returns the cursor."""
+
+if __name__ == "__main__":
+    """Rebuilds the calendar feeds when run as: python -m utils.ics rebuild"""
+
+    if sys.argv[1:] != ["rebuild"]:
+        """Checks whether the rebuild command was given."""
+
+        sys.exit("usage: python -m utils.ics rebuild")
+        """Prints the usage and exits."""
+
+    start = time.perf_counter()
+    """Records the start time of the rebuild."""
+
+    with connection(DB_PATH) as conn:
+        """Borrows a pooled connection to the database."""
+
+        migrate(conn)
+        """Creates the calendar table if the database predates it."""
+
+        with conn:
+            count = render_all(conn)
+            """Serializes every event in one transaction."""
+
+    print(f"Serialized {count} events in {time.perf_counter() - start:.2f}s.")
+    """Prints how many events were serialized and how long it took."""
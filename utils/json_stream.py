@@ -0,0 +1,190 @@
+import json
+"""Imports the json module for its incremental raw_decode parser."""
+
+WHITESPACE = " \t\n\r"
+"""Defines the characters JSON allows between tokens."""
+
+DELIMITERS = WHITESPACE + ",]}"
+"""Defines the characters that can end a number, true, false, or null."""
+
+class StreamingArrayReader:
+    """
+    Reads a top-level JSON object from a stream of text chunks, yielding the items of
+    one array member (e.g. GeoJSON "features") one at a time instead of loading the
+    whole document. All other top-level members are decoded normally and kept in `meta`.
+    """
+
+    def __init__(self, chunks, array_key="features"):
+        """
+        Initialize with an iterable of text chunks and the name of the array to stream.
+        """
+
+        self.chunks = iter(chunks)
+        """Stores the iterator over incoming text chunks."""
+
+        self.array_key = array_key
+        """Stores the name of the top-level member whose items are streamed."""
+
+        self.meta = {}
+        """Stores every other top-level member (e.g. pagination) once it has been read."""
+
+        self.buffer = ""
+        """Holds the text that has been received but not yet consumed."""
+
+        self.pos = 0
+        """Stores the current read position inside the buffer."""
+
+        self.decoder = json.JSONDecoder()
+        """Creates the decoder used to parse individual values."""
+
+    def _fill(self):
+        """
+        Append the next chunk to the buffer, dropping text that was already consumed.
+        Returns False when the stream is exhausted.
+        """
+
+        for chunk in self.chunks:
+            """Reads chunks until a non-empty one arrives."""
+
+            if chunk:
+                """Checks whether the chunk has any content."""
+
+                self.buffer = self.buffer[self.pos:] + chunk
+                """Keeps only the unconsumed text and appends the new chunk."""
+
+                self.pos = 0
+                """Resets the read position to the start of the new buffer."""
+
+                return True
+                """Returns True because more text is available."""
+
+        return False
+        """Returns False because the stream has ended."""
+
+    def _peek(self):
+        """
+        Skip whitespace and return the next character (None at the end of the stream).
+        """
+
+        while True:
+            """Keeps reading until a non-whitespace character is found or the stream ends."""
+
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                """Checks for whitespace at the read position."""
+
+                self.pos += 1
+                """Skips the whitespace character."""
+
+            if self.pos < len(self.buffer):
+                """Checks whether a character is available."""
+
+                return self.buffer[self.pos]
+                """Returns the next character without consuming it."""
+
+            if not self._fill():
+                """Reads more text, stopping at the end of the stream."""
+
+                return None
+                """Returns None because the stream has ended."""
+
+    def _expect(self, char):
+        """
+        Consume the next non-whitespace character, which must be `char`.
+        """
+
+        if self._peek() != char:
+            """Checks whether the document has the expected structure."""
+
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of streamed JSON")
+            """Raises an error for malformed or unexpected JSON."""
+
+        self.pos += 1
+        """Consumes the character."""
+
+    def _value(self):
+        """
+        Decode the next complete JSON value, reading more chunks until it is whole.
+        """
+
+        self._peek()
+        """Skips whitespace before the value."""
+
+        while True:
+            """Retries with more text until the value decodes."""
+
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                """Decodes one value starting at the read position."""
+
+                complete = end < len(self.buffer) and (
+                    isinstance(value, (dict, list, str)) or self.buffer[end] in DELIMITERS
+                )
+                """Checks that the value isn't cut short (e.g. '2' from '2.5' split across chunks)."""
+
+                if complete or not self._fill():
+                    """Returns the value once it is complete or no more text will arrive."""
+
+                    self.pos = end
+                    """Consumes the decoded value."""
+
+                    return value
+                    """Returns the decoded value."""
+
+            except json.JSONDecodeError:
+                """Handles a value that is split across chunks."""
+
+                if not self._fill():
+                    """Reads more text, failing if the stream ended mid-value."""
+
+                    raise
+                    """Re-raises the error because the document is truncated or invalid."""
+
+    def __iter__(self):
+        """
+        Yield each item of the streamed array; other members are stored in `meta`.
+        """
+
+        self._expect("{")
+        """Consumes the opening brace of the top-level object."""
+
+        while self._peek() != "}":
+            """Reads members until the closing brace."""
+
+            key = self._value()
+            """Reads the member name."""
+
+            self._expect(":")
+            """Consumes the colon after the name."""
+
+            if key == self.array_key:
+                """Checks whether this is the array to stream."""
+
+                self._expect("[")
+                """Consumes the opening bracket of the array."""
+
+                while self._peek() != "]":
+                    """Reads items until the closing bracket."""
+
+                    yield self._value()
+                    """Yields one item, so only it is held in memory."""
+
+                    if self._peek() == ",":
+                        """Checks for a separator before the next item."""
+
+                        self.pos += 1
+                        """Consumes the comma."""
+
+                self.pos += 1
+                """Consumes the closing bracket."""
+
+            else:
+                """Handles any other member."""
+
+                self.meta[key] = self._value()
+                """Decodes and stores the member."""
+
+            if self._peek() == ",":
+                """Checks for a separator before the next member."""
+
+                self.pos += 1
+                """Consumes the comma."""
@@ -1,3 +1,575 @@
+import atexit
+"""Imports atexit to drain queued records and flush the log file when the process exits."""
+
+import copy
+"""Imports copy so queued records are snapshots the caller can't change afterwards."""
+
+import json
+"""Imports json to write each record as one structured JSON line."""
+
+import logging
+"""Imports the standard logging framework the subsystem is built on."""
+
+import os
+"""Imports the os module to read logging settings and write to the log file."""
+
+import queue
+"""Imports queue to hand records to the writer thread without blocking the caller."""
+
+import random
+"""Imports random to sample debug records."""
+
+import threading
+"""Imports threading to flush the buffered log file in the background."""
+
+import time
+"""Imports the time module to decide when the buffer is due for a flush."""
+
+from datetime import datetime, timezone
+"""Imports datetime to stamp records with ISO 8601 UTC times."""
+
+from logging.handlers import QueueHandler, QueueListener
+"""Imports the queue handler and listener that move file I/O off the calling thread."""
+
+LOG_PATH = os.environ.get(
+    "CAMPUSCONNECT_LOG_FILE",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs', 'system.log'))
+)
+"""Defines the path of the JSON log file, overridable with an environment variable."""
+
+LOG_LEVEL = os.environ.get("CAMPUSCONNECT_LOG_LEVEL", "INFO").upper()
+"""Defines the lowest level that is logged; records below it cost one level check and nothing else."""
+
+CONSOLE_LEVEL = os.environ.get("CAMPUSCONNECT_LOG_CONSOLE", "WARNING").upper()
+"""Defines the lowest level that is also echoed to stderr."""
+
+DEBUG_SAMPLE = float(os.environ.get("CAMPUSCONNECT_LOG_SAMPLE", 1.0))
+"""Defines the fraction of debug records kept when debug logging is on (e.g. 0.01 keeps 1 in 100)."""
+
+MAX_BYTES = int(os.environ.get("CAMPUSCONNECT_LOG_MAX_BYTES", 10 * 1024 * 1024))
+"""Defines the size at which the log file is rotated."""
+
+BACKUP_COUNT = int(os.environ.get("CAMPUSCONNECT_LOG_BACKUPS", 5))
+"""Defines how many rotated files (system.log.1 ... system.log.N) are kept."""
+
+BUFFER_SIZE = 64 * 1024
+"""Defines how many bytes are buffered before they are written to the file."""
+
+FLUSH_INTERVAL = float(os.environ.get("CAMPUSCONNECT_LOG_FLUSH", 1.0))
+"""Defines the longest time (in seconds) a record waits in the buffer."""
+
+QUEUE_SIZE = 10000
+"""Defines how many records may wait for the writer thread before new ones are dropped."""
+
+RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+"""Defines the standard record attributes, so anything else passed with extra= is written as a field."""
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line with its extra fields."""
+
+    def format(self, record):
+        """
+        Return the record as a JSON line: time, level, logger, message, any fields
+        passed with extra=, and the traceback if there is one.
+        """
+
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        """Builds the standard fields."""
+
+        for key, value in record.__dict__.items():
+            """Iterates through the record's attributes."""
+
+            if key not in RESERVED:
+                """Checks whether the attribute was passed with extra=."""
+
+                entry[key] = value
+                """Adds it as a structured field."""
+
+        if record.exc_info and not record.exc_text:
+            """Checks whether the traceback still needs formatting."""
+
+            record.exc_text = self.formatException(record.exc_info)
+            """Formats the traceback."""
+
+        if record.exc_text:
+            """Checks whether the record carries a traceback."""
+
+            entry["exc"] = record.exc_text
+            """Adds the traceback."""
+
+        return json.dumps(entry, default=str, separators=(",", ":"))
+        """Returns the JSON line (values JSON can't encode are written as strings)."""
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of debug records, so verbose dumps can stay on in production."""
+
+    def __init__(self, rate, level=logging.DEBUG):
+        """
+        Initialize with the fraction of records at or below `level` to keep.
+        """
+
+        super().__init__()
+        """Initializes the base filter."""
+
+        self.rate = rate
+        """Stores the fraction of low-level records to keep."""
+
+        self.level = level
+        """Stores the highest level that is sampled; anything above it is always kept."""
+
+    def filter(self, record):
+        """Returns whether the record should be logged."""
+
+        return record.levelno > self.level or random.random() < self.rate
+        """Keeps every important record and a random sample of the rest."""
+
+class AsyncHandler(QueueHandler):
+    """Puts records on a bounded queue for the writer thread, so logging never waits on disk."""
+
+    def __init__(self, records):
+        """
+        Initialize with the queue the writer thread reads from.
+        """
+
+        super().__init__(records)
+        """Initializes the queue handler."""
+
+        self.dropped = 0
+        """Counts records dropped because the queue was full."""
+
+    def prepare(self, record):
+        """
+        Return a copy of the record with its message rendered now, on the caller's thread,
+        so arguments changed after the call are logged as they were.
+        """
+
+        record = copy.copy(record)
+        """Copies the record so other handlers still see the original."""
+
+        record.msg = record.getMessage()
+        """Renders the message."""
+
+        record.args = None
+        """Drops the arguments that are now part of the message."""
+
+        if record.exc_info:
+            """Checks whether the record carries an exception."""
+
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            """Formats the traceback while it is still available."""
+
+            record.exc_info = None
+            """Drops the traceback objects so they aren't kept alive in the queue."""
+
+        return record
+        """Returns the prepared record."""
+
+    def enqueue(self, record):
+        """Queues the record, dropping it if the writer thread has fallen behind."""
+
+        try:
+            self.queue.put_nowait(record)
+            """Hands the record to the writer thread."""
+
+        except queue.Full:
+            """Handles a full queue (e.g. a stalled disk)."""
+
+            self.dropped += 1
+            """Counts the dropped record instead of blocking the caller."""
+
+class BufferedFileHandler(logging.Handler):
+    """
+    Appends formatted records to a file in batches: the buffer is written when it holds
+    BUFFER_SIZE bytes, when FLUSH_INTERVAL has passed, or at once for errors. Rotates the file
+    at MAX_BYTES, keeping BACKUP_COUNT old files.
+    """
+
+    def __init__(self, path, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT,
+                 buffer_size=BUFFER_SIZE, flush_interval=FLUSH_INTERVAL):
+        """
+        Initialize with the log file path, the rotation size and count, and the flush thresholds.
+        """
+
+        super().__init__()
+        """Initializes the base handler and its lock."""
+
+        self.path = path
+        """Stores the path of the log file."""
+
+        self.max_bytes = max_bytes
+        """Stores the size at which the file is rotated (0 disables rotation)."""
+
+        self.backup_count = backup_count
+        """Stores how many rotated files are kept."""
+
+        self.buffer_size = buffer_size
+        """Stores how many bytes are buffered before a write."""
+
+        self.flush_interval = flush_interval
+        """Stores the longest time a record waits in the buffer."""
+
+        self.buffer = []
+        """Holds the encoded lines waiting to be written."""
+
+        self.buffered = 0
+        """Counts the bytes waiting to be written."""
+
+        self.last_flush = time.monotonic()
+        """Stores when the buffer was last written."""
+
+        self.fd = None
+        """Holds the file descriptor once the file has been opened."""
+
+    def emit(self, record):
+        """Formats the record into the buffer and writes the buffer if it is due."""
+
+        try:
+            line = (self.format(record) + "\n").encode("utf-8")
+            """Formats and encodes the record."""
+
+            self.buffer.append(line)
+            """Adds the line to the buffer."""
+
+            self.buffered += len(line)
+            """Counts the buffered bytes."""
+
+            if (self.buffered >= self.buffer_size or record.levelno >= logging.ERROR
+                    or time.monotonic() - self.last_flush >= self.flush_interval):
+                """Checks whether the buffer is full, the record is an error, or the buffer is old."""
+
+                self.write()
+                """Writes the buffer to the file."""
+
+        except Exception:
+            """Handles formatting or write failures."""
+
+            self.handleError(record)
+            """Reports the failure without raising into the writer thread."""
+
+    def flush(self):
+        """Writes any buffered lines to the file."""
+
+        with self.lock:
+            """Holds the handler lock so the writer thread isn't emitting at the same time."""
+
+            try:
+                self.write()
+                """Writes the buffer."""
+
+            except OSError:
+                """Handles a failed write (e.g. a full disk)."""
+
+                pass
+                """Drops the batch rather than crash the flushing thread."""
+
+    def write(self):
+        """
+        Write the whole buffer with one append, opening or rotating the file first if needed.
+        """
+
+        self.last_flush = time.monotonic()
+        """Records the flush time."""
+
+        if not self.buffer:
+            """Checks whether anything is buffered."""
+
+            return
+            """Returns because there is nothing to write."""
+
+        data = b"".join(self.buffer)
+        """Joins the buffered lines."""
+
+        self.buffer = []
+        """Empties the buffer."""
+
+        self.buffered = 0
+        """Resets the buffered byte count."""
+
+        self.reopen_if_moved()
+        """Makes sure the descriptor still refers to the file at self.path."""
+
+        size = os.fstat(self.fd).st_size
+        """Reads the current size of the file (including lines written by other processes)."""
+
+        if self.max_bytes and size and size + len(data) > self.max_bytes:
+            """Checks whether the batch would push the file past its size limit."""
+
+            self.rotate()
+            """Moves the full file aside and starts a new one."""
+
+        os.write(self.fd, data)
+        """Appends the batch with one system call, so lines from several processes never interleave."""
+
+    def reopen_if_moved(self):
+        """
+        Open the file if it isn't open, or reopen it if another process rotated it away.
+        """
+
+        if self.fd is not None:
+            """Checks whether a file is already open."""
+
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self.fd).st_ino:
+                    """Checks whether the open file is still the one at self.path."""
+
+                    return
+                    """Keeps using the open file."""
+
+            except FileNotFoundError:
+                """Handles a file that was renamed away and not yet recreated."""
+
+                pass
+                """Falls through to reopening."""
+
+            os.close(self.fd)
+            """Closes the rotated-away file."""
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        """Creates the log directory if it doesn't exist."""
+
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        """Opens the log file for appending."""
+
+    def rotate(self):
+        """
+        Rename system.log to system.log.1 (shifting older files up and dropping the oldest)
+        and open a new, empty system.log.
+        """
+
+        os.close(self.fd)
+        """Closes the full file."""
+
+        self.fd = None
+        """Clears the descriptor."""
+
+        for index in range(self.backup_count - 1, 0, -1):
+            """Iterates through the rotated files from oldest to newest."""
+
+            if os.path.exists(f"{self.path}.{index}"):
+                """Checks whether this rotated file exists."""
+
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+                """Shifts it up by one."""
+
+        if self.backup_count:
+            """Checks whether rotated files are kept."""
+
+            os.replace(self.path, f"{self.path}.1")
+            """Moves the full file to the first backup."""
+
+        else:
+            """Handles rotation without backups."""
+
+            os.remove(self.path)
+            """Discards the full file."""
+
+        self.reopen_if_moved()
+        """Opens the new log file."""
+
+    def close(self):
+        """Writes the buffer and closes the file."""
+
+        self.flush()
+        """Writes any buffered lines."""
+
+        with self.lock:
+            """Holds the handler lock while closing."""
+
+            if self.fd is not None:
+                """Checks whether the file is open."""
+
+                os.close(self.fd)
+                """Closes the file."""
+
+                self.fd = None
+                """Clears the descriptor."""
+
+        super().close()
+        """Closes the base handler."""
+
+class LogSystem:
+    """Owns the queue, the writer thread, and the flusher thread behind every CampusConnect logger."""
+
+    def __init__(self, path=LOG_PATH):
+        """
+        Initialize with the log file path. Nothing is started until start() is called.
+        """
+
+        self.path = path
+        """Stores the path of the log file."""
+
+        self.root = logging.getLogger("campusconnect")
+        """Looks up the parent logger every get_logger() logger propagates to."""
+
+        self.handler = None
+        """Holds the queue handler attached to the parent logger."""
+
+        self.listener = None
+        """Holds the listener that runs the file and console handlers on its own thread."""
+
+        self.file_handler = None
+        """Holds the buffered file handler."""
+
+        self._stop = threading.Event()
+        """Creates an event used to tell the flusher thread to exit."""
+
+        self._lock = threading.Lock()
+        """Creates a lock so the system is only started once."""
+
+    def start(self):
+        """
+        Attach the queue handler and start the writer and flusher threads (once per process).
+        """
+
+        with self._lock:
+            """Holds the lock so concurrent first calls start only one writer."""
+
+            if self.handler is not None:
+                """Checks whether logging is already running."""
+
+                return
+                """Keeps the running system."""
+
+            self.file_handler = BufferedFileHandler(self.path)
+            """Creates the buffered, rotating file handler."""
+
+            self.file_handler.setFormatter(JsonFormatter())
+            """Writes JSON lines to the file."""
+
+            console = logging.StreamHandler()
+            """Creates a handler that echoes important records to stderr."""
+
+            console.setLevel(CONSOLE_LEVEL)
+            """Echoes only records at or above the console level."""
+
+            console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+            """Formats console records for people rather than machines."""
+
+            self.handler = AsyncHandler(queue.Queue(QUEUE_SIZE))
+            """Creates the non-blocking handler the loggers write to."""
+
+            self.handler.addFilter(SamplingFilter(DEBUG_SAMPLE))
+            """Drops sampled-out debug records before they are copied or queued."""
+
+            self.listener = QueueListener(self.handler.queue, self.file_handler, console, respect_handler_level=True)
+            """Creates the writer thread that runs the handlers."""
+
+            self.listener.start()
+            """Starts the writer thread."""
+
+            self._stop.clear()
+            """Resets the stop flag in case the system was stopped before."""
+
+            threading.Thread(target=self._flush_loop, name="campusconnect-log-flush", daemon=True).start()
+            """Starts the thread that writes idle buffers every FLUSH_INTERVAL seconds."""
+
+            self.root.setLevel(LOG_LEVEL)
+            """Sets the level every CampusConnect logger inherits."""
+
+            self.root.propagate = False
+            """Keeps CampusConnect records out of the root logger (and Flask's console)."""
+
+            self.root.addHandler(self.handler)
+            """Routes every CampusConnect logger to the queue."""
+
+    def _flush_loop(self):
+        """Writes the file buffer every FLUSH_INTERVAL seconds until the system stops."""
+
+        while not self._stop.wait(FLUSH_INTERVAL):
+            """Wakes up every interval until stopped."""
+
+            self.file_handler.flush()
+            """Writes records that have waited in the buffer."""
+
+    def stop(self):
+        """
+        Drain the queue, write the buffer, and detach the handler.
+        """
+
+        with self._lock:
+            """Holds the lock so stop and start don't interleave."""
+
+            if self.handler is None:
+                """Checks whether logging is running."""
+
+                return
+                """Returns because there is nothing to stop."""
+
+            self._stop.set()
+            """Tells the flusher thread to exit."""
+
+            self.root.removeHandler(self.handler)
+            """Stops sending new records to the queue."""
+
+            self.listener.stop()
+            """Waits for the writer thread to handle every queued record."""
+
+            self.file_handler.close()
+            """Writes the buffer and closes the file."""
+
+            self.handler = None
+            """Marks the system as stopped."""
+
+    def after_fork(self):
+        """
+        Restart logging in a forked worker, whose copy of the writer thread doesn't run.
+        """
+
+        self.root.removeHandler(self.handler)
+        """Detaches the parent's handler, whose queue has no reader in this process."""
+
+        self.handler = None
+        """Marks the system as stopped."""
+
+        if self.file_handler.fd is not None:
+            """Checks whether the parent's log file is open in this process."""
+
+            os.close(self.file_handler.fd)
+            """Closes the inherited descriptor (its buffer was written before the fork)."""
+
+        self._lock = threading.Lock()
+        """Replaces a lock that may have been held by another thread at the time of the fork."""
+
+        self._stop = threading.Event()
+        """Replaces the stop event so the parent's flusher state isn't shared."""
+
+        self.start()
+        """Starts a writer and flusher for this process."""
+
+log_system = LogSystem()
+"""Creates the process-wide logging system."""
+
+def get_logger(name):
+    """
+    Return a CampusConnect logger, starting the logging system on first use. Pass
+    structured fields with extra=, and use lazy %-style arguments for anything large
+    (e.g. log.debug("Rows: %s", rows)) so it is only rendered if the record is kept.
+    """
+
+    log_system.start()
+    """Starts the writer thread if it isn't running yet."""
+
+    return logging.getLogger(f"campusconnect.{name}")
+    """Returns the named child of the campusconnect logger."""
+
 def log(message):
-    with open("logs/system.log", "a") as log_file:
-        log_file.write(message + "\n")
\ No newline at end of file
+    """
+    Log a message at INFO level (kept for code written against the old helper).
+    """
+
+    get_logger("system").info(message)
+    """Queues the message for the log file."""
+
+atexit.register(log_system.stop)
+"""Writes every queued and buffered record before the process exits."""
+
+os.register_at_fork(
+    before=lambda: log_system.file_handler and log_system.file_handler.flush(),
+    after_in_child=lambda: log_system.handler and log_system.after_fork(),
+)
+"""Writes the buffer before a fork (so it isn't written twice) and restarts logging in the child."""
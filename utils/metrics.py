@@ -0,0 +1,476 @@
+import bisect
+"""Imports bisect to find a value's histogram bucket."""
+
+import cProfile
+"""Imports cProfile for the opt-in per-request profiler."""
+
+import os
+"""Imports the os module to read profiling settings and build dump paths."""
+
+import threading
+"""Imports threading to guard metric updates from concurrent requests and refreshes."""
+
+import time
+"""Imports the time module to measure stage and request durations."""
+
+from functools import wraps
+"""Imports wraps to keep function names when timing them."""
+
+from flask import g, request, template_rendered, before_render_template
+"""Imports Flask's request globals and the template signals used to time rendering."""
+
+from utils.logger import get_logger
+"""Imports the structured, non-blocking logger."""
+
+log = get_logger(__name__)
+"""Creates the logger that reports profile dumps."""
+
+PROFILING = os.environ.get("CAMPUSCONNECT_PROFILING") == "1"
+"""Defines whether requests may ask to be profiled (enable on staging only)."""
+
+PROFILE_DIR = os.environ.get(
+    "CAMPUSCONNECT_PROFILE_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs', 'profiles'))
+)
+"""Defines where per-request cProfile dumps are written."""
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+"""Defines the latency histogram buckets in seconds (sub-millisecond for cached pages, up to a minute for scrapes)."""
+
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 100000)
+"""Defines the row count histogram buckets."""
+
+SIZE_BUCKETS = tuple(256 * 4 ** power for power in range(10))
+"""Defines the payload size histogram buckets in bytes (256 B to 64 MB)."""
+
+def escape_label(value):
+    """
+    Escape a label value for the Prometheus text format.
+    """
+
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    """Returns the escaped value."""
+
+def format_labels(names, values, extra=""):
+    """
+    Format label names and values as {name="value",...}, with an optional extra label already formatted.
+    """
+
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    """Formats each label."""
+
+    if extra:
+        """Checks whether an extra label (such as le) should be added."""
+
+        pairs.append(extra)
+        """Adds the extra label."""
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+    """Returns the label set, or an empty string when there are no labels."""
+
+class Counter:
+    """A Prometheus counter with labels."""
+
+    kind = "counter"
+    """Defines the metric type reported on the TYPE line."""
+
+    def __init__(self, name, description, labels=()):
+        """
+        Initialize with the metric name, its help text, and its label names.
+        """
+
+        self.name = name
+        """Stores the metric name."""
+
+        self.description = description
+        """Stores the help text."""
+
+        self.labels = labels
+        """Stores the label names."""
+
+        self.values = {}
+        """Stores the count for each label combination."""
+
+        self._lock = threading.Lock()
+        """Creates a lock so concurrent increments aren't lost."""
+
+    def inc(self, *labels, amount=1):
+        """Adds an amount to the counter for the given label values."""
+
+        with self._lock:
+            """Guards the update."""
+
+            self.values[labels] = self.values.get(labels, 0) + amount
+            """Adds to the count."""
+
+    def render(self):
+        """
+        Return the counter in the Prometheus text format.
+        """
+
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        """Starts with the help and type lines."""
+
+        with self._lock:
+            """Guards the values while reading them."""
+
+            for labels, value in sorted(self.values.items()):
+                """Iterates through each label combination."""
+
+                lines.append(f"{self.name}{format_labels(self.labels, labels)} {value}")
+                """Adds the sample."""
+
+        return lines
+        """Returns the lines."""
+
+class Gauge(Counter):
+    """A Prometheus gauge with labels (a value that can go down as well as up)."""
+
+    kind = "gauge"
+    """Defines the metric type reported on the TYPE line."""
+
+    def set(self, *labels, value):
+        """Sets the gauge for the given label values."""
+
+        with self._lock:
+            """Guards the update."""
+
+            self.values[labels] = value
+            """Stores the value."""
+
+class Histogram:
+    """A Prometheus histogram with labels."""
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        """
+        Initialize with the metric name, its help text, its label names, and its bucket bounds.
+        """
+
+        self.name = name
+        """Stores the metric name."""
+
+        self.description = description
+        """Stores the help text."""
+
+        self.labels = labels
+        """Stores the label names."""
+
+        self.buckets = tuple(buckets)
+        """Stores the upper bounds of the buckets."""
+
+        self.values = {}
+        """Stores [bucket counts, sum, count] for each label combination."""
+
+        self._lock = threading.Lock()
+        """Creates a lock so concurrent observations aren't lost."""
+
+    def observe(self, value, *labels):
+        """Records one value for the given label values."""
+
+        index = bisect.bisect_left(self.buckets, value)
+        """Finds the first bucket the value fits in (len(buckets) means only +Inf)."""
+
+        with self._lock:
+            """Guards the update."""
+
+            series = self.values.get(labels)
+            """Looks up the series for these labels."""
+
+            if series is None:
+                """Checks whether this is the first value for these labels."""
+
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                """Creates the series."""
+
+            series[0][index] += 1
+            """Counts the value in its bucket."""
+
+            series[1] += value
+            """Adds the value to the sum."""
+
+            series[2] += 1
+            """Counts the value."""
+
+    def render(self):
+        """
+        Return the histogram in the Prometheus text format (cumulative buckets, sum, and count).
+        """
+
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        """Starts with the help and type lines."""
+
+        with self._lock:
+            """Guards the values while reading them."""
+
+            for labels, (counts, total, count) in sorted(self.values.items()):
+                """Iterates through each label combination."""
+
+                cumulative = 0
+                """Initializes the running bucket count."""
+
+                for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                    """Iterates through each bucket."""
+
+                    cumulative += bucket
+                    """Adds the bucket to the running count."""
+
+                    bucket_labels = format_labels(self.labels, labels, f'le="{bound}"')
+                    """Formats the series labels plus the bucket's upper bound."""
+
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                    """Adds the cumulative bucket sample."""
+
+                lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {total}")
+                """Adds the sum of the values."""
+
+                lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {count}")
+                """Adds the number of values."""
+
+        return lines
+        """Returns the lines."""
+
+STAGE_SECONDS = Histogram("campusconnect_stage_duration_seconds", "Time spent in each pipeline stage or query.", ("stage",))
+"""Times each stage of the scrape and alert pipelines and each page query."""
+
+STAGE_ROWS = Histogram("campusconnect_stage_rows", "Rows produced or written by each stage.", ("stage",), ROW_BUCKETS)
+"""Counts the rows each stage returned or saved."""
+
+STAGE_BYTES = Histogram("campusconnect_stage_payload_bytes", "Size of the payload each stage downloaded.", ("stage",), SIZE_BUCKETS)
+"""Measures downloaded page and feed sizes."""
+
+STAGE_ERRORS = Counter("campusconnect_stage_errors_total", "Stages that raised an exception.", ("stage",))
+"""Counts failed stages."""
+
+REQUEST_SECONDS = Histogram("campusconnect_http_request_duration_seconds", "Time to handle each request.", ("endpoint", "method", "status"))
+"""Times each request from before_request to after_request."""
+
+RESPONSE_BYTES = Histogram("campusconnect_http_response_bytes", "Size of each non-streamed response.", ("endpoint",), SIZE_BUCKETS)
+"""Measures response sizes."""
+
+TEMPLATE_SECONDS = Histogram("campusconnect_template_render_seconds", "Time to render each template.", ("template",))
+"""Times template rendering."""
+
+UPSTREAM_STATE = Gauge(
+    "campusconnect_upstream_breaker_state", "Circuit breaker state of each outbound host (0 closed, 1 half-open, 2 open).", ("host",)
+)
+"""Reports whether requests to each external host are currently let through."""
+
+UPSTREAM_TRANSITIONS = Counter(
+    "campusconnect_upstream_breaker_transitions_total", "Circuit breaker state changes by host and new state.", ("host", "state")
+)
+"""Counts circuit breaker openings, probes, and closings."""
+
+UPSTREAM_REQUESTS = Counter(
+    "campusconnect_upstream_requests_total", "Outbound requests by host and outcome.", ("host", "outcome")
+)
+"""Counts outbound requests that succeeded, failed, were retried, or were refused by an open breaker."""
+
+METRICS = [STAGE_SECONDS, STAGE_ROWS, STAGE_BYTES, STAGE_ERRORS, REQUEST_SECONDS, RESPONSE_BYTES, TEMPLATE_SECONDS,
+           UPSTREAM_STATE, UPSTREAM_TRANSITIONS, UPSTREAM_REQUESTS]
+"""Lists every metric /metrics reports."""
+
+def timed(stage, rows=None):
+    """
+    Decorate a function so every call is recorded under `stage` in the stage histogram.
+    If rows is given, it is called with the function's result to get the row count to record.
+    """
+
+    def decorator(func):
+        """Wraps the function."""
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            """Runs the function and records its duration, row count, and failures."""
+
+            start = time.perf_counter()
+            """Records the start time."""
+
+            try:
+                result = func(*args, **kwargs)
+                """Runs the function."""
+
+            except Exception:
+                """Handles a failed call."""
+
+                STAGE_ERRORS.inc(stage)
+                """Counts the failure."""
+
+                raise
+                """Re-raises the exception for the caller."""
+
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+                """Records the duration, whether or not the call failed."""
+
+            if rows is not None and result is not None:
+                """Checks whether a row count should be recorded."""
+
+                STAGE_ROWS.observe(rows(result), stage)
+                """Records the row count."""
+
+            return result
+            """Returns the function's result."""
+
+        return wrapper
+        """Returns the timed function."""
+
+    return decorator
+    """Returns the decorator."""
+
+def observe_stage(stage, seconds, rows=None, failed=False):
+    """
+    Record one run of a stage that was timed by the caller (such as a fetch or parse
+    the scrape engine ran on a thread or in a worker process), as timed does for calls.
+    """
+
+    STAGE_SECONDS.observe(seconds, stage)
+    """Records the duration."""
+
+    if failed:
+        """Checks whether the stage failed."""
+
+        STAGE_ERRORS.inc(stage)
+        """Counts the failure."""
+
+    elif rows is not None:
+        """Checks whether a row count should be recorded."""
+
+        STAGE_ROWS.observe(rows, stage)
+        """Records the row count."""
+
+def observe_bytes(stage, size):
+    """
+    Record the size of a payload downloaded by a stage.
+    """
+
+    STAGE_BYTES.observe(size, stage)
+    """Records the size."""
+
+def counter_from(name, description, label, values):
+    """
+    Build a counter from a dictionary of totals kept elsewhere (e.g. the page cache statistics).
+    """
+
+    counter = Counter(name, description, (label,))
+    """Creates the counter."""
+
+    for key, value in values.items():
+        """Iterates through each total."""
+
+        counter.inc(key, amount=value)
+        """Sets the total for its label."""
+
+    return counter
+    """Returns the counter."""
+
+def render(extra=()):
+    """
+    Return every metric (plus any extra metrics) in the Prometheus text format.
+    """
+
+    lines = []
+    """Initializes the output lines."""
+
+    for metric in [*METRICS, *extra]:
+        """Iterates through each metric."""
+
+        lines.extend(metric.render())
+        """Adds its lines."""
+
+    return "\n".join(lines) + "\n"
+    """Returns the exposition text."""
+
+def start_request():
+    """Records when the request started and starts the profiler if it was asked for."""
+
+    g.metrics_start = time.perf_counter()
+    """Stores the request's start time."""
+
+    if PROFILING and (request.headers.get("X-Profile") == "1" or request.args.get("profile") == "1"):
+        """Checks whether profiling is enabled and this request asked for it."""
+
+        g.profiler = cProfile.Profile()
+        """Creates a profiler for this request."""
+
+        g.profiler.enable()
+        """Starts profiling the request's thread."""
+
+def finish_request(response):
+    """Records the request's duration and size, and writes its profile if it was profiled."""
+
+    profiler = g.pop("profiler", None)
+    """Takes the request's profiler, if it was profiled."""
+
+    if profiler is not None:
+        """Checks whether the request was profiled."""
+
+        profiler.disable()
+        """Stops profiling."""
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        """Creates the profile directory if it doesn't exist."""
+
+        path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unknown'}-{os.getpid()}.prof")
+        """Builds a file name from the time, the endpoint, and the process id."""
+
+        profiler.dump_stats(path)
+        """Writes the profile (read it with python -m pstats or snakeviz)."""
+
+        response.headers["X-Profile-File"] = os.path.basename(path)
+        """Tells the caller which dump belongs to the request."""
+
+        log.info("Wrote request profile %s", path, extra={"endpoint": request.endpoint, "path": request.full_path})
+        """Logs where the profile was written."""
+
+    start = g.pop("metrics_start", None)
+    """Takes the request's start time."""
+
+    if start is not None:
+        """Checks whether the request was timed from the start."""
+
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or "unknown", request.method, response.status_code)
+        """Records the request duration."""
+
+    if not response.is_streamed:
+        """Checks whether the body's size is known (streamed feeds are sent after this hook)."""
+
+        RESPONSE_BYTES.observe(response.content_length or 0, request.endpoint or "unknown")
+        """Records the response size."""
+
+    return response
+    """Returns the response unchanged (apart from the profile header)."""
+
+def template_started(sender, template, context, **extra):
+    """Records when a template starts rendering."""
+
+    g.setdefault("template_starts", []).append(time.perf_counter())
+    """Pushes the start time (a stack, in case a template renders another through render_template)."""
+
+def template_finished(sender, template, context, **extra):
+    """Records how long a template took to render."""
+
+    starts = g.get("template_starts")
+    """Looks up the pending start times."""
+
+    if starts:
+        """Checks whether the start of this render was recorded."""
+
+        TEMPLATE_SECONDS.observe(time.perf_counter() - starts.pop(), template.name or "string")
+        """Records the render time."""
+
+def init_app(app):
+    """
+    Time every request and template render of a Flask app, and enable opt-in profiling.
+    """
+
+    app.before_request(start_request)
+    """Starts the request timer (and profiler) before the view and any cache lookup."""
+
+    app.after_request(finish_request)
+    """Records the request once its response is ready."""
+
+    before_render_template.connect(template_started, app)
+    """Starts the template timer when the app renders a template."""
+
+    template_rendered.connect(template_finished, app)
+    """Records the template render time."""
@@ -0,0 +1,645 @@
+import sqlite3
+"""Imports SQLite3 to read migrated rows as dictionaries."""
+
+import sys
+"""Imports sys to read the command-line arguments."""
+
+from utils.db import DB_PATH, add_column, connection
+"""Imports the database path, the column upgrade helper, and the pooled connection helper."""
+
+from utils.logger import get_logger
+"""Imports the structured, non-blocking logger."""
+
+log = get_logger(__name__)
+"""Creates the logger for schema migrations."""
+
+BUSY_TIMEOUT = 60000
+"""Defines how long (in milliseconds) a worker waits for another worker that is applying the same migration."""
+
+MIGRATIONS = []
+"""Stores every registered migration in version order."""
+
+class Migration:
+    """One numbered schema change, applied inside a single transaction."""
+
+    def __init__(self, version, name, apply):
+        """
+        Initialize with the schema version the migration produces, a short name, and the
+        function that applies it to a connection (without committing).
+        """
+
+        self.version = version
+        """Stores the schema version reached once this migration is applied."""
+
+        self.name = name
+        """Stores the short name shown in logs and by the status command."""
+
+        self.apply = apply
+        """Stores the function that makes the change."""
+
+def migration(version, name):
+    """
+    Register the decorated function as the migration to schema `version`. Versions
+    must be registered in order, one after another, starting at 1.
+    """
+
+    def register(apply):
+        """Adds the migration to the registry and returns the function unchanged."""
+
+        if version != len(MIGRATIONS) + 1:
+            """Checks whether the version would leave a gap or repeat an earlier one."""
+
+            raise ValueError(f"migration {version} ({name}) registered out of order")
+            """Raises an error so a misnumbered migration can't ship."""
+
+        MIGRATIONS.append(Migration(version, name, apply))
+        """Adds the migration to the registry."""
+
+        return apply
+        """Returns the function so it can still be called directly."""
+
+    return register
+    """Returns the decorator."""
+
+def latest_version():
+    """
+    Return the schema version the registered migrations bring a database to.
+    """
+
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+    """Returns the version of the last migration."""
+
+def current_version(conn):
+    """
+    Return the schema version a database is at (0 for a new or pre-migration database).
+    """
+
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+    """Reads the version stored in the database header."""
+
+def table_exists(conn, name):
+    """
+    Return True if the database has a table (or virtual table) with the given name.
+    """
+
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+    """Looks the table up in the schema."""
+
+@migration(1, "core tables")
+def create_core_tables(conn):
+    """
+    Create the users, events, scraped events, alerts, refresh, and generation tables
+    with their query indexes. Databases created by older versions are upgraded in place.
+    """
+
+    id_type = [row[2] for row in conn.execute("PRAGMA table_info(api_data)") if row[1] == "id"]
+    """Reads the declared type of the alert id column, if the table already exists."""
+
+    if id_type and id_type[0].upper() != "TEXT":
+        """Checks for an api_data table created by the original schema, whose INTEGER id can't hold alert ids."""
+
+        conn.execute("ALTER TABLE api_data RENAME TO api_data_legacy")
+        """Moves the old table aside (keeping its rows) so the correct table can be created."""
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            preferences TEXT
+        )
+    """)
+    """Creates the users table."""
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            location TEXT,
+            date TEXT,
+            changed_gen INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    """Creates the internal events table."""
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS external_events (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            date TEXT,
+            location TEXT,
+            description TEXT,
+            event_key TEXT,
+            source TEXT,
+            changed_gen INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    """Creates the scraped events table; changed_gen is the data generation of the last insert or update (for feed sync)."""
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS api_data (
+            id TEXT PRIMARY KEY,
+            event TEXT,
+            headline TEXT,
+            description TEXT,
+            severity TEXT,
+            urgency TEXT,
+            certainty TEXT,
+            effective TEXT,
+            expires TEXT,
+            area TEXT,
+            source TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            changed_gen INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    """Creates the weather alerts table, keyed by the weather.gov alert id (URN)."""
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS refresh_state (
+            source TEXT PRIMARY KEY,
+            refreshed_at REAL NOT NULL DEFAULT 0,
+            lease_until REAL NOT NULL DEFAULT 0,
+            last_error TEXT
+        )
+    """)
+    """Creates the background refresh bookkeeping shared by every worker process."""
+
+    conn.execute("CREATE TABLE IF NOT EXISTS data_generation (name TEXT PRIMARY KEY, generation INTEGER NOT NULL DEFAULT 0)")
+    """Creates the data generation counters bumped whenever ingest commits new data."""
+
+    add_column(conn, "external_events", "event_key", "TEXT")
+    """Adds the event_key column if the table predates keyed upserts."""
+
+    add_column(conn, "external_events", "source", "TEXT")
+    """Adds the source column if the table predates multi-source scraping."""
+
+    for table in ("events", "external_events", "api_data"):
+        """Iterates through each table served by a feed."""
+
+        add_column(conn, table, "changed_gen", "INTEGER NOT NULL DEFAULT 0")
+        """Adds the change generation column if the table predates incremental feeds."""
+
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS idx_events_date ON events(date)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_external_events_key ON external_events(event_key)",
+        "CREATE INDEX IF NOT EXISTS idx_external_events_date_location ON external_events(date, location)",
+        "CREATE INDEX IF NOT EXISTS idx_external_events_changed ON external_events(changed_gen)",
+        "CREATE INDEX IF NOT EXISTS idx_api_data_effective ON api_data(effective, id)",
+        "CREATE INDEX IF NOT EXISTS idx_api_data_expires ON api_data(expires)",
+        "CREATE INDEX IF NOT EXISTS idx_api_data_changed ON api_data(changed_gen)",
+    ):
+        """Iterates through the indexes the upserts, paginated queries, and feeds rely on."""
+
+        conn.execute(statement)
+        """Creates the index if it is missing."""
+
+@migration(2, "full-text search")
+def create_search_index(conn):
+    """
+    Create the FTS5 search index and its sync triggers, indexing the rows stored
+    before search existed.
+    """
+
+    from utils import search
+    """Imports the search module here, since it imports this module for its command line."""
+
+    exists = table_exists(conn, "search_index")
+    """Checks whether the index was created before migrations were versioned."""
+
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            title, body, kind UNINDEXED,
+            tokenize = 'porter unicode61 remove_diacritics 2'
+        )
+    """)
+    """Creates the FTS5 table."""
+
+    for kind, code, table, title, body in (
+        ("event", 0, "events", "title", "location"),
+        ("external", 1, "external_events", "title", "description"),
+        ("alert", 2, "api_data", "headline", "description"),
+    ):
+        """Iterates through each source table, the kind code in the low bits of its document rowids (rowid * 4 + code),
+        and its title and body columns."""
+
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO search_index (rowid, title, body, kind)
+                VALUES (new.rowid * 4 + {code}, new.{title}, new.{body}, '{kind}');
+            END
+        """)
+        """Creates the trigger that indexes new rows."""
+
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {title}, {body} ON {table} BEGIN
+                DELETE FROM search_index WHERE rowid = old.rowid * 4 + {code};
+                INSERT INTO search_index (rowid, title, body, kind)
+                VALUES (new.rowid * 4 + {code}, new.{title}, new.{body}, '{kind}');
+            END
+        """)
+        """Creates the trigger that replaces the documents of edited rows."""
+
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM search_index WHERE rowid = old.rowid * 4 + {code};
+            END
+        """)
+        """Creates the trigger that removes the documents of deleted rows."""
+
+    if not exists:
+        """Checks whether the index was just created."""
+
+        for kind in search.SOURCES:
+            """Iterates through each source table."""
+
+            search.index_rows(conn, kind)
+            """Indexes the rows already in the table."""
+
+        search.optimize(conn)
+        """Merges the index segments."""
+
+@migration(3, "recommendations")
+def create_recommendations(conn):
+    """
+    Create the preference term index and the precomputed matches (the users and events
+    stored before recommendations existed are matched by the recommendation start
+    times migration, once events have epoch start times).
+    """
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_preference_terms (
+            term TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (term, user_id)
+        ) WITHOUT ROWID
+    """)
+    """Creates the inverted preference index."""
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_event_matches (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            event_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            event_date TEXT,
+            PRIMARY KEY (user_id, kind, event_id)
+        ) WITHOUT ROWID
+    """)
+    """Creates the materialized matches."""
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_event_matches_rank ON user_event_matches(user_id, score DESC, event_date)")
+    """Creates the index each user's feed is read from, best match first."""
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_event_matches_event ON user_event_matches(kind, event_id)")
+    """Creates the index used to replace an event's matches when it changes."""
+
+@migration(4, "retention archive")
+def create_retention_archive(conn):
+    """
+    Create the cold-storage table that retention moves expired alerts and past events into.
+    Each row holds one deleted batch as compressed JSON.
+    """
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS retention_archive (
+            id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            archived_at REAL NOT NULL,
+            row_count INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    """Creates the archive table."""
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_retention_archive_source ON retention_archive(source, archived_at)")
+    """Creates the index used to export one table's archive in order."""
+
+@migration(5, "alert geometry")
+def create_alert_geometry(conn):
+    """
+    Add the alert polygon and zone columns, and create the campus locations, the
+    R*Tree indexes, and the campus-alert matches. Alerts stored before this have no
+    geometry and get one the next time weather.gov sends them.
+    """
+
+    add_column(conn, "api_data", "geometry", "TEXT")
+    """Adds the GeoJSON geometry column."""
+
+    add_column(conn, "api_data", "zones", "TEXT")
+    """Adds the space-separated zone codes column."""
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS campus_locations (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            zones TEXT
+        )
+    """)
+    """Creates the campus locations."""
+
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS campus_points USING rtree(id, min_lon, max_lon, min_lat, max_lat)")
+    """Creates the R*Tree index of campus points."""
+
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS alert_bounds USING rtree(id, min_lon, max_lon, min_lat, max_lat)")
+    """Creates the R*Tree index of alert bounding boxes, keyed by alert rowid."""
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS campus_alerts (
+            campus_id INTEGER NOT NULL,
+            alert_rowid INTEGER NOT NULL,
+            PRIMARY KEY (campus_id, alert_rowid)
+        ) WITHOUT ROWID
+    """)
+    """Creates the precomputed campus-alert matches."""
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_campus_alerts_alert ON campus_alerts(alert_rowid)")
+    """Creates the index used to replace an alert's matches."""
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS api_data_geo_delete AFTER DELETE ON api_data BEGIN
+            DELETE FROM alert_bounds WHERE id = old.rowid;
+            DELETE FROM campus_alerts WHERE alert_rowid = old.rowid;
+        END
+    """)
+    """Creates the trigger that drops a deleted alert's bounds and matches."""
+
+@migration(6, "epoch timestamps")
+def create_epoch_timestamps(conn):
+    """
+    Add integer UTC epoch columns next to the loosely formatted date text (starts_at for
+    events, effective_at and expires_at for alerts), fill them in for stored rows, and
+    move the range and sort indexes onto them.
+    """
+
+    from utils import timestamps
+    """Imports the timestamp module here, alongside the other deferred imports."""
+
+    for table, columns in timestamps.COLUMNS.items():
+        """Iterates through each table with dates."""
+
+        for _, epoch in columns:
+            """Iterates through each epoch column."""
+
+            add_column(conn, table, epoch, "INTEGER")
+            """Adds the column."""
+
+        timestamps.normalize_rows(conn, table)
+        """Converts the stored dates."""
+
+    for statement in (
+        "DROP INDEX IF EXISTS idx_events_date",
+        "DROP INDEX IF EXISTS idx_external_events_date_location",
+        "DROP INDEX IF EXISTS idx_api_data_effective",
+        "DROP INDEX IF EXISTS idx_api_data_expires",
+        "CREATE INDEX IF NOT EXISTS idx_events_starts ON events(starts_at)",
+        "CREATE INDEX IF NOT EXISTS idx_external_events_starts ON external_events(starts_at)",
+        "CREATE INDEX IF NOT EXISTS idx_external_events_location_starts ON external_events(location, starts_at)",
+        "CREATE INDEX IF NOT EXISTS idx_api_data_effective_at ON api_data(effective_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_api_data_expires_at ON api_data(expires_at)",
+    ):
+        """Iterates through the text-date indexes to replace and the epoch indexes replacing them."""
+
+        conn.execute(statement)
+        """Drops or creates the index."""
+
+@migration(7, "calendar feeds")
+def create_calendar_feeds(conn):
+    """
+    Create the table of pre-serialized VEVENT blocks behind the iCalendar feeds and
+    serialize the events stored before the feeds existed.
+    """
+
+    from utils import ics
+    """Imports the calendar module here, since it imports this module for its command line."""
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ics_events (
+            kind TEXT NOT NULL,
+            event_id INTEGER NOT NULL,
+            source TEXT,
+            starts_at INTEGER NOT NULL,
+            vevent TEXT NOT NULL,
+            PRIMARY KEY (kind, event_id)
+        ) WITHOUT ROWID
+    """)
+    """Creates the table of pre-serialized VEVENT blocks."""
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ics_events_starts ON ics_events(starts_at)")
+    """Creates the index the campus feed is read from in date order."""
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ics_events_source ON ics_events(source, starts_at)")
+    """Creates the index the per-calendar feeds are read from."""
+
+    for kind, table in (("event", "events"), ("external", "external_events")):
+        """Iterates through each kind of event and its table."""
+
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_ics_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM ics_events WHERE kind = '{kind}' AND event_id = old.id;
+            END
+        """)
+        """Creates the trigger that drops a deleted event's block."""
+
+    ics.render_all(conn)
+    """Serializes every stored event."""
+
+@migration(8, "http validators")
+def create_http_validators(conn):
+    """
+    Create the table of ETag/Last-Modified validators for outbound fetches, kept next
+    to the data they describe so a new or purged database is always fetched in full.
+    """
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS http_validators (
+            cache_key TEXT PRIMARY KEY,
+            url TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            stored_at REAL
+        ) WITHOUT ROWID
+    """)
+    """Creates the table keyed by the hash of each request's URL and parameters."""
+
+@migration(9, "recommendation start times")
+def create_recommendation_start_times(conn):
+    """
+    Store each match's epoch start time, so full users evict past matches before
+    upcoming ones and the upcoming filter uses the index instead of comparing date
+    text, then match any users and events that have no matches yet.
+    """
+
+    from utils import recommendations
+    """Imports the recommendations module here, alongside the other deferred imports."""
+
+    add_column(conn, "user_event_matches", "starts_at", "INTEGER")
+    """Adds the column to tables created before it existed."""
+
+    for kind, table in (("event", "events"), ("external", "external_events")):
+        """Iterates through each kind of event and its table."""
+
+        conn.execute(f"""
+            UPDATE user_event_matches SET starts_at = (SELECT starts_at FROM {table} WHERE id = event_id)
+            WHERE kind = ? AND starts_at IS NULL
+        """, (kind,))
+        """Copies the start times of the matched events."""
+
+    conn.execute("DROP INDEX IF EXISTS idx_user_event_matches_rank")
+    """Drops the index ordered by the date text."""
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_event_matches_starts ON user_event_matches(user_id, score DESC, starts_at)")
+    """Creates the index ordered by the start time."""
+
+    if conn.execute("SELECT 1 FROM user_event_matches LIMIT 1").fetchone() is None:
+        """Checks whether nothing has been matched yet (such as a database upgraded past the recommendations migration)."""
+
+        recommendations.match_all(conn)
+        """Computes every match."""
+
+@migration(10, "deletion tombstones")
+def create_deletion_tombstones(conn):
+    """
+    Create the tombstones of rows deleted by retention, which the incremental feeds
+    send so clients remove them too, and the per-feed generation below which the
+    tombstones have been pruned and clients must sync in full.
+    """
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS deleted_rows (
+            name TEXT NOT NULL,
+            deleted_gen INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            id NOT NULL,
+            deleted_at REAL NOT NULL,
+            PRIMARY KEY (name, deleted_gen, kind, id)
+        ) WITHOUT ROWID
+    """)
+    """Creates the tombstones, keyed by the data generation they were deleted in so feeds read them in order."""
+
+    conn.execute("CREATE TABLE IF NOT EXISTS sync_floor (name TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+    """Creates the table of the oldest generation each feed can still sync incrementally from."""
+
+def migrate(conn):
+    """
+    Apply every migration the database hasn't had yet, each in its own transaction
+    together with the new schema version, so an interrupted upgrade resumes where it
+    stopped and never leaves a half-applied step. Safe to call from every worker at
+    startup: a worker that finds another one migrating waits for it, then skips the
+    steps it applied. Returns the number of migrations applied.
+    """
+
+    if current_version(conn) >= latest_version():
+        """Checks whether the database is already up to date (the common case)."""
+
+        return 0
+        """Returns without taking any locks."""
+
+    conn.commit()
+    """Ends any transaction the caller left open, since each step needs its own."""
+
+    row_factory = conn.row_factory
+    """Stores the caller's row factory so it can be restored."""
+
+    timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+    """Stores the caller's busy timeout so it can be restored."""
+
+    conn.row_factory = sqlite3.Row
+    """Reads rows as dictionaries, which the backfills rely on."""
+
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT}")
+    """Waits longer than usual for a worker that is backfilling a large database."""
+
+    applied = 0
+    """Counts the migrations applied by this call."""
+
+    try:
+        for step in MIGRATIONS:
+            """Iterates through each migration in version order."""
+
+            if step.version <= current_version(conn):
+                """Checks whether the database already has this migration."""
+
+                continue
+                """Skips it."""
+
+            conn.execute("BEGIN IMMEDIATE")
+            """Takes the write lock, so only one worker applies the migration."""
+
+            try:
+                if step.version <= current_version(conn):
+                    """Checks whether another worker applied the migration while this one waited."""
+
+                    conn.rollback()
+                    """Releases the write lock."""
+
+                    continue
+                    """Skips it."""
+
+                step.apply(conn)
+                """Makes the change."""
+
+                conn.execute(f"PRAGMA user_version={step.version}")
+                """Records the new schema version in the same transaction."""
+
+                conn.commit()
+                """Commits the change and the version together."""
+
+            except BaseException:
+                """Handles a migration that failed partway through."""
+
+                conn.rollback()
+                """Undoes the partial change, leaving the database at the previous version."""
+
+                raise
+                """Re-raises the error so startup fails loudly."""
+
+            applied += 1
+            """Counts the migration."""
+
+            log.info("applied migration", extra={"version": step.version, "migration": step.name})
+            """Logs the migration."""
+
+    finally:
+        conn.row_factory = row_factory
+        """Restores the caller's row factory."""
+
+        conn.execute(f"PRAGMA busy_timeout={timeout}")
+        """Restores the caller's busy timeout."""
+
+    return applied
+    """Returns the number of migrations applied."""
+
+if __name__ == "__main__":
+    """Shows or applies pending migrations when run as: python -m utils.migrations [status|migrate]"""
+
+    command = sys.argv[1:] or ["status"]
+    """Reads the command, showing the status by default."""
+
+    if command not in (["status"], ["migrate"]):
+        """Checks whether a known command was given."""
+
+        sys.exit("usage: python -m utils.migrations [status|migrate]")
+        """Prints the usage and exits."""
+
+    with connection(DB_PATH) as conn:
+        """Borrows a pooled connection to the database."""
+
+        if command == ["migrate"]:
+            """Checks whether pending migrations should be applied."""
+
+            print(f"Applied {migrate(conn)} migrations.")
+            """Applies them and prints how many there were."""
+
+        version = current_version(conn)
+        """Reads the database's schema version."""
+
+    print(f"{DB_PATH}: schema version {version} of {latest_version()}")
+    """Prints the database's version and the latest one."""
+
+    for step in MIGRATIONS:
+        """Iterates through each migration."""
+
+        print(f"  {step.version:>3} {step.name:<24} {'applied' if step.version <= version else 'pending'}")
+        """Prints whether the migration has been applied."""
@@ -0,0 +1,417 @@
+import hashlib
+"""Imports hashlib to build ETags and cache file names."""
+
+import json
+"""Imports the json module to store cached pages on disk."""
+
+import os
+"""Imports the os module to handle the optional file-backed cache directory."""
+
+import threading
+"""Imports threading to guard the in-process cache from concurrent requests."""
+
+from collections import OrderedDict
+"""Imports OrderedDict to keep cache entries in least-recently-used order."""
+
+from functools import wraps
+"""Imports wraps to keep view function names when decorating them."""
+
+from flask import Response, request
+"""Imports Flask's response class and the current request."""
+
+from utils.db import get_db, get_generation
+"""Imports the per-request connection and the data generation lookup."""
+
+CACHE_DIR = os.environ.get("CAMPUSCONNECT_PAGE_CACHE")
+"""Defines the optional directory for the file-backed cache tier (disabled when unset)."""
+
+MAX_ENTRIES = int(os.environ.get("CAMPUSCONNECT_PAGE_CACHE_SIZE", 256))
+"""Defines how many rendered pages the in-process cache keeps."""
+
+MAX_FILES = int(os.environ.get("CAMPUSCONNECT_PAGE_CACHE_FILES", 1024))
+"""Defines how many rendered pages the file tier keeps (the oldest are deleted beyond this)."""
+
+PRUNE_INTERVAL = 64
+"""Defines how many file writes each worker makes between prunes of the file tier."""
+
+class PageCache:
+    """Two-tier cache of rendered responses: an in-process LRU and an optional shared file tier."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, directory=CACHE_DIR, max_files=MAX_FILES):
+        """
+        Initialize with the LRU size, the optional cache directory, and the file tier's size.
+        """
+
+        self.max_entries = max_entries
+        """Stores the maximum number of in-process entries."""
+
+        self.directory = directory
+        """Stores the directory of the file tier, or None when it is disabled."""
+
+        self.max_files = max_files
+        """Stores the maximum number of files in the file tier."""
+
+        self._writes = 0
+        """Counts the files this process has written since it last pruned the file tier."""
+
+        self._entries = OrderedDict()
+        """Stores cached pages keyed by cache key, oldest first."""
+
+        self._lock = threading.Lock()
+        """Creates a lock so request threads don't corrupt the LRU order."""
+
+        self.stats = {"hits": 0, "file_hits": 0, "misses": 0, "not_modified": 0, "pruned": 0}
+        """Stores the hit, miss, 304, and pruned file counters."""
+
+    def _path(self, key):
+        """
+        Return the file path for a cache key in the file tier.
+        """
+
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+        """Returns a file name derived from the key."""
+
+    def count(self, name):
+        """
+        Increment one of the statistics counters.
+        """
+
+        with self._lock:
+            """Prevents lost updates from concurrent requests."""
+
+            self.stats[name] += 1
+            """Increments the counter."""
+
+    def get(self, key):
+        """
+        Return the cached entry for a key (checking memory, then the file tier), or None.
+        """
+
+        with self._lock:
+            """Guards the in-process cache while reading it."""
+
+            entry = self._entries.get(key)
+            """Looks up the key in memory."""
+
+            if entry is not None:
+                """Checks whether the page is cached in memory."""
+
+                self._entries.move_to_end(key)
+                """Marks the entry as most recently used."""
+
+                self.stats["hits"] += 1
+                """Counts the memory hit."""
+
+                return entry
+                """Returns the cached entry."""
+
+        if self.directory:
+            """Checks whether the file tier is enabled."""
+
+            try:
+                with open(self._path(key)) as cache_file:
+                    """Opens the cached file."""
+
+                    entry = json.load(cache_file)
+                    """Reads the cached entry."""
+
+            except (OSError, ValueError):
+                """Handles a missing or corrupt file."""
+
+                entry = None
+                """Treats the page as not cached."""
+
+            if entry is not None:
+                """Checks whether the page was found on disk."""
+
+                self._store_memory(key, entry)
+                """Promotes the entry into the in-process cache."""
+
+                self.count("file_hits")
+                """Counts the file hit."""
+
+                return entry
+                """Returns the cached entry."""
+
+        self.count("misses")
+        """Counts the miss."""
+
+        return None
+        """Returns None so the caller renders the page."""
+
+    def _store_memory(self, key, entry):
+        """
+        Add an entry to the in-process LRU, evicting the oldest entries beyond the limit.
+        """
+
+        with self._lock:
+            """Guards the in-process cache while writing it."""
+
+            self._entries[key] = entry
+            """Stores the entry."""
+
+            self._entries.move_to_end(key)
+            """Marks the entry as most recently used."""
+
+            while len(self._entries) > self.max_entries:
+                """Checks whether the cache is over its size limit."""
+
+                self._entries.popitem(last=False)
+                """Evicts the least recently used entry."""
+
+    def put(self, key, entry):
+        """
+        Store an entry in memory and, when enabled, in the file tier.
+        """
+
+        self._store_memory(key, entry)
+        """Stores the entry in the in-process cache."""
+
+        if self.directory:
+            """Checks whether the file tier is enabled."""
+
+            os.makedirs(self.directory, exist_ok=True)
+            """Creates the cache directory if it doesn't exist yet."""
+
+            path = self._path(key)
+            """Builds the path of the cache file."""
+
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            """Builds a temporary path unique to this process and thread."""
+
+            with open(tmp_path, "w") as cache_file:
+                """Opens the temporary file for writing."""
+
+                json.dump(entry, cache_file)
+                """Writes the entry."""
+
+            os.replace(tmp_path, path)
+            """Atomically moves the file into place so other workers never read a partial entry."""
+
+            with self._lock:
+                """Guards the write counter."""
+
+                self._writes += 1
+                """Counts the write."""
+
+                due = self._writes >= PRUNE_INTERVAL
+                """Checks whether it is time to prune."""
+
+                if due:
+                    """Handles a due prune."""
+
+                    self._writes = 0
+                    """Restarts the count."""
+
+            if due:
+                """Checks whether this write should prune the file tier."""
+
+                self.prune()
+                """Deletes the oldest files beyond the limit."""
+
+    def prune(self):
+        """
+        Delete the oldest files of the file tier beyond max_files. Every ingest moves
+        the generations in the keys on, so the pages of older generations (which can
+        never be hit again) are the ones written longest ago and go first, and pages
+        for arbitrary query strings can't fill the disk. Returns the number deleted.
+        """
+
+        files = []
+        """Stores the modification time and path of each cached page."""
+
+        try:
+            with os.scandir(self.directory) as entries:
+                """Lists the cache directory."""
+
+                for entry in entries:
+                    """Iterates through each file."""
+
+                    if not entry.name.endswith(".json"):
+                        """Checks whether the file is a temporary file another worker is still writing."""
+
+                        continue
+                        """Skips it."""
+
+                    try:
+                        files.append((entry.stat().st_mtime, entry.path))
+                        """Stores when the file was written."""
+
+                    except OSError:
+                        """Handles a file another worker deleted meanwhile."""
+
+                        continue
+                        """Skips it."""
+
+        except OSError:
+            """Handles a missing cache directory."""
+
+            return 0
+            """Returns 0 because there is nothing to prune."""
+
+        if len(files) <= self.max_files:
+            """Checks whether the file tier is within its limit."""
+
+            return 0
+            """Returns 0 because nothing needs deleting."""
+
+        files.sort()
+        """Orders the files oldest first."""
+
+        deleted = 0
+        """Counts the deleted files."""
+
+        for _, path in files[:len(files) - self.max_files]:
+            """Iterates through the files beyond the limit, oldest first."""
+
+            try:
+                os.remove(path)
+                """Deletes the file."""
+
+                deleted += 1
+                """Counts the deletion."""
+
+            except OSError:
+                """Handles a file another worker already deleted."""
+
+                continue
+                """Skips it."""
+
+        with self._lock:
+            """Guards the counters."""
+
+            self.stats["pruned"] += deleted
+            """Counts the pruned files."""
+
+        return deleted
+        """Returns the number of deleted files."""
+
+    def clear(self):
+        """
+        Drop every in-process entry (file entries become unreachable once the generation moves on).
+        """
+
+        with self._lock:
+            """Guards the in-process cache while clearing it."""
+
+            self._entries.clear()
+            """Removes all entries."""
+
+    def summary(self):
+        """
+        Return the counters along with the hit rate and current size.
+        """
+
+        with self._lock:
+            """Reads a consistent snapshot of the counters."""
+
+            stats = dict(self.stats)
+            """Copies the counters."""
+
+            stats["entries"] = len(self._entries)
+            """Adds the number of in-process entries."""
+
+        lookups = stats["hits"] + stats["file_hits"] + stats["misses"]
+        """Counts every cache lookup."""
+
+        stats["hit_rate"] = (stats["hits"] + stats["file_hits"]) / lookups if lookups else 0.0
+        """Calculates the fraction of lookups served from the cache."""
+
+        return stats
+        """Returns the summary."""
+
+page_cache = PageCache()
+"""Creates the shared page cache used by the routes."""
+
+def cached_page(*sources, max_age=30, vary=None):
+    """
+    Decorate a view so its rendered response is cached per route and query string,
+    and invalidated whenever one of the named data generations is bumped by ingest.
+    vary is an optional function whose result is added to the key, for pages that
+    depend on something besides the query and the data (such as today's date).
+    Responses carry a strong ETag and Cache-Control, and matching If-None-Match
+    requests get a 304 without rendering.
+    """
+
+    def decorator(view):
+        """Wraps the view function with the cache."""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            """Serves the page from the cache, rendering it only on a miss."""
+
+            conn = get_db()
+            """Borrows the request's pooled connection."""
+
+            generations = ",".join(f"{name}:{get_generation(conn, name)}" for name in sources)
+            """Reads the current generation of each data source the page depends on."""
+
+            query = "&".join(f"{name}={value}" for name, value in sorted(request.args.items(multi=True)))
+            """Builds the query string in a stable order."""
+
+            key = f"{request.path}?{query}|{generations}" + (f"|{vary()}" if vary else "")
+            """Builds the cache key from the route, the query, the data generations, and anything else the page varies with."""
+
+            entry = page_cache.get(key)
+            """Looks up the rendered page."""
+
+            if entry is None:
+                """Handles a cache miss."""
+
+                response = view(*args, **kwargs)
+                """Renders the page."""
+
+                if not isinstance(response, Response):
+                    """Checks whether the view returned a plain string."""
+
+                    response = Response(response)
+                    """Wraps the string in a response object."""
+
+                if response.status_code != 200:
+                    """Checks whether the page rendered normally."""
+
+                    return response
+                    """Returns error responses without caching them."""
+
+                body = response.get_data(as_text=True)
+                """Reads the rendered body."""
+
+                entry = {
+                    "body": body,
+                    "mimetype": response.mimetype,
+                    "etag": hashlib.sha1(body.encode("utf-8")).hexdigest(),
+                }
+                """Builds the cache entry with a strong ETag derived from the body."""
+
+                page_cache.put(key, entry)
+                """Stores the rendered page."""
+
+            if request.if_none_match.contains(entry["etag"]):
+                """Checks whether the client already has this exact page."""
+
+                page_cache.count("not_modified")
+                """Counts the 304 response."""
+
+                response = Response(status=304)
+                """Builds an empty 304 Not Modified response."""
+
+            else:
+                """Handles clients that need the page body."""
+
+                response = Response(entry["body"], mimetype=entry["mimetype"])
+                """Builds the response from the cached body."""
+
+            response.set_etag(entry["etag"])
+            """Sets the ETag header so browsers and proxies can revalidate."""
+
+            response.headers["Cache-Control"] = f"public, max-age={max_age}"
+            """Allows browsers and the reverse proxy to reuse the page briefly, then revalidate."""
+
+            return response
+            """Returns the cached (or 304) response."""
+
+        return wrapper
+        """Returns the wrapped view."""
+
+    return decorator
+    """Returns the decorator."""
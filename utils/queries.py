@@ -0,0 +1,485 @@
+import base64
+"""Imports base64 to encode pagination cursors as opaque URL-safe tokens."""
+
+import heapq
+"""Imports heapq to merge the sorted event and alert cursors into one timeline."""
+
+import itertools
+"""Imports itertools to stop reading the merged timeline after one page."""
+
+import json
+"""Imports the json module to serialize pagination cursors."""
+
+import time
+"""Imports the time module to compare alert expiry times with the current time."""
+
+from utils import timestamps
+"""Imports the date parsing that turns query string dates into epoch seconds."""
+
+from utils.db import get_generation
+"""Imports the data generation lookup."""
+
+from utils.metrics import timed
+"""Imports the decorator that records each query's latency and row count at /metrics."""
+
+PAGE_SIZE = 50
+"""Defines how many rows a page shows by default."""
+
+MAX_PAGE_SIZE = 500
+"""Defines the largest page size a client may request."""
+
+SQLITE_INT = (-2 ** 63, 2 ** 63 - 1)
+"""Defines the range of integers SQLite can bind (larger ones raise OverflowError)."""
+
+def encode_cursor(*values):
+    """
+    Encode the sort key of the last row on a page as an opaque cursor token.
+    """
+
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+    """Returns the URL-safe token."""
+
+def cursor_value(value, kinds):
+    """
+    Check whether one decoded cursor value has one of the allowed types (bool is not an
+    int here) and, for integers, fits in a SQLite integer.
+    """
+
+    if type(value) not in kinds:
+        """Checks the value's exact type."""
+
+        return False
+        """Rejects lists, objects, booleans, and other unexpected values."""
+
+    return not isinstance(value, int) or SQLITE_INT[0] <= value <= SQLITE_INT[1]
+    """Accepts strings and None, and integers within SQLite's range."""
+
+def decode_cursor(token, types=((int,), (int,))):
+    """
+    Decode a cursor token back into its sort key values, one per entry of `types` (a
+    tuple of the types each value may have). Returns None if the token is missing or
+    doesn't decode to such values, so the first page is shown.
+    """
+
+    if not token:
+        """Checks whether a cursor was given."""
+
+        return None
+        """Returns None so the first page is shown."""
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        """Decodes the sort key values."""
+
+    except ValueError:
+        """Handles a malformed or tampered token."""
+
+        return None
+        """Returns None so the first page is shown."""
+
+    if not isinstance(values, list) or len(values) != len(types):
+        """Checks whether the token holds the right number of values."""
+
+        return None
+        """Returns None so the first page is shown."""
+
+    if not all(cursor_value(value, kinds) for value, kinds in zip(values, types)):
+        """Checks whether every value can be bound to the page query."""
+
+        return None
+        """Returns None so the first page is shown."""
+
+    return values
+    """Returns the sort key values."""
+
+def page_size(value):
+    """
+    Turn a requested page size into a safe integer between 1 and MAX_PAGE_SIZE.
+    """
+
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+        """Returns the requested size, clamped to the allowed range."""
+
+    except (TypeError, ValueError):
+        """Handles a missing or non-numeric value."""
+
+        return PAGE_SIZE
+        """Returns the default page size."""
+
+def _page(rows, limit, key):
+    """
+    Split limit+1 fetched rows into the page and the cursor for the next page.
+    """
+
+    if len(rows) <= limit:
+        """Checks whether this is the last page."""
+
+        return rows, None
+        """Returns every row and no next cursor."""
+
+    rows = rows[:limit]
+    """Keeps only the rows for this page."""
+
+    return rows, encode_cursor(*key(rows[-1]))
+    """Returns the page and a cursor pointing after its last row."""
+
+def _date_filters(start, end, location, after):
+    """
+    Build the WHERE clause and parameters shared by the event queries. Dates are
+    compared as epoch seconds on the indexed starts_at column, so rows without a
+    parseable date are left out and the (starts_at, id) keyset comparison stays
+    index-friendly.
+    """
+
+    first, last = timestamps.day_range(start, end)
+    """Converts the date range to epoch seconds."""
+
+    clauses = ["starts_at IS NOT NULL" if first is None else "starts_at >= ?"]
+    """Starts with the lower bound of the date range."""
+
+    params = [] if first is None else [first]
+    """Uses the given start date, or every dated event."""
+
+    if last is not None:
+        """Checks whether an upper bound was given."""
+
+        clauses.append("starts_at < ?")
+        """Adds the upper bound of the date range (the end of the given day)."""
+
+        params.append(last)
+        """Adds the end of the range."""
+
+    if location:
+        """Checks whether a location filter was given."""
+
+        clauses.append("location = ?")
+        """Adds the location filter."""
+
+        params.append(location)
+        """Adds the location parameter."""
+
+    if after:
+        """Checks whether this is a later page."""
+
+        clauses.append("(starts_at, id) > (?, ?)")
+        """Continues strictly after the last row of the previous page."""
+
+        params.extend(after)
+        """Adds the previous page's last start time and id."""
+
+    return " AND ".join(clauses), params
+    """Returns the clause and its parameters."""
+
+@timed("db.internal_events", rows=lambda page: len(page[0]))
+def internal_events(conn, start=None, end=None, location=None, after=None, limit=PAGE_SIZE):
+    """
+    Return one page of internal events ordered by date, plus the next page's cursor.
+    """
+
+    where, params = _date_filters(start, end, location, decode_cursor(after))
+    """Builds the filters and keyset condition."""
+
+    rows = conn.execute(
+        f"SELECT id, title, location, date, starts_at FROM events WHERE {where} ORDER BY starts_at, id LIMIT ?",
+        params + [limit + 1]
+    ).fetchall()
+    """Fetches one more row than needed to know whether another page exists."""
+
+    return _page(rows, limit, lambda row: (row["starts_at"], row["id"]))
+    """Returns the page and the next cursor."""
+
+@timed("db.external_events", rows=lambda page: len(page[0]))
+def external_events(conn, start=None, end=None, location=None, after=None, limit=PAGE_SIZE):
+    """
+    Return one page of scraped events ordered by date, plus the next page's cursor.
+    """
+
+    where, params = _date_filters(start, end, location, decode_cursor(after))
+    """Builds the filters and keyset condition."""
+
+    rows = conn.execute(
+        f"SELECT id, title, date, location, description, starts_at FROM external_events WHERE {where} ORDER BY starts_at, id LIMIT ?",
+        params + [limit + 1]
+    ).fetchall()
+    """Fetches one more row than needed to know whether another page exists."""
+
+    return _page(rows, limit, lambda row: (row["starts_at"], row["id"]))
+    """Returns the page and the next cursor."""
+
+@timed("db.alerts", rows=lambda page: len(page[0]))
+def alerts(conn, include_expired=False, after=None, limit=PAGE_SIZE, campus=None):
+    """
+    Return one page of weather alerts, newest effective first, plus the next page's cursor.
+    Expired alerts are left out unless include_expired is set. Given a campus id, only
+    the alerts matched to that campus at ingest are returned.
+    """
+
+    clauses = ["1 = 1"]
+    """Starts with an always-true clause so filters can be appended."""
+
+    params = []
+    """Initializes the query parameters."""
+
+    if not include_expired:
+        """Checks whether expired alerts should be hidden."""
+
+        clauses.append("(expires_at IS NULL OR expires_at > ?)")
+        """Compares epoch seconds, since weather.gov timestamps carry different UTC offsets."""
+
+        params.append(int(time.time()))
+        """Adds the current time."""
+
+    if campus is not None:
+        """Checks whether only one campus's alerts were asked for."""
+
+        clauses.append("rowid IN (SELECT alert_rowid FROM campus_alerts WHERE campus_id = ?)")
+        """Looks the alerts up in the precomputed campus matches."""
+
+        params.append(campus)
+        """Adds the campus id."""
+
+    cursor = decode_cursor(after, types=((int, type(None)), (str,)))
+    """Decodes the previous page's last effective time (None for alerts without one) and id."""
+
+    select = f"""
+        SELECT id, event, headline, description,
+               severity, urgency, certainty,
+               effective, expires, area, source, effective_at
+        FROM api_data
+        WHERE {" AND ".join(clauses)}
+    """
+    """Builds the filtered query each part of the page is read with."""
+
+    if not cursor:
+        """Checks whether this is the first page."""
+
+        rows = conn.execute(
+            f"{select} ORDER BY effective_at DESC, id DESC LIMIT ?", params + [limit + 1]
+        ).fetchall()
+        """Walks the effective time index newest first (alerts without one sort last), stopping after one more row
+        than needed."""
+
+    elif cursor[0] is None:
+        """Checks whether the previous page ended among the alerts without an effective time."""
+
+        rows = conn.execute(
+            f"{select} AND effective_at IS NULL AND id < ? ORDER BY id DESC LIMIT ?", params + [cursor[1], limit + 1]
+        ).fetchall()
+        """Continues through the undated alerts only, since every dated one came before them."""
+
+    else:
+        """Handles a later page that ended among the dated alerts."""
+
+        rows = conn.execute(f"""
+            SELECT * FROM ({select} AND (effective_at, id) < (?, ?) ORDER BY effective_at DESC, id DESC LIMIT ?)
+            UNION ALL
+            SELECT * FROM ({select} AND effective_at IS NULL ORDER BY id DESC LIMIT ?)
+            ORDER BY effective_at DESC, id DESC
+            LIMIT ?
+        """, params + [*cursor, limit + 1] + params + [limit + 1, limit + 1]).fetchall()
+        """Continues after the previous page's last row, then into the undated alerts (which the row-value comparison
+        can't reach, since comparing with NULL is never true), each part read through the index in order."""
+
+    return _page(rows, limit, lambda row: (row["effective_at"], row["id"]))
+    """Returns the page and the next cursor."""
+
+def next_expiry(conn):
+    """
+    Return the epoch time at which the next alert expires (None if none is pending).
+    Pages that hide expired alerts vary their cache key with it, since an alert
+    expiring changes no row and bumps no generation.
+    """
+
+    return conn.execute("SELECT MIN(expires_at) FROM api_data WHERE expires_at > ?", (int(time.time()),)).fetchone()[0]
+    """Reads the earliest future expiry from the expiry index."""
+
+def begin_snapshot(conn, source):
+    """
+    Start a read transaction and return the source's current data generation within it.
+    Every row a feed then reads is consistent with that generation, so a client that
+    syncs again with since=<generation> misses nothing and repeats nothing.
+    """
+
+    conn.execute("BEGIN")
+    """Opens a read transaction so the generation and the rows come from one snapshot."""
+
+    return get_generation(conn, source)
+    """Returns the generation of the data in the snapshot."""
+
+def events_since(conn, since=None):
+    """
+    Return cursors over internal and scraped events changed after a generation
+    (every event when since is None). Rows are read lazily as the cursors are iterated.
+    """
+
+    since = -1 if since is None else since
+    """Includes rows that were never stamped when no generation was given."""
+
+    internal = conn.execute(
+        "SELECT 'internal' AS kind, id, title, location, date, starts_at, changed_gen FROM events WHERE changed_gen > ? ORDER BY id",
+        (since,)
+    )
+    """Opens a cursor over the internal events."""
+
+    external = conn.execute("""
+        SELECT 'external' AS kind, id, title, location, date, starts_at, description, source, changed_gen
+        FROM external_events
+        WHERE changed_gen > ?
+        ORDER BY changed_gen, id
+    """, (since,))
+    """Opens a cursor over the scraped events, oldest change first."""
+
+    return internal, external
+    """Returns both cursors."""
+
+def alerts_since(conn, since=None, include_expired=False):
+    """
+    Return a cursor over alerts changed after a generation (every alert when since is None).
+    Expired alerts are left out unless include_expired is set.
+    """
+
+    expired = "" if include_expired else "AND (expires_at IS NULL OR expires_at > ?)"
+    """Builds the optional filter that hides expired alerts."""
+
+    return conn.execute(f"""
+        SELECT id, event, headline, description,
+               severity, urgency, certainty,
+               effective, expires, area, source,
+               effective_at, expires_at, changed_gen
+        FROM api_data
+        WHERE changed_gen > ? {expired}
+        ORDER BY changed_gen, id
+    """, (-1 if since is None else since,) + (() if include_expired else (int(time.time()),)))
+    """Returns a cursor over the alerts, oldest change first."""
+
+def deleted_since(conn, source, since):
+    """
+    Return a cursor over the tombstones of a source's rows deleted after a generation,
+    as {"kind", "id", "deleted": 1, "changed_gen"} rows, oldest deletion first.
+    """
+
+    return conn.execute("""
+        SELECT kind, id, 1 AS deleted, deleted_gen AS changed_gen
+        FROM deleted_rows
+        WHERE name = ? AND deleted_gen > ?
+        ORDER BY deleted_gen
+    """, (source, since))
+    """Returns a cursor over the tombstones in the order they were deleted."""
+
+def sync_floor(conn, source):
+    """
+    Return the oldest generation a source's feed can still sync incrementally from
+    (0 until retention has pruned tombstones).
+    """
+
+    row = conn.execute("SELECT generation FROM sync_floor WHERE name = ?", (source,)).fetchone()
+    """Reads the floor."""
+
+    return row[0] if row else 0
+    """Returns the floor, or 0 if nothing was pruned yet."""
+
+TIMELINE_SOURCES = [
+    ("event", "SELECT 'event' AS kind, id, title, location, starts_at AS at, NULL AS detail FROM events", "starts_at"),
+    ("external", "SELECT 'external' AS kind, id, title, location, starts_at AS at, description AS detail FROM external_events", "starts_at"),
+    ("alert", "SELECT 'alert' AS kind, id, headline AS title, area AS location, effective_at AS at, severity AS detail FROM api_data", "effective_at"),
+]
+"""Defines the timeline's sources in tie-break order: each kind, the query of its rows, and its indexed epoch column."""
+
+@timed("db.timeline", rows=lambda page: len(page[0]))
+def timeline(conn, start=None, end=None, after=None, limit=PAGE_SIZE):
+    """
+    Return one page of internal events, scraped events, and alerts in one list ordered
+    by start time (effective time for alerts), plus the next page's cursor. start and
+    end are epoch seconds bounding the range [start, end). Each source is read through
+    its own index in order, and the cursors are merged lazily, so only the rows on the
+    page (plus one look-ahead row per source) are read, however large the tables are.
+    """
+
+    cursor = decode_cursor(after, types=((int,), (str,), (int, str)))
+    """Decodes the previous page's last (time, kind, id); alert ids are strings."""
+
+    ranks = {kind: rank for rank, (kind, _, _) in enumerate(TIMELINE_SOURCES)}
+    """Maps each kind to its place in the tie-break order."""
+
+    if cursor and cursor[1] not in ranks:
+        """Checks whether the cursor names an unknown kind."""
+
+        cursor = None
+        """Ignores it so the first page is shown."""
+
+    streams = []
+    """Stores the cursor over each source."""
+
+    for kind, select, column in TIMELINE_SOURCES:
+        """Iterates through each source."""
+
+        clauses = [f"{column} IS NOT NULL" if start is None else f"{column} >= ?"]
+        """Starts with the lower bound of the range."""
+
+        params = [] if start is None else [start]
+        """Adds the start of the range."""
+
+        if end is not None:
+            """Checks whether the range has an end."""
+
+            clauses.append(f"{column} < ?")
+            """Adds the upper bound of the range."""
+
+            params.append(end)
+            """Adds the end of the range."""
+
+        if cursor:
+            """Checks whether this is a later page."""
+
+            at, last_kind, last_id = cursor
+            """Unpacks the previous page's last row."""
+
+            if ranks[kind] < ranks[last_kind]:
+                """Checks whether this source sorts before the last row's source at equal times."""
+
+                clauses.append(f"{column} > ?")
+                """Continues after the last row's time."""
+
+                params.append(at)
+                """Adds the time."""
+
+            elif ranks[kind] > ranks[last_kind]:
+                """Checks whether this source sorts after the last row's source at equal times."""
+
+                clauses.append(f"{column} >= ?")
+                """Continues from the last row's time."""
+
+                params.append(at)
+                """Adds the time."""
+
+            else:
+                """Handles the last row's own source."""
+
+                clauses.append(f"({column}, id) > (?, ?)")
+                """Continues strictly after the last row."""
+
+                params.extend((at, last_id))
+                """Adds the time and id."""
+
+        streams.append(conn.execute(
+            f"{select} WHERE {' AND '.join(clauses)} ORDER BY {column}, id LIMIT ?", params + [limit + 1]
+        ))
+        """Opens the source's cursor, which reads rows only as the merge asks for them."""
+
+    rows = list(itertools.islice(heapq.merge(*streams, key=lambda row: (row["at"], ranks[row["kind"]])), limit + 1))
+    """Merges the sorted cursors, stopping one row past the page."""
+
+    return _page(rows, limit, lambda row: (row["at"], row["kind"], row["id"]))
+    """Returns the page and the next cursor."""
+
+def upcoming(conn, days=7, now=None, limit=PAGE_SIZE):
+    """
+    Return the events and alerts starting in the next `days` days, soonest first.
+    """
+
+    now = int(time.time()) if now is None else now
+    """Uses the current time unless one was given."""
+
+    return timeline(conn, now, now + days * timestamps.DAY, limit=limit)[0]
+    """Returns the first page of the range."""
@@ -0,0 +1,550 @@
+import heapq
+"""Imports heapq to keep only a user's best matches."""
+
+import os
+"""Imports the os module to read recommendation settings from environment variables."""
+
+import sqlite3
+"""Imports SQLite3 for its error types."""
+
+import sys
+"""Imports sys to read the command-line arguments."""
+
+import time
+"""Imports the time module to report how long a rebuild took."""
+
+from utils.db import DB_PATH, bump_generation, connection
+"""Imports the database path, the generation counter, and the pooled connection helper."""
+
+from utils.text import terms
+"""Imports the tokenizer shared by preferences and events."""
+
+from utils.metrics import timed
+"""Imports the decorator that records each query's latency and row count at /metrics."""
+
+from utils.migrations import migrate
+"""Imports the migration runner that creates the recommendation tables on older databases."""
+
+from utils.timestamps import to_epoch
+"""Imports the date parser used for the upcoming_from filter."""
+
+FIELD_WEIGHTS = (("title", 3.0), ("location", 2.0), ("description", 1.0))
+"""Defines how much a preference term counts when it appears in each event field."""
+
+SOURCES = {
+    "event": "SELECT id, title, location, NULL AS description, date, starts_at FROM events",
+    "external": "SELECT id, title, location, description, date, starts_at FROM external_events",
+}
+"""Defines the query that reads the matchable fields of each kind of event."""
+
+BATCH_SIZE = 500
+"""Defines how many events are matched per batch during a rebuild."""
+
+MAX_MATCHES = int(os.environ.get("CAMPUSCONNECT_MAX_MATCHES", 100))
+"""Defines how many matches are kept per user (bounds the table at users x MAX_MATCHES rows). Matches with past
+or unknown start times are evicted first, so the cap keeps each user's best upcoming events."""
+
+PAGE_SIZE = 20
+"""Defines how many recommended events are shown per page."""
+
+def keep_order(score, starts_at, now):
+    """
+    Return the key matches are kept by when a user's list is full: every upcoming
+    match ranks above every past (or undated) one, then the higher score wins.
+    """
+
+    return (starts_at is not None and starts_at >= now, score)
+    """Returns whether the event is upcoming, then its score."""
+
+def score_event(event, term_users):
+    """
+    Score one event for every user with a matching preference term.
+    Each matched term adds the weight of the most important field it appears in.
+    Returns a dictionary of user id to score.
+    """
+
+    best = {}
+    """Stores the best field weight of each term found in the event."""
+
+    for field, weight in FIELD_WEIGHTS:
+        """Iterates through each matchable field."""
+
+        for term in terms(event[field]):
+            """Iterates through each term in the field."""
+
+            if term in term_users and weight > best.get(term, 0.0):
+                """Checks whether some user wants the term and this field ranks it higher."""
+
+                best[term] = weight
+                """Records the field weight for the term."""
+
+    scores = {}
+    """Stores the score of each matched user."""
+
+    for term, weight in best.items():
+        """Iterates through each matched term."""
+
+        for user_id in term_users[term]:
+            """Iterates through each user who listed the term."""
+
+            scores[user_id] = scores.get(user_id, 0.0) + weight
+            """Adds the term's weight to the user's score."""
+
+    return scores
+    """Returns the scores."""
+
+def load_term_users(conn, wanted):
+    """
+    Look up which users listed each of the given terms in their preferences.
+    Returns a dictionary of term to list of user ids (terms nobody listed are left out).
+    """
+
+    wanted = list(wanted)
+    """Stores the terms so they can be looked up in chunks."""
+
+    term_users = {}
+    """Stores the users of each term."""
+
+    for start in range(0, len(wanted), BATCH_SIZE):
+        """Iterates through the terms in chunks to stay under SQLite's variable limit."""
+
+        chunk = wanted[start:start + BATCH_SIZE]
+        """Selects the current chunk of terms."""
+
+        for term, user_id in conn.execute(
+            f"SELECT term, user_id FROM user_preference_terms WHERE term IN ({','.join('?' * len(chunk))})", chunk
+        ):
+            """Iterates through each user who listed one of the terms."""
+
+            term_users.setdefault(term, []).append(user_id)
+            """Adds the user to the term's list."""
+
+    return term_users
+    """Returns the users of each term."""
+
+def load_user_stats(conn, user_ids, now):
+    """
+    Read how many matches each of the given users has stored and the keep_order key
+    of the one that would be evicted first. Returns a dictionary of user id to
+    (count, lowest key); users without matches are left out.
+    """
+
+    user_ids = list(user_ids)
+    """Stores the users so they can be looked up in chunks."""
+
+    stats = {}
+    """Stores the count and lowest key of each user."""
+
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        """Iterates through the users in chunks to stay under SQLite's variable limit."""
+
+        chunk = user_ids[start:start + BATCH_SIZE]
+        """Selects the current chunk of users."""
+
+        for user_id, count, lowest_past, lowest_upcoming in conn.execute(f"""
+            SELECT user_id, COUNT(*),
+                   MIN(CASE WHEN COALESCE(starts_at >= ?, 0) = 0 THEN score END),
+                   MIN(CASE WHEN starts_at >= ? THEN score END)
+            FROM user_event_matches
+            WHERE user_id IN ({','.join('?' * len(chunk))})
+            GROUP BY user_id
+        """, [now, now, *chunk]):
+            """Iterates through each user's stored matches (at most MAX_MATCHES each)."""
+
+            stats[user_id] = (count, (False, lowest_past) if lowest_past is not None else (True, lowest_upcoming))
+            """Stores the user's count and the key of their weakest past match, or else their weakest upcoming one."""
+
+    return stats
+    """Returns the counts and lowest keys."""
+
+def match_events(conn, kind, events, now=None):
+    """
+    Recompute the stored matches of a batch of events (rows with id, title, location,
+    description, date, and starts_at) inside the caller's transaction. Only the
+    preference terms that occur in these events are read, so the cost grows with the
+    batch, not with the number of users. Each user keeps at most MAX_MATCHES matches,
+    compared by keep_order: past matches are evicted before upcoming ones, oldest
+    first, and a new match that doesn't beat a full user's weakest one is dropped.
+    """
+
+    now = int(time.time()) if now is None else now
+    """Uses the current time unless one was given."""
+
+    if not events:
+        """Checks whether there is anything to match."""
+
+        return 0
+        """Returns 0 because nothing was matched."""
+
+    wanted = set()
+    """Stores every term that occurs in the batch."""
+
+    for event in events:
+        """Iterates through each event."""
+
+        for field, _ in FIELD_WEIGHTS:
+            """Iterates through each matchable field."""
+
+            wanted |= terms(event[field])
+            """Adds the field's terms."""
+
+    term_users = load_term_users(conn, wanted)
+    """Looks up the users of those terms."""
+
+    ids = [event["id"] for event in events]
+    """Stores the ids of the events being matched."""
+
+    conn.execute(
+        f"DELETE FROM user_event_matches WHERE kind = ? AND event_id IN ({','.join('?' * len(ids))})", [kind, *ids]
+    )
+    """Removes the events' old matches (an updated event may no longer match)."""
+
+    found = {}
+    """Stores the new matches of each user as (score, event id, date, start time)."""
+
+    for event in events:
+        """Iterates through each event."""
+
+        for user_id, score in score_event(event, term_users).items():
+            """Iterates through each user the event matches."""
+
+            found.setdefault(user_id, []).append((score, event["id"], event["date"], event["starts_at"]))
+            """Adds the match to the user's list."""
+
+    stats = load_user_stats(conn, found, now)
+    """Reads how full each matched user's list already is."""
+
+    rows = []
+    """Stores the matches to insert."""
+
+    trims = []
+    """Stores the users whose weakest matches must be removed to stay within MAX_MATCHES."""
+
+    for user_id, matches in found.items():
+        """Iterates through each matched user."""
+
+        count, lowest = stats.get(user_id, (0, None))
+        """Reads the user's current count and the key of their weakest match."""
+
+        if count >= MAX_MATCHES:
+            """Checks whether the user's list is already full."""
+
+            matches = [match for match in matches if keep_order(match[0], match[3], now) > lowest]
+            """Keeps only the matches that beat the user's weakest stored match."""
+
+        matches = heapq.nlargest(MAX_MATCHES, matches, key=lambda match: keep_order(match[0], match[3], now))
+        """Keeps at most MAX_MATCHES of the new matches, upcoming and best first."""
+
+        rows.extend((user_id, kind, event_id, score, date, starts_at) for score, event_id, date, starts_at in matches)
+        """Queues the accepted matches."""
+
+        if count + len(matches) > MAX_MATCHES:
+            """Checks whether the user would go over the limit."""
+
+            trims.append((user_id, user_id, now, count + len(matches) - MAX_MATCHES))
+            """Queues the removal of the user's weakest matches."""
+
+    conn.executemany(
+        "INSERT INTO user_event_matches (user_id, kind, event_id, score, event_date, starts_at) VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    """Stores the new matches."""
+
+    conn.executemany("""
+        DELETE FROM user_event_matches
+        WHERE user_id = ? AND (kind, event_id) IN (
+            SELECT kind, event_id FROM user_event_matches WHERE user_id = ?
+            ORDER BY COALESCE(starts_at >= ?, 0), score, starts_at
+            LIMIT ?
+        )
+    """, trims)
+    """Removes the weakest matches of users who went over the limit: past and undated ones first (oldest first),
+    then the lowest-scoring upcoming ones."""
+
+    return len(rows)
+    """Returns the number of matches stored."""
+
+@timed("recommendations.match_generation", rows=lambda count: count)
+def match_generation(conn, generation, kind="external"):
+    """
+    Match the events of one kind written in one ingest generation inside the caller's
+    transaction (the scraper runs it in its own transaction right after the write, so
+    scoring users never holds the events write lock; bulk loads run it in theirs).
+    """
+
+    cursor = conn.execute(f"{SOURCES[kind]} WHERE changed_gen = ?", (generation,))
+    """Opens a cursor over the events stamped with the generation."""
+
+    count = 0
+    """Counts the stored matches."""
+
+    while True:
+        """Keeps reading until every event is matched."""
+
+        events = cursor.fetchmany(BATCH_SIZE)
+        """Reads the next batch of events."""
+
+        if not events:
+            """Checks whether the cursor is exhausted."""
+
+            return count
+            """Returns the number of matches stored."""
+
+        count += match_events(conn, kind, events)
+        """Matches the batch."""
+
+def refill(conn, now=None):
+    """
+    Rematch every upcoming event, one batch per transaction, so matches a full user
+    evicted earlier come back once retention or time has freed their slots (past
+    matches are evicted before them). Returns the number of matches stored.
+    """
+
+    now = int(time.time()) if now is None else now
+    """Uses the current time unless one was given."""
+
+    count = 0
+    """Counts the stored matches."""
+
+    for kind, query in SOURCES.items():
+        """Iterates through each kind of event."""
+
+        last = 0
+        """Stores the id of the last event matched, so each batch continues where the previous one stopped."""
+
+        while True:
+            """Keeps matching until every upcoming event is done."""
+
+            with conn:
+                events = conn.execute(
+                    f"{query} WHERE starts_at >= ? AND id > ? ORDER BY id LIMIT ?", (now, last, BATCH_SIZE)
+                ).fetchall()
+                """Reads the next batch of upcoming events."""
+
+                if not events:
+                    """Checks whether every upcoming event was matched."""
+
+                    break
+                    """Moves on to the next kind of event."""
+
+                count += match_events(conn, kind, events, now)
+                """Matches the batch."""
+
+            last = events[-1]["id"]
+            """Remembers where the batch ended."""
+
+    with conn:
+        bump_generation(conn, "preferences")
+        """Invalidates cached feed pages."""
+
+    return count
+    """Returns the number of matches stored."""
+
+def index_user(conn, user_id, preferences):
+    """
+    Replace a user's preference terms and recompute their matches against every event
+    inside the caller's transaction.
+    """
+
+    conn.execute("DELETE FROM user_preference_terms WHERE user_id = ?", (user_id,))
+    """Removes the user's old terms."""
+
+    conn.execute("DELETE FROM user_event_matches WHERE user_id = ?", (user_id,))
+    """Removes the user's old matches."""
+
+    wanted = terms(preferences)
+    """Tokenizes the preferences."""
+
+    conn.executemany(
+        "INSERT INTO user_preference_terms (term, user_id) VALUES (?, ?)", [(term, user_id) for term in wanted]
+    )
+    """Stores the user's terms."""
+
+    if not wanted:
+        """Checks whether the user has any usable preferences."""
+
+        return
+        """Exits because nothing can match."""
+
+    term_users = {term: [user_id] for term in wanted}
+    """Builds a term index containing only this user."""
+
+    rows = []
+    """Initializes the user's matches."""
+
+    now = int(time.time())
+    """Stores the time that separates upcoming matches from past ones."""
+
+    for kind, query in SOURCES.items():
+        """Iterates through each kind of event."""
+
+        for event in conn.execute(query):
+            """Iterates through each event of this kind."""
+
+            score = score_event(event, term_users).get(user_id)
+            """Scores the event for the user."""
+
+            if score:
+                """Checks whether the event matched any preference."""
+
+                rows.append((user_id, kind, event["id"], score, event["date"], event["starts_at"]))
+                """Adds the match."""
+
+    conn.executemany(
+        "INSERT INTO user_event_matches (user_id, kind, event_id, score, event_date, starts_at) VALUES (?, ?, ?, ?, ?, ?)",
+        heapq.nlargest(MAX_MATCHES, rows, key=lambda row: keep_order(row[3], row[5], now))
+    )
+    """Stores the user's best matches, upcoming ones first."""
+
+def set_preferences(conn, user_id, preferences):
+    """
+    Save a user's preferences and update their recommendations in one transaction.
+    """
+
+    with conn:
+        conn.execute("UPDATE users SET preferences = ? WHERE id = ?", (preferences, user_id))
+        """Saves the new preferences."""
+
+        index_user(conn, user_id, preferences)
+        """Recomputes the user's terms and matches."""
+
+        bump_generation(conn, "preferences")
+        """Invalidates cached feed pages in the same transaction."""
+
+def match_all(conn):
+    """
+    Recompute every user's preference terms and every event's matches from scratch
+    inside the caller's transaction.
+    """
+
+    conn.execute("DELETE FROM user_preference_terms")
+    """Removes every preference term."""
+
+    conn.execute("DELETE FROM user_event_matches")
+    """Removes every match."""
+
+    try:
+        users = conn.execute("SELECT id, preferences FROM users").fetchall()
+        """Reads every user's preferences."""
+
+    except sqlite3.OperationalError:
+        """Handles a database without a users table."""
+
+        users = []
+        """Treats the database as having no users."""
+
+    conn.executemany(
+        "INSERT INTO user_preference_terms (term, user_id) VALUES (?, ?)",
+        ((term, user_id) for user_id, preferences in users for term in terms(preferences))
+    )
+    """Builds the inverted preference index."""
+
+    for kind, query in SOURCES.items():
+        """Iterates through each kind of event."""
+
+        try:
+            cursor = conn.execute(query)
+            """Opens a cursor over the events."""
+
+        except sqlite3.OperationalError:
+            """Handles a table that doesn't exist yet."""
+
+            continue
+            """Skips this kind of event."""
+
+        while True:
+            """Keeps reading until every event is matched."""
+
+            events = cursor.fetchmany(BATCH_SIZE)
+            """Reads the next batch of events."""
+
+            if not events:
+                """Checks whether the cursor is exhausted."""
+
+                break
+                """Moves on to the next kind of event."""
+
+            match_events(conn, kind, events)
+            """Matches the batch."""
+
+def rebuild(conn):
+    """
+    Recompute every recommendation in one transaction. Returns the number of matches stored.
+    """
+
+    with conn:
+        match_all(conn)
+        """Recomputes the preference terms and matches."""
+
+        bump_generation(conn, "preferences")
+        """Invalidates cached feed pages in the same transaction."""
+
+    return conn.execute("SELECT COUNT(*) FROM user_event_matches").fetchone()[0]
+    """Returns the number of matches stored."""
+
+@timed("db.recommended_events", rows=lambda page: len(page[0]))
+def recommended_events(conn, user_id, upcoming_from=None, page=1, limit=PAGE_SIZE):
+    """
+    Return one page of a user's recommended events, best match first, and whether a
+    next page exists. This is a single lookup on the (user_id, score) index; pass
+    upcoming_from (a date like 2025-04-01) to leave out events starting before it.
+    """
+
+    params = [user_id]
+    """Starts the parameters with the user."""
+
+    upcoming = ""
+    """Holds the optional date filter."""
+
+    earliest = to_epoch(upcoming_from)
+    """Converts the earliest date to epoch seconds (None when it is missing or can't be parsed)."""
+
+    if earliest is not None:
+        """Checks whether past events should be left out."""
+
+        upcoming = "AND m.starts_at >= ?"
+        """Adds the filter on the indexed epoch start time."""
+
+        params.append(earliest)
+        """Adds the earliest start time."""
+
+    rows = conn.execute(f"""
+        SELECT m.kind, m.event_id, m.score, m.event_date AS date,
+               COALESCE(e.title, x.title) AS title,
+               COALESCE(e.location, x.location) AS location,
+               x.description AS description
+        FROM user_event_matches m
+        LEFT JOIN events e ON m.kind = 'event' AND e.id = m.event_id
+        LEFT JOIN external_events x ON m.kind = 'external' AND x.id = m.event_id
+        WHERE m.user_id = ? {upcoming} AND (e.id IS NOT NULL OR x.id IS NOT NULL)
+        ORDER BY m.score DESC, m.starts_at
+        LIMIT ? OFFSET ?
+    """, params + [limit + 1, (max(page, 1) - 1) * limit]).fetchall()
+    """Reads the page from the user's precomputed matches, plus one row to know whether another page exists."""
+
+    return rows[:limit], len(rows) > limit
+    """Returns the page and whether there are more."""
+
+if __name__ == "__main__":
+    """Recomputes every recommendation when run as: python -m utils.recommendations rebuild"""
+
+    if sys.argv[1:] != ["rebuild"]:
+        """Checks whether a known command was given."""
+
+        sys.exit("usage: python -m utils.recommendations rebuild")
+        """Prints the usage and exits."""
+
+    start = time.perf_counter()
+    """Records the start time."""
+
+    with connection(DB_PATH) as conn:
+        """Borrows a pooled connection to the database."""
+
+        migrate(conn)
+        """Brings the database up to date, creating the recommendation tables if they are missing."""
+
+        matched = rebuild(conn)
+        """Recomputes every match."""
+
+    print(f"Stored {matched} matches in {time.perf_counter() - start:.2f}s.")
+    """Prints how many matches were stored and how long it took."""
@@ -0,0 +1,452 @@
+import os
+"""Imports the os module to read refresh intervals from environment variables."""
+
+import random
+"""Imports the random module to add jitter to refresh schedules."""
+
+import threading
+"""Imports threading to run refreshes in the background, off the request path."""
+
+import time
+"""Imports the time module for timestamps and sleeping between scheduler ticks."""
+
+from utils.db import DB_PATH, get_pool
+"""Imports the canonical database path and the shared connection pools, which also hold refresh state."""
+
+from utils.migrations import migrate
+"""Imports the migration runner that creates the refresh_state table."""
+
+from utils.logger import get_logger
+"""Imports the structured, non-blocking logger."""
+
+log = get_logger(__name__)
+"""Creates the logger for background refreshes."""
+
+REFRESH_INTERVALS = {
+    "events": int(os.environ.get("CAMPUSCONNECT_EVENTS_REFRESH", 900)),
+    "alerts": int(os.environ.get("CAMPUSCONNECT_ALERTS_REFRESH", 120)),
+    "retention": int(os.environ.get("CAMPUSCONNECT_RETENTION_INTERVAL", 21600)),
+}
+"""Defines how often (in seconds) each source is refreshed, overridable with environment variables."""
+
+class RefreshSource:
+    """Describes one data pipeline that the background refresher keeps up to date."""
+
+    def __init__(self, name, job, db_path, interval, jitter=0.1, lease=300):
+        """
+        Initialize with a source name, the callable that refreshes it, and its schedule.
+        """
+
+        self.name = name
+        """Stores the unique name of the source (e.g. 'events' or 'alerts')."""
+
+        self.job = job
+        """Stores the callable that fetches and saves fresh data for this source."""
+
+        self.db_path = db_path
+        """Stores the database path where refresh state for this source is kept."""
+
+        self.interval = interval
+        """Stores the number of seconds after which the source's data is considered stale."""
+
+        self.jitter = jitter
+        """Stores the fraction of the interval used to randomize the next refresh time."""
+
+        self.lease = lease
+        """Stores how many seconds a worker may hold the refresh lock before it expires."""
+
+        self.lock = threading.Lock()
+        """Creates a lock so only one thread in this process refreshes the source at a time."""
+
+        self.next_due = 0
+        """Stores the jittered timestamp at which the scheduler should next refresh the source."""
+
+        self.retry_after = 0
+        """Stores the time before which a failed source is not retried from request triggers."""
+
+class BackgroundRefresher:
+    """Runs data pipelines on a schedule in a background thread so routes only read the database."""
+
+    def __init__(self, tick=5):
+        """
+        Initialize with the number of seconds between scheduler checks.
+        """
+
+        self.tick = tick
+        """Stores how often the scheduler thread wakes up to check for stale sources."""
+
+        self.sources = {}
+        """Stores the registered sources keyed by name."""
+
+        self._thread = None
+        """Holds the scheduler thread once it has been started."""
+
+        self._stop = threading.Event()
+        """Creates an event used to tell the scheduler thread to exit."""
+
+        self._start_lock = threading.Lock()
+        """Creates a lock so concurrent first requests start only one scheduler thread."""
+
+        self.enabled = True
+        """Stores whether this process refreshes sources (web workers can leave it to a dedicated refresh process)."""
+
+        self._ready = set()
+        """Stores the sources whose state row already exists, so the setup runs once per process."""
+
+    def register(self, name, job, db_path, interval, jitter=0.1, lease=300):
+        """
+        Register a source to be refreshed every `interval` seconds.
+        """
+
+        self.sources[name] = RefreshSource(name, job, db_path, interval, jitter, lease)
+        """Creates and stores the source description under its name."""
+
+    def _connect(self, source):
+        """
+        Borrow a connection to the source's database, ensuring the refresh_state table
+        and the source's row exist the first time (staleness checks run on every page view).
+        """
+
+        conn = get_pool(source.db_path).acquire()
+        """Borrows a pooled connection to the SQLite database."""
+
+        try:
+            if source.name not in self._ready:
+                """Checks whether the source was set up in this process."""
+
+                migrate(conn)
+                """Applies any pending migrations, which create the refresh_state table shared by every worker process."""
+
+                conn.execute("INSERT OR IGNORE INTO refresh_state (source) VALUES (?)", (source.name,))
+                """Ensures a state row exists for the source."""
+
+                conn.commit()
+                """Commits the setup so other workers can see the state row."""
+
+                self._ready.add(source.name)
+                """Records that the source is set up."""
+
+        except BaseException:
+            """Handles a setup that failed (such as a database locked past the busy timeout)."""
+
+            get_pool(source.db_path).release(conn)
+            """Returns the connection to the pool instead of leaking it."""
+
+            raise
+            """Re-raises the error for the caller."""
+
+        return conn
+        """Returns the open connection."""
+
+    def last_refreshed(self, name):
+        """
+        Return the timestamp of the last successful refresh of a source (0 if never).
+        """
+
+        source = self.sources[name]
+        """Looks up the registered source."""
+
+        conn = self._connect(source)
+        """Opens a connection to the source's database."""
+
+        try:
+            row = conn.execute("SELECT refreshed_at FROM refresh_state WHERE source = ?", (name,)).fetchone()
+            """Reads the last refresh time for the source."""
+
+        finally:
+            get_pool(source.db_path).release(conn)
+            """Returns the connection to the pool, even if the read failed."""
+
+        return row[0] if row else 0
+        """Returns the stored timestamp or 0 if the source has never been refreshed."""
+
+    def is_stale(self, name):
+        """
+        Check whether a source's data is older than its refresh interval.
+        """
+
+        source = self.sources[name]
+        """Looks up the registered source."""
+
+        return time.time() - self.last_refreshed(name) >= source.interval
+        """Returns True when the last refresh is older than the configured interval."""
+
+    def _acquire_lease(self, conn, source):
+        """
+        Take the cross-process refresh lease for a source, returning True on success.
+        """
+
+        now = time.time()
+        """Stores the current time used to check and set the lease."""
+
+        cursor = conn.execute(
+            "UPDATE refresh_state SET lease_until = ? WHERE source = ? AND lease_until < ?",
+            (now + source.lease, source.name, now)
+        )
+        """Claims the lease only if no other worker currently holds an unexpired one."""
+
+        conn.commit()
+        """Commits the claim so other workers see the lease."""
+
+        return cursor.rowcount == 1
+        """Returns True if this worker now holds the lease."""
+
+    def refresh(self, name, force=False):
+        """
+        Run a source's pipeline now, unless another thread or worker is already doing it.
+        Returns True if this call performed the refresh.
+        """
+
+        source = self.sources[name]
+        """Looks up the registered source."""
+
+        if not source.lock.acquire(blocking=False):
+            """Skips the refresh if another thread in this process is already running it."""
+
+            return False
+            """Returns False because the refresh is already in flight."""
+
+        try:
+            conn = self._connect(source)
+            """Opens a connection to the source's database."""
+
+            try:
+                if not force:
+                    """Re-checks staleness so workers that lost the race don't refresh again."""
+
+                    row = conn.execute("SELECT refreshed_at FROM refresh_state WHERE source = ?", (name,)).fetchone()
+                    """Reads the last refresh time while holding the in-process lock."""
+
+                    if time.time() - row[0] < source.interval:
+                        """Checks whether another worker refreshed the source in the meantime."""
+
+                        return False
+                        """Returns False because the data is already fresh."""
+
+                if not self._acquire_lease(conn, source):
+                    """Skips the refresh if another worker process holds the lease."""
+
+                    return False
+                    """Returns False because the refresh is already in flight elsewhere."""
+
+                error = None
+                """Holds any error raised by the job so it can be recorded."""
+
+                try:
+                    source.job()
+                    """Runs the source's fetch/parse/save pipeline."""
+
+                except Exception as e:
+                    """Handles any failure so the old data keeps being served."""
+
+                    error = str(e)
+                    """Stores the error message for the refresh_state table."""
+
+                    log.exception("Refresh of %s failed: %s", name, e, extra={"source": name})
+                    """Logs the error and its traceback if the refresh fails."""
+
+                if error is None:
+                    """Checks whether the job completed successfully."""
+
+                    conn.execute(
+                        "UPDATE refresh_state SET refreshed_at = ?, lease_until = 0, last_error = NULL WHERE source = ?",
+                        (time.time(), name)
+                    )
+                    """Records the successful refresh time and releases the lease."""
+
+                else:
+                    """Handles a failed refresh."""
+
+                    conn.execute(
+                        "UPDATE refresh_state SET lease_until = 0, last_error = ? WHERE source = ?",
+                        (error, name)
+                    )
+                    """Releases the lease and records the error, keeping the old refresh time."""
+
+                    source.retry_after = time.time() + min(source.interval, 60)
+                    """Backs off request-triggered retries so an outage doesn't start a thread per page view."""
+
+                conn.commit()
+                """Commits the new refresh state."""
+
+                return error is None
+                """Returns True if the refresh succeeded."""
+
+            finally:
+                get_pool(source.db_path).release(conn)
+                """Returns the connection to the pool."""
+
+        finally:
+            source.lock.release()
+            """Releases the in-process lock so later refreshes can run."""
+
+    def trigger(self, name):
+        """
+        Stale-while-revalidate: if a source is stale, refresh it in a background thread
+        and return immediately so the caller can serve the data already in the database.
+        """
+
+        source = self.sources[name]
+        """Looks up the registered source."""
+
+        if not self.enabled:
+            """Checks whether this process leaves refreshing to a dedicated refresh process."""
+
+            return False
+            """Returns False because refreshes don't run here."""
+
+        if source.lock.locked() or time.time() < source.retry_after or not self.is_stale(name):
+            """Checks whether a refresh is running, recently failed, or the data is still fresh."""
+
+            return False
+            """Returns False because no refresh needs to be started."""
+
+        threading.Thread(target=self.refresh, args=(name,), daemon=True).start()
+        """Starts the refresh on a daemon thread so the request is not delayed."""
+
+        return True
+        """Returns True because a background refresh was started."""
+
+    def _schedule_next(self, source):
+        """
+        Pick the next jittered due time for a source so workers don't refresh in lockstep.
+        """
+
+        spread = source.interval * source.jitter
+        """Calculates how far the next refresh may move from the nominal interval."""
+
+        source.next_due = time.time() + source.interval + random.uniform(-spread, spread)
+        """Stores the randomized time of the next scheduled refresh."""
+
+    def _loop(self):
+        """
+        Scheduler loop: refresh each source when its jittered due time has passed.
+        """
+
+        while not self._stop.is_set():
+            """Keeps running until stop() is called."""
+
+            for source in list(self.sources.values()):
+                """Iterates through each registered source."""
+
+                if time.time() < source.next_due:
+                    """Checks whether the source is not yet due."""
+
+                    continue
+                    """Skips sources that are not due yet."""
+
+                if self.is_stale(source.name):
+                    """Checks the shared state in case another worker refreshed recently."""
+
+                    self.refresh(source.name)
+                    """Refreshes the source on the scheduler thread."""
+
+                self._schedule_next(source)
+                """Schedules the next check for the source."""
+
+            self._stop.wait(self.tick)
+            """Sleeps until the next tick or until stop() is called."""
+
+    def start(self):
+        """
+        Start the scheduler thread if it is not already running (cheap enough to call on
+        every request, so each forked worker starts its own on its first request).
+        """
+
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            """Checks whether refreshing is disabled here or the scheduler is already running (the common case)."""
+
+            return
+            """Exits early so only one scheduler thread runs per process."""
+
+        with self._start_lock:
+            """Holds the lock so concurrent first calls start only one scheduler."""
+
+            if self._thread and self._thread.is_alive():
+                """Checks whether another thread started the scheduler meanwhile."""
+
+                return
+                """Keeps the running scheduler."""
+
+            self._stop.clear()
+            """Resets the stop flag in case the scheduler was stopped before."""
+
+            self._thread = threading.Thread(target=self._loop, name="campusconnect-refresher", daemon=True)
+            """Creates a daemon thread so it never blocks interpreter shutdown."""
+
+            self._thread.start()
+            """Starts the scheduler thread."""
+
+    def stop(self):
+        """
+        Ask the scheduler thread to exit.
+        """
+
+        self._stop.set()
+        """Signals the scheduler loop to stop."""
+
+def refresh_events():
+    """Fetches, parses, and stores external events from every configured campus calendar."""
+
+    from utils.scrape_engine import ScrapeEngine, load_sources, format_report
+    """Imports the scraping engine lazily so it only loads where refreshes actually run."""
+
+    report = ScrapeEngine(load_sources(), DB_PATH).run()
+    """Scrapes all sources concurrently into the database."""
+
+    log.info("Scraped events:\n%s", format_report(report), extra={"sources": report})
+    """Logs the per-source timing report."""
+
+    if all(row["status"].startswith("error") for row in report):
+        """Checks whether every source failed (e.g. unreachable or behind an open circuit breaker)."""
+
+        raise RuntimeError(f"every event source failed: {report[0]['status'] if report else 'no sources'}")
+        """Fails the refresh so the stored events keep their last good refresh time and retries back off."""
+
+def refresh_alerts():
+    """Fetches and stores active weather alerts from weather.gov."""
+
+    from utils.api_client import APIClient
+    """Imports the API client lazily so it only loads where refreshes actually run."""
+
+    client = APIClient(db_path=DB_PATH)
+    """Creates the API client for the shared database."""
+
+    client.run()
+    """Runs the API client pipeline against the shared database."""
+
+    if client.last_error is not None:
+        """Checks whether weather.gov couldn't be reached (the stored alerts were left as they were)."""
+
+        raise client.last_error
+        """Fails the refresh so the stored alerts keep their last good refresh time and retries back off."""
+
+def compact_data():
+    """Deletes or archives expired alerts and past events, then reclaims the freed space."""
+
+    from utils.retention import run_retention
+    """Imports the retention job lazily so it only loads where refreshes actually run."""
+
+    run_retention(DB_PATH)
+    """Applies the retention policies to the shared database."""
+
+refresher = BackgroundRefresher()
+"""Creates the shared refresher instance used by the app and routes."""
+
+refresher.register("events", refresh_events, DB_PATH, REFRESH_INTERVALS["events"])
+"""Registers the events scraper as a refreshed source."""
+
+refresher.register("alerts", refresh_alerts, DB_PATH, REFRESH_INTERVALS["alerts"])
+"""Registers the weather alerts client as a refreshed source."""
+
+if REFRESH_INTERVALS["retention"] > 0:
+    """Checks whether scheduled retention is enabled (an interval of 0 turns it off)."""
+
+    refresher.register("retention", compact_data, DB_PATH, REFRESH_INTERVALS["retention"], lease=3600)
+    """Registers retention as a scheduled job, with a lease long enough for a full vacuum."""
+
+if __name__ == "__main__":
+    """Runs a dedicated refresh process when run as: python -m utils.refresher (serve the app with REFRESH off)."""
+
+    refresher._loop()
+    """Refreshes every source on its schedule in the foreground until interrupted."""
@@ -0,0 +1,403 @@
+import argparse
+"""Imports argparse to read retention options from the command line."""
+
+import json
+"""Imports the json module to serialize archived rows."""
+
+import os
+"""Imports the os module to read retention settings from environment variables."""
+
+import sys
+"""Imports sys to write exported archives to standard output."""
+
+import time
+"""Imports the time module to time runs and pause between batches."""
+
+import zlib
+"""Imports zlib to compress archived batches."""
+
+from utils import db, metrics, recommendations
+"""Imports the connection settings, the metrics layer that records each run, and the recommendation matcher."""
+
+from utils.migrations import migrate
+"""Imports the migration runner that creates the archive table."""
+
+from utils.logger import get_logger
+"""Imports the structured, non-blocking logger."""
+
+log = get_logger(__name__)
+"""Creates the logger for retention runs."""
+
+ALERT_DAYS = float(os.environ.get("CAMPUSCONNECT_ALERT_RETENTION_DAYS", 7))
+"""Defines how many days after it expires an alert is kept."""
+
+EVENT_DAYS = float(os.environ.get("CAMPUSCONNECT_EVENT_RETENTION_DAYS", 180))
+"""Defines how many days after its date a scraped event is kept."""
+
+ARCHIVE = os.environ.get("CAMPUSCONNECT_RETENTION_ARCHIVE", "1") == "1"
+"""Defines whether deleted rows are archived (set to 0 to delete them outright)."""
+
+BATCH_SIZE = int(os.environ.get("CAMPUSCONNECT_RETENTION_BATCH", 1000))
+"""Defines how many rows are deleted per transaction, which bounds how long other writers wait."""
+
+BATCH_PAUSE = 0.01
+"""Defines how long (in seconds) to pause between batches so ingest writers can take the lock."""
+
+TOMBSTONE_DAYS = float(os.environ.get("CAMPUSCONNECT_TOMBSTONE_DAYS", 30))
+"""Defines how many days the tombstones of deleted rows are kept for incremental feed clients."""
+
+FEED_KINDS = {"events": "internal", "external_events": "external", "api_data": "alert"}
+"""Maps each table to the kind its tombstones are labelled with in the feeds."""
+
+VACUUM_PAGES = 1000
+"""Defines how many free pages each incremental vacuum step returns to the OS."""
+
+VACUUM_THRESHOLD = 0.25
+"""Defines the fraction of free pages above which a database without incremental auto-vacuum is fully vacuumed."""
+
+class RetentionPolicy:
+    """Describes which rows of one table have expired and what else must go with them."""
+
+    def __init__(self, table, expired, days, generation, match_kind=None):
+        """
+        Initialize with the table, the SQL condition (taking the cutoff in epoch seconds
+        as its one parameter) that selects expired rows, the number of days to keep rows
+        past that point, the data generation to bump, and the recommendation kind whose
+        matches are removed with the rows.
+        """
+
+        self.table = table
+        """Stores the table the policy prunes."""
+
+        self.expired = expired
+        """Stores the SQL condition that selects expired rows."""
+
+        self.days = days
+        """Stores how many days rows are kept past their expiry."""
+
+        self.generation = generation
+        """Stores the data generation bumped when rows are removed, so cached pages are rebuilt."""
+
+        self.match_kind = match_kind
+        """Stores the kind of the precomputed recommendation matches that point at the table's rows."""
+
+    @property
+    def cutoff(self):
+        """Returns the policy's cutoff in epoch seconds: rows that expired before it are deleted."""
+
+        return int(time.time() - self.days * 86400)
+        """Returns the cutoff."""
+
+POLICIES = [
+    RetentionPolicy("api_data", "expires_at < ?", ALERT_DAYS, "alerts"),
+    RetentionPolicy("external_events", "starts_at < ?", EVENT_DAYS, "events", "external"),
+]
+"""Defines the retention policies: alerts some days after they expire, and scraped events some days after they happen."""
+
+def expire_rows(conn, policy, archive=ARCHIVE, batch_size=BATCH_SIZE):
+    """
+    Delete a policy's expired rows in batches of batch_size, each in its own short
+    transaction, archiving each batch first when archive is True. Each batch bumps the
+    policy's data generation and leaves a tombstone per row stamped with it, so feed
+    clients syncing with since=<generation> delete the rows too. Rows without a
+    parseable date are kept. Returns the number of rows deleted.
+    """
+
+    last = 0
+    """Stores the rowid of the last row examined, so each batch continues where the previous one stopped."""
+
+    deleted = 0
+    """Counts the deleted rows."""
+
+    while True:
+        """Keeps deleting until no expired rows are left."""
+
+        with conn:
+            """Deletes one batch in its own transaction."""
+
+            rows = conn.execute(
+                f"SELECT rowid AS _rowid, * FROM {policy.table} WHERE rowid > ? AND {policy.expired} ORDER BY rowid LIMIT ?",
+                (last, policy.cutoff, batch_size)
+            ).fetchall()
+            """Reads the next batch of expired rows."""
+
+            if not rows:
+                """Checks whether every expired row was handled."""
+
+                break
+                """Stops deleting."""
+
+            rowids = [(row["_rowid"],) for row in rows]
+            """Stores the rowids of the batch."""
+
+            generation = db.bump_generation(conn, policy.generation)
+            """Invalidates cached pages and starts the generation the deletions are stamped with."""
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO deleted_rows (name, deleted_gen, kind, id, deleted_at) VALUES (?, ?, ?, ?, ?)",
+                [(policy.generation, generation, FEED_KINDS[policy.table], row["id"], time.time()) for row in rows]
+            )
+            """Leaves a tombstone for each row in the same transaction as the delete."""
+
+            if archive:
+                """Checks whether the rows should be kept in cold storage."""
+
+                conn.execute(
+                    "INSERT INTO retention_archive (source, archived_at, row_count, data) VALUES (?, ?, ?, ?)",
+                    (policy.table, time.time(), len(rows),
+                     zlib.compress(json.dumps([{key: row[key] for key in row.keys()[1:]} for row in rows]).encode("utf-8"), 9))
+                )
+                """Stores the whole batch as one compressed JSON array."""
+
+            conn.executemany(f"DELETE FROM {policy.table} WHERE rowid = ?", rowids)
+            """Deletes the rows (the search triggers remove their documents)."""
+
+            if policy.match_kind:
+                """Checks whether recommendations point at the table's rows."""
+
+                conn.executemany(
+                    "DELETE FROM user_event_matches WHERE kind = ? AND event_id = ?",
+                    [(policy.match_kind, rowid) for rowid, in rowids]
+                )
+                """Removes the deleted events from users' recommendations."""
+
+        deleted += len(rows)
+        """Counts the batch."""
+
+        last = rows[-1]["_rowid"]
+        """Remembers where the batch ended."""
+
+        time.sleep(BATCH_PAUSE)
+        """Gives other writers a chance to take the write lock."""
+
+    if deleted:
+        """Checks whether any rows were deleted."""
+
+        with conn:
+            conn.execute("DELETE FROM http_validators")
+            """Forgets the upstream validators, so the next fetch is sent unconditionally and restores any rows
+            that are still listed upstream instead of getting a 304."""
+
+    return deleted
+    """Returns the number of deleted rows."""
+
+def prune_tombstones(conn, days=TOMBSTONE_DAYS):
+    """
+    Delete the tombstones older than `days` in one transaction, raising each feed's
+    sync floor past them: a client whose since is below the floor may have missed a
+    deletion, so the feed sends it everything again. Returns the number deleted.
+    """
+
+    cutoff = time.time() - days * 86400
+    """Calculates the oldest deletion time kept."""
+
+    with conn:
+        floors = conn.execute(
+            "SELECT name, MAX(deleted_gen) FROM deleted_rows WHERE deleted_at < ? GROUP BY name", (cutoff,)
+        ).fetchall()
+        """Reads the newest generation pruned from each feed."""
+
+        conn.executemany("""
+            INSERT INTO sync_floor (name, generation) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET generation = MAX(generation, excluded.generation)
+        """, [tuple(floor) for floor in floors])
+        """Raises the floors, so clients that last synced before the pruned deletions get a full sync."""
+
+        return conn.execute("DELETE FROM deleted_rows WHERE deleted_at < ?", (cutoff,)).rowcount
+        """Deletes the old tombstones and returns how many there were."""
+
+def database_size(conn):
+    """
+    Return the size of the database in bytes and the number of bytes on its free list.
+    """
+
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    """Reads the page size."""
+
+    return (conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+            conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size)
+    """Returns the total and free bytes."""
+
+def reclaim_space(conn):
+    """
+    Return free pages to the operating system and refresh the query planner's statistics.
+    Databases with incremental auto-vacuum are shrunk VACUUM_PAGES pages at a time, so
+    no single step holds the write lock for long. Older databases are fully vacuumed
+    (converting them to incremental auto-vacuum) once free pages pass VACUUM_THRESHOLD,
+    which rewrites the whole file. Returns the number of bytes reclaimed.
+    """
+
+    before, free = database_size(conn)
+    """Reads the size before reclaiming."""
+
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        """Checks whether the database uses incremental auto-vacuum."""
+
+        for _ in range(0, conn.execute("PRAGMA freelist_count").fetchone()[0], VACUUM_PAGES):
+            """Repeats once per VACUUM_PAGES of the free pages counted at the start."""
+
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+            """Truncates up to VACUUM_PAGES free pages off the file (run as a script so every page is freed)."""
+
+            time.sleep(BATCH_PAUSE)
+            """Gives other writers a chance to take the write lock."""
+
+    elif before and free / before > VACUUM_THRESHOLD:
+        """Checks whether enough of an older database is free to be worth a full rewrite."""
+
+        conn.commit()
+        """Ends any open transaction, since VACUUM can't run inside one."""
+
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        """Asks the rewrite to switch the database to incremental auto-vacuum."""
+
+        conn.execute("VACUUM")
+        """Rewrites the database without its free pages."""
+
+    conn.execute("PRAGMA optimize")
+    """Updates the statistics of tables whose contents changed a lot."""
+
+    return before - database_size(conn)[0]
+    """Returns the number of bytes reclaimed."""
+
+@metrics.timed("retention.run", rows=lambda report: sum(report["deleted"].values()))
+def run_retention(path=db.DB_PATH, archive=ARCHIVE, policies=POLICIES):
+    """
+    Apply every retention policy to the database, then reclaim the freed space.
+    Returns a report of the rows deleted per table, the bytes reclaimed, and the time taken.
+    """
+
+    start = time.perf_counter()
+    """Records the start time."""
+
+    report = {"deleted": {}, "reclaimed_bytes": 0, "size_bytes": 0}
+    """Initializes the report."""
+
+    with db.connection(path) as conn:
+        """Borrows a pooled connection to the database."""
+
+        migrate(conn)
+        """Creates the archive table if the database predates it."""
+
+        for policy in policies:
+            """Iterates through each retention policy."""
+
+            report["deleted"][policy.table] = expire_rows(conn, policy, archive)
+            """Deletes the policy's expired rows."""
+
+        report["tombstones_pruned"] = prune_tombstones(conn)
+        """Deletes the tombstones older than TOMBSTONE_DAYS."""
+
+        if any(policy.match_kind for policy in policies):
+            """Checks whether any policy removes recommendation matches."""
+
+            report["rematched"] = recommendations.refill(conn)
+            """Rematches the upcoming events, restoring matches that full users evicted before slots were freed."""
+
+        report["reclaimed_bytes"] = reclaim_space(conn)
+        """Returns the freed space to the operating system."""
+
+        report["size_bytes"] = database_size(conn)[0]
+        """Records the size of the database afterwards."""
+
+    report["seconds"] = time.perf_counter() - start
+    """Records how long the run took."""
+
+    log.info("retention run finished", extra=report)
+    """Logs the report."""
+
+    return report
+    """Returns the report."""
+
+def count_expired(path=db.DB_PATH, policies=POLICIES):
+    """
+    Return the number of rows each policy would delete now, without deleting anything.
+    """
+
+    with db.connection(path) as conn:
+        """Borrows a pooled connection to the database."""
+
+        return {
+            policy.table: conn.execute(f"SELECT COUNT(*) FROM {policy.table} WHERE {policy.expired}", (policy.cutoff,)).fetchone()[0]
+            for policy in policies
+        }
+        """Counts each policy's expired rows."""
+
+def archived_rows(conn, table):
+    """
+    Yield the archived rows of a table as dictionaries, oldest batch first.
+    """
+
+    for (data,) in conn.execute("SELECT data FROM retention_archive WHERE source = ? ORDER BY archived_at, id", (table,)):
+        """Iterates through each archived batch."""
+
+        yield from json.loads(zlib.decompress(data))
+        """Yields the batch's rows."""
+
+def main():
+    """Runs retention, previews it, or exports an archive from the command line."""
+
+    parser = argparse.ArgumentParser(description="Delete or archive expired alerts and past events, then reclaim space.")
+    """Creates the command-line parser."""
+
+    parser.add_argument("--db", default=db.DB_PATH, help="database file")
+    """Adds the option for the database path."""
+
+    parser.add_argument("--dry-run", action="store_true", help="only count the rows that would be deleted")
+    """Adds the option that previews the run."""
+
+    parser.add_argument("--no-archive", action="store_true", help="delete expired rows without archiving them")
+    """Adds the option that skips archiving."""
+
+    parser.add_argument("--export", metavar="TABLE", help="write a table's archived rows to standard output as JSON lines")
+    """Adds the option that exports an archive."""
+
+    args = parser.parse_args()
+    """Parses the command-line arguments."""
+
+    if args.export:
+        """Checks whether an archive should be exported."""
+
+        with db.connection(args.db) as conn:
+            """Borrows a pooled connection to the database."""
+
+            migrate(conn)
+            """Creates the archive table if the database predates it."""
+
+            for row in archived_rows(conn, args.export):
+                """Iterates through each archived row."""
+
+                sys.stdout.write(json.dumps(row) + "\n")
+                """Writes the row as one JSON line."""
+
+        return
+        """Exits after the export."""
+
+    if args.dry_run:
+        """Checks whether only a preview was asked for."""
+
+        for table, count in count_expired(args.db).items():
+            """Iterates through each table's expired row count."""
+
+            print(f"{table}: {count} rows would be deleted")
+            """Prints the count."""
+
+        return
+        """Exits without deleting anything."""
+
+    report = run_retention(args.db, archive=not args.no_archive)
+    """Runs retention."""
+
+    for table, count in report["deleted"].items():
+        """Iterates through each table's deleted row count."""
+
+        print(f"{table}: deleted {count} rows")
+        """Prints the count."""
+
+    print(f"reclaimed {report['reclaimed_bytes'] / 1e6:.1f} MB in {report['seconds']:.2f}s "
+          f"(database is now {report['size_bytes'] / 1e6:.1f} MB)")
+    """Prints the reclaimed space and the time taken."""
+
+if __name__ == "__main__":
+    main()
+    """Runs the retention tool when executed directly."""
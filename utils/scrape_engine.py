@@ -0,0 +1,442 @@
+import json
+"""Imports the json module to load source configs from a file."""
+
+import multiprocessing
+"""Imports multiprocessing to start parse workers without forking this (threaded) process."""
+
+import os
+"""Imports the os module to read the source config path from the environment."""
+
+import threading
+"""Imports threading to limit how many requests hit the same host at once."""
+
+import time
+"""Imports the time module to time each stage."""
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+"""Imports executors to fetch sources concurrently and parse pages in worker processes."""
+
+from concurrent.futures.process import BrokenProcessPool
+"""Imports the error raised once a parse worker has died, so the pool can be replaced."""
+
+from urllib.parse import urlparse
+"""Imports urlparse to group requests by host."""
+
+import requests
+"""Imports the requests library for its exception types."""
+
+from utils import metrics
+"""Imports the metrics layer, which records each fetch and parse the engine runs at /metrics."""
+
+from utils.event_scraper import CampusEventScraper, TRIBE_EVENTS_PROFILE, parse_html
+"""Imports the scraper (for saving), the default selector profile, and the picklable parse function."""
+
+from utils.http_client import http_client
+"""Imports the shared pooled HTTP client with conditional request caching."""
+
+SCRAPE_SOURCES = [
+    {"name": "erskine", "url": "https://www.erskine.edu/events/", "profile": TRIBE_EVENTS_PROFILE},
+]
+"""Defines the campus calendars scraped by default."""
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-US,en;q=0.9",
+}
+"""Defines HTTP headers to mimic a browser and avoid request blocking."""
+
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+"""Defines how parse workers are started: from a clean server process, never by forking one that runs threads."""
+
+_parse_pool = None
+"""Holds the process pool shared by every scrape in this process, once it has been created."""
+
+_parse_pool_pid = None
+"""Stores the process that created the parse pool (a forked child creates its own)."""
+
+_parse_pool_lock = threading.Lock()
+"""Creates a lock that guards creation of the parse pool."""
+
+def get_parse_pool():
+    """
+    Return this process's shared parse pool, creating it on first use. Its workers
+    are started with START_METHOD, since forking a process that already runs the
+    refresher, logger, and pool threads can deadlock on locks held mid-fork.
+    """
+
+    global _parse_pool, _parse_pool_pid
+    """Declares the module-level pool so it can be created here."""
+
+    with _parse_pool_lock:
+        """Prevents two concurrent scrapes from creating separate pools."""
+
+        if _parse_pool is None or _parse_pool_pid != os.getpid():
+            """Checks whether this process has a pool of its own yet."""
+
+            _parse_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context(START_METHOD))
+            """Creates the pool (workers start on the first submitted parse and are reused afterwards)."""
+
+            _parse_pool_pid = os.getpid()
+            """Records the process that owns the pool."""
+
+        return _parse_pool
+        """Returns the shared pool."""
+
+def discard_parse_pool(pool):
+    """
+    Forget a parse pool whose worker died, so the next scrape creates a new one.
+    """
+
+    global _parse_pool
+    """Declares the module-level pool so it can be cleared here."""
+
+    with _parse_pool_lock:
+        """Guards the shared pool while clearing it."""
+
+        if _parse_pool is pool:
+            """Checks whether another scrape already replaced the pool."""
+
+            _parse_pool = None
+            """Clears the broken pool."""
+
+    pool.shutdown(wait=False)
+    """Releases whatever is left of the broken pool."""
+
+def load_sources(path=None):
+    """
+    Load source configs from a JSON file (a list of objects with name, url and an
+    optional profile), falling back to SCRAPE_SOURCES when no file is configured.
+    """
+
+    path = path or os.environ.get("CAMPUSCONNECT_SOURCES")
+    """Uses the given path or the CAMPUSCONNECT_SOURCES environment variable."""
+
+    if not path:
+        """Checks whether a config file was provided."""
+
+        return SCRAPE_SOURCES
+        """Returns the built-in source list."""
+
+    with open(path) as config_file:
+        """Opens the source config file."""
+
+        sources = json.load(config_file)
+        """Parses the list of sources."""
+
+    for source in sources:
+        """Iterates through each configured source."""
+
+        source.setdefault("profile", TRIBE_EVENTS_PROFILE)
+        """Uses the Tribe Events selectors for sources that don't define their own."""
+
+    return sources
+    """Returns the configured sources."""
+
+class ScrapeEngine:
+    """Fetches many campus calendars concurrently, parses them in worker processes, and saves events in batches."""
+
+    def __init__(self, sources, db_path, http=http_client, max_workers=8, per_host=2,
+                 timeout=(5, 15), retries=2, backoff=0.5, batch_size=500, parse_processes=True):
+        """
+        Initialize with the source configs, the database path, and concurrency, retry,
+        and batching settings.
+        """
+
+        self.sources = sources
+        """Stores the list of source configs (dicts with name, url and profile)."""
+
+        self.db_path = db_path
+        """Stores the database path for saving scraped events."""
+
+        self.http = http
+        """Stores the HTTP client used to fetch pages."""
+
+        self.max_workers = max_workers
+        """Stores the maximum number of pages fetched at the same time."""
+
+        self.per_host = per_host
+        """Stores the maximum number of concurrent requests to any single host."""
+
+        self.timeout = timeout
+        """Stores the (connect, read) timeout in seconds for each request."""
+
+        self.retries = retries
+        """Stores how many times a failed fetch is retried."""
+
+        self.backoff = backoff
+        """Stores the base delay in seconds between retries, doubled after each attempt (and jittered)."""
+
+        self.batch_size = batch_size
+        """Stores how many events are written to the database per batch."""
+
+        self.parse_processes = parse_processes
+        """Stores whether pages are parsed in a process pool instead of the calling thread."""
+
+        self._host_limits = {}
+        """Stores one semaphore per host to cap concurrent requests."""
+
+        self._host_lock = threading.Lock()
+        """Creates a lock that guards creation of the per-host semaphores."""
+
+    def _host_limit(self, url):
+        """
+        Return the semaphore limiting concurrent requests to a URL's host.
+        """
+
+        host = urlparse(url).netloc
+        """Extracts the host from the URL."""
+
+        with self._host_lock:
+            """Prevents two threads from creating different semaphores for the same host."""
+
+            if host not in self._host_limits:
+                """Checks whether this host has been seen before."""
+
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+                """Creates the semaphore for the host."""
+
+            return self._host_limits[host]
+            """Returns the host's semaphore."""
+
+    def fetch(self, source):
+        """
+        Fetch one source with per-host limits, timeouts, and retry with exponential backoff
+        and jitter (paid from the HTTP client's shared retry budget, and refused outright
+        while the host's circuit breaker is open).
+        Returns the FetchResult; raises the last error once retries run out.
+        """
+
+        with self._host_limit(source["url"]):
+            """Waits for a free slot for this host."""
+
+            result = self.http.get(source["url"], headers=HEADERS, timeout=self.timeout,
+                                   retries=self.retries, backoff=self.backoff, db_path=self.db_path)
+            """Sends a conditional GET request for the source's page."""
+
+        if not result.not_modified:
+            """Checks whether a new page was returned."""
+
+            result.response.raise_for_status()
+            """Raises an exception if the response contains an HTTP error."""
+
+        return result
+        """Returns the successful (or not-modified) result."""
+
+    def _fetch_timed(self, source):
+        """
+        Fetch a source and return (result, error, seconds taken).
+        """
+
+        start = time.perf_counter()
+        """Records when the fetch started."""
+
+        try:
+            return self.fetch(source), None, time.perf_counter() - start
+            """Returns the result, no error, and the elapsed time."""
+
+        except requests.RequestException as e:
+            """Handles a fetch that failed after all retries."""
+
+            return None, e, time.perf_counter() - start
+            """Returns no result, the error, and the elapsed time."""
+
+    def save(self, source, events, report):
+        """
+        Save a source's events in batches and add the counts to its report entry.
+        """
+
+        scraper = CampusEventScraper(source["url"], db_path=self.db_path, http=self.http,
+                                     profile=source["profile"], source=source["name"])
+        """Creates a scraper for the source, used only for its keyed upsert."""
+
+        start = time.perf_counter()
+        """Records when saving started."""
+
+        for offset in range(0, len(events), self.batch_size):
+            """Iterates through the events one batch at a time."""
+
+            stats = scraper.save_events(events[offset:offset + self.batch_size])
+            """Upserts the batch in its own transaction."""
+
+            for name, count in stats.items():
+                """Iterates through the inserted/updated/unchanged counters."""
+
+                report[name] += count
+                """Adds the batch's counts to the source's totals."""
+
+        report["save_s"] = time.perf_counter() - start
+        """Records how long saving took."""
+
+    @metrics.timed("scraper.run", rows=lambda reports: sum(report["events"] for report in reports))
+    def run(self):
+        """
+        Scrape every source. Pages are fetched concurrently, parsed as each one arrives,
+        and saved as each parse finishes, so total time tracks the slowest source
+        rather than the sum of all sources.
+        Returns a per-source timing report.
+        """
+
+        reports = {}
+        """Stores the report entry for each source, keyed by name."""
+
+        for source in self.sources:
+            """Iterates through each configured source."""
+
+            reports[source["name"]] = {
+                "source": source["name"], "status": "ok", "events": 0,
+                "inserted": 0, "updated": 0, "unchanged": 0,
+                "fetch_s": 0.0, "parse_s": 0.0, "save_s": 0.0,
+            }
+            """Initializes the report entry for the source."""
+
+        parse_pool = get_parse_pool() if self.parse_processes and len(self.sources) > 1 else None
+        """Uses the shared process pool for parsing when there is more than one page to parse (a single page is
+        parsed in a thread)."""
+
+        started = {}
+        """Stores when each parse was submitted, keyed by future."""
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as fetch_pool:
+            """Creates a bounded thread pool for concurrent fetches."""
+
+            pending = {fetch_pool.submit(self._fetch_timed, source): ("fetch", source, None) for source in self.sources}
+            """Starts fetching every source and tracks each future's stage, source, and fetch result."""
+
+            while pending:
+                """Keeps going until every fetch, parse, and save has finished."""
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                """Waits for the next fetch or parse to finish."""
+
+                for future in done:
+                    """Handles each finished future."""
+
+                    stage, source, result = pending.pop(future)
+                    """Looks up what the future was doing and for which source."""
+
+                    report = reports[source["name"]]
+                    """Looks up the source's report entry."""
+
+                    if stage == "fetch":
+                        """Handles a finished fetch."""
+
+                        result, error, report["fetch_s"] = future.result()
+                        """Reads the fetch result, error, and time taken."""
+
+                        metrics.observe_stage("scraper.fetch_page", report["fetch_s"], failed=error is not None)
+                        """Records the fetch under the same stage as the scraper's own fetch_page."""
+
+                        if error is None and not result.not_modified:
+                            """Checks whether a page body was downloaded."""
+
+                            metrics.observe_bytes("scraper.fetch_page", len(result.response.content))
+                            """Records the page size."""
+
+                        if error is not None:
+                            """Checks whether the fetch failed."""
+
+                            report["status"] = f"error: {error}"
+                            """Records the error in the report."""
+
+                        elif result.not_modified:
+                            """Checks whether the page hasn't changed since the last scrape."""
+
+                            report["status"] = "not modified"
+                            """Records that parsing and saving were skipped."""
+
+                        else:
+                            """Handles a new page that needs parsing."""
+
+                            try:
+                                parsed = (parse_pool or fetch_pool).submit(parse_html, result.response.text, source["profile"])
+                                """Submits the page for parsing in a worker process, or on the fetch pool when no
+                                process pool is used."""
+
+                            except BrokenProcessPool:
+                                """Handles a process pool whose worker died during an earlier parse."""
+
+                                discard_parse_pool(parse_pool)
+                                """Lets the next scrape start a fresh pool."""
+
+                                parse_pool = None
+                                """Parses the rest of this scrape's pages in threads."""
+
+                                parsed = fetch_pool.submit(parse_html, result.response.text, source["profile"])
+                                """Submits the page for parsing on the fetch pool."""
+
+                            started[parsed] = time.perf_counter()
+                            """Records when the parse was submitted."""
+
+                            pending[parsed] = ("parse", source, result)
+                            """Tracks the parse so its events are saved as soon as it finishes."""
+
+                        continue
+                        """Moves on to the next finished future."""
+
+                    report["parse_s"] = time.perf_counter() - started[future]
+                    """Records how long the parse took, including time queued for a worker."""
+
+                    try:
+                        events = future.result()
+                        """Reads the parsed events."""
+
+                    except Exception as e:
+                        """Handles a page that failed to parse."""
+
+                        metrics.observe_stage("scraper.parse_events", report["parse_s"], failed=True)
+                        """Records the failed parse."""
+
+                        report["status"] = f"error: {e}"
+                        """Records the error in the report."""
+
+                        continue
+                        """Moves on to the next finished future."""
+
+                    metrics.observe_stage("scraper.parse_events", report["parse_s"], rows=len(events))
+                    """Records the parse under the same stage as the scraper's own parse_events."""
+
+                    report["events"] = len(events)
+                    """Records how many events were parsed."""
+
+                    self.save(source, events, report)
+                    """Saves the events in batches while other sources are still fetching or parsing."""
+
+                    self.http.remember(result)
+                    """Saves the page's validators now that its events are stored."""
+
+        return [reports[source["name"]] for source in self.sources]
+        """Returns the report entries in the same order as the sources."""
+
+def format_report(report):
+    """
+    Format a per-source timing report as a text table.
+    """
+
+    lines = [f"{'source':<20} {'status':<14} {'events':>7} {'new':>6} {'upd':>6} {'fetch':>8} {'parse':>8} {'save':>8}"]
+    """Starts the table with a header row."""
+
+    for row in report:
+        """Iterates through each source's report entry."""
+
+        lines.append(
+            f"{row['source']:<20} {row['status'][:14]:<14} {row['events']:>7} {row['inserted']:>6} {row['updated']:>6} "
+            f"{row['fetch_s']:>7.2f}s {row['parse_s']:>7.2f}s {row['save_s']:>7.2f}s"
+        )
+        """Adds a row with the source's counts and timings."""
+
+    return "\n".join(lines)
+    """Returns the formatted table."""
+
+if __name__ == "__main__":
+    from utils.db import DB_PATH
+    """Imports the default database path for command-line runs."""
+
+    engine = ScrapeEngine(load_sources(), DB_PATH)
+    """Creates an engine for the configured sources."""
+
+    print(format_report(engine.run()))
+    """Runs the engine and prints the per-source timing report."""
@@ -0,0 +1,263 @@
+import os
+"""Imports the os module to read search settings from environment variables."""
+
+import sqlite3
+"""Imports SQLite3 for its error types."""
+
+import sys
+"""Imports sys to read the command-line arguments."""
+
+import time
+"""Imports the time module to report how long a reindex took."""
+
+from markupsafe import Markup, escape
+"""Imports Markup and escape to build highlighted HTML without trusting stored text."""
+
+from utils.db import DB_PATH, connection
+"""Imports the database path and the pooled connection helper."""
+
+from utils.migrations import migrate
+"""Imports the migration runner that creates the search table on older databases."""
+
+from utils.metrics import timed
+"""Imports the decorator that records each query's latency and row count at /metrics."""
+
+KINDS = {"event": 0, "external": 1, "alert": 2}
+"""Maps each document kind to the code stored in the low bits of its rowid."""
+
+KIND_COUNT = 4
+"""Defines the rowid multiplier (room for one more source without renumbering)."""
+
+SOURCES = {
+    "event": ("events", "title", "location"),
+    "external": ("external_events", "title", "description"),
+    "alert": ("api_data", "headline", "description"),
+}
+"""Maps each document kind to its table and its title and body columns."""
+
+MAX_CANDIDATES = int(os.environ.get("CAMPUSCONNECT_SEARCH_CANDIDATES", 5000))
+"""Defines how many of the newest matching documents are ranked per search (split evenly between the kinds searched)."""
+
+HIGHLIGHT_START = "\x02"
+"""Marks the start of a matched term in highlighted text (replaced by <mark> after escaping)."""
+
+HIGHLIGHT_END = "\x03"
+"""Marks the end of a matched term in highlighted text."""
+
+def index_rows(conn, kind, after=0):
+    """
+    Add the documents for one source's rows whose rowid is greater than `after`, with one
+    INSERT ... SELECT inside the caller's transaction. Used to build the index and by bulk
+    loads, which skip the per-row triggers. Returns the number of documents added.
+    """
+
+    table, title, body = SOURCES[kind]
+    """Looks up the source table and its title and body columns."""
+
+    return conn.execute(f"""
+        INSERT INTO search_index (rowid, title, body, kind)
+        SELECT rowid * {KIND_COUNT} + {KINDS[kind]}, {title}, {body}, '{kind}' FROM {table} WHERE rowid > ?
+    """, (after,)).rowcount
+    """Indexes the rows and returns how many were added."""
+
+def optimize(conn):
+    """
+    Merge the index into one segment so queries read as few b-trees as possible.
+    """
+
+    conn.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    """Runs the FTS5 optimize command."""
+
+def reindex(conn):
+    """
+    Rebuild the whole search index from the source tables in one transaction, then
+    merge the index segments. Returns the number of documents indexed.
+    """
+
+    count = 0
+    """Counts the indexed documents."""
+
+    with conn:
+        conn.execute("DELETE FROM search_index")
+        """Removes every document."""
+
+        for kind in SOURCES:
+            """Iterates through each source table."""
+
+            try:
+                count += index_rows(conn, kind)
+                """Indexes every row of the table."""
+
+            except sqlite3.OperationalError:
+                """Handles a source table that doesn't exist yet."""
+
+                continue
+                """Skips the table."""
+
+    optimize(conn)
+    """Merges the index segments."""
+
+    conn.commit()
+    """Commits the merged index."""
+
+    return count
+    """Returns the number of documents indexed."""
+
+def match_query(text):
+    """
+    Turn free text typed by a user into a safe FTS5 query: every word must match
+    (after stemming, so "festivals" finds "festival"), and words are quoted so FTS5
+    operators and punctuation are taken literally. A word typed with a trailing *
+    matches as a prefix. Returns None if there are no words.
+    """
+
+    terms = []
+    """Initializes the list of quoted terms."""
+
+    for word in text.split():
+        """Iterates through each typed word."""
+
+        prefix = word.endswith("*")
+        """Checks whether the user asked for a prefix match."""
+
+        word = word.rstrip("*").replace('"', '""')
+        """Removes the prefix marker and escapes quotes for FTS5 strings."""
+
+        if word:
+            """Checks whether anything is left of the word."""
+
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+            """Adds the quoted term."""
+
+    return " ".join(terms) or None
+    """Returns the query, or None if there are no words."""
+
+def mark(text):
+    """
+    Escape highlighted text for HTML and turn the match markers into <mark> tags.
+    """
+
+    if not text:
+        """Checks whether there is any text."""
+
+        return Markup("")
+        """Returns empty markup."""
+
+    escaped = str(escape(text))
+    """Escapes the stored text so it can't inject markup."""
+
+    return Markup(escaped.replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_END, "</mark>"))
+    """Returns the safe HTML with matches wrapped in <mark>."""
+
+@timed("db.search", rows=lambda page: len(page[0]))
+def search(conn, text, kinds=None, page=1, limit=20):
+    """
+    Return one page of documents matching the text, best match first (BM25, with
+    title matches weighted above body matches), and whether a next page exists.
+    Each result has its kind, source row id, highlighted title, and body snippet.
+    Only the newest MAX_CANDIDATES matches are ranked, so a word that appears in
+    most documents costs no more than a rare one. Each kind searched gets an equal
+    share of the candidates, taken newest first in its own table's row order (the
+    document rowids interleave the tables, so one table's ids would otherwise win).
+    """
+
+    query = match_query(text)
+    """Builds the FTS5 query from the user's text."""
+
+    if query is None:
+        """Checks whether there is anything to search for."""
+
+        return [], False
+        """Returns no results."""
+
+    kinds = [kind for kind in (kinds or KINDS) if kind in KINDS]
+    """Keeps only the known document kinds to search."""
+
+    if not kinds:
+        """Checks whether any known kind was asked for."""
+
+        return [], False
+        """Returns no results."""
+
+    candidates = """
+        SELECT * FROM (
+            SELECT rowid, bm25(search_index, 10.0, 1.0) AS score
+            FROM search_index
+            WHERE search_index MATCH ? AND rowid % ? = ?
+            ORDER BY rowid DESC
+            LIMIT ?
+        )
+    """
+    """Defines the query for one kind's newest candidates. The kind is read from the low bits of the rowid (not
+    the stored column, which would load every matching document), and rowid order within a kind follows its
+    table's row order."""
+
+    share = max(1, MAX_CANDIDATES // len(kinds))
+    """Splits the candidates evenly between the kinds searched."""
+
+    ranked = [row[0] for row in conn.execute(f"""
+        SELECT rowid FROM ({" UNION ALL ".join([candidates] * len(kinds))})
+        ORDER BY score
+        LIMIT ? OFFSET ?
+    """, [value for kind in kinds for value in (query, KIND_COUNT, KINDS[kind], share)] + [limit + 1, (max(page, 1) - 1) * limit])]
+    """Ranks the candidates of every kind together and takes the requested page, plus one row to know whether
+    another page exists."""
+
+    if not ranked:
+        """Checks whether anything matched."""
+
+        return [], False
+        """Returns no results."""
+
+    page_ids = ranked[:limit]
+    """Keeps the document ids for this page."""
+
+    highlighted = {
+        row["rowid"]: row
+        for row in conn.execute(f"""
+            SELECT rowid, kind,
+                   highlight(search_index, 0, ?, ?) AS title,
+                   snippet(search_index, 1, ?, ?, '…', 24) AS snippet
+            FROM search_index
+            WHERE search_index MATCH ? AND rowid IN ({",".join("?" * len(page_ids))})
+        """, [HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END, query, *page_ids])
+    }
+    """Highlights only the documents on this page (highlighting is the expensive part of a result)."""
+
+    results = [
+        {
+            "kind": highlighted[rowid]["kind"],
+            "ref": rowid // KIND_COUNT,
+            "title": mark(highlighted[rowid]["title"]),
+            "snippet": mark(highlighted[rowid]["snippet"]),
+        }
+        for rowid in page_ids if rowid in highlighted
+    ]
+    """Builds the results in rank order with the source row id and safe highlighted HTML."""
+
+    return results, len(ranked) > limit
+    """Returns the page of results and whether there are more."""
+
+if __name__ == "__main__":
+    """Rebuilds the search index when run as: python -m utils.search reindex"""
+
+    if sys.argv[1:] != ["reindex"]:
+        """Checks whether a known command was given."""
+
+        sys.exit("usage: python -m utils.search reindex")
+        """Prints the usage and exits."""
+
+    start = time.perf_counter()
+    """Records the start time."""
+
+    with connection(DB_PATH) as conn:
+        """Borrows a pooled connection to the database."""
+
+        migrate(conn)
+        """Brings the database up to date, creating the search table and triggers if they are missing."""
+
+        indexed = reindex(conn)
+        """Rebuilds the index."""
+
+    print(f"Indexed {indexed} documents in {time.perf_counter() - start:.2f}s.")
+    """Prints how many documents were indexed and how long it took."""
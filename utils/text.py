@@ -0,0 +1,169 @@
+import html
+"""Imports the html module to decode HTML entities such as &amp; and &nbsp;."""
+
+import re
+"""Imports the regex module for precompiled cleaning patterns."""
+
+from functools import lru_cache
+"""Imports lru_cache to memoize cleaned text across refreshes."""
+
+TAG_RE = re.compile(r"<[^>]*>")
+"""Matches HTML tags (including ones that span lines)."""
+
+WHITESPACE_RE = re.compile(r"\s+")
+"""Matches runs of whitespace."""
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+"""Matches the words of lowercased text."""
+
+STOPWORDS = frozenset("""
+    a an and are as at be by for from in into is it of on or the this to with
+    our your you we will am pm events event
+""".split())
+"""Defines words too common to say anything about an event or a preference."""
+
+def is_clean(text):
+    """
+    Check whether clean_text would leave a non-empty string unchanged: no tags, no
+    entities, and no whitespace other than single inner spaces. Uses substring checks,
+    which are much faster than a regex scan for the common already-clean case.
+    """
+
+    return not (
+        "<" in text or "&" in text or "  " in text or "\n" in text or "\t" in text
+        or "\r" in text or "\xa0" in text or "\f" in text or "\v" in text
+        or text[0].isspace() or text[-1].isspace()
+    )
+    """Returns True if none of the markers of dirty text are present."""
+
+CACHE_SIZE = 8192
+"""Defines how many distinct cleaned strings are remembered (alert text repeats heavily between polls)."""
+
+def collapse_whitespace(text):
+    """
+    Collapse runs of whitespace into single spaces (no tag or entity handling).
+    Used for text that a parser has already decoded, such as scraped event fields.
+    """
+
+    if not text:
+        """Checks if the input text is empty or None."""
+
+        return text
+        """Returns the empty value unchanged."""
+
+    return WHITESPACE_RE.sub(" ", text)
+    """Returns the text with each whitespace run replaced by one space."""
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _clean(text):
+    """
+    Remove HTML tags, decode entities, and normalize whitespace (memoized slow path).
+    """
+
+    text = TAG_RE.sub("", text) if "<" in text else text
+    """Removes any HTML tags before decoding, so escaped markup like &lt;b&gt; stays as text."""
+
+    text = html.unescape(text) if "&" in text else text
+    """Decodes HTML entities such as &amp; and &nbsp;."""
+
+    return " ".join(text.split()) or None
+    """Collapses whitespace, strips the ends, and returns None if nothing is left."""
+
+def clean_text(text):
+    """
+    Cleans text: remove HTML tags, decode entities, normalize whitespace.
+    Returns None for empty input. Already-clean text is returned as-is without
+    allocating, and everything else is memoized.
+    """
+
+    if not text:
+        """Checks if the input text is empty or None."""
+
+        return None
+        """Returns None if no text is provided."""
+
+    if is_clean(text):
+        """Checks the common case where the text is already clean."""
+
+        return text
+        """Returns the text unchanged."""
+
+    return _clean(text)
+    """Returns the cleaned (and cached) text."""
+
+def clean_column(values):
+    """
+    Clean a whole column of values in one call, cleaning each distinct value once.
+    """
+
+    cleaned = {}
+    """Stores the cleaned form of each distinct value seen in this column."""
+
+    results = []
+    """Initializes the list of cleaned values."""
+
+    for value in values:
+        """Iterates through each value in the column."""
+
+        if value not in cleaned:
+            """Checks whether this value has already been cleaned in this call."""
+
+            cleaned[value] = clean_text(value)
+            """Cleans the value and remembers the result."""
+
+        results.append(cleaned[value])
+        """Appends the cleaned value in the original order."""
+
+    return results
+    """Returns the cleaned column."""
+
+def terms(text):
+    """
+    Split text into a set of normalized match terms: lowercased words without stopwords
+    or single letters, with simple English plurals made singular ("concerts" -> "concert").
+    Used to match user preferences against events.
+    """
+
+    found = set()
+    """Initializes the set of terms."""
+
+    for word in WORD_RE.findall((text or "").lower()):
+        """Iterates through each word."""
+
+        if len(word) < 2 or word in STOPWORDS:
+            """Checks whether the word is too short or too common to match on."""
+
+            continue
+            """Skips the word."""
+
+        if len(word) > 4 and word.endswith("ies"):
+            """Checks for a plural like "parties"."""
+
+            word = word[:-3] + "y"
+            """Restores the singular "party"."""
+
+        elif word.endswith(("sses", "xes", "ches", "shes")):
+            """Checks for a plural like "classes" or "matches"."""
+
+            word = word[:-2]
+            """Removes the plural "es"."""
+
+        elif len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            """Checks for a plain plural like "concerts"."""
+
+            word = word[:-1]
+            """Removes the plural "s"."""
+
+        found.add(word)
+        """Adds the term."""
+
+    return found
+    """Returns the terms."""
+
+def cache_info():
+    """
+    Return hit/miss statistics for the memoized cleaning cache.
+    """
+
+    return _clean.cache_info()
+    """Returns the lru_cache statistics."""
@@ -0,0 +1,126 @@
+import datetime
+"""Imports datetime to parse stored dates and convert them to and from epoch seconds."""
+
+import functools
+"""Imports functools to memoize parsing, since scraped pages and bulk loads repeat the same dates."""
+
+import os
+"""Imports the os module to read the campus time zone from an environment variable."""
+
+from zoneinfo import ZoneInfo
+"""Imports the IANA time zone database used for the campus time zone."""
+
+TIMEZONE = ZoneInfo(os.environ.get("CAMPUSCONNECT_TIMEZONE", "America/New_York"))
+"""Defines the campus time zone, used for dates and times that don't carry a UTC offset."""
+
+DAY = 86400
+"""Defines the number of seconds in a day."""
+
+COLUMNS = {
+    "events": [("date", "starts_at")],
+    "external_events": [("date", "starts_at")],
+    "api_data": [("effective", "effective_at"), ("expires", "expires_at")],
+}
+"""Maps each table to its (text column, epoch column) pairs, kept in sync at ingest."""
+
+@functools.lru_cache(maxsize=4096)
+def to_epoch(value):
+    """
+    Convert a stored date or timestamp to integer seconds since the epoch (UTC), or None
+    if it can't be parsed. ISO 8601 values with an offset (weather.gov's '2025-04-05T14:00:00-04:00',
+    or a trailing Z) keep it. Values without one, such as seed dates ('2025-04-05') and
+    most scraped <time datetime> values, are read in the campus time zone, and bare dates
+    mean midnight at the start of that day.
+    """
+
+    if not value or not isinstance(value, str):
+        """Checks whether there is text to parse."""
+
+        return None
+        """Returns None for a missing value."""
+
+    try:
+        parsed = datetime.datetime.fromisoformat(value.strip())
+        """Parses the ISO 8601 date or timestamp."""
+
+    except ValueError:
+        """Handles text that isn't an ISO 8601 date."""
+
+        return None
+        """Returns None so the row is left out of range scans instead of failing ingest."""
+
+    if parsed.tzinfo is None:
+        """Checks whether the value is a local time."""
+
+        parsed = parsed.replace(tzinfo=TIMEZONE)
+        """Reads it in the campus time zone."""
+
+    return int(parsed.timestamp())
+    """Returns the whole seconds since the epoch."""
+
+def from_epoch(epoch):
+    """
+    Convert epoch seconds to an aware datetime in the campus time zone (None stays None).
+    """
+
+    return None if epoch is None else datetime.datetime.fromtimestamp(epoch, TIMEZONE)
+    """Returns the local datetime."""
+
+def today():
+    """
+    Return the current date in the campus time zone as YYYY-MM-DD.
+    """
+
+    return datetime.datetime.now(TIMEZONE).date().isoformat()
+    """Returns the date."""
+
+def day_range(start=None, end=None):
+    """
+    Turn a date range from a query string into epoch seconds [start, end). Bare dates
+    cover whole days, so end='2025-04-30' includes every event on the 30th. A missing,
+    unparseable, or out-of-range bound is returned as None.
+    """
+
+    first = to_epoch(start)
+    """Converts the start of the range."""
+
+    last = to_epoch(end)
+    """Converts the end of the range."""
+
+    if last is not None and len(end.strip()) == 10:
+        """Checks whether the end is a bare date."""
+
+        try:
+            last = to_epoch((datetime.date.fromisoformat(end.strip()) + datetime.timedelta(days=1)).isoformat())
+            """Moves the end to the following midnight (correct across daylight saving changes)."""
+
+        except (OverflowError, ValueError):
+            """Handles the last representable day (9999-12-31), which has no following midnight."""
+
+            last = None
+            """Leaves the range open-ended, since nothing can start after that day anyway."""
+
+    elif last is not None:
+        """Handles an end with a time of day."""
+
+        last += 1
+        """Makes the end inclusive."""
+
+    return first, last
+    """Returns the bounds."""
+
+def normalize_rows(conn, table, after=0):
+    """
+    Fill in the epoch columns of a table's rows with a rowid above `after`, inside the
+    caller's transaction. Used for rows written without them, by the migration that
+    added the columns and by the bulk loader. Returns the number of rows updated.
+    """
+
+    conn.create_function("to_epoch", 1, to_epoch, deterministic=True)
+    """Makes the parser callable from SQL, so the update is a single statement."""
+
+    assignments = ", ".join(f"{epoch} = to_epoch({text})" for text, epoch in COLUMNS[table])
+    """Builds the column assignments."""
+
+    return conn.execute(f"UPDATE {table} SET {assignments} WHERE rowid > ?", (after,)).rowcount
+    """Converts the rows and returns how many there were."""